@@ -1,7 +1,9 @@
 import functools
 import json
 
-from flask import g, request, session
+from flask import current_app, g, request, session
+from flask_login import current_user, login_required
+from werkzeug.exceptions import Forbidden
 
 data_quality_items = dict()
 
@@ -78,6 +80,29 @@ def store_query_parameters(names):
     return decorate
 
 
+def admin_required(f):
+    """Decorator for Flask routes which may only be accessed by administrators.
+
+    The user must be logged in (see Flask-Login's login_required decorator), and their username must be included in
+    the ADMIN_USERS setting. Otherwise a Forbidden exception is raised. As for the login_required decorator, nothing
+    is checked if the LOGIN_DISABLED setting is truthy.
+
+    Params:
+    -------
+    f: function
+        Route function.
+    """
+
+    @functools.wraps(f)
+    def wrapped(*args, **kwargs):
+        if not current_app.config.get('LOGIN_DISABLED') and \
+                current_user.get_id() not in current_app.config['ADMIN_USERS']:
+            raise Forbidden('Only administrators may access this page.')
+        return f(*args, **kwargs)
+
+    return login_required(wrapped)
+
+
 def data_quality(name, caption, export_name=None, **kwargs):
     """Decorator for data quality items to be displayed.
 
@@ -88,6 +113,34 @@ def data_quality(name, caption, export_name=None, **kwargs):
     The name passed to the decorator can be used to retrieve the (decorated) function by means of the
     data_quality_figure method. It must be unique within a module.
 
+    Alternatively, you may pass a render function to the decorator. The decorated function must then return the data
+    for the item, and the render function is called with this data and must return the element (or a Bokeh model).
+    Unless you pass False as render_in_process argument, the render function is called in a worker process if the
+    RENDER_PROCESSES setting is positive, so that it has to be defined at the top level of a module, and the data
+    should consist of plain values, NumPy arrays or data frames. (A functools.partial object for such a function is
+    fine as well.)
+
+    If you pass a render function and a truthy split_range argument, the decorated function must return a data frame,
+    and the data frames for consecutive parts of the date range must be combinable by concatenation. The date range may
+    then be split into partitions which are queried in parallel (see the ITEM_SPLIT_SECONDS setting).
+
+    If the content of data quality items is cached (see the ITEM_CACHE_TTL setting), you may pass a max_staleness
+    argument. Expired content is then served for up to that many seconds after its expiry, while it is recreated in the
+    background. Choose a value which is acceptable for the users; nightly statistics may be a few hours old, whereas
+    data for the current night should rather not be stale.
+
+    Instead of a render function you may pass a plot spec (see app.main.plot_specs.PlotSpec) as the spec argument. The
+    decorated function must then return a data frame with the data to plot, and the plot is created from the spec.
+    The item can then be rendered in other formats (such as CSV or PNG) as well.
+
+    The data of items with a render function or plot spec can be exported from the data API (see app.main.data_api),
+    which splits the date range into chunks. If the decorated function of such an item returns a data frame, the data
+    frames for consecutive parts of the date range must hence be combinable by concatenation.
+
+    If several items on a page query the same data, declare it as a dataset (see app.main.datasets.dataset) and pass
+    the datasets used by an item as its inputs argument (see app.main.datasets.dataset_input). The datasets are then
+    queried once per page and shared by the items.
+
     Params:
     -------
     name: str
@@ -98,7 +151,11 @@ def data_quality(name, caption, export_name=None, **kwargs):
         Name to use as filename when this item is exported to file (without the file extension). The default is to use
         the value of the name argument.
     **kwargs: keyword arguments
-        Other keyword arguments.
+        Other keyword arguments, such as render (the render function), render_in_process (whether the render
+        function may be called in a worker process; True by default), split_range (whether the date range may be
+        split; False by default), max_staleness (number of seconds after expiry for which cached content may be
+        served while it is recreated; 0 by default), inputs (the input datasets; none by default) and spec (the plot
+        spec; none by default).
     """
 
     def decorate(func):
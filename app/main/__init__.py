@@ -9,4 +9,4 @@ def bokeh_resources():
     return dict(bokeh_resources=CDN)
 
 
-from . import views, errors
+from . import views, errors, prewarming
@@ -0,0 +1,516 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import pickle
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+# default directory for the file of a shared memory cache, which is named after the cache
+DEFAULT_SHARED_MEMORY_DIR = '/dev/shm'
+
+# default URL of the Redis server
+DEFAULT_REDIS_URL = 'redis://localhost:6379/0'
+
+# number of bytes per slot of the shared memory cache, including the slot header
+SHARED_MEMORY_SLOT_BYTES = 2 * 1024 * 1024
+
+# number of writes to the filesystem cache after which the number of its entries is checked
+FILESYSTEM_PRUNE_INTERVAL = 100
+
+# number of seconds after which Redis removes an entry
+REDIS_ENTRY_EXPIRY = 7 * 24 * 3600
+
+# number of seconds to wait for the Redis server
+REDIS_SOCKET_TIMEOUT = 5
+
+# backends created in this process, keyed by the arguments of cache_backend
+_backends = OrderedDict()
+_backends_lock = threading.Lock()
+
+
+def cache_backend(name, kind, location=None, size=None):
+    """Return a cache backend.
+
+    The following kinds are supported.
+
+    memory: A least recently used cache in the memory of the current process (see MemoryCache). The location is
+    ignored.
+
+    shared_memory: A cache in a memory-mapped file shared by all processes on the host (see SharedMemoryCache). The
+    location is the path of the file, which should be on a RAM disk such as /dev/shm.
+
+    filesystem: A directory with a file per entry (see FilesystemCache), which may be on a network file system
+    shared by several hosts. The location is the path of the directory.
+
+    redis: A Redis server, or any server understanding the Redis protocol (see RedisCache). The location is the URL of
+    the server, such as redis://localhost:6379/0.
+
+    A backend is only created once per process for the same arguments. Caches with different names are independent
+    of each other, even if they are of the same kind.
+
+    Params:
+    -------
+    name: str
+        Name of the cache, such as 'item_cache'. It is used for the default location.
+    kind: str
+        Kind of backend.
+    location: str
+        Location of the cache, or None or an empty string for the default location. This is a file named after the
+        cache in DEFAULT_SHARED_MEMORY_DIR for the shared memory backend, a directory named after the cache (relative
+        to the working directory) for the filesystem backend and DEFAULT_REDIS_URL for the redis backend.
+    size: int
+        Maximum number of entries (for the memory and filesystem backends) or number of slots (for the shared memory
+        backend). This is ignored for the redis backend.
+
+    Return:
+    -------
+    CacheBackend:
+        The backend.
+    """
+
+    key = (name, kind, location, size, os.getpid())
+    with _backends_lock:
+        if key not in _backends:
+            if kind == 'memory':
+                backend = MemoryCache(max_entries=size)
+            elif kind == 'shared_memory':
+                backend = SharedMemoryCache(path=location or os.path.join(DEFAULT_SHARED_MEMORY_DIR,
+                                                                          'data_quality_' + name),
+                                            slots=size)
+            elif kind == 'filesystem':
+                backend = FilesystemCache(directory=location or name, max_entries=size)
+            elif kind == 'redis':
+                backend = RedisCache(url=location or DEFAULT_REDIS_URL, namespace=name)
+            else:
+                raise ValueError('Unknown cache backend: {kind}'.format(kind=kind))
+            backend.name = name
+            _backends[key] = backend
+        return _backends[key]
+
+
+def backend_stats():
+    """Return the hit and miss counts of all cache backends used in this process.
+
+    Return:
+    -------
+    list of dict:
+        The name, kind, location, number of hits and number of misses of each backend.
+    """
+
+    with _backends_lock:
+        backends = [backend for key, backend in _backends.items() if key[4] == os.getpid()]
+    return [backend.stats() for backend in backends]
+
+
+def _hashed_key(key):
+    """Return the SHA-1 digest of a cache key.
+
+    Params:
+    -------
+    key: str
+        Cache key.
+
+    Return:
+    -------
+    bytes:
+        The digest.
+    """
+
+    return hashlib.sha1(key.encode('utf-8')).digest()
+
+
+class CacheBackend:
+    """Base class for cache backends.
+
+    Keys are strings, and values may be any picklable objects. The get method counts hits and misses, so that the
+    counts have the same meaning for all backends: they refer to the lookups made by the current process.
+
+    Subclasses must implement the _get and _set methods.
+
+    Params:
+    -------
+    location: str
+        Location of the cache, as shown by the stats method.
+    """
+
+    kind = None
+
+    def __init__(self, location=None):
+        self.name = None
+        self.location = location
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value for a key.
+
+        Params:
+        -------
+        key: str
+            Key.
+
+        Return:
+        -------
+        object:
+            The value, or None if there is no value for the key.
+        """
+
+        value = self._get(key)
+        with self._counter_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Store the value for a key.
+
+        Params:
+        -------
+        key: str
+            Key.
+        value: object
+            Value. It must be picklable and must not be None.
+        """
+
+        self._set(key, value)
+
+    def stats(self):
+        """Return the hit and miss counts.
+
+        Return:
+        -------
+        dict:
+            The name, kind, location, number of hits and number of misses.
+        """
+
+        with self._counter_lock:
+            return dict(name=self.name, kind=self.kind, location=self.location, hits=self.hits, misses=self.misses)
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, value):
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    """Least recently used cache in the memory of the current process.
+
+    Values are stored as they are, without pickling.
+
+    Params:
+    -------
+    max_entries: int
+        Maximum number of entries.
+    """
+
+    kind = 'memory'
+
+    def __init__(self, max_entries):
+        CacheBackend.__init__(self)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        """Remove all entries."""
+
+        with self._lock:
+            self._entries.clear()
+
+    def _get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SharedMemoryCache(CacheBackend):
+    """Cache in a memory-mapped file shared by all processes on the host.
+
+    The file is divided into slots of SHARED_MEMORY_SLOT_BYTES bytes, and every key is mapped to a slot by its hash. A
+    new entry replaces any entry in its slot, and values which don't fit into a slot aren't cached. Every slot starts
+    with the SHA-1 digest of its key and the length of the pickled value. Slots are locked with POSIX record locks
+    while they are read or written.
+
+    Params:
+    -------
+    path: str
+        Path of the file. It is created if it doesn't exist.
+    slots: int
+        Number of slots.
+    """
+
+    kind = 'shared_memory'
+
+    # format of the slot header (key digest and value length)
+    HEADER = struct.Struct('<20sQ')
+
+    def __init__(self, path, slots):
+        CacheBackend.__init__(self, location=path)
+        self.slots = slots
+        size = slots * SHARED_MEMORY_SLOT_BYTES
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._lock = threading.Lock()
+
+    def _slot(self, digest):
+        return int.from_bytes(digest[:8], 'little') % self.slots * SHARED_MEMORY_SLOT_BYTES
+
+    def _get(self, key):
+        digest = _hashed_key(key)
+        offset = self._slot(digest)
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_SH, SHARED_MEMORY_SLOT_BYTES, offset)
+            try:
+                slot_digest, length = self.HEADER.unpack_from(self._map, offset)
+                if slot_digest != digest or length == 0:
+                    return None
+                start = offset + self.HEADER.size
+                data = self._map[start:start + length]
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, SHARED_MEMORY_SLOT_BYTES, offset)
+        entry_key, value = pickle.loads(data)
+        return value if entry_key == key else None
+
+    def _set(self, key, value):
+        data = pickle.dumps((key, value), protocol=pickle.HIGHEST_PROTOCOL)
+        if self.HEADER.size + len(data) > SHARED_MEMORY_SLOT_BYTES:
+            return
+        digest = _hashed_key(key)
+        offset = self._slot(digest)
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, SHARED_MEMORY_SLOT_BYTES, offset)
+            try:
+                start = offset + self.HEADER.size
+                self._map[start:start + len(data)] = data
+                self.HEADER.pack_into(self._map, offset, digest, len(data))
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, SHARED_MEMORY_SLOT_BYTES, offset)
+
+
+class FilesystemCache(CacheBackend):
+    """Cache with a file per entry in a directory.
+
+    Entries are written to a temporary file first, which is then renamed, so that readers never see a partially
+    written entry, even on a network file system shared by several hosts. Every FILESYSTEM_PRUNE_INTERVAL writes the
+    oldest entries are removed if there are more than max_entries.
+
+    Params:
+    -------
+    directory: str
+        Directory for the entries. It is created if it doesn't exist.
+    max_entries: int
+        Maximum number of entries, or None for no limit.
+    """
+
+    kind = 'filesystem'
+
+    def __init__(self, directory, max_entries=None):
+        CacheBackend.__init__(self, location=directory)
+        self.directory = directory
+        self.max_entries = max_entries
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def prune(self, retention):
+        """Remove the entries which haven't been written for some time.
+
+        Params:
+        -------
+        retention: float
+            Number of seconds after which an entry is removed.
+
+        Return:
+        -------
+        int:
+            The number of removed entries.
+        """
+
+        now = time.time()
+        return self._remove([path for path, modified in self._entry_files() if now - modified > retention])
+
+    def _path(self, key):
+        return os.path.join(self.directory, _hashed_key(key).hex() + '.pickle')
+
+    def _get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                entry_key, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return value if entry_key == key else None
+
+    def _set(self, key, value):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = '{path}.{host}.{pid}.{thread}.tmp'.format(path=path, host=socket.gethostname(), pid=os.getpid(),
+                                                             thread=threading.get_ident())
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((key, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._writes += 1
+            check = self.max_entries is not None and self._writes % FILESYSTEM_PRUNE_INTERVAL == 0
+        if check:
+            files = sorted(self._entry_files(), key=lambda entry: entry[1])
+            self._remove([path for path, _ in files[:max(len(files) - self.max_entries, 0)]])
+
+    def _entry_files(self):
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for name in os.listdir(self.directory):
+            if name.endswith('.pickle'):
+                path = os.path.join(self.directory, name)
+                try:
+                    entries.append((path, os.path.getmtime(path)))
+                except OSError:
+                    pass
+        return entries
+
+    @staticmethod
+    def _remove(paths):
+        removed = 0
+        for path in paths:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+class RedisCache(CacheBackend):
+    """Cache on a server understanding the Redis protocol.
+
+    Only the GET and SET commands are used, so that any server implementing these commands of the Redis
+    serialization protocol (RESP) can be used. Entries expire after REDIS_ENTRY_EXPIRY seconds. If the server can't be
+    reached, lookups are treated as misses and writes are skipped.
+
+    Params:
+    -------
+    url: str
+        URL of the server, such as redis://localhost:6379/0.
+    namespace: str
+        Prefix for the keys on the server, so that several caches can use the same server.
+    """
+
+    kind = 'redis'
+
+    def __init__(self, url, namespace='cache'):
+        CacheBackend.__init__(self, location=url)
+        self.namespace = namespace
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.database = int(parsed.path.strip('/') or 0)
+        self._socket = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        try:
+            data = self._command(b'GET', self._redis_key(key))
+        except (OSError, RedisError):
+            return None
+        if data is None:
+            return None
+        entry_key, value = pickle.loads(data)
+        return value if entry_key == key else None
+
+    def _set(self, key, value):
+        data = pickle.dumps((key, value), protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            self._command(b'SET', self._redis_key(key), data, b'EX', str(REDIS_ENTRY_EXPIRY).encode())
+        except (OSError, RedisError):
+            pass
+
+    def _redis_key(self, key):
+        return 'dq:{namespace}:{digest}'.format(namespace=self.namespace, digest=_hashed_key(key).hex()).encode()
+
+    def _command(self, *args):
+        with self._lock:
+            try:
+                if self._socket is None:
+                    self._connect()
+                return self._send(*args)
+            except (OSError, RedisError):
+                self._close()
+                raise
+
+    def _connect(self):
+        self._socket = socket.create_connection((self.host, self.port), timeout=REDIS_SOCKET_TIMEOUT)
+        self._reader = self._socket.makefile('rb')
+        if self.password:
+            self._send(b'AUTH', self.password.encode())
+        if self.database:
+            self._send(b'SELECT', str(self.database).encode())
+
+    def _close(self):
+        if self._socket is not None:
+            try:
+                self._reader.close()
+                self._socket.close()
+            except OSError:
+                pass
+        self._socket = None
+        self._reader = None
+
+    def _send(self, *args):
+        request = b'*' + str(len(args)).encode() + b'\r\n'
+        for arg in args:
+            request += b'$' + str(len(arg)).encode() + b'\r\n' + arg + b'\r\n'
+        self._socket.sendall(request)
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise RedisError('Connection closed by the server')
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b'+':
+            return payload
+        if prefix == b'-':
+            raise RedisError(payload.decode('utf-8', 'replace'))
+        if prefix == b':':
+            return int(payload)
+        if prefix == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if prefix == b'*':
+            count = int(payload)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise RedisError('Invalid reply from the server: {line}'.format(line=line))
+
+
+class RedisError(Exception):
+    """Error reported by a Redis server or caused by an invalid reply."""
+
+    pass
@@ -0,0 +1,565 @@
+import io
+import json
+import math
+import os
+import tempfile
+import zipfile
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from flask import current_app
+
+from app.main.data_quality import data_quality_item
+from app.main.datasets import DatasetPlan
+from app.main.plot_specs import json_values
+from app.main.scheduling import split_date_range
+
+# route for getting the data of a data quality item; the page path and item name are appended
+DATA_API_ROUTE = '/api/data/'
+
+# output formats of the data API with their MIME types, in the order of preference
+DATA_FORMATS = OrderedDict([('json', 'application/json'),
+                            ('csv', 'text/csv'),
+                            ('arrow', 'application/vnd.apache.arrow.stream'),
+                            ('npz', 'application/x-npz')])
+
+# route for getting the data of several data quality items of a page as a zip archive; the page path is appended
+DATA_EXPORT_ROUTE = '/api/export/'
+
+# maximum number of rows encoded at a time
+ENCODE_CHUNK_ROWS = 10000
+
+# number of bytes copied at a time from a temporary file into the output
+COPY_CHUNK_BYTES = 1024 * 1024
+
+# name of the temporary file for a zip archive, in the temporary directory of the archive
+EXPORT_ARCHIVE_FILE = 'export.zip'
+
+
+def has_item_data(details):
+    """Check whether the data of a data quality item can be obtained without creating its content.
+
+    This is the case if the item has a render function or a plot spec, as its function then returns the data rather
+    than the content.
+
+    Params:
+    -------
+    details: dict
+        Details of the item, as returned by app.main.data_quality.data_quality_item.
+
+    Return:
+    -------
+    bool:
+        Whether the item function returns the item's data.
+    """
+
+    return details.get('spec') is not None or details.get('render') is not None
+
+
+def data_format(requested, accept_mimetypes):
+    """Return the output format for a request to the data API.
+
+    A format requested explicitly (with the format query parameter) takes precedence over the Accept header. If there
+    is no Accept header, JSON is used.
+
+    Params:
+    -------
+    requested: str
+        Explicitly requested format, or None.
+    accept_mimetypes: MIMEAccept
+        MIME types accepted by the client.
+
+    Return:
+    -------
+    str or None:
+        The output format (a key of DATA_FORMATS), or None if none of the formats is acceptable.
+    """
+
+    if requested:
+        return requested if requested in DATA_FORMATS else None
+    if not accept_mimetypes:
+        return 'json'
+    mimetype = accept_mimetypes.best_match(list(DATA_FORMATS.values()))
+    for output_format, format_mimetype in DATA_FORMATS.items():
+        if format_mimetype == mimetype:
+            return output_format
+    return None
+
+
+def item_frames(package, name, start_date, end_date):
+    """Generate the data of a data quality item in chunks.
+
+    The item must have a render function or a plot spec (see has_item_data), and its function must return a data
+    frame. The date range is split with item_date_ranges, and the ranges are queried one after the other. See
+    item_range_frames for the generated data frames.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    package: str
+        Package containing the item.
+    name: str
+        Name of the item.
+    start_date: date
+        Start of the date range (inclusive).
+    end_date: date
+        End of the date range (exclusive).
+
+    Return:
+    -------
+    generator:
+        The data frames.
+    """
+
+    for range_start, range_end in item_date_ranges(package, name, start_date, end_date):
+        for df in item_range_frames(package, name, range_start, range_end):
+            yield df
+
+
+def item_date_ranges(package, name, start_date, end_date):
+    """Return the date ranges for which the data of a data quality item is queried when it is exported.
+
+    The date range is split into ranges of the number of days given by the DATA_API_CHUNK_DAYS setting, so that only
+    the data of a single range needs to be kept in memory at a time. If this setting isn't positive, the whole date
+    range is queried at once.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    package: str
+        Package containing the item.
+    name: str
+        Name of the item.
+    start_date: date
+        Start of the date range (inclusive).
+    end_date: date
+        End of the date range (exclusive).
+
+    Return:
+    -------
+    list of tuple:
+        The start (inclusive) and end (exclusive) of the ranges, in chronological order.
+    """
+
+    chunk_days = current_app.config['DATA_API_CHUNK_DAYS']
+    if chunk_days > 0:
+        parts = max(int(math.ceil((end_date - start_date).days / chunk_days)), 1)
+        return split_date_range(start_date, end_date, parts)
+    return [(start_date, end_date)]
+
+
+def item_range_frames(package, name, start_date, end_date):
+    """Query the data of a data quality item for a date range and generate it in chunks.
+
+    The item must have a render function or a plot spec (see has_item_data), and its function must return a data
+    frame. This data frame is split into chunks of at most ENCODE_CHUNK_ROWS rows, and categorical columns are
+    converted to plain columns. An empty data frame is generated as it is.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    package: str
+        Package containing the item.
+    name: str
+        Name of the item.
+    start_date: date
+        Start of the date range (inclusive).
+    end_date: date
+        End of the date range (exclusive).
+
+    Return:
+    -------
+    generator:
+        The data frames.
+    """
+
+    func, details = data_quality_item(package, name)
+    if not has_item_data(details):
+        raise ValueError('The data quality item {name} has neither a render function nor a plot spec.'
+                         .format(name=name))
+
+    df = func(start_date=start_date, end_date=end_date)
+    if not isinstance(df, pd.DataFrame):
+        raise ValueError('The function of the data quality item {name} does not return a data frame.'
+                         .format(name=name))
+    for column in df.columns:
+        if str(df[column].dtype) == 'category':
+            df[column] = df[column].astype(df[column].cat.categories.dtype)
+    if len(df) == 0:
+        yield df
+    for start in range(0, len(df), ENCODE_CHUNK_ROWS):
+        yield df.iloc[start:start + ENCODE_CHUNK_ROWS]
+
+
+def encode_frames(frames, output_format):
+    """Encode data frames with the same columns as a single table in an output format.
+
+    The table is encoded chunk by chunk with the format's encoder (see data_encoders), so that only a single data
+    frame (and no more than a chunk of the output) needs to be kept in memory.
+
+    Params:
+    -------
+    frames: iterable of DataFrame
+        Data frames, as generated by item_frames.
+    output_format: str
+        Output format.
+
+    Return:
+    -------
+    generator:
+        The encoded bytes.
+    """
+
+    if output_format not in data_encoders:
+        raise ValueError('Unsupported output format: {format}'.format(format=output_format))
+
+    sink = ChunkSink()
+    encoder = data_encoders[output_format](sink)
+    for df in frames:
+        encoder.add(df)
+        yield sink.pop()
+    for _ in encoder.finish():
+        yield sink.pop()
+
+
+def export_items(package, names, start_date, end_date, output_format):
+    """Generate a zip archive with the data of several data quality items of a page.
+
+    The archive contains a file <item name>.<output format> per item, which has the same content as the item's data
+    from the data API (see encode_frames), and a file manifest.json listing the page, date range, format and files.
+
+    The date range of each item is split as for the data API (see item_date_ranges), and the ranges are processed one
+    after the other. For every range, the items are created with a dataset plan (see app.main.datasets.DatasetPlan),
+    so that a dataset declared as an input by several items is queried once per range only. The data of an item is
+    encoded in memory, and it is compressed into the archive as soon as its last range has been processed. The archive
+    is generated on the fly, so that the bytes of an item are sent before the next item is finished.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    package: str
+        Package of the page.
+    names: list of str
+        Names of the items. The items must have a render function or plot spec (see has_item_data).
+    start_date: date
+        Start of the date range (inclusive).
+    end_date: date
+        End of the date range (exclusive).
+    output_format: str
+        Format of the item files (a key of DATA_FORMATS).
+
+    Return:
+    -------
+    generator:
+        The bytes of the zip archive.
+    """
+
+    # date ranges to query, with the items to query for them
+    steps = OrderedDict()
+    for name in names:
+        for date_range in item_date_ranges(package, name, start_date, end_date):
+            steps.setdefault(date_range, []).append(name)
+
+    # index of the last date range to query for each item
+    last_steps = {}
+    for index, date_range in enumerate(sorted(steps)):
+        for name in steps[date_range]:
+            last_steps[name] = index
+
+    files = OrderedDict((name, '{name}.{extension}'.format(name=name, extension=output_format)) for name in names)
+    buffers = {name: io.BytesIO() for name in names}
+    encoders = {name: data_encoders[output_format](buffers[name]) for name in names}
+    sink = ChunkSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for index, (range_start, range_end) in enumerate(sorted(steps)):
+            step_names = steps[(range_start, range_end)]
+            plan = DatasetPlan(package)
+            for name in step_names:
+                plan.add_item(name, data_quality_item(package, name)[1].get('inputs', ()), range_start, range_end)
+            for name in step_names:
+                for df in plan.run(name, list, item_range_frames(package, name, range_start, range_end)):
+                    encoders[name].add(df)
+            for name in names:
+                if last_steps.get(name) != index:
+                    continue
+                for _ in encoders[name].finish():
+                    pass
+                archive.writestr(files[name], buffers.pop(name).getvalue())
+                yield sink.pop()
+
+        manifest = dict(page=package,
+                        start_date=str(start_date),
+                        end_date=str(end_date),
+                        format=output_format,
+                        files=[dict(item=name, file=file) for name, file in files.items()])
+        archive.writestr('manifest.json', json.dumps(manifest, indent=2))
+    yield sink.pop()
+
+
+class JsonEncoder:
+    """Encoder writing data frames as a JSON object with the columns and rows.
+
+    The JSON object has a list of the column names as its columns property and a list of rows (lists of values) as its
+    rows property. Datetimes are given as ISO strings, and missing values as null.
+
+    Params:
+    -------
+    out: file object
+        Binary file object to write to.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self._started = False
+        self._has_rows = False
+
+    def add(self, df):
+        """Encode a data frame.
+
+        Params:
+        -------
+        df: DataFrame
+            Data frame.
+        """
+
+        if not self._started:
+            self.out.write('{{"columns": {columns}, "rows": ['
+                           .format(columns=json.dumps([str(c) for c in df.columns])).encode('utf-8'))
+            self._started = True
+        if len(df) == 0:
+            return
+        rows = ', '.join(json.dumps(list(row)) for row in zip(*[json_values(df[c]) for c in df.columns]))
+        self.out.write(((', ' if self._has_rows else '') + rows).encode('utf-8'))
+        self._has_rows = True
+
+    def finish(self):
+        """Finish the encoding.
+
+        This is a generator function, and the remaining output is written while iterating over the generator.
+        """
+
+        if not self._started:
+            self.out.write(b'{"columns": [], "rows": [')
+        self.out.write(b']}')
+        yield
+
+
+class CsvEncoder:
+    """Encoder writing data frames as CSV with a header row.
+
+    Params:
+    -------
+    out: file object
+        Binary file object to write to.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self._header = True
+
+    def add(self, df):
+        """Encode a data frame.
+
+        Params:
+        -------
+        df: DataFrame
+            Data frame.
+        """
+
+        self.out.write(df.to_csv(index=False, header=self._header, date_format='%Y-%m-%d %H:%M:%S').encode('utf-8'))
+        self._header = False
+
+    def finish(self):
+        """Finish the encoding.
+
+        This is a generator function, and the remaining output is written while iterating over the generator.
+        """
+
+        yield
+
+
+class ArrowEncoder:
+    """Encoder writing data frames as an Apache Arrow IPC stream with a record batch per data frame.
+
+    The schema of the stream is the one of the first non-empty data frame.
+
+    Params:
+    -------
+    out: file object
+        Binary file object to write to.
+    """
+
+    def __init__(self, out):
+        # PyArrow is imported here rather than at the top, as it is slow to import and only needed for this format
+        import pyarrow
+
+        self.out = out
+        self._pa = pyarrow
+        self._writer = None
+        self._empty = None
+
+    def add(self, df):
+        """Encode a data frame.
+
+        Params:
+        -------
+        df: DataFrame
+            Data frame.
+        """
+
+        if len(df) == 0:
+            self._empty = df
+            return
+        schema = self._writer.schema if self._writer is not None else None
+        batch = self._pa.RecordBatch.from_pandas(df, schema=schema, preserve_index=False)
+        if self._writer is None:
+            self._writer = self._pa.RecordBatchStreamWriter(self.out, batch.schema)
+        self._writer.write_batch(batch)
+
+    def finish(self):
+        """Finish the encoding.
+
+        This is a generator function, and the remaining output is written while iterating over the generator.
+        """
+
+        if self._writer is None:
+            empty = self._empty if self._empty is not None else pd.DataFrame()
+            schema = self._pa.Table.from_pandas(empty, preserve_index=False).schema
+            self._writer = self._pa.RecordBatchStreamWriter(self.out, schema)
+        self._writer.close()
+        yield
+
+
+class NpzEncoder:
+    """Encoder writing data frames as a NumPy .npz archive with an array per column.
+
+    The arrays are named after the columns. Columns with Python objects (such as strings) are stored as fixed-width
+    unicode strings. As the length of the arrays must be known before they are written, the data frames are spooled to
+    a temporary file per column. When the encoding is finished, the archive is written to a temporary file, which is
+    then copied to the output in blocks.
+
+    Params:
+    -------
+    out: file object
+        Binary file object to write to.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self._spools = OrderedDict()
+        self._empty = None
+
+    def add(self, df):
+        """Encode a data frame.
+
+        Params:
+        -------
+        df: DataFrame
+            Data frame.
+        """
+
+        if len(df) == 0:
+            # empty data frames might have other column types, and they are only needed if all data frames are empty
+            self._empty = df
+            return
+        self._add_columns(df)
+
+    def finish(self):
+        """Finish the encoding.
+
+        This is a generator function, and the remaining output is written while iterating over the generator.
+        """
+
+        if not self._spools and self._empty is not None:
+            self._add_columns(self._empty)
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                archive_path = os.path.join(tmp_dir, EXPORT_ARCHIVE_FILE)
+                array_path = os.path.join(tmp_dir, 'array.npy')
+                with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+                    for column, spool in self._spools.items():
+                        dtype = np.result_type(*spool['dtypes'])
+                        with open(array_path, 'wb') as f:
+                            np.lib.format.write_array_header_1_0(f, dict(descr=np.lib.format.dtype_to_descr(dtype),
+                                                                         fortran_order=False,
+                                                                         shape=(spool['rows'],)))
+                            spool['file'].seek(0)
+                            for _ in spool['dtypes']:
+                                f.write(np.load(spool['file'], allow_pickle=False).astype(dtype).tobytes())
+                        archive.write(array_path, '{column}.npy'.format(column=column))
+                        spool['file'].close()
+                        yield
+                with open(archive_path, 'rb') as f:
+                    for block in iter(lambda: f.read(COPY_CHUNK_BYTES), b''):
+                        self.out.write(block)
+                        yield
+        finally:
+            for spool in self._spools.values():
+                spool['file'].close()
+
+    def _add_columns(self, df):
+        """Spool the columns of a data frame.
+
+        Params:
+        -------
+        df: DataFrame
+            Data frame.
+        """
+
+        for column in df.columns:
+            values = df[column].values
+            if values.dtype == object:
+                values = df[column].astype(str).values.astype('U')
+            if column not in self._spools:
+                self._spools[column] = dict(file=tempfile.TemporaryFile(), dtypes=[], rows=0)
+            spool = self._spools[column]
+            np.save(spool['file'], values, allow_pickle=False)
+            spool['dtypes'].append(values.dtype)
+            spool['rows'] += len(values)
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file object collecting the written bytes until they are taken with the pop method.
+
+    The file object is not seekable, but it keeps track of its position, so that it can be used for writing zip
+    archives and Arrow streams on the fly.
+    """
+
+    def __init__(self):
+        io.RawIOBase.__init__(self)
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._position += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._position
+
+    def pop(self):
+        """Return the bytes written since the last call of this method.
+
+        Return:
+        -------
+        bytes:
+            The bytes.
+        """
+
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+# encoders for the output formats, which are called with a binary file object to write to and have add and finish
+# methods
+data_encoders = dict(json=JsonEncoder, csv=CsvEncoder, arrow=ArrowEncoder, npz=NpzEncoder)
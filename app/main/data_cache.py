@@ -0,0 +1,134 @@
+import pickle
+import re
+
+from flask import current_app
+
+from app.main.cache_backends import cache_backend
+from app.main.render_cache import current_generation
+from app.main.single_flight import flight_key
+
+# quoted string literals and identifiers in SQL, which must not be changed when normalising whitespace
+_SQL_QUOTED = re.compile(r"""('(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*"|`[^`]*`)""")
+
+
+def data_cache():
+    """Return the cache backend for query results, or None if query results aren't cached.
+
+    Query results are cached if the DATA_CACHE_SIZE setting is positive. The backend is chosen with the
+    DATA_CACHE_BACKEND setting, and its location with the DATA_CACHE_LOCATION setting (see
+    app.main.cache_backends.cache_backend). This cache is independent of the cache for the rendered content of data
+    quality items (see app.main.item_cache), so that both can have their own size and eviction.
+
+    This function must be called within a Flask app context.
+
+    Return:
+    -------
+    CacheBackend or None:
+        The cache backend.
+    """
+
+    size = current_app.config['DATA_CACHE_SIZE']
+    if size <= 0:
+        return None
+    return cache_backend('data_cache',
+                         current_app.config['DATA_CACHE_BACKEND'],
+                         current_app.config['DATA_CACHE_LOCATION'],
+                         size)
+
+
+def normalise_sql(sql):
+    """Normalise the whitespace of an SQL query.
+
+    Runs of whitespace outside quoted string literals and identifiers are replaced with a single space, and leading and
+    trailing whitespace and semicolons are removed. So the same query gets the same cache key, however it is indented.
+
+    Params:
+    -------
+    sql: str
+        SQL query.
+
+    Return:
+    -------
+    str:
+        The normalised query.
+    """
+
+    parts = _SQL_QUOTED.split(sql)
+    # the split pattern has a group, so that every odd part is a quoted literal or identifier
+    normalised = ''.join(part if i % 2 else re.sub(r'\s+', ' ', part) for i, part in enumerate(parts))
+    return normalised.strip().rstrip(';').strip()
+
+
+def data_key(sql, params=None, bind=None, schema=None):
+    """Return the cache key for the result of an SQL query.
+
+    The key consists of the normalised query (see normalise_sql), its parameters, the database bind, the column types
+    applied to the result and the current data generation (see app.main.render_cache.current_generation). Hence cached
+    results are not used any longer once the nightly pipeline has added new data.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    sql: str
+        SQL query.
+    params: list or dict
+        Query parameters.
+    bind: str
+        Bind name of the database to query.
+    schema: dict
+        Column types, keyed by column name.
+
+    Return:
+    -------
+    str:
+        The key.
+    """
+
+    return flight_key('data', normalise_sql(sql), params, bind, sorted((schema or {}).items()), current_generation())
+
+
+def cached_frame(key):
+    """Return a cached query result.
+
+    The returned data frame is a new copy, so that it may be changed freely.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    key: str
+        Key for the query result, as returned by data_key.
+
+    Return:
+    -------
+    DataFrame or None:
+        The query result, or None if query results aren't cached or the result isn't in the cache.
+    """
+
+    cache = data_cache()
+    if cache is None:
+        return None
+    data = cache.get(key)
+    return pickle.loads(data) if data is not None else None
+
+
+def cache_frame(key, df):
+    """Cache a query result.
+
+    The data frame is stored in pickled form, which keeps the column types (such as categories or 32 bit floats, see
+    app.main.data_fetching.apply_schema) and so is as compact as the data frame itself.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    key: str
+        Key for the query result, as returned by data_key.
+    df: DataFrame
+        Query result.
+    """
+
+    cache = data_cache()
+    if cache is not None:
+        cache.set(key, pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL))
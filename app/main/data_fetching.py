@@ -0,0 +1,452 @@
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from flask import current_app
+
+from app import db
+from app.main.data_cache import cache_frame, cached_frame, data_cache, data_key
+from app.main.range_cache import nightly_frames
+
+# number of rows fetched from the database at a time when streaming a query result
+STREAM_CHUNK_SIZE = 50000
+
+
+def read_sql_for_date_range(sql, start_date, end_date, bind=None, schema=None, night_column=None, streamed=False,
+                            **kwargs):
+    """Read the result of an SQL query for a date range into a data frame.
+
+    The query must contain the placeholders {start_date} and {end_date}, and these must be used for a condition
+    including the start date and excluding the end date, such as
+
+    UTStart >= '{start_date}' AND UTStart < '{end_date}'
+
+    If the date range is longer than the number of days given by the QUERY_PARTITION_DAYS setting, it is split into
+    partitions of that length, and the query is run for each partition. Up to QUERY_MAX_PARALLELISM queries are run in
+    parallel, each using its own connection from the connection pool. The partition results are concatenated in the
+    order of the partitions, so that a query ordered by date returns the same rows in the same order as a single query
+    for the whole range.
+
+    Only use this function for queries which return one or more rows per record, not for queries aggregating over the
+    whole date range (such as GROUP BY clauses on a column other than the date), as the aggregation would be done per
+    partition.
+
+    The query is parsed as a Python format string, with the start and end date of the partition and the additional
+    keyword arguments as format arguments. Hence the MySQL wildcard % has to be escaped by another %, as for Pandas'
+    read_sql function, and literal braces have to be doubled.
+
+    If a schema is given, the column types of the result are changed accordingly (see apply_schema).
+
+    The partition results are cached if caching of query results is enabled (see read_sql). If a night column is
+    given as well (and the date range is a range of dates without times, and the SDB database is queried), the results
+    are cached per night instead, and only the nights not cached yet are queried (see
+    app.main.range_cache.nightly_frames). So sliding or extending the date range by a few days only queries these
+    days. The night column must be the result column containing the datetime or date used in the date condition, and
+    it must be a column of the query's source tables as well.
+
+    Pass True as streamed argument for queries with large results, so that their rows are fetched in chunks (see
+    read_sql).
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    sql: str
+        SQL query.
+    start_date: date or datetime
+        Start of the date range (inclusive).
+    end_date: date or datetime
+        End of the date range (exclusive).
+    bind: str
+        Bind name of the database to query. The default is to query the SDB database.
+    schema: dict
+        Column types, keyed by column name.
+    night_column: str
+        Name of the result column containing the datetime or date used in the date condition.
+    streamed: bool
+        Whether to fetch the rows in chunks.
+    kwargs: dict
+        Additional format arguments for the query.
+
+    Return:
+    -------
+    DataFrame:
+        The query result.
+    """
+
+    if night_column is not None and bind is None and data_cache() is not None and end_date > start_date \
+            and not isinstance(start_date, datetime.datetime) and not isinstance(end_date, datetime.datetime):
+        def fetch_range(range_start, range_end):
+            return _read_partitions(sql, range_start, range_end, bind, schema, False, streamed, kwargs)
+
+        return _concatenate(nightly_frames(sql, start_date, end_date, night_column, fetch_range, bind=bind,
+                                           schema=schema, **kwargs),
+                            schema)
+
+    return _read_partitions(sql, start_date, end_date, bind, schema, True, streamed, kwargs)
+
+
+def _read_partitions(sql, start_date, end_date, bind, schema, cached, streamed, kwargs):
+    """Read the result of an SQL query for a date range, querying partitions of the range in parallel.
+
+    See read_sql_for_date_range for details.
+
+    Params:
+    -------
+    sql: str
+        SQL query.
+    start_date: date or datetime
+        Start of the date range (inclusive).
+    end_date: date or datetime
+        End of the date range (exclusive).
+    bind: str
+        Bind name of the database to query.
+    schema: dict
+        Column types, keyed by column name.
+    cached: bool
+        Whether to cache the partition results (see read_sql).
+    streamed: bool
+        Whether to fetch the rows in chunks (see read_sql).
+    kwargs: dict
+        Additional format arguments for the query.
+
+    Return:
+    -------
+    DataFrame:
+        The query result.
+    """
+
+    partitions = date_range_partitions(start_date,
+                                       end_date,
+                                       current_app.config['QUERY_PARTITION_DAYS'],
+                                       current_app.config['QUERY_MAX_PARALLELISM'])
+
+    app = current_app._get_current_object()
+
+    def fetch(partition):
+        with app.app_context():
+            return read_sql(sql.format(start_date=partition[0], end_date=partition[1], **kwargs),
+                            bind=bind,
+                            schema=schema,
+                            cached=cached,
+                            streamed=streamed)
+
+    if len(partitions) == 1:
+        return fetch(partitions[0])
+
+    max_workers = min(current_app.config['QUERY_MAX_PARALLELISM'], len(partitions))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        frames = list(executor.map(fetch, partitions))
+    return _concatenate(frames, schema)
+
+
+def _concatenate(frames, schema):
+    """Concatenate the query results for consecutive date ranges.
+
+    Params:
+    -------
+    frames: list of DataFrame
+        Query results, in chronological order.
+    schema: dict
+        Column types, keyed by column name.
+
+    Return:
+    -------
+    DataFrame:
+        The concatenated results.
+    """
+
+    non_empty_frames = [df for df in frames if not df.empty]
+    if not non_empty_frames:
+        return frames[0]
+    df = pd.concat(non_empty_frames, ignore_index=True)
+    # the partitions have their own categories, which Pandas falls back to object columns for when concatenating
+    return apply_schema(df, schema) if schema else df
+
+
+def read_sql(sql, bind=None, schema=None, params=None, cached=True, streamed=False):
+    """Read the result of an SQL query into a data frame.
+
+    If the DATA_CACHE_SIZE setting is positive, the result is cached (see app.main.data_cache), so that items which
+    query the same data share the result, and so that the data needn't be queried again if only the rendering of an
+    item has changed. Cached results are used until the data generation changes, i.e. until new data has been added
+    to the database.
+
+    If a schema is given, the column types of the result are changed accordingly (see apply_schema).
+
+    Pandas' read_sql function holds all the rows of the result as Python objects before it creates the data frame. If
+    streamed is True, the rows are hence fetched with a server-side cursor in chunks of STREAM_CHUNK_SIZE rows instead
+    (see stream_sql), and every chunk is converted to a data frame (with the schema applied) before the next one is
+    fetched. The peak memory use is then close to the size of the data frame.
+
+    As for Pandas' read_sql function, the MySQL wildcard % has to be escaped by another % if there are no parameters.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    sql: str
+        SQL query.
+    bind: str
+        Bind name of the database to query. The default is to query the SDB database.
+    schema: dict
+        Column types, keyed by column name.
+    params: list or dict
+        Query parameters.
+    cached: bool
+        Whether to use the cache, if caching of query results is enabled.
+    streamed: bool
+        Whether to fetch the rows in chunks.
+
+    Return:
+    -------
+    DataFrame:
+        The query result.
+    """
+
+    key = data_key(sql, params=params, bind=bind, schema=schema) if cached else None
+    df = cached_frame(key) if cached else None
+    if df is not None:
+        return df
+
+    if streamed:
+        df = stream_sql(sql, _FrameCollector(schema), bind=bind, chunksize=STREAM_CHUNK_SIZE, params=params)
+    else:
+        df = pd.read_sql(sql, db.get_engine(app=current_app, bind=bind), params=params)
+        if schema:
+            apply_schema(df, schema)
+    if cached:
+        cache_frame(key, df)
+    return df
+
+
+def apply_schema(df, schema):
+    """Change the column types of a data frame.
+
+    The schema maps column names to the types to use, such as 'float32' for values which don't need double precision
+    or 'category' for strings with few distinct values (such as file names or observation modes). Categorical columns
+    store each distinct value only once, which considerably reduces memory use. Use 'datetime64[ns]' to convert date
+    columns, which are returned as date objects by the database driver.
+
+    Columns not included in the schema are left unchanged, and columns in the schema which don't exist in the data
+    frame are ignored. The data frame is changed in place.
+
+    Params:
+    -------
+    df: DataFrame
+        Data frame.
+    schema: dict
+        Column types, keyed by column name.
+
+    Return:
+    -------
+    DataFrame:
+        The data frame.
+    """
+
+    for column, dtype in schema.items():
+        if column not in df.columns:
+            continue
+        if str(dtype).startswith('datetime64'):
+            df[column] = pd.to_datetime(df[column])
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def date_range_partitions(start_date, end_date, partition_days, max_parallelism):
+    """Split a date range into partitions.
+
+    All partitions but the last one are partition_days days long. The range is not split if it isn't longer than
+    partition_days days or if max_parallelism is less than 2, as there would be no gain from running several queries.
+
+    Params:
+    -------
+    start_date: date or datetime
+        Start of the date range (inclusive).
+    end_date: date or datetime
+        End of the date range (exclusive).
+    partition_days: int
+        Number of days per partition.
+    max_parallelism: int
+        Maximum number of queries run in parallel.
+
+    Return:
+    -------
+    list of tuple:
+        The start (inclusive) and end (exclusive) of the partitions, in chronological order.
+    """
+
+    step = datetime.timedelta(days=partition_days)
+    if partition_days < 1 or max_parallelism < 2 or end_date - start_date <= step:
+        return [(start_date, end_date)]
+
+    partitions = []
+    partition_start = start_date
+    while partition_start < end_date:
+        partition_end = min(partition_start + step, end_date)
+        partitions.append((partition_start, partition_end))
+        partition_start = partition_end
+    return partitions
+
+
+def stream_sql(sql, reducer, bind=None, chunksize=STREAM_CHUNK_SIZE, params=None):
+    """Stream the result of an SQL query into a reducer.
+
+    The query is run with a server-side cursor (if the database driver supports one), and its rows are fetched in
+    chunks of chunksize rows. Each chunk is converted into a data frame and passed to the reducer's add method, and
+    then discarded. Hence peak memory use is proportional to the chunk size and the reducer's output rather than to the
+    size of the query result. If the query returns no rows, an empty data frame with the result columns is passed to
+    the reducer. See the module app.main.data_reduction for available reducers.
+
+    As for Pandas' read_sql function, the MySQL wildcard % has to be escaped by another %.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    sql: str
+        SQL query.
+    reducer: object
+        Reducer with an add method accepting a data frame and a result method.
+    bind: str
+        Bind name of the database to query. The default is to query the SDB database.
+    chunksize: int
+        Number of rows per chunk.
+    params: list or dict
+        Query parameters.
+
+    Return:
+    -------
+    object:
+        The result of the reducer.
+    """
+
+    engine = db.get_engine(app=current_app, bind=bind)
+    connection = engine.raw_connection()
+    try:
+        cursor = _server_side_cursor(connection, engine.dialect.driver)
+        try:
+            # an empty tuple of parameters ensures that escaped % characters are treated as by read_sql
+            cursor.execute(sql, params if params is not None else ())
+            columns = [d[0] for d in cursor.description]
+            fetched = False
+            while True:
+                rows = cursor.fetchmany(chunksize)
+                if not rows:
+                    break
+                reducer.add(pd.DataFrame.from_records(rows, columns=columns))
+                fetched = True
+            if not fetched:
+                # the reducer still learns the columns
+                reducer.add(pd.DataFrame(columns=columns))
+        finally:
+            cursor.close()
+    finally:
+        connection.close()
+
+    return reducer.result()
+
+
+def stream_sql_for_date_range(sql, start_date, end_date, reducer, bind=None, chunksize=STREAM_CHUNK_SIZE, **kwargs):
+    """Stream the result of an SQL query for a date range into a reducer.
+
+    The query must contain the placeholders {start_date} and {end_date}, and it is parsed as a Python format string
+    with the start and end date and the additional keyword arguments as format arguments (see
+    read_sql_for_date_range). The formatted query is streamed with the stream_sql function.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    sql: str
+        SQL query.
+    start_date: date or datetime
+        Start of the date range (inclusive).
+    end_date: date or datetime
+        End of the date range (exclusive).
+    reducer: object
+        Reducer with an add method accepting a data frame and a result method.
+    bind: str
+        Bind name of the database to query. The default is to query the SDB database.
+    chunksize: int
+        Number of rows per chunk.
+    kwargs: dict
+        Additional format arguments for the query.
+
+    Return:
+    -------
+    object:
+        The result of the reducer.
+    """
+
+    return stream_sql(sql.format(start_date=start_date, end_date=end_date, **kwargs),
+                      reducer,
+                      bind=bind,
+                      chunksize=chunksize)
+
+
+class _FrameCollector:
+    """Reducer concatenating the streamed chunks of a query result into a data frame.
+
+    The schema is applied to every chunk, so that the chunks are stored with the column types of the result.
+
+    Params:
+    -------
+    schema: dict
+        Column types, keyed by column name.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self._frames = []
+
+    def add(self, chunk):
+        """Add a chunk of rows.
+
+        Params:
+        -------
+        chunk: DataFrame
+            Rows.
+        """
+
+        self._frames.append(apply_schema(chunk, self.schema) if self.schema else chunk)
+
+    def result(self):
+        """Return the concatenated chunks.
+
+        Return:
+        -------
+        DataFrame:
+            The rows of all chunks.
+        """
+
+        return _concatenate(self._frames, self.schema)
+
+
+def _server_side_cursor(connection, driver):
+    """Return a server-side cursor for a database connection.
+
+    Server-side cursors are supported for the mysqldb (mysqlclient) and pymysql drivers. For other drivers a normal
+    cursor is returned.
+
+    Params:
+    -------
+    connection: connection
+        DBAPI connection.
+    driver: str
+        Name of the database driver, as used by SQLAlchemy.
+
+    Return:
+    -------
+    cursor:
+        The cursor.
+    """
+
+    if driver == 'mysqldb':
+        import MySQLdb.cursors
+        return connection.cursor(MySQLdb.cursors.SSCursor)
+    if driver == 'pymysql':
+        import pymysql.cursors
+        return connection.cursor(pymysql.cursors.SSCursor)
+    return connection.cursor()
@@ -1,11 +1,36 @@
+import datetime
+import functools
+import hashlib
 import importlib
+import inspect
+import math
 import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+import pandas as pd
 from bokeh.embed import components
 from bokeh.model import Model
 from dateutil import parser
-from flask import g, render_template
+from flask import current_app, g, render_template, url_for
 from app.decorators import store_query_parameters, data_quality_items
+from app.main.datasets import DatasetPlan
+from app.main.frame_details import frame_details_url
 from app.main.date_range_form import DateRangeForm
+from app.main.item_cache import item_cache
+from app.main.plot_specs import render_bokeh
+from app.main.render_cache import current_generation, read_rendered, write_rendered
+from app.main.rendering import submit_render
+from app.main.scheduling import (expected_item_cost, longest_first, range_length_bucket, record_item_cost,
+                                 split_date_range)
+from app.main.single_flight import flight_key, single_flight
+
+# package containing the data quality pages
+PAGES_PACKAGE = 'app.main.pages'
+
+# fingerprints of the code of data quality items, keyed by package and item name
+_fingerprints = {}
+_fingerprints_lock = threading.Lock()
 
 
 def data_quality_item_html(item, caption=None, export_name='item'):
@@ -43,12 +68,57 @@ def data_quality_item_html(item, caption=None, export_name='item'):
         HTML representing the data quality item.
     """
 
+    return figure_html(data_quality_item_content(item), caption=caption, export_name=export_name)
+
+
+def data_quality_item_content(item):
+    """Create the HTML content for a data quality item, without the enclosing <figure> element.
+
+    See data_quality_item_html for details.
+
+    Params:
+    -------
+    item: object
+        Data quality item.
+
+    Return:
+    -------
+    str:
+        HTML with the item content.
+    """
+
     if isinstance(item, Model):
         script, div = components(item)
-        content = '<div>{script}{div}</div>'.format(script=script, div=div)
-    else:
-        content = str(item)
+        return '<div>{script}{div}</div>'.format(script=script, div=div)
+    return str(item)
+
+
+def figure_html(content, caption, export_name, as_of=None):
+    """Wrap the HTML content of a data quality item in a <figure> element.
+
+    See data_quality_item_html for details. If a datetime is passed as the as_of argument, the caption includes the
+    text "Data as of" followed by this datetime.
+
+    Params:
+    -------
+    content: str
+        HTML content of the data quality item.
+    caption: str
+        Figure caption.
+    export_name: str
+        Filename for exporting the data quality item.
+    as_of: datetime
+        (UTC) datetime when the data was queried.
+
+    Return:
+    -------
+    str:
+        HTML representing the data quality item.
+    """
 
+    if as_of is not None:
+        caption = '{caption} <span class="data-as-of">Data as of {as_of} UT</span>'\
+            .format(caption=caption or '', as_of=as_of.strftime('%Y-%m-%d %H:%M')).strip()
     figcaption = ''
     if caption:
         figcaption = '    <figcaption>\n' \
@@ -84,6 +154,68 @@ def data_quality_item(package, name):
     return data_quality_items[package][name]
 
 
+def item_key(package, name, args, kwargs):
+    """Return the key for the content of a data quality item.
+
+    The key consists of the package, the item name, a fingerprint of the code of the item (see item_fingerprint) and
+    the arguments for the item function. As it includes the fingerprint, content cached before a change to the code
+    of the item (such as its figure size or formatters) isn't used after a deployment, whereas the query results which
+    the content was created from can still be used (see app.main.data_cache).
+
+    Params:
+    -------
+    package: str
+        Package containing the item.
+    name: str
+        Name of the item.
+    args: tuple
+        Positional arguments for the data quality item function.
+    kwargs: dict
+        Keyword arguments for the data quality item function.
+
+    Return:
+    -------
+    str:
+        The key.
+    """
+
+    return flight_key(package, name, item_fingerprint(package, name), args, kwargs)
+
+
+def item_fingerprint(package, name):
+    """Return a fingerprint of the code of a data quality item.
+
+    The fingerprint is the SHA-1 digest of the source code of the modules containing the item function and its render
+    function (if there is one, including the renderer of a plot spec). It is calculated once per process.
+
+    Params:
+    -------
+    package: str
+        Package containing the item.
+    name: str
+        Name of the item.
+
+    Return:
+    -------
+    str:
+        The fingerprint.
+    """
+
+    with _fingerprints_lock:
+        if (package, name) not in _fingerprints:
+            func = data_quality_item(package, name)[0]
+            render = data_quality_item_render(package, name)
+            functions = [func] + ([getattr(render, 'func', render)] if render is not None else [])
+            digest = hashlib.sha1()
+            for module in sorted(set(inspect.getmodule(f) for f in functions), key=lambda m: m.__name__):
+                try:
+                    digest.update(inspect.getsource(module).encode('utf-8'))
+                except (OSError, TypeError):
+                    digest.update(module.__name__.encode('utf-8'))
+            _fingerprints[(package, name)] = digest.hexdigest()
+        return _fingerprints[(package, name)]
+
+
 @store_query_parameters(names=('start_date', 'end_date'))
 def default_data_quality_content_for_date_range(package, default_start_date=None, default_end_date=None):
     """Create default data quality content for a date range query.
@@ -119,9 +251,13 @@ def default_data_quality_content_for_date_range(package, default_start_date=None
         start_date = form.start_date.data
         end_date = form.end_date.data
         query_results = _default_data_quality_content(package, start_date=start_date, end_date=end_date)
+        export_url = url_for('main.export_figure_images', page=package[len(PAGES_PACKAGE) + 1:].replace('.', '/'),
+                             start_date=str(start_date), end_date=str(end_date))
     else:
         query_results = ''
-    return render_template('data_quality/data_quality_query_page.html', form=form.html(), query_results=query_results)
+        export_url = None
+    return render_template('data_quality/data_quality_query_page.html', form=form.html(), query_results=query_results,
+                           export_url=export_url)
 
 
 def _default_data_quality_content(package, *args, **kwargs):
@@ -150,6 +286,27 @@ def _default_data_quality_content(package, *args, **kwargs):
 
     You can choose any function names, as long as the name argument of the decorator has the correct value.
 
+    The items are started in the order of decreasing expected render time (see app.main.scheduling.longest_first), and
+    up to ITEM_MAX_PARALLELISM items are created in parallel threads. Their HTML is joined in the order of the
+    content.txt file, though.
+
+    If the ITEM_CACHE_TTL setting is positive, the HTML content of the items is cached for that many seconds, and the
+    time when the data was queried is shown in the figure captions. If a function's decorator has a max_staleness
+    argument, expired content is still served for up to max_staleness seconds after expiry, while it is recreated in a
+    background thread. This means that users don't have to wait for items on popular pages.
+
+    If g.prewarming is truthy, cached content is ignored, and up to PREWARM_MAX_PARALLELISM rather than
+    ITEM_MAX_PARALLELISM items are created in parallel (see app.main.prewarming.prewarm).
+
+    If functions' decorators declare input datasets (see app.main.datasets.dataset_input), a dataset plan is created for
+    the page, so that every dataset is queried only once, with the columns needed by all the items, and shared by the
+    items (see app.main.datasets.DatasetPlan). This requires start_date and end_date keyword arguments.
+
+    If a function's decorator has a render argument, the function's return value is passed to the render function,
+    which creates the data quality item. Unless the decorator's render_in_process argument is False, this is done in a
+    worker process if the RENDER_PROCESSES setting is positive (see app.main.rendering.submit_render), so that the
+    items of a large page are rendered on multiple cores.
+
     Positional and keyword arguments (other than the first one, which gives the package) are passed on to the functions.
     This implies that all the functions should have the same signature.
 
@@ -178,6 +335,416 @@ def _default_data_quality_content(package, *args, **kwargs):
 
     """
 
+    names = data_quality_item_names(package)
+    plan = DatasetPlan(package)
+    if 'start_date' in kwargs and 'end_date' in kwargs:
+        bucket = range_length_bucket(kwargs['start_date'], kwargs['end_date'])
+        for name in names:
+            plan.add_item(name, data_quality_item(package, name)[1].get('inputs', ()), kwargs['start_date'],
+                          kwargs['end_date'])
+    else:
+        bucket = 0
+
+    # the content of items with a render function may be created in worker processes while the data for the next
+    # items is queried, so the HTML is only collected once all items have been started
+    app = current_app._get_current_object()
+    prewarming = g.get('prewarming', False)
+    if prewarming:
+        max_parallelism = current_app.config['PREWARM_MAX_PARALLELISM']
+    else:
+        max_parallelism = current_app.config['ITEM_MAX_PARALLELISM']
+    if max_parallelism > 1:
+        with ThreadPoolExecutor(max_workers=max_parallelism) as executor:
+            contents = {name: executor.submit(plan.run, name, _item_content, app, package, name, bucket, args, kwargs,
+                                              prewarming)
+                        for name in longest_first(package, names, bucket)}
+    else:
+        contents = {name: plan.run(name, _item_content, app, package, name, bucket, args, kwargs, prewarming)
+                    for name in longest_first(package, names, bucket)}
+
+    show_as_of = current_app.config['ITEM_CACHE_TTL'] > 0
+    html = '<div>\n'
+    for name in names:
+        content = contents[name]
+        while isinstance(content, Future):
+            content = content.result()
+        content, as_of = content
+        details = data_quality_item(package, name)[1]
+        html += figure_html(content,
+                            caption=details.get('caption'),
+                            export_name=details.get('export_name'),
+                            as_of=as_of if show_as_of else None) + '\n'
+    html += '</div>'
+    plan.record()
+
+    return html
+
+
+def _item_content(app, package, name, bucket, args, kwargs, refresh=False):
+    """Get the HTML content of a data quality item from the cache or start creating it.
+
+    If the ITEM_CACHE_TTL setting is positive and there is cached content for the item and arguments which is at most
+    ITEM_CACHE_TTL seconds old and has been created for the current data generation, that content is used. The same is
+    true for older content if its age doesn't exceed ITEM_CACHE_TTL plus the max_staleness argument of the item's
+    decorator, but in this case the content is recreated in a background thread. Content is looked for in the
+    item cache (see app.main.item_cache) first and then in the render cache on disk, if the RENDER_CACHE_DIR setting is
+    non-empty (see app.main.render_cache).
+
+    Otherwise the content is created. Concurrent calls for the same item and arguments, whether in this or another
+    server process, share a single computation (see app.main.single_flight.single_flight), so that the same queries
+    aren't run several times when several users load the same page at the same time.
+
+    This function may be called in a thread other than the request thread.
+
+    Params:
+    -------
+    app: Flask
+        Flask app.
+    package: str
+        Package containing the item.
+    name: str
+        Name of the item.
+    bucket: int
+        Range length bucket, as returned by app.main.scheduling.range_length_bucket.
+    args: tuple
+        Positional arguments for the data quality item function.
+    kwargs: dict
+        Keyword arguments for the data quality item function.
+    refresh: bool
+        Whether to ignore cached content.
+
+    Return:
+    -------
+    Future:
+        Future for a tuple of the HTML content and the (UTC) datetime when its creation was started.
+    """
+
+    with app.app_context():
+        key = item_key(package, name, args, kwargs)
+        ttl = current_app.config['ITEM_CACHE_TTL']
+        if ttl > 0 and not refresh:
+            cached = _cached_item_content(key)
+            if cached is not None:
+                content, as_of, generation = cached
+                age = (datetime.datetime.utcnow() - as_of).total_seconds()
+                fresh = age <= ttl and generation == current_generation()
+                max_staleness = data_quality_item(package, name)[1].get('max_staleness', 0)
+                if fresh or (max_staleness > 0 and age <= ttl + max_staleness):
+                    if not fresh:
+                        threading.Thread(target=_refresh_item_content,
+                                         args=(app, key, package, name, bucket, args, kwargs),
+                                         daemon=True).start()
+                    future = Future()
+                    future.set_result((content, as_of))
+                    return future
+        return _shared_item_content(app, key, package, name, bucket, args, kwargs)
+
+
+def _cached_item_content(key):
+    """Return the cached HTML content of a data quality item.
+
+    The item cache (see app.main.item_cache) is checked first. If the content isn't found there, the render cache on
+    disk is checked (if the RENDER_CACHE_DIR setting is non-empty), and content found there is added to the item cache.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    key: str
+        Key identifying the item and its arguments, as returned by item_key.
+
+    Return:
+    -------
+    tuple or None:
+        The HTML content, the (UTC) datetime when its creation was started and the data generation at that time, or
+        None if there is no cached content.
+    """
+
+    cache = item_cache()
+    cached = cache.get(key)
+    render_cache_dir = current_app.config['RENDER_CACHE_DIR']
+    if cached is None and render_cache_dir:
+        cached = read_rendered(render_cache_dir, key)
+        if cached is not None:
+            cache.set(key, cached)
+    return cached
+
+
+def _shared_item_content(app, key, package, name, bucket, args, kwargs):
+    """Start creating the HTML content of a data quality item, unless it is being created already.
+
+    Concurrent calls for the same key share a single computation (see app.main.single_flight.single_flight). The
+    content is put into the item cache (see app.main.item_cache) once it has been created, if the ITEM_CACHE_TTL
+    setting is positive. It is written to the render cache on disk as well if the RENDER_CACHE_DIR setting is
+    non-empty.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    app: Flask
+        Flask app.
+    key: str
+        Key identifying the item and its arguments, as returned by item_key.
+    package: str
+        Package containing the item.
+    name: str
+        Name of the item.
+    bucket: int
+        Range length bucket, as returned by app.main.scheduling.range_length_bucket.
+    args: tuple
+        Positional arguments for the data quality item function.
+    kwargs: dict
+        Keyword arguments for the data quality item function.
+
+    Return:
+    -------
+    Future:
+        Future for a tuple of the HTML content and the (UTC) datetime when its creation was started.
+    """
+
+    def compute():
+        as_of = datetime.datetime.utcnow()
+        content = _compute_item_content(app, package, name, bucket, args, kwargs)
+        if not isinstance(content, Future):
+            return content, as_of
+        timestamped = Future()
+        content.add_done_callback(lambda f: timestamped.set_exception(f.exception()) if f.exception() is not None
+                                  else timestamped.set_result((f.result(), as_of)))
+        return timestamped
+
+    caching = current_app.config['ITEM_CACHE_TTL'] > 0
+    generation = current_generation() if caching else None
+    flight = single_flight(key, compute)
+    if caching:
+        backend = item_cache()
+        render_cache_dir = current_app.config['RENDER_CACHE_DIR']
+
+        def cache(f):
+            if f.exception() is not None:
+                return
+            content, as_of = f.result()
+            try:
+                backend.set(key, (content, as_of, generation))
+                if render_cache_dir:
+                    write_rendered(render_cache_dir, key, content, as_of, generation)
+            except Exception as e:
+                app.logger.warning('The content for {key} could not be cached: {error}'.format(key=key, error=e))
+
+        flight.add_done_callback(cache)
+    return flight
+
+
+def _refresh_item_content(app, key, package, name, bucket, args, kwargs):
+    """Recreate the cached HTML content of a data quality item.
+
+    Errors are logged rather than raised, as this function is meant to be run in a background thread.
+
+    Params:
+    -------
+    app: Flask
+        Flask app.
+    key: str
+        Key identifying the item and its arguments, as returned by item_key.
+    package: str
+        Package containing the item.
+    name: str
+        Name of the item.
+    bucket: int
+        Range length bucket, as returned by app.main.scheduling.range_length_bucket.
+    args: tuple
+        Positional arguments for the data quality item function.
+    kwargs: dict
+        Keyword arguments for the data quality item function.
+    """
+
+    with app.app_context():
+        try:
+            _shared_item_content(app, key, package, name, bucket, args, kwargs).result()
+        except Exception as e:
+            app.logger.error('The data quality item {name} in {package} could not be refreshed: {error}'
+                             .format(name=name, package=package, error=e), exc_info=1)
+
+
+def _compute_item_content(app, package, name, bucket, args, kwargs):
+    """Start creating the HTML content of a data quality item.
+
+    The data quality item function is called, and if the item has a render function, this is called (in a worker
+    process, if possible) with the returned data. The time until the content is available is recorded as the item's
+    render time (see app.main.scheduling.record_item_cost).
+
+    If the item has a plot spec, the function's data is rendered with the spec's Bokeh renderer (see
+    app.main.plot_specs.render_bokeh). Dense plot specs are rendered in the current thread, as re-rasterising needs the
+    app context.
+
+    If the item's decorator has a truthy split_range argument and the item is expected to take longer than the
+    ITEM_SPLIT_SECONDS setting, the date range is split into partitions, for which the data is queried in parallel.
+    The function must return a data frame in this case, and the data frames for the partitions are concatenated
+    before being passed to the render function.
+
+    This function may be called in a thread other than the request thread.
+
+    Params:
+    -------
+    app: Flask
+        Flask app.
+    package: str
+        Package containing the item.
+    name: str
+        Name of the item.
+    bucket: int
+        Range length bucket, as returned by app.main.scheduling.range_length_bucket.
+    args: tuple
+        Positional arguments for the data quality item function.
+    kwargs: dict
+        Keyword arguments for the data quality item function.
+
+    Return:
+    -------
+    str or Future:
+        The HTML content, or a future for it.
+    """
+
+    with app.app_context():
+        start = time.perf_counter()
+        func, details = data_quality_item(package, name)
+        render = data_quality_item_render(package, name, kwargs)
+        spec = details.get('spec')
+
+        parts = 1
+        split_seconds = current_app.config['ITEM_SPLIT_SECONDS']
+        if render is not None and details.get('split_range') and split_seconds > 0 and bucket > 0:
+            parts = min(int(math.ceil(expected_item_cost(package, name, bucket) / split_seconds)),
+                        current_app.config['ITEM_MAX_PARALLELISM'])
+        if parts > 1:
+            date_ranges = split_date_range(kwargs['start_date'], kwargs['end_date'], parts)
+            with ThreadPoolExecutor(max_workers=len(date_ranges)) as executor:
+                frames = list(executor.map(lambda date_range: _call_in_app_context(app, func, args,
+                                                                                   dict(kwargs,
+                                                                                        start_date=date_range[0],
+                                                                                        end_date=date_range[1])),
+                                           date_ranges))
+            result = pd.concat(frames, ignore_index=True)
+        else:
+            result = func(*args, **kwargs)
+
+        if render is None:
+            content = data_quality_item_content(result)
+        elif details.get('render_in_process', True) and not (spec is not None and spec.dense):
+            content = submit_render(_render_content, render, result)
+        else:
+            content = _render_content(render, result)
+
+    def record(_):
+        record_item_cost(package, name, bucket, time.perf_counter() - start)
+
+    if isinstance(content, Future):
+        content.add_done_callback(record)
+    else:
+        record(content)
+    return content
+
+
+def data_quality_item_render(package, name, kwargs=None, frame_details=True):
+    """Return the render function of a data quality item.
+
+    This is the render function passed to the item's decorator or, if a plot spec was passed instead, the spec's Bokeh
+    renderer. If the spec is dense and the keyword arguments include a start and end date, the renderer is given the
+    item and date range, so that it can rasterise the plot (see app.main.plot_specs.render_bokeh). If frame_details is
+    False, the spec's Bokeh renderer doesn't show frame details. Otherwise it is given the URL of the frame details
+    route, as the renderer may be called in a worker process without an app context.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    package: str
+        Package containing the item.
+    name: str
+        Name of the item.
+    kwargs: dict
+        Keyword arguments for the data quality item function.
+    frame_details: bool
+        Whether the Bokeh renderer of a plot spec may show frame details.
+
+    Return:
+    -------
+    function or None:
+        The render function, or None if the item has neither a render function nor a plot spec.
+    """
+
+    details = data_quality_item(package, name)[1]
+    spec = details.get('spec')
+    if spec is None:
+        return details.get('render')
+    if frame_details and spec.frame_details:
+        frame_details = frame_details_url()
+    if spec.dense and kwargs and 'start_date' in kwargs and 'end_date' in kwargs:
+        raster = dict(package=package, name=name, start_date=kwargs['start_date'], end_date=kwargs['end_date'])
+        return functools.partial(render_bokeh, spec, raster=raster, frame_details=frame_details)
+    return functools.partial(render_bokeh, spec, frame_details=frame_details)
+
+
+def _call_in_app_context(app, func, args, kwargs):
+    """Call a function within an app context.
+
+    Params:
+    -------
+    app: Flask
+        Flask app.
+    func: function
+        Function to call.
+    args: tuple
+        Positional arguments for the function.
+    kwargs: dict
+        Keyword arguments for the function.
+
+    Return:
+    -------
+    object:
+        The function's return value.
+    """
+
+    with app.app_context():
+        return func(*args, **kwargs)
+
+
+def _render_content(render, data):
+    """Create a data quality item with a render function and return its HTML content.
+
+    Params:
+    -------
+    render: function
+        Function creating the data quality item from the data.
+    data: object
+        Input for the render function.
+
+    Return:
+    -------
+    str:
+        HTML with the item content.
+    """
+
+    return data_quality_item_content(render(data))
+
+
+def data_quality_item_names(package):
+    """Return the names of the data quality items listed in the content.txt file of a package.
+
+    All the modules of the package are imported, so that all the data quality item functions (i.e. functions with a
+    data_quality decorator) are registered.
+
+    Params:
+    -------
+    package: str
+        Fully qualified name of the package.
+
+    Return:
+    -------
+    list of str:
+        The names of the items, in the order in which they are listed in the content.txt file.
+    """
+
     # find package directory
     spec = importlib.util.find_spec(package)
     package_init = spec.origin
@@ -196,23 +763,33 @@ def _default_data_quality_content(package, *args, **kwargs):
     for module in modules:
         importlib.import_module(module)
 
-    # add content for each function named in context.txt
+    # collect the names in content.txt
     content_file = os.path.join(package_dir, 'content.txt')
     if not os.path.isfile(content_file):
-        raise IOError('The file {path} does not exist')
-    html = '<div>\n'
+        raise IOError('The file {path} does not exist'.format(path=content_file))
     with open(content_file, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                dqi = data_quality_item(package, line)
-                item = dqi[0](*args, **kwargs)
-                caption = dqi[1].get('caption')
-                export_name = dqi[1].get('export_name')
-                html += data_quality_item_html(item, caption=caption, export_name=export_name) + '\n'
-    html += '</div>'
+        return [line.strip() for line in f if line.strip()]
 
-    return html
+
+def data_quality_page_packages():
+    """Return the packages of all default data quality pages.
+
+    A default data quality page is a package in app.main.pages with a content.txt file.
+
+    Return:
+    -------
+    list of str:
+        The fully qualified package names, in alphabetical order.
+    """
+
+    pages_package = 'app.main.pages'
+    pages_dir = os.path.dirname(importlib.util.find_spec(pages_package).origin)
+    packages = []
+    for directory, _, files in os.walk(pages_dir):
+        if 'content.txt' in files and '__init__.py' in files:
+            relative_path = os.path.relpath(directory, pages_dir)
+            packages.append(pages_package + '.' + relative_path.replace(os.path.sep, '.'))
+    return sorted(packages)
 
 
 def _is_package_init(path):
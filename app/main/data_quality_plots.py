@@ -1,12 +1,157 @@
-import pandas as pd
+import datetime
+import decimal
+import math
+import numbers
 
+import numpy as np
+import pandas as pd
+from bokeh.models import ColorBar, LinearColorMapper
 from bokeh.models.formatters import DatetimeTickFormatter #, DEFAULT_DATETIME_FORMATS
+from bokeh.palettes import Viridis256
 from bokeh.plotting import figure, ColumnDataSource
 
-from app import db
+from app.main.data_fetching import read_sql_for_date_range
+
+
+def column_data_source(df):
+    """Create a column data source for a data frame.
+
+    All numeric and datetime columns are passed to Bokeh as contiguous NumPy arrays of a type which Bokeh can encode as
+    a binary buffer, so that they are included in the page as base64 strings rather than as (much longer) JSON lists
+    of numbers. As Bokeh cannot encode 64 bit integers this way, these are converted to 32 bit integers or, if their
+    values don't fit, to floats.
+
+    Categorical columns (see app.main.data_fetching.apply_schema) are converted back to plain columns, as Bokeh cannot
+    serialise them. Other object columns must contain strings (or missing values); a ValueError is raised if they
+    contain numbers, dates or datetimes, which should be converted to a numeric or datetime type (for example with a
+    schema) instead.
+
+    Params:
+    -------
+    df: DataFrame
+        Data frame.
+
+    Return:
+    -------
+    ColumnDataSource:
+        The column data source.
+    """
+
+    data = {}
+    for column in df.columns:
+        data[column] = _column_values(column, df[column])
+    data['index'] = _column_values('index', pd.Series(df.index.values))
+    return ColumnDataSource(data=data)
+
+
+def _column_values(column, series):
+    """Return the values of a data frame column for a column data source.
+
+    Params:
+    -------
+    column: str
+        Column name (only used for error messages).
+    series: Series
+        Column values.
+
+    Return:
+    -------
+    ndarray:
+        The values.
+    """
+
+    if str(series.dtype) == 'category':
+        series = series.astype(series.cat.categories.dtype)
+    values = series.values
+    if values.dtype == object:
+        for value in values:
+            # missing strings may be None or NaN
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                continue
+            if isinstance(value, (numbers.Number, decimal.Decimal, datetime.date)) and not isinstance(value, bool):
+                raise ValueError('Column {column} has object type but contains values of type {type}. Convert it to '
+                                 'a numeric or datetime type.'.format(column=column, type=type(value).__name__))
+        return values
+    if values.dtype.kind in 'iu' and values.dtype.itemsize == 8:
+        info = np.iinfo(np.int32)
+        if len(values) == 0 or (values.min() >= info.min and values.max() <= info.max):
+            values = values.astype(np.int32)
+        else:
+            values = values.astype(np.float64)
+    return np.ascontiguousarray(values)
+
+
+def heatmap(p, df, x, y, value, dx, dy, palette=Viridis256, color_bar_title=''):
+    """Add a heatmap of gridded values to a plot.
+
+    The data frame must have one row per grid cell, with the cell centre given by the x and y column. The centres must
+    lie on a regular grid with spacings dx and dy, but cells without a value may be omitted. The values are arranged in
+    a dense NumPy grid, which is added to the plot as a single image glyph, together with a colour bar. Missing cells
+    are transparent.
+
+    The colour range extends from the 2nd to the 98th percentile of the values, so that a few outliers don't hide
+    smaller variations.
+
+    Params:
+    -------
+    p: Figure
+        Plot.
+    df: DataFrame
+        Data frame with the cell values.
+    x: str
+        Column with the x coordinate of the cell centres. It may be a datetime column.
+    y: str
+        Column with the y coordinate of the cell centres.
+    value: str
+        Column with the cell values.
+    dx: float or timedelta
+        Grid spacing along the x axis. It must be a timedelta if x is a datetime column.
+    dy: float
+        Grid spacing along the y axis.
+    palette: list
+        Colour palette.
+    color_bar_title: str
+        Title for the colour bar.
+
+    Return:
+    -------
+    GlyphRenderer:
+        The image renderer.
+    """
+
+    xs = df[x].values
+    if np.issubdtype(xs.dtype, np.datetime64):
+        # Bokeh expects milliseconds since the epoch
+        xs = xs.astype('datetime64[ms]').astype(np.int64).astype(np.float64)
+        dx = pd.Timedelta(dx).total_seconds() * 1000
+    ys = df[y].values.astype(np.float64)
+    values = df[value].values.astype(np.float32)
+
+    if len(df) > 0:
+        x_min, y_min = xs.min(), ys.min()
+        columns = np.round((xs - x_min) / dx).astype(np.int64)
+        rows = np.round((ys - y_min) / dy).astype(np.int64)
+        grid = np.full((rows.max() + 1, columns.max() + 1), np.nan, dtype=np.float32)
+        grid[rows, columns] = values
+        low, high = np.nanpercentile(values, [2, 98])
+    else:
+        x_min, y_min = 0, 0
+        grid = np.full((1, 1), np.nan, dtype=np.float32)
+        low, high = 0, 1
+
+    color_mapper = LinearColorMapper(palette=palette, low=low, high=high, nan_color=(0, 0, 0, 0))
+    renderer = p.image(image=[grid],
+                       x=x_min - dx / 2,
+                       y=y_min - dy / 2,
+                       dw=grid.shape[1] * dx,
+                       dh=grid.shape[0] * dy,
+                       color_mapper=color_mapper)
+    p.add_layout(ColorBar(color_mapper=color_mapper, title=color_bar_title, location=(0, 0)), 'right')
+
+    return renderer
 
 
-def data_quality_date_plot(start_date, end_date, title, column, table, logic='', y_axis_label=''):
+def data_quality_date_plot(start_date, end_date, title, column, table, logic='', y_axis_label='', join_file_data=True):
     """Create a plot using a data quality table and the FileData table
 
     The plot shows the column from table for the period between start_date
@@ -30,18 +175,21 @@ def data_quality_date_plot(start_date, end_date, title, column, table, logic='',
         Any other logic to append to the query
     y_axis_label: string
         Y-axis label
+    join_file_data: bool
+        Whether to join the table with FileData. Use False for tables which
+        contain the UTStart column themselves, such as DQ_HrsFrame.
 
     Return:
     -------
     str:
         A <div> element with the weather downtime plot.
     """
-    sql = "select UTStart, {column} from {table} join FileData using (FileData_Id) " \
-          "       where UTStart > '{start_date}' and UTStart <'{end_date}' {logic}"\
-        .format(column=column, start_date=start_date, end_date=end_date,
-                table=table, logic=logic)
-    df = pd.read_sql(sql, db.engine)
-    source = ColumnDataSource(df)
+    join = 'join FileData using (FileData_Id)' if join_file_data else ''
+    sql = "select UTStart, {column} from {table} {join} " \
+          "       where UTStart >= '{start_date}' and UTStart < '{end_date}' {logic}"
+    df = read_sql_for_date_range(sql, start_date, end_date, column=column, table=table, join=join, logic=logic,
+                                 schema={column: 'float64'}, night_column='UTStart')
+    source = column_data_source(df)
 
     date_formatter = DatetimeTickFormatter(days=['%e %b %Y'], months=['%e %b %Y'], years=['%e %b %Y'])
 
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+
+class TimeBinReducer:
+    """Incremental aggregation of rows into time bins.
+
+    The rows are passed in chunks (see stream_sql), which must be ordered by the time column. A bin is
+    aggregated as soon as a chunk contains a later bin, so that only the rows of the latest bin and the aggregated
+    values have to be kept in memory. This allows any aggregation supported by Pandas' groupby, including the median.
+
+    The bins start at the origin plus a multiple of the bin width. If no origin is given, the start of the day of the
+    first row is used. The result is then the same as for resampling the whole data frame (indexed by the time column)
+    with the same frequency, i.e. bins without rows are included with NaN values. Pass the start of the queried range
+    as origin if the bins should be the same for all queries starting at that time.
+
+    Params:
+    -------
+    time_column: str
+        Name of the time column.
+    freq: str
+        Pandas frequency string for the bin width, such as '5T' for five minutes. It must be a fixed width.
+    aggregations: iterable of str
+        Names of the aggregations, such as 'mean' or 'median'.
+    origin: datetime
+        Start time of a bin.
+    """
+
+    def __init__(self, time_column, freq, aggregations=('mean',), origin=None):
+        self.time_column = time_column
+        self.freq = freq
+        self.aggregations = tuple(aggregations)
+        self._width = np.int64(to_offset(freq).nanos)
+        self._origin = np.int64(pd.Timestamp(origin).value) if origin is not None else None
+        self._parts = {aggregation: [] for aggregation in self.aggregations}
+        self._pending = None
+        self._last_aggregated_bin = None
+        self._columns = None
+
+    def add(self, chunk):
+        """Add a chunk of rows.
+
+        Params:
+        -------
+        chunk: DataFrame
+            Rows, ordered by the time column.
+        """
+
+        if self._columns is None:
+            self._columns = [c for c in chunk.columns if c != self.time_column]
+        if chunk.empty:
+            return
+        chunk = chunk.copy()
+        chunk[self.time_column] = pd.to_datetime(chunk[self.time_column])
+        if self._pending is not None:
+            chunk = pd.concat([self._pending, chunk], ignore_index=True)
+        if self._origin is None:
+            self._origin = np.int64(chunk[self.time_column].iloc[0].normalize().value)
+        bins = self._bins(chunk[self.time_column])
+        unordered = (bins.values[1:] < bins.values[:-1]).any()
+        if unordered or (self._last_aggregated_bin is not None and bins.iloc[0] <= self._last_aggregated_bin):
+            raise ValueError('The rows must be ordered by the column {column}.'.format(column=self.time_column))
+
+        complete = (bins < bins.iloc[-1]).values
+        if complete.any():
+            self._aggregate(chunk[complete], bins[complete])
+        self._pending = chunk[~complete]
+
+    def result(self):
+        """Return the aggregated values.
+
+        Return:
+        -------
+        dict:
+            A data frame indexed by bin start time for each aggregation.
+        """
+
+        if self._pending is not None and not self._pending.empty:
+            self._aggregate(self._pending, self._bins(self._pending[self.time_column]))
+            self._pending = None
+
+        results = {}
+        for aggregation in self.aggregations:
+            parts = self._parts[aggregation]
+            if parts:
+                df = pd.concat(parts)
+                df = df.reindex(pd.date_range(df.index[0], df.index[-1], freq=self.freq))
+            else:
+                df = pd.DataFrame(columns=self._columns or [], index=pd.DatetimeIndex([]))
+            df.index.name = self.time_column
+            results[aggregation] = df
+        return results
+
+    def _bins(self, times):
+        """Return the bin start times for times.
+
+        Params:
+        -------
+        times: Series
+            Times.
+
+        Return:
+        -------
+        Series:
+            The start times of the bins containing the times.
+        """
+
+        offsets = times.values.astype('datetime64[ns]').astype(np.int64) - self._origin
+        starts = self._origin + offsets // self._width * self._width
+        return pd.Series(pd.to_datetime(starts), index=times.index)
+
+    def _aggregate(self, rows, bins):
+        """Aggregate complete bins.
+
+        Params:
+        -------
+        rows: DataFrame
+            Rows of the complete bins.
+        bins: Series
+            Bin start times for the rows.
+        """
+
+        grouped = rows.drop(self.time_column, axis=1).groupby(bins.values)
+        for aggregation in self.aggregations:
+            self._parts[aggregation].append(grouped.agg(aggregation))
+        self._last_aggregated_bin = bins.iloc[-1]
@@ -0,0 +1,329 @@
+import datetime
+import threading
+import time
+from collections import deque, namedtuple, OrderedDict
+from concurrent.futures import Future
+
+# number of recent dataset plans which are kept for the debug view
+RECENT_PLANS = 20
+
+# dataset functions, keyed by dataset name
+datasets = dict()
+
+# the dataset plan and data quality item for which the current thread is creating content
+_active = threading.local()
+
+_recent_plans = deque(maxlen=RECENT_PLANS)
+_recent_plans_lock = threading.Lock()
+
+# an input dataset declared by a data quality item, with the columns it needs and the dataset parameters
+DatasetInput = namedtuple('DatasetInput', ['name', 'columns', 'params'])
+
+
+def dataset(name):
+    """Decorator for functions returning a dataset for a date range.
+
+    The decorated function must accept a start date (inclusive) and an end date (exclusive) as its first two arguments
+    and a list of column names as its third argument. It may accept additional keyword arguments (the dataset
+    parameters), whose values must be serialisable as JSON. It must return a data frame with the requested columns (and
+    any columns it always includes, such as UTStart).
+
+    The function is registered under the given name, which must be unique across all modules. Data quality items
+    obtain the dataset with dataset_frame, and they should declare it as an input (see dataset_input), so that items
+    on the same page share a single query for the dataset.
+
+    Params:
+    -------
+    name: str
+        Name for identifying the decorated function.
+    """
+
+    def decorate(func):
+        if name in datasets:
+            raise Exception('There are multiple functions with a dataset decorator that has the value "{name}" as its '
+                            'name argument.'.format(name=name))
+        datasets[name] = func
+
+        return func
+    return decorate
+
+
+def dataset_input(name, columns=(), **params):
+    """Declare an input dataset of a data quality item.
+
+    Pass a list of the return values as the inputs argument of the item's data_quality decorator, such as
+
+    @data_quality(name='temp_air', caption='', inputs=[dataset_input('hrs_temperatures', columns=['TEM_AIR'])])
+
+    The date range of the dataset is the one of the item.
+
+    Params:
+    -------
+    name: str
+        Name of the dataset.
+    columns: list of str
+        Columns of the dataset used by the item.
+    **params: keyword arguments
+        Dataset parameters.
+
+    Return:
+    -------
+    DatasetInput:
+        The input declaration.
+    """
+
+    return DatasetInput(name, tuple(columns), params)
+
+
+def dataset_frame(name, start_date, end_date, columns=(), **params):
+    """Return a dataset for a date range.
+
+    If the current thread creates a data quality item for a page with a dataset plan (see DatasetPlan.run), and the
+    page's items declare the dataset with these parameters and columns as an input, the dataset is queried once for all
+    these items, with the union of their columns, and shared. Otherwise it is queried for the requested columns only.
+
+    The returned data frame may be changed freely, and it contains the requested columns only (in addition to those
+    which the dataset function always includes).
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    name: str
+        Name of the dataset.
+    start_date: date
+        Start of the date range (inclusive).
+    end_date: date
+        End of the date range (exclusive).
+    columns: list of str
+        Columns to include.
+    **params: keyword arguments
+        Dataset parameters.
+
+    Return:
+    -------
+    DataFrame:
+        The dataset.
+    """
+
+    plan = getattr(_active, 'plan', None)
+    if plan is not None:
+        df = plan.frame(name, start_date, end_date, columns, params, getattr(_active, 'item', None))
+        if df is not None:
+            return df
+    return datasets[name](start_date, end_date, list(columns), **params)
+
+
+def recent_plans():
+    """Return summaries of the dataset plans of the most recently created pages.
+
+    Only plans with at least one dataset are included, and at most RECENT_PLANS plans are kept per server process.
+
+    Return:
+    -------
+    list of dict:
+        The plan summaries (see DatasetPlan.summary), most recent first.
+    """
+
+    with _recent_plans_lock:
+        return list(reversed(_recent_plans))
+
+
+def _node_key(name, start_date, end_date, params):
+    """Return the key identifying a dataset node of a plan.
+
+    Params:
+    -------
+    name: str
+        Name of the dataset.
+    start_date: date
+        Start of the date range (inclusive).
+    end_date: date
+        End of the date range (exclusive).
+    params: dict
+        Dataset parameters.
+
+    Return:
+    -------
+    tuple:
+        The key.
+    """
+
+    return name, str(start_date), str(end_date), tuple(sorted((k, str(v)) for k, v in params.items()))
+
+
+class DatasetPlan:
+    """Graph of the datasets of a page and the data quality items using them.
+
+    Add the items with add_item, which creates a dataset node for every distinct combination of dataset name,
+    parameters and date range declared as an input, with an edge to the item. The columns of a node are the union of
+    the columns needed by its items.
+
+    Create the item content with the run method. When an item asks for a dataset (see dataset_frame), the dataset is
+    queried for the first item needing it, and the other items wait for and share its result.
+
+    Params:
+    -------
+    page: str
+        Package of the page.
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.created = datetime.datetime.utcnow()
+        self.nodes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add_item(self, item, inputs, start_date, end_date):
+        """Add a data quality item with its input datasets.
+
+        Params:
+        -------
+        item: str
+            Name of the item.
+        inputs: list of DatasetInput
+            Input datasets, as returned by dataset_input.
+        start_date: date
+            Start of the item's date range (inclusive).
+        end_date: date
+            End of the item's date range (exclusive).
+        """
+
+        for name, columns, params in inputs:
+            key = _node_key(name, start_date, end_date, params)
+            node = self.nodes.get(key)
+            if node is None:
+                node = self.nodes[key] = dict(name=name,
+                                              params=params,
+                                              start_date=start_date,
+                                              end_date=end_date,
+                                              columns=[],
+                                              items=[],
+                                              served=[],
+                                              fetches=0,
+                                              seconds=None,
+                                              future=None)
+            node['columns'].extend(column for column in columns if column not in node['columns'])
+            if item not in node['items']:
+                node['items'].append(item)
+
+    def run(self, item, func, *args, **kwargs):
+        """Call a function for creating the content of a data quality item, with this plan active.
+
+        Params:
+        -------
+        item: str
+            Name of the item.
+        func: function
+            Function to call.
+        *args: positional arguments
+            Positional arguments for the function.
+        **kwargs: keyword arguments
+            Keyword arguments for the function.
+
+        Return:
+        -------
+        object:
+            The function's return value.
+        """
+
+        previous = getattr(_active, 'plan', None), getattr(_active, 'item', None)
+        _active.plan, _active.item = self, item
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _active.plan, _active.item = previous
+
+    def frame(self, name, start_date, end_date, columns, params, item=None):
+        """Return a dataset of this plan, querying it if necessary.
+
+        Params:
+        -------
+        name: str
+            Name of the dataset.
+        start_date: date
+            Start of the date range (inclusive).
+        end_date: date
+            End of the date range (exclusive).
+        columns: list of str
+            Columns to include.
+        params: dict
+            Dataset parameters.
+        item: str
+            Name of the item asking for the dataset.
+
+        Return:
+        -------
+        DataFrame or None:
+            The dataset with the requested columns, or None if the plan has no dataset node with all these columns.
+        """
+
+        with self._lock:
+            node = self.nodes.get(_node_key(name, start_date, end_date, params))
+            if node is None or any(column not in node['columns'] for column in columns):
+                return None
+            if item is not None and item not in node['served']:
+                node['served'].append(item)
+            fetch = node['future'] is None
+            if fetch:
+                node['future'] = Future()
+                node['fetches'] += 1
+
+        if fetch:
+            start = time.perf_counter()
+            try:
+                node['future'].set_result(datasets[name](start_date, end_date, list(node['columns']), **params))
+            except Exception as e:
+                node['future'].set_exception(e)
+            node['seconds'] = time.perf_counter() - start
+
+        df = node['future'].result()
+        return df.drop([column for column in node['columns'] if column not in columns], axis=1)
+
+    def summary(self):
+        """Return a summary of this plan.
+
+        The summary lists the dataset nodes with their name, parameters, date range, columns, the items declaring them
+        as input ("items"), the items which actually got the dataset ("served"; items served from a cache don't need
+        it), the number of queries ("fetches"), the query time in seconds and whether the query was shared by several
+        items. It also includes the graph in the DOT language of Graphviz.
+
+        Return:
+        -------
+        dict:
+            The summary.
+        """
+
+        with self._lock:
+            nodes = [dict(name=node['name'],
+                          params=node['params'],
+                          start_date=str(node['start_date']),
+                          end_date=str(node['end_date']),
+                          columns=list(node['columns']),
+                          items=list(node['items']),
+                          served=list(node['served']),
+                          fetches=node['fetches'],
+                          seconds=node['seconds'],
+                          shared=len(node['served']) > 1)
+                     for node in self.nodes.values()]
+
+        dot = ['digraph "{page}" {{'.format(page=self.page)]
+        for i, node in enumerate(nodes):
+            label = '{name} {params}\\n{columns}'.format(name=node['name'],
+                                                         params=node['params'] or '',
+                                                         columns=', '.join(node['columns']))
+            dot.append('  dataset{i} [shape=box, label="{label}"];'.format(i=i, label=label.replace('"', "'")))
+            for item in node['items']:
+                style = '' if item in node['served'] else ' [style=dashed]'
+                dot.append('  dataset{i} -> "{item}"{style};'.format(i=i, item=item, style=style))
+        dot.append('}')
+
+        return dict(page=self.page, created=self.created.isoformat(), datasets=nodes, dot='\n'.join(dot))
+
+    def record(self):
+        """Keep the summary of this plan for the debug view, if the plan has any datasets (see recent_plans)."""
+
+        if self.nodes:
+            summary = self.summary()
+            with _recent_plans_lock:
+                _recent_plans.append(summary)
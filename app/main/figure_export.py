@@ -0,0 +1,787 @@
+import base64
+import datetime
+import json
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+import pandas as pd
+from bokeh.models import ColumnDataSource, DatetimeAxis, GlyphRenderer, Image, ImageRGBA, LayoutDOM, Line, Marker, \
+    Plot, Range1d
+from flask import current_app
+
+from app.main.data_api import ChunkSink
+from app.main.data_quality import data_quality_item, data_quality_item_render
+from app.main.datasets import DatasetPlan
+from app.main.plot_specs import PNG_HEIGHT, PNG_MARGIN, PNG_WIDTH
+from app.main.png_images import draw_text, encode_png, line_pixels, stamp_discs, value_extent
+from app.main.rasterisation import color_rgb
+from app.main.rendering import submit_render
+
+# route for getting the figures of a page as a zip archive; the page path is appended
+FIGURE_EXPORT_ROUTE = '/api/figures/'
+
+# supported image formats and their MIME types
+FIGURE_FORMATS = OrderedDict([('png', 'image/png'), ('svg', 'image/svg+xml')])
+
+# number of tick labels along an axis of SVG images
+SVG_TICKS = 5
+
+# minimum span (in milliseconds) of a datetime axis for which SVG tick labels show dates without times
+SVG_DATE_ONLY_SPAN = 3 * 24 * 3600 * 1000
+
+# font size (in pixels) of the text in SVG images
+SVG_FONT_SIZE = 11
+
+# length (in pixels) of the tick marks outside the frame
+TICK_LENGTH = 4
+
+# colours of the title, axis labels and legend, and of the tick labels and notes
+TEXT_COLOR = 'black'
+AXIS_COLOR = 'gray'
+
+# glyph types which can be drawn into an image
+SUPPORTED_GLYPHS = (Line, Marker, Image, ImageRGBA)
+
+
+def export_figures(package, names, start_date, end_date, output_format):
+    """Generate a zip archive with images of the figures of data quality items.
+
+    The archive contains a file <export name>.<output format> per item (see the export_name argument of the
+    data_quality decorator), with the item's figure rendered by figure_image, and a file manifest.json listing the
+    page, date range, format and files, as well as the items which have no figure.
+
+    The data of the items is queried in up to ITEM_MAX_PARALLELISM threads, with a dataset plan (see
+    app.main.datasets.DatasetPlan), so that datasets shared by several items are queried once only. Items with a plot
+    spec or render function are rendered in the worker processes for rendering items if the RENDER_PROCESSES setting
+    is positive and their decorator's render_in_process argument isn't False (see app.main.rendering.submit_render).
+    Dense plots are never rasterised, as there is no browser to request the raster for a zoom level. The images are
+    added to the archive in the order of the names, as they become available.
+
+    No browser or display is needed for rendering.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    package: str
+        Package of the page.
+    names: list of str
+        Names of the items.
+    start_date: date
+        Start of the date range (inclusive).
+    end_date: date
+        End of the date range (exclusive).
+    output_format: str
+        Image format (a key of FIGURE_FORMATS).
+
+    Return:
+    -------
+    generator:
+        The bytes of the zip archive.
+    """
+
+    plan = DatasetPlan(package)
+    for name in names:
+        plan.add_item(name, data_quality_item(package, name)[1].get('inputs', ()), start_date, end_date)
+
+    app = current_app._get_current_object()
+    sink = ChunkSink()
+    files = []
+    skipped = []
+    with ThreadPoolExecutor(max_workers=max(current_app.config['ITEM_MAX_PARALLELISM'], 1)) as executor:
+        images = [executor.submit(plan.run, name, _item_image, app, package, name, start_date, end_date,
+                                  output_format)
+                  for name in names]
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+            used = set()
+            for name, image in zip(names, images):
+                while isinstance(image, Future):
+                    image = image.result()
+                if image is None:
+                    skipped.append(name)
+                    continue
+                export_name = data_quality_item(package, name)[1].get('export_name') or name
+                if export_name in used:
+                    export_name = '{export_name}_{name}'.format(export_name=export_name, name=name)
+                used.add(export_name)
+                filename = '{export_name}.{extension}'.format(export_name=export_name, extension=output_format)
+                archive.writestr(filename, image)
+                files.append(dict(item=name, file=filename))
+                yield sink.pop()
+
+            manifest = dict(page=package,
+                            start_date=str(start_date),
+                            end_date=str(end_date),
+                            format=output_format,
+                            files=files,
+                            skipped=skipped)
+            archive.writestr('manifest.json', json.dumps(manifest, indent=2))
+        yield sink.pop()
+    plan.record()
+
+
+def figure_image(model, output_format, width=PNG_WIDTH, height=PNG_HEIGHT):
+    """Render the plots of a Bokeh model as an image.
+
+    The model may be a plot or a layout containing plots; the plots are stacked vertically. Lines, markers, images and
+    RGBA images with data from a ColumnDataSource are drawn, as well as the plot frame, title, tick marks, tick labels,
+    axis labels and legend. PNG images are drawn with NumPy and a bitmap font, so their text is smaller and plainer
+    than that of SVG images, but the layout is the same. Other glyphs aren't drawn, but are named in a note on the
+    plot. Other annotations and widgets are ignored.
+
+    No browser or display is needed.
+
+    Params:
+    -------
+    model: LayoutDOM
+        Bokeh model.
+    output_format: str
+        Image format (a key of FIGURE_FORMATS).
+    width: int
+        Width of a plot, in pixels.
+    height: int
+        Height of a plot, in pixels.
+
+    Return:
+    -------
+    bytes:
+        The image.
+    """
+
+    if output_format not in FIGURE_FORMATS:
+        raise ValueError('Unsupported image format: {format}'.format(format=output_format))
+    plots = _plots(model)
+    if not plots:
+        raise ValueError('The model contains no plot.')
+
+    if output_format == 'png':
+        image = np.vstack([_plot_rgb(plot, width, height) for plot in plots])
+        return encode_png(np.round(image).astype(np.uint8), plots[0].title.text if plots[0].title else '')
+
+    groups = ['<g transform="translate(0,{offset})">{content}</g>'.format(offset=index * height,
+                                                                          content=_plot_svg(plot, width, height))
+              for index, plot in enumerate(plots)]
+    svg = '<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" ' \
+          'font-family="Helvetica, Arial, sans-serif" font-size="{font_size}">' \
+          '<rect width="100%" height="100%" fill="white"/>{groups}</svg>'\
+        .format(width=width, height=height * len(plots), font_size=SVG_FONT_SIZE, groups=''.join(groups))
+    return svg.encode('utf-8')
+
+
+def _item_image(app, package, name, start_date, end_date, output_format):
+    """Query the data of a data quality item and start rendering its figure.
+
+    This function may be called in a thread other than the request thread.
+
+    Params:
+    -------
+    app: Flask
+        Flask app.
+    package: str
+        Package containing the item.
+    name: str
+        Name of the item.
+    start_date: date
+        Start of the date range (inclusive).
+    end_date: date
+        End of the date range (exclusive).
+    output_format: str
+        Image format (a key of FIGURE_FORMATS).
+
+    Return:
+    -------
+    Future or bytes or None:
+        A future for the image, the image, or None if the item has no figure.
+    """
+
+    with app.app_context():
+        func, details = data_quality_item(package, name)
+        render = data_quality_item_render(package, name)
+        result = func(start_date=start_date, end_date=end_date)
+        if render is not None and details.get('render_in_process', True):
+            return submit_render(_render_image, render, result, output_format)
+        if render is not None:
+            return _render_image(render, result, output_format)
+        if isinstance(result, LayoutDOM) and _plots(result):
+            return figure_image(result, output_format)
+        return None
+
+
+def _render_image(render, data, output_format):
+    """Create the figure of a data quality item with a render function and render it as an image.
+
+    Params:
+    -------
+    render: function
+        Function creating the data quality item from the data.
+    data: object
+        Input for the render function.
+    output_format: str
+        Image format (a key of FIGURE_FORMATS).
+
+    Return:
+    -------
+    bytes:
+        The image.
+    """
+
+    return figure_image(render(data), output_format)
+
+
+def _plots(model):
+    """Return the plots of a Bokeh model, in layout order.
+
+    Params:
+    -------
+    model: LayoutDOM
+        Bokeh model.
+
+    Return:
+    -------
+    list of Plot:
+        The plots.
+    """
+
+    if isinstance(model, Plot):
+        return [model]
+    plots = []
+    for child in getattr(model, 'children', None) or []:
+        plots.extend(_plots(child))
+    return plots
+
+
+def _plot_layers(plot):
+    """Return the drawable glyphs of a plot.
+
+    Each layer is a dictionary with a kind ('line', 'marker' or 'image') and the coordinates, sizes and colours of the
+    glyph. Datetimes are converted to milliseconds since the epoch, as Bokeh does.
+
+    Params:
+    -------
+    plot: Plot
+        Plot.
+
+    Return:
+    -------
+    list of dict:
+        The layers, in drawing order.
+    """
+
+    layers = []
+    for renderer in plot.renderers:
+        if not isinstance(renderer, GlyphRenderer) or not renderer.visible or \
+                not isinstance(renderer.data_source, ColumnDataSource):
+            continue
+        glyph = renderer.glyph
+        data = renderer.data_source.data
+        if isinstance(glyph, (Line, Marker)):
+            xs, ys = _spec_values(glyph.x, data), _spec_values(glyph.y, data)
+            if len(xs) != len(ys):
+                xs, ys = np.broadcast_arrays(xs, ys)
+        if isinstance(glyph, Line):
+            layers.append(dict(kind='line',
+                               xs=xs,
+                               ys=ys,
+                               color=glyph.line_color,
+                               alpha=_scalar(glyph.line_alpha, 1),
+                               size=_scalar(glyph.line_width, 1),
+                               label=_legend_label(plot, renderer)))
+        elif isinstance(glyph, Marker):
+            layers.append(dict(kind='marker',
+                               xs=xs,
+                               ys=ys,
+                               color=_spec_values(glyph.fill_color, data, len(xs), numeric=False),
+                               alpha=_scalar(glyph.fill_alpha, 1),
+                               size=_scalar(glyph.size, 4),
+                               label=_legend_label(plot, renderer)))
+        elif isinstance(glyph, (Image, ImageRGBA)):
+            images = data.get(glyph.image, []) if isinstance(glyph.image, str) else [glyph.image]
+            count = len(images)
+            for index, image in enumerate(images):
+                image = np.asarray(image)
+                if isinstance(glyph, Image):
+                    rgba = _mapped_colors(image, glyph.color_mapper)
+                else:
+                    rgba = image.astype(np.uint32).view(np.uint8).reshape(image.shape + (4,)).astype(np.float64)
+                x, y = _spec_values(glyph.x, data, count)[index], _spec_values(glyph.y, data, count)[index]
+                dw, dh = _spec_values(glyph.dw, data, count)[index], _spec_values(glyph.dh, data, count)[index]
+                layers.append(dict(kind='image', xs=np.array([x, x + dw]), ys=np.array([y, y + dh]), rgba=rgba))
+    return layers
+
+
+def _spec_values(spec, data, length=1, numeric=True):
+    """Return the values of a glyph property.
+
+    Params:
+    -------
+    spec: object
+        Property value, which may be a column name, a dictionary with a field or value, or a value.
+    data: dict
+        Data of the glyph's ColumnDataSource.
+    length: int
+        Number of values to return if the property is a single value.
+    numeric: bool
+        Whether to return the values as floats, with datetimes as milliseconds since the epoch.
+
+    Return:
+    -------
+    ndarray:
+        The values.
+    """
+
+    if isinstance(spec, dict):
+        spec = data[spec['field']] if 'field' in spec else spec.get('value')
+    elif isinstance(spec, str) and spec in data:
+        spec = data[spec]
+    if isinstance(spec, (str, tuple)) or spec is None or np.isscalar(spec) or isinstance(spec, datetime.date):
+        spec = [spec] * length
+    values = pd.Series(list(spec) if not isinstance(spec, (np.ndarray, pd.Series)) else spec)
+    if not numeric:
+        return values.values
+    if values.dtype == object and len(values) and isinstance(values.iloc[0], datetime.date):
+        values = pd.to_datetime(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        ms = values.values.astype('datetime64[ms]').astype(np.int64).astype(np.float64)
+        ms[pd.isnull(values.values)] = np.nan
+        return ms
+    return pd.to_numeric(values, errors='coerce').values.astype(np.float64)
+
+
+def _scalar(value, default):
+    """Return a glyph property as a single number.
+
+    Params:
+    -------
+    value: object
+        Property value.
+    default: float
+        Value to return if the property is not a number, for example because it refers to a column.
+
+    Return:
+    -------
+    float:
+        The number.
+    """
+
+    if isinstance(value, dict):
+        value = value.get('value')
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else default
+
+
+def _legend_label(plot, renderer):
+    """Return the legend label of a glyph renderer.
+
+    Params:
+    -------
+    plot: Plot
+        Plot containing the renderer.
+    renderer: GlyphRenderer
+        Glyph renderer.
+
+    Return:
+    -------
+    str or None:
+        The label, or None if the renderer has no legend item.
+    """
+
+    for legend in plot.legend:
+        for item in legend.items:
+            if renderer in item.renderers and isinstance(item.label, dict) and 'value' in item.label:
+                return item.label['value']
+    return None
+
+
+def _color(value):
+    """Return the red, green and blue component and the opacity of a colour.
+
+    Params:
+    -------
+    value: str or tuple
+        Hex string, CSS colour name or function, or tuple of red, green, blue and (optionally) alpha.
+
+    Return:
+    -------
+    tuple:
+        The components and the opacity, or None if there is no colour.
+    """
+
+    if value is None or (isinstance(value, str) and value.lower() in ('', 'none', 'transparent')):
+        return None
+    if isinstance(value, str) and value.lower().startswith('rgb'):
+        # Bokeh stores colour tuples as CSS functions such as 'rgba(0, 0, 0, 0)'
+        value = [float(c) for c in value[value.index('(') + 1:value.index(')')].split(',')]
+    if isinstance(value, str):
+        return color_rgb(value), 1.0
+    components = tuple(value)
+    return tuple(int(c) for c in components[:3]), float(components[3]) if len(components) > 3 else 1.0
+
+
+def _mapped_colors(values, color_mapper):
+    """Map the values of an image to RGBA colours with a linear colour mapper.
+
+    Params:
+    -------
+    values: ndarray
+        Values.
+    color_mapper: ColorMapper
+        Colour mapper with a palette, low and high value and NaN colour.
+
+    Return:
+    -------
+    ndarray:
+        The colours, as floats between 0 and 255 with shape values.shape + (4,).
+    """
+
+    values = values.astype(np.float64)
+    finite = values[np.isfinite(values)]
+    low = color_mapper.low if color_mapper.low is not None else (finite.min() if len(finite) else 0)
+    high = color_mapper.high if color_mapper.high is not None else (finite.max() if len(finite) else 1)
+    palette = np.array([_color(c)[0] + (255 * _color(c)[1],) for c in color_mapper.palette], dtype=np.float64)
+    scaled = (values - low) / (high - low) if high > low else np.zeros_like(values)
+    indices = np.clip(np.floor(np.nan_to_num(scaled) * len(palette)), 0, len(palette) - 1).astype(np.int64)
+    rgba = palette[indices]
+    nan_color = _color(color_mapper.nan_color)
+    rgba[~np.isfinite(values)] = (nan_color[0] + (255 * nan_color[1],)) if nan_color else (0, 0, 0, 0)
+    return rgba
+
+
+def _plot_extent(plot, layers):
+    """Return the ranges shown along the axes of a plot.
+
+    Ranges with an explicit start and end (Range1d) are used as they are; other ranges cover the data of all layers.
+
+    Params:
+    -------
+    plot: Plot
+        Plot.
+    layers: list of dict
+        Layers of the plot, as returned by _plot_layers.
+
+    Return:
+    -------
+    tuple:
+        The minimum and maximum x and the minimum and maximum y.
+    """
+
+    def extent(plot_range, key):
+        if isinstance(plot_range, Range1d):
+            return _spec_values(plot_range.start, {})[0], _spec_values(plot_range.end, {})[0]
+        return value_extent(np.concatenate([layer[key] for layer in layers] + [np.array([])]))
+
+    return extent(plot.x_range, 'xs') + extent(plot.y_range, 'ys')
+
+
+def _pixels(layer, extent, width, height):
+    """Return the pixel columns and rows of the points of a layer.
+
+    Params:
+    -------
+    layer: dict
+        Layer, as returned by _plot_layers.
+    extent: tuple
+        Ranges shown along the axes, as returned by _plot_extent.
+    width: int
+        Image width, in pixels.
+    height: int
+        Image height, in pixels.
+
+    Return:
+    -------
+    tuple:
+        The columns and rows (as floats), which are NaN for missing coordinates.
+    """
+
+    x_min, x_max, y_min, y_max = extent
+    columns = PNG_MARGIN + (layer['xs'] - x_min) / (x_max - x_min) * (width - 2 * PNG_MARGIN - 1)
+    rows = height - 1 - PNG_MARGIN - (layer['ys'] - y_min) / (y_max - y_min) * (height - 2 * PNG_MARGIN - 1)
+    return columns, rows
+
+
+def _plot_rgb(plot, width, height):
+    """Draw a plot into an RGB image.
+
+    Params:
+    -------
+    plot: Plot
+        Plot.
+    width: int
+        Image width, in pixels.
+    height: int
+        Image height, in pixels.
+
+    Return:
+    -------
+    ndarray:
+        The image, as an array of floats with shape (height, width, 3).
+    """
+
+    layers = _plot_layers(plot)
+    extent = _plot_extent(plot, layers)
+    image = np.full((height, width, 3), 255, dtype=np.float64)
+    for layer in layers:
+        columns, rows = _pixels(layer, extent, width, height)
+        if layer['kind'] == 'image':
+            _paste(image, layer['rgba'], columns, rows)
+            continue
+        valid = np.isfinite(columns) & np.isfinite(rows)
+        columns = np.round(columns[valid]).astype(np.int64)
+        rows = np.round(rows[valid]).astype(np.int64)
+        if layer['kind'] == 'line':
+            color = _color(layer['color'])
+            if color is not None:
+                rows, columns = line_pixels(rows, columns)
+                stamp_discs(image, rows, columns, np.array(color[0], dtype=np.float64),
+                            max(int(layer['size']) // 2, 0), layer['alpha'] * color[1], outline=False)
+        else:
+            colors = pd.Series(layer['color'][valid]).astype(str)
+            for value in colors.unique():
+                color = _color(value if value != 'None' else None)
+                if color is not None:
+                    selected = (colors == value).values
+                    stamp_discs(image, rows[selected], columns[selected], np.array(color[0], dtype=np.float64),
+                                max(int(layer['size']) // 2, 1), layer['alpha'] * color[1], outline=True)
+
+    top, bottom = PNG_MARGIN - 1, height - PNG_MARGIN
+    left, right = PNG_MARGIN - 1, width - PNG_MARGIN
+    image[[top, bottom], left:right + 1] = 0
+    image[top:bottom + 1, [left, right]] = 0
+
+    annotations = _plot_annotations(plot, layers, extent, width, height)
+    for x1, x2, y1, y2 in annotations['ticks']:
+        rows, columns = line_pixels(np.round([y1, y2]).astype(np.int64), np.round([x1, x2]).astype(np.int64))
+        stamp_discs(image, rows, columns, np.zeros(3), 0, 1, outline=False)
+    for x, y, color in annotations['markers']:
+        stamp_discs(image, np.array([int(round(y))]), np.array([int(round(x))]), np.array(color[0], dtype=np.float64),
+                    4, color[1], outline=True)
+    for text in annotations['texts']:
+        draw_text(image, text['text'], text['x'], text['y'], np.array(color_rgb(text['color']), dtype=np.float64),
+                  anchor=text['anchor'], vertical=text['vertical'], bold=text['bold'])
+    return image
+
+
+def _paste(image, rgba, columns, rows):
+    """Blend an RGBA image into the region of an RGB image between two corners.
+
+    Params:
+    -------
+    image: ndarray
+        RGB image, as an array of floats with shape (height, width, 3). It is changed in place.
+    rgba: ndarray
+        RGBA image, with its first row at the bottom (as for Bokeh images).
+    columns: ndarray
+        Pixel columns of the left and right edge.
+    rows: ndarray
+        Pixel rows of the bottom and top edge.
+    """
+
+    height, width = image.shape[:2]
+    left, right = sorted(columns)
+    top, bottom = sorted(rows)
+    if not np.isfinite([left, right, top, bottom]).all() or right <= left or bottom <= top:
+        return
+    pixel_columns = np.arange(max(int(np.floor(left)), 0), min(int(np.ceil(right)), width))
+    pixel_rows = np.arange(max(int(np.floor(top)), 0), min(int(np.ceil(bottom)), height))
+    if len(pixel_columns) == 0 or len(pixel_rows) == 0:
+        return
+    grid_columns = np.clip(((pixel_columns - left) / (right - left) * rgba.shape[1]).astype(np.int64), 0,
+                           rgba.shape[1] - 1)
+    grid_rows = np.clip(((bottom - pixel_rows) / (bottom - top) * rgba.shape[0]).astype(np.int64), 0,
+                        rgba.shape[0] - 1)
+    colors = rgba[grid_rows[:, np.newaxis], grid_columns[np.newaxis, :]]
+    alpha = colors[:, :, 3:] / 255
+    region = image[pixel_rows[0]:pixel_rows[-1] + 1, pixel_columns[0]:pixel_columns[-1] + 1]
+    region[:] = region * (1 - alpha) + colors[:, :, :3] * alpha
+
+
+def _plot_svg(plot, width, height):
+    """Return the SVG elements for a plot.
+
+    Params:
+    -------
+    plot: Plot
+        Plot.
+    width: int
+        Plot width, in pixels.
+    height: int
+        Plot height, in pixels.
+
+    Return:
+    -------
+    str:
+        The SVG elements.
+    """
+
+    layers = _plot_layers(plot)
+    extent = _plot_extent(plot, layers)
+    left, top = PNG_MARGIN - 0.5, PNG_MARGIN - 0.5
+    inner_width, inner_height = width - 2 * PNG_MARGIN + 1, height - 2 * PNG_MARGIN + 1
+    elements = ['<defs><clipPath id="frame{id}"><rect x="{x}" y="{y}" width="{width}" height="{height}"/></clipPath>'
+                '</defs><g clip-path="url(#frame{id})">'.format(id=id(plot), x=left, y=top, width=inner_width,
+                                                                height=inner_height)]
+    for layer in layers:
+        columns, rows = _pixels(layer, extent, width, height)
+        if layer['kind'] == 'image':
+            rgba = layer['rgba']
+            alpha = rgba[:, :, 3:] / 255
+            rgb = np.round(255 * (1 - alpha) + rgba[:, :, :3] * alpha).astype(np.uint8)[::-1]
+            elements.append('<image x="{x:.1f}" y="{y:.1f}" width="{width:.1f}" height="{height:.1f}" '
+                            'preserveAspectRatio="none" style="image-rendering:pixelated" '
+                            'href="data:image/png;base64,{data}"/>'
+                            .format(x=min(columns), y=min(rows), width=abs(columns[1] - columns[0]),
+                                    height=abs(rows[1] - rows[0]),
+                                    data=base64.b64encode(encode_png(rgb, '')).decode('ascii')))
+            continue
+        valid = np.isfinite(columns) & np.isfinite(rows)
+        if layer['kind'] == 'line':
+            color = _color(layer['color'])
+            if color is not None:
+                points = ' '.join('{0:.1f},{1:.1f}'.format(c, r) for c, r in zip(columns[valid], rows[valid]))
+                elements.append('<polyline points="{points}" fill="none" stroke="{color}" stroke-width="{size}" '
+                                'stroke-opacity="{alpha}"/>'.format(points=points, color=_svg_color(color),
+                                                                    size=layer['size'],
+                                                                    alpha=layer['alpha'] * color[1]))
+        else:
+            for c, r, value in zip(columns[valid], rows[valid], layer['color'][valid]):
+                color = _color(value)
+                if color is not None:
+                    elements.append('<circle cx="{cx:.1f}" cy="{cy:.1f}" r="{r}" fill="{color}" '
+                                    'fill-opacity="{alpha}" stroke="{color}"/>'
+                                    .format(cx=c, cy=r, r=layer['size'] / 2, color=_svg_color(color),
+                                            alpha=layer['alpha'] * color[1]))
+    elements.append('</g>')
+
+    elements.append('<rect x="{x}" y="{y}" width="{width}" height="{height}" fill="none" stroke="black"/>'
+                    .format(x=left, y=top, width=inner_width, height=inner_height))
+    annotations = _plot_annotations(plot, layers, extent, width, height)
+    for x1, x2, y1, y2 in annotations['ticks']:
+        elements.append('<line x1="{x1:.1f}" y1="{y1:.1f}" x2="{x2:.1f}" y2="{y2:.1f}" stroke="black"/>'
+                        .format(x1=x1, y1=y1, x2=x2, y2=y2))
+    for x, y, color in annotations['markers']:
+        elements.append('<circle cx="{cx}" cy="{cy}" r="4" fill={color}/>'
+                        .format(cx=x, cy=y, color=quoteattr(_svg_color(color))))
+    for text in annotations['texts']:
+        position = 'transform="translate({x},{y}) rotate(-90)"' if text['vertical'] else 'x="{x}" y="{y}"'
+        elements.append(('<text ' + position + ' text-anchor="{anchor}" fill="{color}"{weight}>{text}</text>')
+                        .format(x=text['x'], y=text['y'], anchor=text['anchor'], color=text['color'],
+                                weight=' font-weight="bold"' if text['bold'] else '', text=escape(text['text'])))
+    return ''.join(elements)
+
+
+def _plot_annotations(plot, layers, extent, width, height):
+    """Return the title, axes, legend and notes of a plot, laid out for an image.
+
+    The same layout is used for PNG and SVG images. Tick labels are placed at equal intervals rather than at round
+    values. If the plot has glyphs which can't be drawn, a note naming their types is added at the bottom right of the
+    plot area.
+
+    Params:
+    -------
+    plot: Plot
+        Plot.
+    layers: list of dict
+        Layers of the plot, as returned by _plot_layers.
+    extent: tuple
+        Ranges shown along the axes, as returned by _plot_extent.
+    width: int
+        Plot width, in pixels.
+    height: int
+        Plot height, in pixels.
+
+    Return:
+    -------
+    dict:
+        The texts (as dictionaries with a position x and y, text, anchor, colour, and whether the text is vertical or
+        bold), the tick marks (as tuples of start and end column and row) and the legend markers (as tuples of column,
+        row and colour).
+    """
+
+    def tick_label(axis, value, span):
+        if isinstance(axis, DatetimeAxis):
+            date_format = '%Y-%m-%d' if span > SVG_DATE_ONLY_SPAN else '%d %b %H:%M'
+            return pd.Timestamp(value, unit='ms').strftime(date_format)
+        return '{value:.4g}'.format(value=value)
+
+    def text(x, y, content, anchor='start', color=AXIS_COLOR, vertical=False, bold=False):
+        texts.append(dict(x=x, y=y, text=content, anchor=anchor, color=color, vertical=vertical, bold=bold))
+
+    x_min, x_max, y_min, y_max = extent
+    left, right = PNG_MARGIN - 0.5, width - PNG_MARGIN + 0.5
+    top, bottom = PNG_MARGIN - 0.5, height - PNG_MARGIN + 0.5
+    fractions = np.linspace(0, 1, SVG_TICKS)
+    texts, ticks, markers = [], [], []
+
+    if plot.title and plot.title.text:
+        text(left, top - 6, plot.title.text, color=TEXT_COLOR, bold=True)
+    for axis in plot.below[:1] + plot.above[:1]:
+        for index, fraction in enumerate(fractions):
+            x = left + fraction * (right - left)
+            anchor = 'start' if index == 0 else ('end' if index == len(fractions) - 1 else 'middle')
+            text(x, bottom + TICK_LENGTH + 7, tick_label(axis, x_min + fraction * (x_max - x_min), x_max - x_min),
+                 anchor)
+            ticks.append((x, x, bottom, bottom + TICK_LENGTH))
+        if getattr(axis, 'axis_label', None):
+            text(width / 2, height - 1, axis.axis_label, 'middle', TEXT_COLOR)
+    for axis in plot.left[:1] + plot.right[:1]:
+        for index, fraction in enumerate(fractions):
+            y = bottom - fraction * (bottom - top)
+            # the top label is placed below its tick, so that it stays inside the frame
+            text(left + 2, y + 10 if index == len(fractions) - 1 else y - 2,
+                 tick_label(axis, y_min + fraction * (y_max - y_min), y_max - y_min))
+            ticks.append((left - TICK_LENGTH, left, y, y))
+        if getattr(axis, 'axis_label', None):
+            text(SVG_FONT_SIZE, height / 2, axis.axis_label, 'middle', TEXT_COLOR, vertical=True)
+
+    labelled = [layer for layer in layers if layer.get('label')]
+    for index, layer in enumerate(labelled):
+        colors = layer['color'] if layer['kind'] == 'marker' else [layer['color']]
+        color = _color(colors[0]) if len(colors) else None
+        y = top + 6 + (index + 1) * (SVG_FONT_SIZE + 4)
+        text(right - 20, y, layer['label'], 'end', TEXT_COLOR)
+        if color is not None:
+            markers.append((right - 11, y - 4, color))
+
+    unsupported = _unsupported_glyphs(plot)
+    if unsupported:
+        text(right - 4, bottom - 4, 'Not drawn: ' + ', '.join(unsupported), 'end')
+
+    return dict(texts=texts, ticks=ticks, markers=markers)
+
+
+def _unsupported_glyphs(plot):
+    """Return the types of the visible glyphs of a plot which can't be drawn into an image.
+
+    Params:
+    -------
+    plot: Plot
+        Plot.
+
+    Return:
+    -------
+    list of str:
+        The names of the glyph types, in alphabetical order.
+    """
+
+    return sorted({type(renderer.glyph).__name__ for renderer in plot.renderers
+                   if isinstance(renderer, GlyphRenderer) and renderer.visible and
+                   (not isinstance(renderer.glyph, SUPPORTED_GLYPHS) or
+                    not isinstance(renderer.data_source, ColumnDataSource))})
+
+
+def _svg_color(color):
+    """Return an SVG colour.
+
+    Params:
+    -------
+    color: tuple
+        Colour, as returned by _color.
+
+    Return:
+    -------
+    str:
+        The colour as a hex string.
+    """
+
+    return '#{0:02x}{1:02x}{2:02x}'.format(*color[0])
@@ -0,0 +1,142 @@
+import copy
+import threading
+
+from bokeh.models import HoverTool
+from bokeh.models.formatters import DatetimeTickFormatter
+from bokeh.plotting import figure
+
+# tools of the plots
+PLOT_TOOLS = 'pan,reset,save,wheel_zoom,box_zoom'
+
+# tick formats for datetime axes
+DATE_FORMATS = dict(microseconds=['%f'],
+                    milliseconds=['%S.%2Ns'],
+                    seconds=[':%Ss'],
+                    minsec=[':%Mm:%Ss'],
+                    minutes=['%H:%M:%S'],
+                    hourmin=['%H:%M:'],
+                    hours=['%H:%M'],
+                    days=['%d %b'],
+                    months=['%d %b %Y'],
+                    years=['%b %Y'])
+
+# figure templates (keyword arguments for building figures), keyed by the options they have been built for
+_templates = dict()
+_templates_lock = threading.Lock()
+
+
+def datetime_formatter(formats=None):
+    """Return a new tick formatter for a datetime axis.
+
+    Bokeh models must not be shared between documents, so a formatter must never be stored in a module variable and
+    assigned to the axes of several plots. Call this function for every axis instead.
+
+    Params:
+    -------
+    formats: dict
+        Tick formats, as accepted by Bokeh's DatetimeTickFormatter. The default is DATE_FORMATS.
+
+    Return:
+    -------
+    DatetimeTickFormatter:
+        The formatter.
+    """
+
+    return DatetimeTickFormatter(**(formats if formats is not None else DATE_FORMATS))
+
+
+def template_figure(title, x_axis_label='', y_axis_label='', x_axis_type='datetime', tools=PLOT_TOOLS, tooltips=None,
+                    formatters=None, date_formats=None):
+    """Return a new Bokeh figure built from a template.
+
+    A template is the set of constant keyword arguments for Bokeh's figure function, hover tool and tick formatter. It
+    is prepared only once per process for every combination of the arguments, and every call builds a new figure from
+    it with Bokeh's public API. The figure and all the models it refers to are hence new models (with the current
+    theme applied), so that the figure may be changed and added to a document like any figure created by Bokeh's
+    figure function.
+
+    A datetime x axis gets a tick formatter with the given date formats. If tooltips are given, a hover tool with
+    these tooltips is added to the tools. As the templates are kept for the lifetime of the process, the tooltips
+    should be module constants rather than strings varying from request to request.
+
+    Params:
+    -------
+    title: str
+        Plot title.
+    x_axis_label: str
+        Label of the x axis.
+    y_axis_label: str
+        Label of the y axis.
+    x_axis_type: str
+        Type of the x axis, such as 'datetime' or 'linear'.
+    tools: str
+        Comma-separated list of tools.
+    tooltips: str or list
+        Hover tooltips.
+    formatters: dict
+        Hover tooltip formatters.
+    date_formats: dict
+        Tick formats for a datetime x axis. The default is DATE_FORMATS.
+
+    Return:
+    -------
+    Figure:
+        The figure.
+    """
+
+    key = (x_axis_type,
+           tools,
+           tooltips if not isinstance(tooltips, list) else tuple(tooltips),
+           tuple(sorted((formatters or {}).items())),
+           tuple(sorted((k, tuple(v)) for k, v in (date_formats or {}).items())))
+    with _templates_lock:
+        template = _templates.get(key)
+        if template is None:
+            template = _templates[key] = _build_template(x_axis_type, tools, tooltips, formatters, date_formats)
+
+    # Bokeh may keep the lists and dicts passed to it, so they mustn't be shared between figures
+    template = copy.deepcopy(template)
+    figure_kwargs = template['figure']
+    if template['hover'] is not None:
+        figure_kwargs['tools'] = [figure_kwargs['tools'], HoverTool(**template['hover'])]
+    p = figure(title=title, x_axis_label=x_axis_label, y_axis_label=y_axis_label, **figure_kwargs)
+    if template['date_formats'] is not None:
+        p.xaxis[0].formatter = datetime_formatter(template['date_formats'])
+
+    return p
+
+
+def _build_template(x_axis_type, tools, tooltips, formatters, date_formats):
+    """Build a figure template.
+
+    See template_figure for an explanation of the parameters.
+
+    Params:
+    -------
+    x_axis_type: str
+        Type of the x axis.
+    tools: str
+        Comma-separated list of tools.
+    tooltips: str or list
+        Hover tooltips.
+    formatters: dict
+        Hover tooltip formatters.
+    date_formats: dict
+        Tick formats for a datetime x axis.
+
+    Return:
+    -------
+    dict:
+        The keyword arguments for the figure function (as figure), for the hover tool or None if there is no hover tool
+        (as hover) and the tick formats of the x axis or None if the x axis isn't a datetime axis (as date_formats).
+    """
+
+    hover = None
+    if tooltips is not None:
+        hover = dict(tooltips=list(tooltips) if isinstance(tooltips, (list, tuple)) else tooltips,
+                     formatters=dict(formatters or {}))
+    x_date_formats = None
+    if x_axis_type == 'datetime':
+        x_date_formats = {k: list(v) for k, v in (date_formats if date_formats is not None else DATE_FORMATS).items()}
+
+    return dict(figure=dict(x_axis_type=x_axis_type, tools=tools), hover=hover, date_formats=x_date_formats)
@@ -0,0 +1,185 @@
+import datetime
+import decimal
+import functools
+import json
+
+from bokeh.layouts import column
+from bokeh.models import CustomJS, Div, HoverTool, TapTool
+from flask import current_app, has_request_context, url_for
+from sqlalchemy import text
+
+from app import db
+from app.main.hrs_frames import HEADER_COLUMNS
+
+# route for looking up the details of a frame; the FileData_Id is appended
+FRAME_DETAILS_ROUTE = '/frame-details/'
+
+# columns included in the details of a frame
+FRAME_DETAILS_COLUMNS = ('FileData.FileData_Id', 'FileData.FileName', 'FileData.UTStart', 'FileData.OBSMODE',
+                         'FileData.Target_Name', 'ProposalCode.Proposal_Code') + \
+                        tuple('FitsHeaderHrs.{column}'.format(column=column) for column in HEADER_COLUMNS)
+
+# maximum number of frames whose details are cached
+FRAME_DETAILS_CACHE_SIZE = 1024
+
+# JavaScript for showing a summary of the hovered frame
+HOVER_CODE = """
+frameDetails.hover(source, cb_data, panel, {url});
+"""
+
+# JavaScript for showing all details of the tapped frame
+TAP_CODE = """
+frameDetails.tap([{sources}], panel, {url});
+"""
+
+
+class _MissingFrame(Exception):
+    """Raised if there is no frame for a FileData_Id.
+
+    Raising rather than returning None keeps the lookup from being cached.
+    """
+
+    pass
+
+
+def frame_details(file_data_id):
+    """Return the details of a frame.
+
+    The details comprise the FRAME_DETAILS_COLUMNS columns, i.e. the file name, UTStart, observation mode, target name
+    and proposal code of the frame and its FitsHeaderHrs values (if there is a FitsHeaderHrs entry for the frame). They
+    are cached for the FRAME_DETAILS_CACHE_SIZE most recently requested frames. Lookups for non-existing frames aren't
+    cached, so that a frame is found once it has been added to the database.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    file_data_id: int
+        FileData_Id of the frame.
+
+    Return:
+    -------
+    tuple:
+        The column names and values, as a tuple of (name, value) pairs, or None if there is no frame with the given
+        FileData_Id. Dates and datetimes are given as ISO strings, and decimals as floats.
+    """
+
+    try:
+        return _frame_details(file_data_id)
+    except _MissingFrame:
+        return None
+
+
+@functools.lru_cache(maxsize=FRAME_DETAILS_CACHE_SIZE)
+def _frame_details(file_data_id):
+    """Query the details of a frame.
+
+    See frame_details for a description of the parameters and return value. _MissingFrame is raised if there is no
+    frame with the given FileData_Id.
+    """
+
+    sql = text('SELECT {columns} FROM FileData '
+               '    LEFT JOIN ProposalCode ON ProposalCode.ProposalCode_Id = FileData.ProposalCode_Id '
+               '    LEFT JOIN FitsHeaderHrs ON FitsHeaderHrs.FileData_Id = FileData.FileData_Id '
+               '    WHERE FileData.FileData_Id = :file_data_id'.format(columns=', '.join(FRAME_DETAILS_COLUMNS)))
+    row = db.engine.execute(sql, file_data_id=file_data_id).first()
+    if row is None:
+        raise _MissingFrame()
+    return tuple((name, _json_value(value)) for name, value in zip(row.keys(), row))
+
+
+def _json_value(value):
+    """Convert a database value into a value which can be serialised as JSON.
+
+    Params:
+    -------
+    value: object
+        Database value.
+
+    Return:
+    -------
+    object:
+        The converted value.
+    """
+
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return str(value)
+
+
+def frame_details_url():
+    """Return the URL of the frame details route, without the FileData_Id.
+
+    The URL is created with url_for, so that it includes the path under which the app is mounted. Outside a request
+    (for example when an item is prewarmed or refreshed in a background thread) a test request context is used, so
+    that the SERVER_NAME and APPLICATION_ROOT settings apply.
+
+    This function must be called within a Flask app context.
+
+    Return:
+    -------
+    str:
+        The URL, to which the FileData_Id must be appended.
+    """
+
+    if not has_request_context():
+        with current_app.test_request_context():
+            return frame_details_url()
+
+    # the route requires a FileData_Id, which is removed again
+    return url_for('main.frame_details_lookup', file_data_id=0)[:-1]
+
+
+def frame_details_plot(p, renderers, tooltips, formatters=None, url=None):
+    """Add on-demand frame details to a plot.
+
+    Rather than including the file name and other metadata for every plotted point, the data sources of the given
+    renderers only need to have a FileData_Id column. Hovering over a point shows the given tooltips, which should only
+    refer to columns of the data sources, and fetches the file name and UTStart of the frame from the frame details
+    route. Tapping a point fetches all the details of the frame and lists them in a panel below the plot.
+
+    Params:
+    -------
+    p: Figure
+        Plot. It should not have a hover or tap tool.
+    renderers: list of GlyphRenderer
+        Renderers whose points are frames.
+    tooltips: str or list
+        Hover tooltips.
+    formatters: dict
+        Hover tooltip formatters.
+    url: str
+        URL of the frame details route, as returned by frame_details_url. If it isn't given, frame_details_url is
+        called, which requires an app context.
+
+    Return:
+    -------
+    LayoutDOM:
+        The plot with the panel for the frame details.
+    """
+
+    panel = Div(text='<p class="frame-details-hint">Tap a point to see the details of its frame.</p>',
+                css_classes=['frame-details'],
+                width=p.plot_width)
+    url = json.dumps(url if url is not None else frame_details_url())
+    for renderer in renderers:
+        callback = CustomJS(args=dict(source=renderer.data_source, panel=panel), code=HOVER_CODE.format(url=url))
+        p.add_tools(HoverTool(renderers=[renderer],
+                              tooltips=tooltips,
+                              formatters=formatters or {},
+                              callback=callback))
+
+    # CustomJS arguments must be models, so the data sources are passed individually
+    source_names = ['source{index}'.format(index=index) for index in range(len(renderers))]
+    args = dict(zip(source_names, (renderer.data_source for renderer in renderers)))
+    args['panel'] = panel
+    code = TAP_CODE.format(sources=', '.join(source_names), url=url)
+    p.add_tools(TapTool(renderers=renderers, callback=CustomJS(args=args, code=code)))
+
+    return column(p, panel)
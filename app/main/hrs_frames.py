@@ -0,0 +1,128 @@
+from app import db
+
+# denormalised table with one row per HRS frame
+HRS_FRAME_TABLE = 'DQ_HrsFrame'
+
+# columns copied from the FitsHeaderHrs table
+HEADER_COLUMNS = ('TEM_AIR', 'TEM_BCAM', 'TEM_COLL', 'TEM_ECH', 'TEM_IOD', 'TEM_OB', 'TEM_RCAM', 'TEM_RMIR', 'TEM_VAC',
+                  'PRE_DEW', 'PRE_VAC', 'FOC_BMIR', 'FOC_RMIR')
+
+# first letters of the file names of HRS frames, i.e. H for the blue arm and R for the red arm
+HRS_ARMS = ('H', 'R')
+
+# number of FileData_Id values processed in a single insert statement
+REFRESH_BATCH_SIZE = 50000
+
+# number of FileData_Id values below the high-water mark which are checked again for late-arriving rows
+LATE_ROW_LOOKBACK = 20000
+
+
+def refresh():
+    """Bring the denormalised HRS frame table up to date.
+
+    All HRS frames (i.e. all FileData entries whose file name starts with H or R) whose FileData_Id is greater than the
+    maximum FileData_Id in the DQ_HrsFrame table (the high-water mark) are added to the table, in batches of
+    REFRESH_BATCH_SIZE FileData_Id values. Frames without a UTStart or FileName are skipped. Frames without a
+    FitsHeaderHrs entry are added as well, with a HasHeader value of 0 and no header values.
+
+    As FitsHeaderHrs entries may be added some time after a frame has been recorded, the last LATE_ROW_LOOKBACK
+    FileData_Id values below the high-water mark are checked again: Missing frames are inserted, and the header values
+    of frames added without a FitsHeaderHrs entry are filled in.
+
+    The table has no data quality values, as there may be several PipelineDataQuality_CCD entries per frame. Join
+    PipelineDataQuality_CCD with the table to get them.
+
+    This function must be called within a Flask app context.
+
+    Return:
+    -------
+    tuple:
+        The number of inserted rows and the number of updated rows.
+    """
+
+    high_water_mark = db.engine.execute('SELECT IFNULL(MAX(FileData_Id), 0) FROM {table}'
+                                        .format(table=HRS_FRAME_TABLE)).scalar()
+    max_file_data_id = db.engine.execute('SELECT IFNULL(MAX(FileData_Id), 0) FROM FileData').scalar()
+
+    inserted_rows = 0
+    lower = max(high_water_mark - LATE_ROW_LOOKBACK, 0)
+    while lower < max_file_data_id:
+        upper = min(lower + REFRESH_BATCH_SIZE, max_file_data_id)
+        inserted_rows += db.engine.execute(_insert_sql(lower, upper)).rowcount
+        lower = upper
+
+    updated_rows = db.engine.execute(_update_sql(max(high_water_mark - LATE_ROW_LOOKBACK, 0))).rowcount
+
+    return inserted_rows, updated_rows
+
+
+def _insert_sql(lower, upper):
+    """Return the SQL for adding missing frames to the HRS frame table.
+
+    Frames which are in the table already and frames without a UTStart or FileName are skipped, so that the statement
+    is a plain INSERT, which fails rather than storing invalid values.
+
+    Params:
+    -------
+    lower: int
+        Exclusive lower bound for the FileData_Id values to consider.
+    upper: int
+        Inclusive upper bound for the FileData_Id values to consider.
+
+    Return:
+    -------
+    str:
+        The SQL statement.
+    """
+
+    columns = ('FileData_Id', 'Arm', 'FileName', 'UTStart', 'OBSMODE', 'Target_Name', 'Proposal_Code', 'HasHeader') \
+        + HEADER_COLUMNS
+    values = ('FileData.FileData_Id', 'SUBSTR(FileData.FileName, 1, 1)', 'FileData.FileName', 'FileData.UTStart',
+              'FileData.OBSMODE', 'FileData.Target_Name', 'ProposalCode.Proposal_Code',
+              'CASE WHEN FitsHeaderHrs.FileData_Id IS NULL THEN 0 ELSE 1 END') \
+        + tuple('FitsHeaderHrs.' + c for c in HEADER_COLUMNS)
+
+    return 'INSERT INTO {table} ({columns}) ' \
+           '    SELECT {values} ' \
+           '        FROM FileData ' \
+           '            LEFT JOIN FitsHeaderHrs ON FitsHeaderHrs.FileData_Id = FileData.FileData_Id ' \
+           '            LEFT JOIN ProposalCode ON ProposalCode.ProposalCode_Id = FileData.ProposalCode_Id ' \
+           '            LEFT JOIN {table} AS Existing ON Existing.FileData_Id = FileData.FileData_Id ' \
+           '        WHERE FileData.FileData_Id > {lower} AND FileData.FileData_Id <= {upper} ' \
+           '            AND Existing.FileData_Id IS NULL ' \
+           '            AND FileData.UTStart IS NOT NULL AND SUBSTR(FileData.FileName, 1, 1) IN ({arms})' \
+        .format(table=HRS_FRAME_TABLE,
+                columns=', '.join(columns),
+                values=', '.join(values),
+                lower=lower,
+                upper=upper,
+                arms=', '.join("'{arm}'".format(arm=arm) for arm in HRS_ARMS))
+
+
+def _update_sql(lower):
+    """Return the SQL for filling in the header values of frames added without a FitsHeaderHrs entry.
+
+    Params:
+    -------
+    lower: int
+        Exclusive lower bound for the FileData_Id values to consider.
+
+    Return:
+    -------
+    str:
+        The SQL statement.
+    """
+
+    header = 'SELECT {column} FROM FitsHeaderHrs WHERE FitsHeaderHrs.FileData_Id = {table}.FileData_Id'
+    assignments = ', '.join(['HasHeader = 1'] +
+                            ['{column} = ({header})'.format(column=column,
+                                                            header=header.format(column=column, table=HRS_FRAME_TABLE))
+                             for column in HEADER_COLUMNS])
+    return 'UPDATE {table} ' \
+           '    SET {assignments} ' \
+           '    WHERE HasHeader = 0 AND FileData_Id > {lower} ' \
+           '        AND EXISTS ({header})' \
+        .format(table=HRS_FRAME_TABLE,
+                assignments=assignments,
+                lower=lower,
+                header=header.format(column='FileData_Id', table=HRS_FRAME_TABLE))
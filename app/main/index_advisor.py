@@ -0,0 +1,472 @@
+import os
+import re
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import event
+
+from app import db
+from app.main.data_quality import data_quality_item, data_quality_item_names, data_quality_page_packages
+
+# EXPLAIN access types for which the whole table or index is scanned
+FULL_SCAN_ACCESS_TYPES = ('ALL', 'index')
+
+# maximum length of MySQL identifiers
+MAX_IDENTIFIER_LENGTH = 64
+
+# comparison operators in a WHERE clause
+_OPERATORS = r'(<=>|<=|>=|<>|!=|=|<|>|\blike\b|\bbetween\b|\bin\b)'
+
+
+def capture_queries(start_date, end_date):
+    """Capture the SQL queries issued by all the registered data quality items.
+
+    Every data quality item of every default data quality page (see data_quality_page_packages) is called with the
+    given start and end date, and the SQL statements it issues are recorded by means of an SQLAlchemy event listener on
+    the database engines. You should point the database URIs of the configuration used to a stand-in database with
+    realistic content.
+
+    The DATA_CACHE_SIZE setting is set to 0 while the items are called, so that no queries are hidden by cached query
+    results (see app.main.data_cache).
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    start_date: date
+        Start date to pass to the data quality items.
+    end_date: date
+        End date to pass to the data quality items.
+
+    Return:
+    -------
+    tuple:
+        A list of the captured queries and a list of the items which failed. Each query is a dictionary with the
+        bind, statement, parameters and the list of items issuing the query (in the form package:name). Each failure
+        is a tuple of the item and the error message.
+    """
+
+    captured = OrderedDict()
+    current_item = dict(name=None)
+
+    def listener(bind):
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            key = (bind, statement)
+            if key not in captured:
+                captured[key] = dict(bind=bind, statement=statement, parameters=parameters, items=[])
+            if current_item['name'] not in captured[key]['items']:
+                captured[key]['items'].append(current_item['name'])
+        return before_cursor_execute
+
+    listeners = [(engine, listener(bind)) for bind, engine in _engines().items()]
+    for engine, f in listeners:
+        event.listen(engine, 'before_cursor_execute', f)
+
+    failures = []
+    data_cache_size = current_app.config['DATA_CACHE_SIZE']
+    current_app.config['DATA_CACHE_SIZE'] = 0
+    try:
+        for package in data_quality_page_packages():
+            for name in data_quality_item_names(package):
+                current_item['name'] = '{package}:{name}'.format(package=package, name=name)
+                try:
+                    data_quality_item(package, name)[0](start_date, end_date)
+                except Exception as e:
+                    failures.append((current_item['name'], str(e)))
+    finally:
+        current_app.config['DATA_CACHE_SIZE'] = data_cache_size
+        for engine, f in listeners:
+            event.remove(engine, 'before_cursor_execute', f)
+
+    return list(captured.values()), failures
+
+
+def analyse_queries(queries):
+    """Run EXPLAIN for captured queries.
+
+    Only SELECT statements are analysed. Full table or index scans and filesorts are flagged, and the number of rows
+    examined is estimated as the product of the rows values of the query plan.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    queries: list of dict
+        Queries, as returned by capture_queries.
+
+    Return:
+    -------
+    list of dict:
+        The queries with the additional keys plan (the rows of the EXPLAIN output as dictionaries), flags (list of
+        str), rows_examined (int or None) and error (str or None). The list is ordered by the estimated number of rows
+        examined, with the largest number first.
+    """
+
+    engines = _engines()
+    results = []
+    for query in queries:
+        if not query['statement'].lstrip().lower().startswith('select'):
+            continue
+        result = dict(query, plan=[], flags=[], rows_examined=None, error=None)
+        try:
+            result['plan'] = _explain(engines[query['bind']], query['statement'], query['parameters'])
+        except Exception as e:
+            result['error'] = str(e)
+        for row in result['plan']:
+            if row.get('type') in FULL_SCAN_ACCESS_TYPES:
+                result['flags'].append('full scan of {table}'.format(table=row.get('table')))
+            if 'filesort' in (row.get('Extra') or ''):
+                result['flags'].append('filesort for {table}'.format(table=row.get('table')))
+        if result['plan']:
+            result['rows_examined'] = 1
+            for row in result['plan']:
+                result['rows_examined'] *= max(int(row.get('rows') or 1), 1)
+        results.append(result)
+
+    return sorted(results, key=lambda r: r['rows_examined'] or 0, reverse=True)
+
+
+def candidate_indexes(results):
+    """Suggest indexes for the tables which are fully scanned or filesorted.
+
+    For every flagged table in a query plan the columns of the table used in the WHERE clause, GROUP BY clause or ORDER
+    BY clause are collected (see index_columns), and an index on these is suggested unless an existing index starts
+    with the same columns.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    results: list of dict
+        Analysed queries, as returned by analyse_queries.
+
+    Return:
+    -------
+    list of dict:
+        The suggested indexes, as dictionaries with the bind, table, columns and the list of statements which would
+        benefit from the index.
+    """
+
+    engines = _engines()
+    table_columns = {}
+    existing_indexes = {}
+    candidates = OrderedDict()
+    for result in results:
+        for row in result['plan']:
+            table = row.get('table')
+            flagged = row.get('type') in FULL_SCAN_ACCESS_TYPES or 'filesort' in (row.get('Extra') or '')
+            if not flagged or not table or table.startswith('<'):
+                continue
+            key = (result['bind'], table)
+            if key not in table_columns:
+                engine = engines[result['bind']]
+                table_columns[key] = [r[0] for r in engine.execute('SHOW COLUMNS FROM {table}'.format(table=table))]
+                existing_indexes[key] = _existing_indexes(engine, table)
+            columns = index_columns(result['statement'], table, table_columns[key])
+            if not columns:
+                continue
+            if any(index[:len(columns)] == columns for index in existing_indexes[key]):
+                continue
+            candidate_key = (result['bind'], table, tuple(columns))
+            if candidate_key not in candidates:
+                candidates[candidate_key] = dict(bind=result['bind'], table=table, columns=columns, statements=[])
+            candidates[candidate_key]['statements'].append(result['statement'])
+
+    return list(candidates.values())
+
+
+def index_columns(statement, table, columns):
+    """Return the columns for an index supporting an SQL statement.
+
+    The index columns are the columns of the given table which are compared for equality in the WHERE clause,
+    followed by the first column used in a range condition. (MySQL cannot make use of index columns after a range
+    column.) If there is no range condition, the columns used in the GROUP BY or ORDER BY clause are appended instead.
+    LIKE conditions with a leading wildcard are ignored, as they cannot use an index.
+
+    Columns qualified with the name of another table are ignored.
+
+    Params:
+    -------
+    statement: str
+        SQL statement.
+    table: str
+        Table name.
+    columns: list of str
+        The columns of the table.
+
+    Return:
+    -------
+    list of str:
+        The index columns. The list is empty if none of the table columns is used in the relevant clauses.
+    """
+
+    where, grouping = _clauses(statement)
+    equality_columns = []
+    range_columns = []
+    for column in columns:
+        pattern = r'(?<![\w.])(?:(\w+)\.)?' + re.escape(column) + r'\s*' + _OPERATORS + r'\s*(\S*)'
+        for match in re.finditer(pattern, where, re.IGNORECASE):
+            qualifier, operator, operand = match.group(1), match.group(2).lower(), match.group(3)
+            if qualifier and qualifier.lower() != table.lower():
+                continue
+            if operator in ('=', '<=>', 'in'):
+                equality_columns.append(column)
+            elif operator == 'like':
+                if not operand.lstrip('\'"').startswith('%'):
+                    range_columns.append((match.start(), column))
+            elif operator not in ('<>', '!='):
+                range_columns.append((match.start(), column))
+
+    index = sorted(set(equality_columns))
+    range_columns = [c for _, c in sorted(range_columns) if c not in index]
+    if range_columns:
+        index.append(range_columns[0])
+    else:
+        for expression in grouping:
+            match = re.match(r'^(?:(\w+)\.)?(\w+)(\s+(asc|desc))?$', expression, re.IGNORECASE)
+            if not match or (match.group(1) and match.group(1).lower() != table.lower()):
+                continue
+            column = [c for c in columns if c.lower() == match.group(2).lower()]
+            if column and column[0] not in index:
+                index.append(column[0])
+
+    return index
+
+
+def migration_sql(candidates):
+    """Return the content of a migration file creating suggested indexes.
+
+    Only indexes for the default (SDB) database are included, as migrations are run for this database only.
+
+    Params:
+    -------
+    candidates: list of dict
+        Suggested indexes, as returned by candidate_indexes.
+
+    Return:
+    -------
+    str:
+        The SQL statements, with comments listing the queries benefiting from each index.
+    """
+
+    sql = '-- Indexes suggested by the index advisor (manage.py advise_indexes).\n' \
+          '-- Please review them before applying this migration.\n'
+    for candidate in candidates:
+        if candidate['bind'] is not None:
+            continue
+        sql += '\n-- Supports:\n'
+        for statement in candidate['statements']:
+            sql += '--     {statement}\n'.format(statement=_single_line(statement, 200))
+        sql += 'CREATE INDEX {name} ON {table} ({columns});\n'.format(name=_index_name(candidate),
+                                                                      table=candidate['table'],
+                                                                      columns=', '.join(candidate['columns']))
+    return sql
+
+
+def write_migration(candidates, sql_dir):
+    """Write a Flyway migration file creating suggested indexes.
+
+    The file is given the next free version number in the migration directory.
+
+    Params:
+    -------
+    candidates: list of dict
+        Suggested indexes, as returned by candidate_indexes.
+    sql_dir: str
+        Directory containing the migration files.
+
+    Return:
+    -------
+    str:
+        The path of the written file.
+    """
+
+    os.makedirs(sql_dir, exist_ok=True)
+    versions = [int(m.group(1)) for m in (re.match(r'^V(\d+)__', f) for f in os.listdir(sql_dir)) if m]
+    version = max(versions) + 1 if versions else 1
+    path = os.path.join(sql_dir, 'V{version}__Add_suggested_indexes.sql'.format(version=version))
+    with open(path, 'w') as f:
+        f.write(migration_sql(candidates))
+    return path
+
+
+def report(results, candidates, failures):
+    """Return a plain text report of analysed queries and suggested indexes.
+
+    Params:
+    -------
+    results: list of dict
+        Analysed queries, as returned by analyse_queries.
+    candidates: list of dict
+        Suggested indexes, as returned by candidate_indexes.
+    failures: list of tuple
+        Failed items, as returned by capture_queries.
+
+    Return:
+    -------
+    str:
+        The report.
+    """
+
+    lines = ['Queries ranked by estimated rows examined', '']
+    for rank, result in enumerate(results, start=1):
+        rows = result['rows_examined'] if result['rows_examined'] is not None else 'n/a'
+        lines.append('{rank}. {rows} rows [{database}]'.format(rank=rank,
+                                                               rows=rows,
+                                                               database=result['bind'] or 'sdb'))
+        lines.append('   ' + _single_line(result['statement'], 300))
+        lines.append('   Items: ' + ', '.join(str(item) for item in result['items']))
+        if result['flags']:
+            lines.append('   Flags: ' + ', '.join(result['flags']))
+        if result['error']:
+            lines.append('   EXPLAIN failed: ' + result['error'])
+        lines.append('')
+
+    lines.extend(['Suggested indexes', ''])
+    for candidate in candidates:
+        statement = 'CREATE INDEX {name} ON {table} ({columns});'.format(name=_index_name(candidate),
+                                                                         table=candidate['table'],
+                                                                         columns=', '.join(candidate['columns']))
+        if candidate['bind'] is not None:
+            statement += '  -- apply manually to the {bind} database'.format(bind=candidate['bind'])
+        lines.append(statement)
+    if not candidates:
+        lines.append('None')
+
+    if failures:
+        lines.extend(['', 'Failed items', ''])
+        for item, error in failures:
+            lines.append('{item}: {error}'.format(item=item, error=error))
+
+    return '\n'.join(lines) + '\n'
+
+
+def _engines():
+    """Return the database engines, keyed by bind name.
+
+    The default (SDB) database has None as its bind name.
+
+    Return:
+    -------
+    dict:
+        The engines.
+    """
+
+    binds = [None] + sorted(current_app.config.get('SQLALCHEMY_BINDS', {}).keys())
+    return {bind: db.get_engine(app=current_app, bind=bind) for bind in binds}
+
+
+def _explain(engine, statement, parameters):
+    """Run EXPLAIN for an SQL statement.
+
+    The statement is executed in the same way as when it was captured, so that escaped percentage signs are treated
+    correctly.
+
+    Params:
+    -------
+    engine: Engine
+        Database engine.
+    statement: str
+        SQL statement.
+    parameters: tuple or dict
+        Parameters passed along with the statement.
+
+    Return:
+    -------
+    list of dict:
+        The rows of the EXPLAIN output.
+    """
+
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN ' + statement, parameters)
+        keys = [d[0] for d in cursor.description]
+        return [dict(zip(keys, row)) for row in cursor.fetchall()]
+    finally:
+        connection.close()
+
+
+def _existing_indexes(engine, table):
+    """Return the existing indexes of a table.
+
+    Params:
+    -------
+    engine: Engine
+        Database engine.
+    table: str
+        Table name.
+
+    Return:
+    -------
+    list of list:
+        The column lists of the indexes.
+    """
+
+    indexes = OrderedDict()
+    for row in engine.execute('SHOW INDEX FROM {table}'.format(table=table)):
+        row = dict(row.items())
+        indexes.setdefault(row['Key_name'], []).append((int(row['Seq_in_index']), row['Column_name']))
+    return [[column for _, column in sorted(columns)] for columns in indexes.values()]
+
+
+def _clauses(statement):
+    """Extract the WHERE clause and the GROUP BY and ORDER BY expressions from an SQL statement.
+
+    Params:
+    -------
+    statement: str
+        SQL statement.
+
+    Return:
+    -------
+    tuple:
+        The WHERE clause (or an empty string) and the list of GROUP BY and ORDER BY expressions.
+    """
+
+    statement = ' '.join(statement.split())
+    where = re.search(r'\bwhere\b(.*?)(\bgroup\s+by\b|\border\s+by\b|\bhaving\b|\blimit\b|$)', statement,
+                      re.IGNORECASE)
+    grouping = []
+    for clause in re.findall(r'\b(?:group|order)\s+by\b(.*?)(?=\bgroup\s+by\b|\border\s+by\b|\bhaving\b|\blimit\b|$)',
+                             statement, re.IGNORECASE):
+        grouping.extend(expression.strip() for expression in clause.split(',') if expression.strip())
+    return (where.group(1) if where else ''), grouping
+
+
+def _index_name(candidate):
+    """Return the name for a suggested index.
+
+    Params:
+    -------
+    candidate: dict
+        Suggested index, as returned by candidate_indexes.
+
+    Return:
+    -------
+    str:
+        The index name.
+    """
+
+    name = 'ix_{table}_{columns}'.format(table=candidate['table'], columns='_'.join(candidate['columns']))
+    return name[:MAX_IDENTIFIER_LENGTH]
+
+
+def _single_line(text, max_length):
+    """Collapse whitespace in a text and truncate it.
+
+    Params:
+    -------
+    text: str
+        Text.
+    max_length: int
+        Maximum length.
+
+    Return:
+    -------
+    str:
+        The collapsed and truncated text.
+    """
+
+    text = ' '.join(text.split())
+    return text if len(text) <= max_length else text[:max_length - 3] + '...'
@@ -0,0 +1,28 @@
+from flask import current_app
+
+from app.main.cache_backends import cache_backend
+
+
+def item_cache():
+    """Return the cache backend for the HTML content of data quality items.
+
+    The backend is chosen with the ITEM_CACHE_BACKEND setting, which may be 'memory', 'shared_memory', 'filesystem' or
+    'redis' (see app.main.cache_backends.cache_backend). The ITEM_CACHE_LOCATION setting gives the location of the
+    cache, and the ITEM_CACHE_SIZE setting its maximum number of entries (or number of slots).
+
+    Cache keys are returned by app.main.data_quality.item_key, and cache values are tuples of the HTML content, the
+    (UTC) datetime when its creation was started and the data generation at that time (see
+    app.main.render_cache.current_generation).
+
+    This function must be called within a Flask app context.
+
+    Return:
+    -------
+    CacheBackend:
+        The cache backend.
+    """
+
+    return cache_backend('item_cache',
+                         current_app.config['ITEM_CACHE_BACKEND'],
+                         current_app.config['ITEM_CACHE_LOCATION'],
+                         current_app.config['ITEM_CACHE_SIZE'])
@@ -1,10 +1,9 @@
-import pandas as pd
-
 from bokeh.models.formatters import DatetimeTickFormatter
-from bokeh.plotting import figure, ColumnDataSource
+from bokeh.plotting import figure
 
-from app import db
 from app.decorators import data_quality
+from app.main.data_fetching import read_sql_for_date_range
+from app.main.data_quality_plots import column_data_source
 
 
 @data_quality(name='weather_downtime', caption='Weather downtime.')
@@ -74,10 +73,10 @@ def _downtime_plot(downtime_column, title, start_date, end_date):
     """
 
     sql = 'SELECT Date, {downtime_column} FROM NightInfo' \
-          '       WHERE Date >= \'{start_date}\' AND Date < \'{end_date}\' AND {downtime_column} IS NOT NULL' \
-        .format(start_date=start_date, end_date=end_date, downtime_column=downtime_column)
-    df = pd.read_sql(sql, db.engine)
-    source = ColumnDataSource(df)
+          '       WHERE Date >= \'{start_date}\' AND Date < \'{end_date}\' AND {downtime_column} IS NOT NULL'
+    df = read_sql_for_date_range(sql, start_date, end_date, downtime_column=downtime_column,
+                                 schema=dict(Date='datetime64[ns]'))
+    source = column_data_source(df)
 
     date_formatter = DatetimeTickFormatter(formats=dict(hours=['%e %b %Y'],
                                                         days=['%e %b %Y'],
@@ -1,19 +1,19 @@
-import pandas as pd
-
-from bokeh.embed import components
-from bokeh.models.formatters import DatetimeTickFormatter, DEFAULT_DATETIME_FORMATS
-from bokeh.plotting import figure, ColumnDataSource
-
-from app import db
 from app.decorators import data_quality
-from app.main.data_quality_plots import data_quality_date_plot
+from app.main.data_fetching import read_sql_for_date_range
+from app.main.plot_specs import PlotSpec, series
 
 
-@data_quality(name='hrdet_bias', caption='Mean  HRDET Bias Background levels')
-def hrdet_bias_plot(start_date, end_date):
-    """Return a <div> element with a weather downtime plot.
+@data_quality(name='hrdet_bias', caption='Mean  HRDET Bias Background levels',
+              spec=PlotSpec(title='HRDET Bias Levels',
+                            x='UTStart',
+                            y='BkgdMean',
+                            x_label='Date',
+                            y_label='Bias Background Mean (e)',
+                            series=[series(color='blue')]))
+def hrdet_bias_data(start_date, end_date):
+    """Return the data for a HRDET bias level plot.
 
-    The plot shows the downtime for the period between start_date (inclusive) and end_date (exclusive).
+    The data covers the bias frames for the period between start_date (inclusive) and end_date (exclusive).
 
     Params:
     -------
@@ -24,22 +24,26 @@ def hrdet_bias_plot(start_date, end_date):
 
     Return:
     -------
-    str:
-        A <div> element with the weather downtime plot.
+    DataFrame:
+        The UTStart and background mean of the bias frames.
     """
-    title = "HRDET Bias Levels"
-    column = 'BkgdMean'
-    table = 'PipelineDataQuality_CCD'
-    logic = " and FileName like 'R%%' and Target_Name='BIAS'"
-    y_axis_label = 'Bias Background Mean (e)'
-    return data_quality_date_plot(start_date, end_date, title, column, table, logic=logic, y_axis_label=y_axis_label)
 
+    sql = "select UTStart, BkgdMean from PipelineDataQuality_CCD join DQ_HrsFrame using (FileData_Id) " \
+          "       where UTStart >= '{start_date}' and UTStart < '{end_date}' and Arm = 'R' and Target_Name='BIAS'"
+    return read_sql_for_date_range(sql, start_date, end_date, schema=dict(BkgdMean='float64'), night_column='UTStart')
 
-@data_quality(name='hrdet_vacuum_temp', caption='HRS HRDET Vacuum Temperature')
-def hrdet_vacuum_temp_plot(start_date, end_date):
-    """Return a <div> element with a HRS vacuum temperature plot.
 
-    The plot shows the HRS vacuum temperature for the period between start_date (inclusive) and end_date (exclusive).
+@data_quality(name='hrdet_vacuum_temp', caption='HRS HRDET Vacuum Temperature',
+              spec=PlotSpec(title='HRDET Vacuum Temp',
+                            x='UTStart',
+                            y='TEM_VAC',
+                            x_label='Date',
+                            y_label='Vacuum Temp',
+                            series=[series(color='blue')]))
+def hrdet_vacuum_temp_data(start_date, end_date):
+    """Return the data for a HRS vacuum temperature plot.
+
+    The data covers the period between start_date (inclusive) and end_date (exclusive).
 
     Params:
     -------
@@ -50,47 +54,26 @@ def hrdet_vacuum_temp_plot(start_date, end_date):
 
     Return:
     -------
-    str:
-        A <div> element with the weather downtime plot.
+    DataFrame:
+        The UTStart and vacuum temperature of the red arm frames.
     """
-    title = "HRDET Vacuum Temp"
-    y_axis_label = 'Vacuum Temp'
-
-    # creates your query
-    table = 'FitsHeaderHrs'
-    column = 'TEM_VAC'
-    logic = " and FileName like 'R%%'"
-    sql = "select UTStart, {column} from {table} join FileData using (FileData_Id) " \
-          "       where UTStart > '{start_date}' and UTStart <'{end_date}' {logic}"\
-        .format(column=column, start_date=start_date, end_date=end_date,
-                table=table, logic=logic)
-    df = pd.read_sql(sql, db.engine)
-    source = ColumnDataSource(df)
 
-    # creates your plot
-    date_formats = DEFAULT_DATETIME_FORMATS()
-    date_formats['hours'] = ['%e %b %Y']
-    date_formats['days'] = ['%e %b %Y']
-    date_formats['months'] = ['%e %b %Y']
-    date_formats['years'] = ['%e %b %Y']
-    date_formatter = DatetimeTickFormatter(formats=date_formats)
+    sql = "select UTStart, TEM_VAC from DQ_HrsFrame " \
+          "       where UTStart >= '{start_date}' and UTStart < '{end_date}' and Arm = 'R' and HasHeader = 1"
+    return read_sql_for_date_range(sql, start_date, end_date, schema=dict(TEM_VAC='float32'))
 
-    p = figure(title=title,
-               x_axis_label='Date',
-               y_axis_label=y_axis_label,
-               x_axis_type='datetime')
-    p.scatter(source=source, x='UTStart', y=column)
 
-    p.xaxis[0].formatter = date_formatter
+@data_quality(name='hrdet_arc_wave', caption='HRS Arc stability',
+              spec=PlotSpec(title='HRDET Arc Stability',
+                            x='UTStart',
+                            y='x',
+                            x_label='Date',
+                            y_label='Pixel Position',
+                            series=[series(color='blue')]))
+def hrdet_arc_wave_data(start_date, end_date):
+    """Return the data for a HRS arc stability plot.
 
-    return p
-
-
-@data_quality(name='hrdet_arc_wave', caption='HRS Arc stability')
-def hrdet_arc_wave_plot(start_date, end_date):
-    """Return a <div> element with a HRS arc stability plot.
-
-    The plot shows the HRS wavelenght as a function of pixel position for a set of time
+    The plot shows the pixel position of an arc line over time.
 
     Params:
     -------
@@ -101,42 +84,12 @@ def hrdet_arc_wave_plot(start_date, end_date):
 
     Return:
     -------
-    str:
-        A <div> element with the weather downtime plot.
+    DataFrame:
+        The UTStart and pixel position (as x) of the arc line.
     """
-    title = "HRDET Arc Stability"
-    y_axis_label = 'Pixel Position'
-
-    # creates your query
-    table = 'DQ_HrsArc'
-    column = 'x'
-    obsmode = 'LOW RESOLUTION'
-    wavelength = 6483.08
-    logic = " and FileName like 'R%%' and OBSMODE like '{obsmode}' and wavelength={wavelength}"\
-        .format(obsmode=obsmode, wavelength=wavelength)
-    sql = "select UTStart, {column} from {table} join FileData using (FileData_Id) " \
-          "       where UTStart > '{start_date}' and UTStart <'{end_date}' {logic}"\
-        .format(column=column, start_date=start_date, end_date=end_date,
-                table=table, logic=logic)
-    print(sql)
-    df = pd.read_sql(sql, db.engine)
-    source = ColumnDataSource(df)
-
-    # creates your plot
-    date_formats = DEFAULT_DATETIME_FORMATS()
-    date_formats['hours'] = ['%e %b %Y']
-    date_formats['days'] = ['%e %b %Y']
-    date_formats['months'] = ['%e %b %Y']
-    date_formats['years'] = ['%e %b %Y']
-    date_formatter = DatetimeTickFormatter(formats=date_formats)
-
-    p = figure(title=title,
-               x_axis_label='Date',
-               y_axis_label=y_axis_label,
-               x_axis_type='datetime')
-    print(df['UTStart'], df['x'])
-    p.scatter(source=source, x='UTStart', y=column)
-
-    p.xaxis[0].formatter = date_formatter
-
-    return p
+
+    sql = "select UTStart, x from DQ_HrsArc join DQ_HrsFrame using (FileData_Id) " \
+          "       where UTStart >= '{start_date}' and UTStart < '{end_date}' " \
+          "             and Arm = 'R' and OBSMODE like '{obsmode}' and wavelength={wavelength}"
+    return read_sql_for_date_range(sql, start_date, end_date, obsmode='LOW RESOLUTION', wavelength=6483.08,
+                                   schema=dict(x='float32'), streamed=True)
@@ -1,30 +1,20 @@
-import pandas as pd
-
-from bokeh.models import HoverTool
-from bokeh.models.formatters import DatetimeTickFormatter
-from bokeh.plotting import figure, ColumnDataSource
-
-from app import db
 from app.decorators import data_quality
+from app.main.data_fetching import read_sql_for_date_range
+from app.main.plot_specs import PlotSpec, series
 
-# creates your plot
-date_formatter = DatetimeTickFormatter(microseconds=['%f'],
-                                       milliseconds=['%S.%2Ns'],
-                                       seconds=[':%Ss'],
-                                       minsec=[':%Mm:%Ss'],
-                                       minutes=['%H:%M:%S'],
-                                       hourmin=['%H:%M:'],
-                                       hours=["%H:%M"],
-                                       days=["%d %b"],
-                                       months=["%d %b %Y"],
-                                       years=["%b %Y"])
 
+@data_quality(name='hbdet_bias', caption=' ',
+              spec=PlotSpec(title='HBDET Bias Levels',
+                            x='UTStart',
+                            y='BkgdMean',
+                            x_label='Date',
+                            y_label='Bias Background Mean (e)',
+                            series=[series(color='blue')],
+                            frame_details=True))
+def hbdet_bias_data(start_date, end_date):
+    """Return the data for a HBDET bias level plot.
 
-@data_quality(name='hbdet_bias', caption=' ')
-def hbdet_bias_plot(start_date, end_date):
-    """Return a <div> element with a weather downtime plot.
-
-    The plot shows the downtime for the period between start_date (inclusive) and end_date (exclusive).
+    The data covers the bias frames for the period between start_date (inclusive) and end_date (exclusive).
 
     Params:
     -------
@@ -35,51 +25,13 @@ def hbdet_bias_plot(start_date, end_date):
 
     Return:
     -------
-    str:
-        A <div> element with the weather downtime plot.
+    DataFrame:
+        The UTStart, background mean and FileData_Id of the bias frames.
     """
-    title = "HBDET Bias Levels"
-    column = 'BkgdMean'
-    table = 'PipelineDataQuality_CCD'
-    logic = " and FileName like 'H%%' and Target_Name='BIAS'"
-    y_axis_label = 'Bias Background Mean (e)'
-
-    sql = "select UTStart, {column}, FileName, CONVERT(UTStart,char) AS Time " \
-          "      from {table} join FileData using (FileData_Id) " \
-          "            where UTStart > '{start_date}' and UTStart <'{end_date}' {logic}" \
-        .format(column=column, start_date=start_date, end_date=end_date,
-                table=table, logic=logic)
-    df = pd.read_sql(sql, db.engine)
-    source = ColumnDataSource(df)
-
-    tool_list = "pan,reset,save,wheel_zoom, box_zoom"
-    _hover = HoverTool(
-        tooltips="""
-                        <div>
-                            <div>
-                                <span style="font-size: 15px; font-weight: bold;">Date: </span>
-                                <span style="font-size: 15px;"> @Time</span>
-                            </div>
-                            <div>
-                                <span style="font-size: 15px; font-weight: bold;">Pixel Position: </span>
-                                <span style="font-size: 15px;"> @BkgdMean</span>
-                            </div>
-                            <div>
-                                <span style="font-size: 15px; font-weight: bold;">Filename: </span>
-                                <span style="font-size: 15px;"> @FileName</span>
-                            </div>
-                        </div>
-                        """
-    )
-
-    p = figure(title=title,
-               x_axis_label='Date',
-               y_axis_label=y_axis_label,
-               x_axis_type='datetime',
-               tools=[tool_list, _hover])
-
-    p.scatter(source=source, x='UTStart', y=column, color='blue', fill_alpha=0.2, size=10)
 
-    p.xaxis[0].formatter = date_formatter
-    return p  # data_quality_date_plot(start_date, end_date, title, column, table,
-    # logic=logic, y_axis_label=y_axis_label)
+    sql = "select UTStart, BkgdMean, FileData_Id " \
+          "      from PipelineDataQuality_CCD join DQ_HrsFrame using (FileData_Id) " \
+          "            where UTStart >= '{start_date}' and UTStart < '{end_date}' " \
+          "                  and Arm = '{arm}' and Target_Name='BIAS'"
+    return read_sql_for_date_range(sql, start_date, end_date, arm='H', schema=dict(BkgdMean='float32'),
+                                   night_column='UTStart')
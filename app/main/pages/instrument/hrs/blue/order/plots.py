@@ -1,50 +1,108 @@
-import pandas as pd
-
-from bokeh.models import HoverTool
-from bokeh.models.formatters import DatetimeTickFormatter
 from bokeh.palettes import Plasma256
-from bokeh.plotting import figure, ColumnDataSource
 
-from app import db
 from app.decorators import data_quality
+from app.main.data_fetching import read_sql_for_date_range
+from app.main.datasets import dataset, dataset_frame, dataset_input
+from app.main.plot_specs import PlotSpec, series
+
 
-# creates your plot
-date_formatter = DatetimeTickFormatter(microseconds=['%f'],
-                                       milliseconds=['%S.%2Ns'],
-                                       seconds=[':%Ss'],
-                                       minsec=[':%Mm:%Ss'],
-                                       minutes=['%H:%M:%S'],
-                                       hourmin=['%H:%M:'],
-                                       hours=["%H:%M"],
-                                       days=["%d %b"],
-                                       months=["%d %b %Y"],
-                                       years=["%b %Y"])
+@dataset(name='hrs_blue_order_positions')
+def order_positions(start_date, end_date, columns, obsmode):
+    """Return the positions of the HRS orders for a date range.
 
+    Params:
+    -------
+    start_date: date
+        Earliest date to include.
+    end_date: date
+        Earliest date not to include.
+    columns: list of str
+        Ignored, as the dataset always has the same columns.
+    obsmode: int
+        HrsMode_Id of the observation mode.
+
+    Return:
+    -------
+    DataFrame:
+        The Date, y_upper and HrsOrder of the orders.
+    """
 
-def get_position_source(start_date, end_date, obsmode):
     logic = "   and HrsMode_Id = {obsmode} " \
             "   and FileName like 'HORDER%%' " \
         .format(obsmode=obsmode)
-    sql = "select Date, y_upper, HrsOrder, CONVERT(Date,char) AS Time " \
+    sql = "select Date, y_upper, HrsOrder " \
           "     from DQ_HrsOrder join NightInfo using (NightInfo_Id) " \
-          "     where Date > '{start_date}' and Date <'{end_date}' {logic}" \
-        .format(start_date=start_date, end_date=end_date, logic=logic)
-    df = pd.read_sql(sql, db.engine)
+          "     where Date >= '{start_date}' and Date < '{end_date}' {logic}"
+    return read_sql_for_date_range(sql, start_date, end_date, logic=logic,
+                                   schema=dict(Date='datetime64[ns]', y_upper='float32'))
+
+
+def order_position_data(start_date, end_date, obsmode):
+    """Return the positions of the HRS orders for a date range, coloured by order.
+
+    Params:
+    -------
+    start_date: date
+        Earliest date to include.
+    end_date: date
+        Earliest date not to include.
+    obsmode: int
+        HrsMode_Id of the observation mode.
+
+    Return:
+    -------
+    DataFrame:
+        The Date, y_upper, HrsOrder and colour (as colors) of the orders.
+    """
 
-    ord_min = df['HrsOrder'].min()
-    ord_max = df['HrsOrder'].max()
-    colors = [Plasma256[int((y - ord_min) * (len(Plasma256) - 1) / float(ord_max - ord_min))] for y in df["HrsOrder"]]
+    df = dataset_frame('hrs_blue_order_positions', start_date, end_date, obsmode=obsmode)
+    colors = []
+    if len(df) > 0:
+        ord_min = df['HrsOrder'].min()
+        ord_max = df['HrsOrder'].max()
+        colors = [Plasma256[int((y - ord_min) * (len(Plasma256) - 1) / float(max(ord_max - ord_min, 1)))]
+                  for y in df["HrsOrder"]]
     df['colors'] = colors
+    return df
 
-    source = ColumnDataSource(df)
-    return source
 
+def order_position_spec(title):
+    """Return the plot spec of an order position plot.
 
-@data_quality(name='hrs_order', caption='HRS Order')
-def hrs_order_plot(start_date, end_date):
-    """Return a <div> element with the Order plot.
+    Params:
+    -------
+    title: str
+        Plot title.
 
-    The plot shows the HRS order for obsmode High, low and medium over time
+    Return:
+    -------
+    PlotSpec:
+        The plot spec.
+    """
+
+    return PlotSpec(title=title,
+                    x='Date',
+                    y='y_upper',
+                    x_label='Date',
+                    y_label='y_upper',
+                    series=[series(color='colors', size=10, alpha=0.2)],
+                    hover=[('Date', 'Date'), ('Y Upper', 'y_upper'), ('HRS Order', 'HrsOrder')])
+
+
+@data_quality(name='hrs_order', caption='HRS Order',
+              spec=PlotSpec(title='HRS Order',
+                            x='Date',
+                            y='ord',
+                            x_label='Date',
+                            y_label='Max(HrsOrder) - Min(HrsOrder)',
+                            series=[series('Low', 'red', size=10, HrsMode_Id=1),
+                                    series('Medium', 'green', size=10, HrsMode_Id=2),
+                                    series('High', 'blue', size=10, HrsMode_Id=3)],
+                            hover=[('Date', 'Date'), ('HrsOrder(Max - Min)', 'ord')]))
+def hrs_order_data(start_date, end_date):
+    """Return the data for the Order plot.
+
+    The plot shows the range of HRS orders for obsmode High, low and medium over time.
 
     Params:
     -------
@@ -55,219 +113,80 @@ def hrs_order_plot(start_date, end_date):
 
     Return:
     -------
-    str:
-        A <div> element with the Order plot.
+    DataFrame:
+        The Date, HrsMode_Id and range of orders (as ord) per night and observation mode.
     """
 
-    def get_source(obsmode):
-        logic = "   and HrsMode_Id = {obsmode} " \
-                "   and FileName like 'HORDER%%' " \
-                "   group by Date " \
-            .format(obsmode=obsmode)
-        sql = "select Date, (Max(HrsOrder) - Min(HrsOrder)) as ord, CONVERT(Date,char) AS Time " \
-              "     from DQ_HrsOrder join NightInfo using (NightInfo_Id) " \
-              "     where Date > '{start_date}' and Date <'{end_date}' {logic}" \
-            .format(start_date=start_date, end_date=end_date, logic=logic)
-        df = pd.read_sql(sql, db.engine)
-
-        source = ColumnDataSource(df)
-        return source
-
-    low_source = get_source(1)  # HrsMode_Id = 1 low
-    med_source = get_source(2)  # HrsMode_Id = 2 med
-    high_source = get_source(3)  # HrsMode_Id = 3 high
-
-    tool_list = "pan,reset,save,wheel_zoom, box_zoom"
-    _hover = HoverTool(
-        tooltips="""
-                <div>
-                    <div>
-                        <span style="font-size: 15px; font-weight: bold;">Date: </span>
-                        <span style="font-size: 15px;"> @Time</span>
-                    </div>
-                    <div>
-                        <span style="font-size: 15px; font-weight: bold;">HrsOrder(Max - Min): </span>
-                        <span style="font-size: 15px;"> @ord</span>
-                    </div>
-                </div>
-                """
-    )
-
-    p = figure(title="HRS Order",
-               x_axis_label='Date',
-               y_axis_label='Max(HrsOrder) - Min(HrsOrder)',
-               x_axis_type='datetime',
-               tools=[tool_list, _hover])
-    p.scatter(source=low_source, x='Date', y='ord', color='red', fill_alpha=0.2, legend='Low', size=10)
-    p.scatter(source=med_source, x='Date', y='ord', color='green', fill_alpha=0.2, legend='Medium', size=10)
-    p.scatter(source=high_source, x='Date', y='ord', color='blue', fill_alpha=0.2, legend='High', size=10)
-
-    p.xaxis[0].formatter = date_formatter
-    p.legend.location = "top_right"
-    p.legend.click_policy = "hide"
-    p.legend.background_fill_alpha = 0.3
-    p.legend.inactive_fill_alpha = 0.8
-
-    return p
-
-
-@data_quality(name='hrs_order_position_high', caption=' ')
-def hrs_order_position_plot(start_date, end_date):
-    """
-        Return a <div> element with the Order Position plot.
+    logic = "   and HrsMode_Id in (1, 2, 3) " \
+            "   and FileName like 'HORDER%%' " \
+            "   group by Date, HrsMode_Id "
+    sql = "select Date, HrsMode_Id, (Max(HrsOrder) - Min(HrsOrder)) as ord " \
+          "     from DQ_HrsOrder join NightInfo using (NightInfo_Id) " \
+          "     where Date >= '{start_date}' and Date < '{end_date}' {logic}"
+    return read_sql_for_date_range(sql, start_date, end_date, logic=logic, schema=dict(Date='datetime64[ns]'))
 
-        The plot shows the HRS order for obsmode High resolution over time
 
-        Params:
-        -------
-        start_date: date
-            Earliest date to include in the plot.
-        end_date: date
-            Earliest date not to include in the plot.
+@data_quality(name='hrs_order_position_high', caption=' ',
+              inputs=[dataset_input('hrs_blue_order_positions', obsmode=3)],
+              spec=order_position_spec('HRS Order Position High Resolution'))
+def hrs_order_position_high_data(start_date, end_date):
+    """Return the data for the Order Position plot for obsmode High resolution.
 
-        Return:
-        -------
-        str:
-            A <div> element with the Order Position plot.
-    """
+    Params:
+    -------
+    start_date: date
+        Earliest date to include in the plot.
+    end_date: date
+        Earliest date not to include in the plot.
 
-    high_source = get_position_source(start_date, end_date, 3)  # HrsMode_Id = 3 high
-
-    tool_list = "pan,reset,save,wheel_zoom, box_zoom"
-    _hover = HoverTool(
-        tooltips="""
-                <div>
-                    <div>
-                        <span style="font-size: 15px; font-weight: bold;">Date: </span>
-                        <span style="font-size: 15px;"> @Time</span>
-                    </div>
-                    <div>
-                        <span style="font-size: 15px; font-weight: bold;">Y Upper: </span>
-                        <span style="font-size: 15px;"> @y_upper</span>
-                    </div>
-                    <div>
-                        <span style="font-size: 15px; font-weight: bold;">HRS Order: </span>
-                        <span style="font-size: 15px;"> @HrsOrder</span>
-                    </div>
-                </div>
-                """
-    )
-
-    p = figure(title="HRS Order Position High Resolution",
-               x_axis_label='Date',
-               y_axis_label='y_upper',
-               x_axis_type='datetime',
-               tools=[tool_list, _hover])
-    p.scatter(source=high_source, x='Date', y='y_upper', color='colors', fill_alpha=0.2, size=10)
-
-    p.xaxis[0].formatter = date_formatter
-
-    return p
-
-
-@data_quality(name='hrs_order_position_medium', caption=' ')
-def hrs_order_position_plot(start_date, end_date):
+    Return:
+    -------
+    DataFrame:
+        The data for the plot.
     """
-        Return a <div> element with the Order Position plot.
 
-        The plot shows the HRS order for obsmode High resolution over time
+    return order_position_data(start_date, end_date, 3)
 
-        Params:
-        -------
-        start_date: date
-            Earliest date to include in the plot.
-        end_date: date
-            Earliest date not to include in the plot.
 
-        Return:
-        -------
-        str:
-            A <div> element with the Order Position plot.
-    """
+@data_quality(name='hrs_order_position_medium', caption=' ',
+              inputs=[dataset_input('hrs_blue_order_positions', obsmode=2)],
+              spec=order_position_spec('HRS Order Position Medium Resolution'))
+def hrs_order_position_medium_data(start_date, end_date):
+    """Return the data for the Order Position plot for obsmode Medium resolution.
 
-    high_source = get_position_source(start_date, end_date, 2)  # HrsMode_Id = 2 med
-
-    tool_list = "pan,reset,save,wheel_zoom, box_zoom"
-    _hover = HoverTool(
-        tooltips="""
-                <div>
-                    <div>
-                        <span style="font-size: 15px; font-weight: bold;">Date: </span>
-                        <span style="font-size: 15px;"> @Time</span>
-                    </div>
-                    <div>
-                        <span style="font-size: 15px; font-weight: bold;">Y Upper: </span>
-                        <span style="font-size: 15px;"> @y_upper</span>
-                    </div>
-                    <div>
-                        <span style="font-size: 15px; font-weight: bold;">HRS Order: </span>
-                        <span style="font-size: 15px;"> @HrsOrder</span>
-                    </div>
-                </div>
-                """
-    )
-
-    p = figure(title="HRS Order Position Medium Resolution",
-               x_axis_label='Date',
-               y_axis_label='y_upper',
-               x_axis_type='datetime',
-               tools=[tool_list, _hover])
-    p.scatter(source=high_source, x='Date', y='y_upper', color='colors', fill_alpha=0.2, size=10)
-
-    p.xaxis[0].formatter = date_formatter
-
-    return p
-
-
-@data_quality(name='hrs_order_position_low', caption=' ')
-def hrs_order_position_plot(start_date, end_date):
+    Params:
+    -------
+    start_date: date
+        Earliest date to include in the plot.
+    end_date: date
+        Earliest date not to include in the plot.
+
+    Return:
+    -------
+    DataFrame:
+        The data for the plot.
     """
-        Return a <div> element with the Order Position plot.
 
-        The plot shows the HRS order for obsmode High resolution over time
+    return order_position_data(start_date, end_date, 2)
 
-        Params:
-        -------
-        start_date: date
-            Earliest date to include in the plot.
-        end_date: date
-            Earliest date not to include in the plot.
 
-        Return:
-        -------
-        str:
-            A <div> element with the Order Position plot.
+@data_quality(name='hrs_order_position_low', caption=' ',
+              inputs=[dataset_input('hrs_blue_order_positions', obsmode=1)],
+              spec=order_position_spec('HRS Order Position Low Resolution'))
+def hrs_order_position_low_data(start_date, end_date):
+    """Return the data for the Order Position plot for obsmode Low resolution.
+
+    Params:
+    -------
+    start_date: date
+        Earliest date to include in the plot.
+    end_date: date
+        Earliest date not to include in the plot.
+
+    Return:
+    -------
+    DataFrame:
+        The data for the plot.
     """
 
-    high_source = get_position_source(start_date, end_date, 1)  # HrsMode_Id = 1 low
-
-    tool_list = "pan,reset,save,wheel_zoom, box_zoom"
-    _hover = HoverTool(
-        tooltips="""
-                <div>
-                    <div>
-                        <span style="font-size: 15px; font-weight: bold;">Date: </span>
-                        <span style="font-size: 15px;"> @Time</span>
-                    </div>
-                    <div>
-                        <span style="font-size: 15px; font-weight: bold;">Y Upper: </span>
-                        <span style="font-size: 15px;"> @y_upper</span>
-                    </div>
-                    <div>
-                        <span style="font-size: 15px; font-weight: bold;">HRS Order: </span>
-                        <span style="font-size: 15px;"> @HrsOrder</span>
-                    </div>
-                </div>
-                """
-    )
-
-    p = figure(title="HRS Order Position Low Resolution",
-               x_axis_label='Date',
-               y_axis_label='y_upper',
-               x_axis_type='datetime',
-               tools=[tool_list, _hover])
-    p.scatter(source=high_source, x='Date', y='y_upper', color='colors', fill_alpha=0.2, size=10)
-
-    p.xaxis[0].formatter = date_formatter
-
-    return p
+    return order_position_data(start_date, end_date, 1)
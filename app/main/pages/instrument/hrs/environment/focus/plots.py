@@ -1,31 +1,48 @@
-import pandas as pd
+from app.decorators import data_quality
+from app.main.data_fetching import read_sql_for_date_range
+from app.main.plot_specs import PlotSpec, series
 
-from bokeh.embed import components
-from bokeh.models import HoverTool
-from bokeh.models.formatters import DatetimeTickFormatter
-from bokeh.plotting import figure, ColumnDataSource
+# series for the frames of the blue and red arm
+ARM_SERIES = [series('Blue Arm', 'blue', size=12, Arm='H'), series('Red Arm', 'red', size=10, Arm='R')]
 
-from app import db
-from app.decorators import data_quality
 
-# creates your plot
-date_formatter = DatetimeTickFormatter(microseconds=['%f'],
-                                       milliseconds=['%S.%2Ns'],
-                                       seconds=[':%Ss'],
-                                       minsec=[':%Mm:%Ss'],
-                                       minutes=['%H:%M:%S'],
-                                       hourmin=['%H:%M:'],
-                                       hours=["%H:%M"],
-                                       days=["%d %b"],
-                                       months=["%d %b %Y"],
-                                       years=["%b %Y"])
+def focus_data(start_date, end_date, column):
+    """Return the HRS focus data for a date range.
 
+    Params:
+    -------
+    start_date: date
+        Earliest date to include.
+    end_date: date
+        Earliest date not to include.
+    column: str
+        DQ_HrsFrame column with the focus.
 
-@data_quality(name='focus_bmir', caption='')
-def bmir_focus_plot(start_date, end_date):
-    """Return a <div> element with a HRS focus plot.
+    Return:
+    -------
+    DataFrame:
+        The UTStart, focus (as FOCUS), FileData_Id and arm of the frames.
+    """
 
-    The plot shows the HRS focus for the period between start_date (inclusive) and end_date (exclusive).
+    sql = "select UTStart, {column} as FOCUS, FileData_Id, Arm " \
+          "     from DQ_HrsFrame " \
+          "         where UTStart >= '{start_date}' and UTStart < '{end_date}' and HasHeader = 1"
+    return read_sql_for_date_range(sql, start_date, end_date, column=column,
+                                   schema=dict(FOCUS='float32', Arm='category'), night_column='UTStart')
+
+
+@data_quality(name='focus_bmir', caption='',
+              spec=PlotSpec(title='BMIR Focus',
+                            x='UTStart',
+                            y='FOCUS',
+                            x_label='Date',
+                            y_label='Focus',
+                            series=ARM_SERIES,
+                            frame_details=True))
+def bmir_focus_data(start_date, end_date):
+    """Return the data for a HRS focus plot.
+
+    The data covers the period between start_date (inclusive) and end_date (exclusive).
 
     Params:
     -------
@@ -36,69 +53,25 @@ def bmir_focus_plot(start_date, end_date):
 
     Return:
     -------
-    str:
-        A <div> element with the focus plot.
+    DataFrame:
+        The focus data.
     """
-    title = "BMIR Focus"
-    y_axis_label = 'Focus'
-
-    # creates your query
-    table = 'FitsHeaderHrs'
-    column = 'FOC_BMIR'
-    logic = " "
-    sql = "select UTStart, {column} as FOCUS, FileName, CONVERT(UTStart,char) AS Time " \
-          "     from {table} join FileData using (FileData_Id) " \
-          "         where UTStart > '{start_date}' and UTStart <'{end_date}' {logic}"\
-        .format(column=column, start_date=start_date, end_date=end_date,
-                table=table, logic=logic)
-    df = pd.read_sql(sql, db.engine)
-    df2 = pd.read_sql(sql, db.engine)
-    source = ColumnDataSource(df)
-    source2 = ColumnDataSource(df2)
-
-    tool_list = "pan,reset,save,wheel_zoom, box_zoom"
-    _hover = HoverTool(
-        tooltips="""
-                    <div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Date: </span>
-                            <span style="font-size: 15px;"> @Time</span>
-                        </div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Focus: </span>
-                            <span style="font-size: 15px;"> @FOCUS</span>
-                        </div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Filename: </span>
-                            <span style="font-size: 15px;"> @FileName</span>
-                        </div>
-                    </div>
-                    """
-    )
-
-    p = figure(title=title,
-               x_axis_label='Date',
-               y_axis_label=y_axis_label,
-               x_axis_type='datetime',
-               tools=[tool_list, _hover])
-    p.scatter(source=source, x='UTStart', y='FOCUS', color='blue', fill_alpha=0.2, size=12, legend='Blue Arm')
-    p.scatter(source=source2, x='UTStart', y='FOCUS', color='red', fill_alpha=0.2, size=10, legend='Red Arm')
-
-    p.legend.location = "top_right"
-    p.legend.click_policy = "hide"
-    p.legend.background_fill_alpha = 0.3
-    p.legend.inactive_fill_alpha = 0.8
-
-    p.xaxis[0].formatter = date_formatter
-
-    return p
-
-
-@data_quality(name='focus_rmir', caption='')
-def rmir_focus_plot(start_date, end_date):
-    """Return a <div> element with a HRS focus plot.
-
-    The plot shows the HRS focus for the period between start_date (inclusive) and end_date (exclusive).
+
+    return focus_data(start_date, end_date, 'FOC_BMIR')
+
+
+@data_quality(name='focus_rmir', caption='',
+              spec=PlotSpec(title='RMIR Focus',
+                            x='UTStart',
+                            y='FOCUS',
+                            x_label='Date',
+                            y_label='Focus',
+                            series=ARM_SERIES,
+                            frame_details=True))
+def rmir_focus_data(start_date, end_date):
+    """Return the data for a HRS focus plot.
+
+    The data covers the period between start_date (inclusive) and end_date (exclusive).
 
     Params:
     -------
@@ -109,60 +82,8 @@ def rmir_focus_plot(start_date, end_date):
 
     Return:
     -------
-    str:
-        A <div> element with the focus plot.
+    DataFrame:
+        The focus data.
     """
-    title = "RMIR Focus"
-    y_axis_label = 'Focus'
-
-    # creates your query
-    table = 'FitsHeaderHrs'
-    column = 'FOC_RMIR'
-    logic = " and FileName like 'H%%' "
-    logic2 = " and FileName like 'R%%' "
-    sql = "select UTStart, {column} as FOCUS, FileName, CONVERT(UTStart,char) AS Time " \
-          "     from {table} join FileData using (FileData_Id) " \
-          "         where UTStart > '{start_date}' and UTStart <'{end_date}' {logic}"
-    sql1 = sql.format(column=column, start_date=start_date, end_date=end_date, table=table, logic=logic)
-    sql2 = sql.format(column=column, start_date=start_date, end_date=end_date, table=table, logic=logic2)
-    df = pd.read_sql(sql1, db.engine)
-    df2 = pd.read_sql(sql2, db.engine)
-    source = ColumnDataSource(df)
-    source2 = ColumnDataSource(df2)
-
-    tool_list = "pan,reset,save,wheel_zoom, box_zoom"
-    _hover = HoverTool(
-        tooltips="""
-                    <div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Date: </span>
-                            <span style="font-size: 15px;"> @Time</span>
-                        </div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Focus: </span>
-                            <span style="font-size: 15px;"> @FOCUS</span>
-                        </div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Filename: </span>
-                            <span style="font-size: 15px;"> @FileName</span>
-                        </div>
-                    </div>
-                    """
-    )
-
-    p = figure(title=title,
-               x_axis_label='Date',
-               y_axis_label=y_axis_label,
-               x_axis_type='datetime',
-               tools=[tool_list, _hover])
-    p.scatter(source=source, x='UTStart', y='FOCUS', color='blue', fill_alpha=0.2, size=12, legend='Blue Arm')
-    p.scatter(source=source2, x='UTStart', y='FOCUS', color='red', fill_alpha=0.2, size=10, legend='Red Arm')
-
-    p.legend.location = "top_right"
-    p.legend.click_policy = "hide"
-    p.legend.background_fill_alpha = 0.3
-    p.legend.inactive_fill_alpha = 0.8
-
-    p.xaxis[0].formatter = date_formatter
-
-    return p
+
+    return focus_data(start_date, end_date, 'FOC_RMIR')
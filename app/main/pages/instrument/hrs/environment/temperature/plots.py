@@ -1,31 +1,103 @@
-import pandas as pd
+from app.decorators import data_quality
+from app.main.data_fetching import read_sql_for_date_range
+from app.main.datasets import dataset, dataset_frame, dataset_input
+from app.main.plot_specs import PlotSpec, series
 
-from bokeh.embed import components
-from bokeh.models import HoverTool
-from bokeh.models.formatters import DatetimeTickFormatter
-from bokeh.plotting import figure, ColumnDataSource
+# series for the frames of the blue and red arm
+ARM_SERIES = [series('Blue Arm', 'blue', size=12, Arm='H'), series('Red Arm', 'red', size=10, Arm='R')]
 
-from app import db
-from app.decorators import data_quality
 
-# creates your plot
-date_formatter = DatetimeTickFormatter(microseconds=['%f'],
-                                       milliseconds=['%S.%2Ns'],
-                                       seconds=[':%Ss'],
-                                       minsec=[':%Mm:%Ss'],
-                                       minutes=['%H:%M:%S'],
-                                       hourmin=['%H:%M:'],
-                                       hours=["%H:%M"],
-                                       days=["%d %b"],
-                                       months=["%d %b %Y"],
-                                       years=["%b %Y"])
+@dataset(name='hrs_temperatures')
+def hrs_temperatures(start_date, end_date, columns):
+    """Return HRS temperatures for a date range.
+
+    The temperatures are taken from the DQ_HrsFrame table, for the frames of both arms.
+
+    Params:
+    -------
+    start_date: date
+        Earliest date to include.
+    end_date: date
+        Earliest date not to include.
+    columns: list of str
+        DQ_HrsFrame columns with the temperatures.
+
+    Return:
+    -------
+    DataFrame:
+        The UTStart, FileData_Id, Arm and temperatures of the frames.
+    """
+
+    sql = "select UTStart, FileData_Id, Arm{columns} " \
+          "     from DQ_HrsFrame " \
+          "         where UTStart >= '{start_date}' and UTStart < '{end_date}' and HasHeader = 1"
+    schema = {column: 'float32' for column in columns}
+    schema['Arm'] = 'category'
+    return read_sql_for_date_range(sql, start_date, end_date, columns=''.join(', ' + c for c in columns), schema=schema,
+                                   night_column='UTStart')
+
+
+def temperature_data(start_date, end_date, columns):
+    """Return the HRS temperature data for a date range.
+
+    The data is taken from the hrs_temperatures dataset. If two columns are given, the first one is used for the frames
+    of the blue arm and the second one for the frames of the red arm.
+
+    Params:
+    -------
+    start_date: date
+        Earliest date to include.
+    end_date: date
+        Earliest date not to include.
+    columns: list of str
+        DQ_HrsFrame columns with the temperature.
+
+    Return:
+    -------
+    DataFrame:
+        The UTStart, temperature (as TEMP), FileData_Id and arm of the frames.
+    """
+
+    df = dataset_frame('hrs_temperatures', start_date, end_date, columns=columns)
+    df['TEMP'] = df[columns[0]].where(df['Arm'] == 'H', df[columns[-1]])
+    return df[['UTStart', 'TEMP', 'FileData_Id', 'Arm']]
+
+
+def temperature_spec(title, arm_series=ARM_SERIES):
+    """Return the plot spec for a HRS temperature plot.
+
+    The plot shows the temperature of the frames, rasterised if there are many frames.
+
+    Params:
+    -------
+    title: str
+        Plot title.
+    arm_series: list of Series
+        Series of the plot.
+
+    Return:
+    -------
+    PlotSpec:
+        The plot spec.
+    """
 
+    return PlotSpec(title=title,
+                    x='UTStart',
+                    y='TEMP',
+                    x_label='Date',
+                    y_label='Temperature (K)',
+                    series=arm_series,
+                    hover=[('Date', 'UTStart'), ('Temperature', 'TEMP')],
+                    frame_details=True,
+                    dense=True)
 
-@data_quality(name='temp_xcam', caption='')
-def temp_xcam_plot(start_date, end_date):
-    """Return a <div> element with a HRS RCAM and BCAM temperature plot.
 
-    The plot shows the HRS temperature for the period between start_date (inclusive) and end_date (exclusive).
+@data_quality(name='temp_xcam', caption='', spec=temperature_spec('HRS Red and Blue Camera Temperature'),
+              inputs=[dataset_input('hrs_temperatures', columns=['TEM_BCAM', 'TEM_RCAM'])])
+def temp_xcam_data(start_date, end_date):
+    """Return the data for a HRS camera temperature plot.
+
+    The data covers the period between start_date (inclusive) and end_date (exclusive).
 
     Params:
     -------
@@ -36,70 +108,19 @@ def temp_xcam_plot(start_date, end_date):
 
     Return:
     -------
-    str:
-        A <div> element with the temperature plot.
+    DataFrame:
+        The temperature data.
     """
-    title = "HRS Red and Blue Camera Temperature"
-    y_axis_label = 'Temperature (K)'
-
-    # creates your query
-    table = 'FitsHeaderHrs'
-    column1 = 'TEM_BCAM'
-    column2 = 'TEM_RCAM'
-    logic = " and FileName like 'H%%'"
-    logic2 = " and FileName like 'R%%'"
-    sql = "select UTStart, {column} as TEMP, FileName, CONVERT(UTStart,char) AS Time " \
-          "     from {table} join FileData using (FileData_Id) " \
-          "         where UTStart > '{start_date}' and UTStart <'{end_date}' {logic}"
-    sql1 = sql.format(column=column1, start_date=start_date, end_date=end_date, table=table, logic=logic)
-    sql2 = sql.format(column=column2, start_date=start_date, end_date=end_date, table=table, logic=logic2)
-
-    df = pd.read_sql(sql1, db.engine)
-    df2 = pd.read_sql(sql2, db.engine)
-    source = ColumnDataSource(df)
-    source2 = ColumnDataSource(df2)
-
-    tool_list = "pan,reset,save,wheel_zoom, box_zoom"
-    _hover = HoverTool(
-        tooltips="""
-                    <div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Date: </span>
-                            <span style="font-size: 15px;"> @Time</span>
-                        </div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Temperature: </span>
-                            <span style="font-size: 15px;"> @TEMP</span>
-                        </div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Filename: </span>
-                            <span style="font-size: 15px;"> @FileName</span>
-                        </div>
-                    </div>
-                    """
-    )
-
-    p = figure(title=title,
-               x_axis_label='Date', y_axis_label=y_axis_label,
-               x_axis_type='datetime', tools=[tool_list, _hover])
-    p.scatter(source=source, x='UTStart', y='TEMP', color='blue', fill_alpha=0.2, size=12, legend='Blue Arm')
-    p.scatter(source=source2, x='UTStart', y='TEMP', color='red', fill_alpha=0.2, size=10, legend='Red Arm')
-
-    p.xaxis[0].formatter = date_formatter
-
-    p.legend.location = "top_right"
-    p.legend.click_policy = "hide"
-    p.legend.background_fill_alpha = 0.3
-    p.legend.inactive_fill_alpha = 0.8
-
-    return p
-
-
-@data_quality(name='temp_air', caption='')
-def temp_air_plot(start_date, end_date):
-    """Return a <div> element with a HRS temperature plot.
-
-    The plot shows the HRS temperature for the period between start_date (inclusive) and end_date (exclusive).
+
+    return temperature_data(start_date, end_date, ['TEM_BCAM', 'TEM_RCAM'])
+
+
+@data_quality(name='temp_air', caption='', spec=temperature_spec('HRS Environment Air Temperature'),
+              inputs=[dataset_input('hrs_temperatures', columns=['TEM_AIR'])])
+def temp_air_data(start_date, end_date):
+    """Return the data for a HRS air temperature plot.
+
+    The data covers the period between start_date (inclusive) and end_date (exclusive).
 
     Params:
     -------
@@ -110,69 +131,19 @@ def temp_air_plot(start_date, end_date):
 
     Return:
     -------
-    str:
-        A <div> element with the temperature plot.
+    DataFrame:
+        The temperature data.
     """
-    title = "HRS Environment Air Temperature"
-    y_axis_label = 'Temperature (K)'
-
-    # creates your query
-    table = 'FitsHeaderHrs'
-    column = 'TEM_AIR'
-    logic = " and FileName like 'H%%'"
-    logic2 = " and FileName like 'R%%'"
-    sql = "select UTStart, {column} as TEMP, FileName, CONVERT(UTStart,char) AS Time " \
-          "     from {table} join FileData using (FileData_Id) " \
-          "         where UTStart > '{start_date}' and UTStart <'{end_date}' {logic}"
-    sql1 = sql.format(column=column, start_date=start_date, end_date=end_date, table=table, logic=logic)
-    sql2 = sql.format(column=column, start_date=start_date, end_date=end_date, table=table, logic=logic2)
-
-    df = pd.read_sql(sql1, db.engine)
-    df2 = pd.read_sql(sql2, db.engine)
-    source = ColumnDataSource(df)
-    source2 = ColumnDataSource(df2)
-
-    tool_list = "pan,reset,save,wheel_zoom, box_zoom"
-    _hover = HoverTool(
-        tooltips="""
-                    <div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Date: </span>
-                            <span style="font-size: 15px;"> @Time</span>
-                        </div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Temperature: </span>
-                            <span style="font-size: 15px;"> @TEMP</span>
-                        </div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Filename: </span>
-                            <span style="font-size: 15px;"> @FileName</span>
-                        </div>
-                    </div>
-                    """
-    )
-
-    p = figure(title=title,
-               x_axis_label='Date', y_axis_label=y_axis_label,
-               x_axis_type='datetime', tools=[tool_list, _hover])
-    p.scatter(source=source, x='UTStart', y='TEMP', color='blue', fill_alpha=0.2, size=12, legend='Blue Arm')
-    p.scatter(source=source2, x='UTStart', y='TEMP', color='red', fill_alpha=0.2, size=10, legend='Red Arm')
-
-    p.xaxis[0].formatter = date_formatter
-
-    p.legend.location = "top_right"
-    p.legend.click_policy = "hide"
-    p.legend.background_fill_alpha = 0.3
-    p.legend.inactive_fill_alpha = 0.8
-
-    return p
-
-
-@data_quality(name='temp_vac', caption='')
-def temp_vac_plot(start_date, end_date):
-    """Return a <div> element with a HRS temperature plot.
-
-    The plot shows the HRS temperature for the period between start_date (inclusive) and end_date (exclusive).
+
+    return temperature_data(start_date, end_date, ['TEM_AIR'])
+
+
+@data_quality(name='temp_vac', caption='', spec=temperature_spec('HRS Vacuum Chamber Wall Temperature'),
+              inputs=[dataset_input('hrs_temperatures', columns=['TEM_VAC'])])
+def temp_vac_data(start_date, end_date):
+    """Return the data for a HRS vacuum chamber wall temperature plot.
+
+    The data covers the period between start_date (inclusive) and end_date (exclusive).
 
     Params:
     -------
@@ -183,70 +154,19 @@ def temp_vac_plot(start_date, end_date):
 
     Return:
     -------
-    str:
-        A <div> element with the temperature plot.
+    DataFrame:
+        The temperature data.
     """
-    title = "HRS Vacuum Chamber Wall Temperature"
-    y_axis_label = 'Temperature (K)'
-
-    # creates your query
-    table = 'FitsHeaderHrs'
-    column = 'TEM_VAC'
-    logic = " and FileName like 'H%%'"
-    logic2 = " and FileName like 'R%%'"
-    sql = "select UTStart, {column} as TEMP, FileName, CONVERT(UTStart,char) AS Time " \
-          "     from {table} join FileData using (FileData_Id) " \
-          "         where UTStart > '{start_date}' and UTStart <'{end_date}' {logic}"
-
-    sql1 = sql.format(column=column, start_date=start_date, end_date=end_date, table=table, logic=logic)
-    sql2 = sql.format(column=column, start_date=start_date, end_date=end_date, table=table, logic=logic2)
-
-    df = pd.read_sql(sql1, db.engine)
-    df2 = pd.read_sql(sql2, db.engine)
-    source = ColumnDataSource(df)
-    source2 = ColumnDataSource(df2)
-
-    tool_list = "pan,reset,save,wheel_zoom, box_zoom"
-    _hover = HoverTool(
-        tooltips="""
-                    <div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Date: </span>
-                            <span style="font-size: 15px;"> @Time</span>
-                        </div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Temperature: </span>
-                            <span style="font-size: 15px;"> @TEMP</span>
-                        </div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Filename: </span>
-                            <span style="font-size: 15px;"> @FileName</span>
-                        </div>
-                    </div>
-                    """
-    )
-
-    p = figure(title=title,
-               x_axis_label='Date', y_axis_label=y_axis_label,
-               x_axis_type='datetime', tools=[tool_list, _hover])
-    p.scatter(source=source, x='UTStart', y='TEMP', color='blue', fill_alpha=0.2, size=12, legend='Blue Arm')
-    p.scatter(source=source2, x='UTStart', y='TEMP', color='Red', fill_alpha=0.2, size=10, legend='Red Arm')
-
-    p.legend.location = "top_right"
-    p.legend.click_policy = "hide"
-    p.legend.background_fill_alpha = 0.3
-    p.legend.inactive_fill_alpha = 0.8
-
-    p.xaxis[0].formatter = date_formatter
-
-    return p
-
-
-@data_quality(name='temp_rmir', caption='')
-def temp_rmir_plot(start_date, end_date):
-    """Return a <div> element with a HRS temperature plot.
-
-    The plot shows the HRS temperature for the period between start_date (inclusive) and end_date (exclusive).
+
+    return temperature_data(start_date, end_date, ['TEM_VAC'])
+
+
+@data_quality(name='temp_rmir', caption='', spec=temperature_spec('HRS Red Pupil Mirror Cell Temperature'),
+              inputs=[dataset_input('hrs_temperatures', columns=['TEM_RMIR'])])
+def temp_rmir_data(start_date, end_date):
+    """Return the data for a HRS red pupil mirror cell temperature plot.
+
+    The data covers the period between start_date (inclusive) and end_date (exclusive).
 
     Params:
     -------
@@ -257,69 +177,19 @@ def temp_rmir_plot(start_date, end_date):
 
     Return:
     -------
-    str:
-        A <div> element with the temperature plot.
+    DataFrame:
+        The temperature data.
     """
-    title = "HRS Red Pupil Mirror Cell Temperature"
-    y_axis_label = 'Temperature (K)'
-
-    # creates your query
-    table = 'FitsHeaderHrs'
-    column = 'TEM_RMIR'
-    logic = " and FileName like 'H%%'"
-    logic2 = " and FileName like 'R%%'"
-    sql = "select UTStart, {column} as TEMP, FileName, CONVERT(UTStart,char) AS Time " \
-          "     from {table} join FileData using (FileData_Id) " \
-          "         where UTStart > '{start_date}' and UTStart <'{end_date}' {logic}"
-    sql1 = sql.format(column=column, start_date=start_date, end_date=end_date, table=table, logic=logic)
-    sql2 = sql.format(column=column, start_date=start_date, end_date=end_date, table=table, logic=logic2)
-
-    df = pd.read_sql(sql1, db.engine)
-    df2 = pd.read_sql(sql2, db.engine)
-    source = ColumnDataSource(df)
-    source2 = ColumnDataSource(df2)
-
-    tool_list = "pan,reset,save,wheel_zoom, box_zoom"
-    _hover = HoverTool(
-        tooltips="""
-                    <div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Date: </span>
-                            <span style="font-size: 15px;"> @Time</span>
-                        </div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Temperature: </span>
-                            <span style="font-size: 15px;"> @TEMP</span>
-                        </div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Filename: </span>
-                            <span style="font-size: 15px;"> @FileName</span>
-                        </div>
-                    </div>
-                    """
-    )
-
-    p = figure(title=title,
-               x_axis_label='Date', y_axis_label=y_axis_label,
-               x_axis_type='datetime', tools=[tool_list, _hover])
-    p.scatter(source=source, x='UTStart', y='TEMP', color='blue', fill_alpha=0.2, size=12, legend='Blue Arm')
-    p.scatter(source=source2, x='UTStart', y='TEMP', color='red', fill_alpha=0.2, size=10, legend='Red Arm')
-
-    p.legend.location = "top_right"
-    p.legend.click_policy = "hide"
-    p.legend.background_fill_alpha = 0.3
-    p.legend.inactive_fill_alpha = 0.8
-
-    p.xaxis[0].formatter = date_formatter
-
-    return p
-
-
-@data_quality(name='temp_coll', caption='')
-def temp_coll_plot(start_date, end_date):
-    """Return a <div> element with a HRS temperature plot.
-
-    The plot shows the HRS temperature for the period between start_date (inclusive) and end_date (exclusive).
+
+    return temperature_data(start_date, end_date, ['TEM_RMIR'])
+
+
+@data_quality(name='temp_coll', caption='', spec=temperature_spec('HRS Collimator Mount Temperature'),
+              inputs=[dataset_input('hrs_temperatures', columns=['TEM_COLL'])])
+def temp_coll_data(start_date, end_date):
+    """Return the data for a HRS collimator mount temperature plot.
+
+    The data covers the period between start_date (inclusive) and end_date (exclusive).
 
     Params:
     -------
@@ -330,69 +200,19 @@ def temp_coll_plot(start_date, end_date):
 
     Return:
     -------
-    str:
-        A <div> element with the temperature plot.
+    DataFrame:
+        The temperature data.
     """
-    title = "HRS Collimator Mount Temperature"
-    y_axis_label = 'Temperature (K)'
-
-    # creates your query
-    table = 'FitsHeaderHrs'
-    column = 'TEM_COLL'
-    logic = " and FileName like 'H%%'"
-    logic2 = " and FileName like 'R%%'"
-    sql = "select UTStart, {column} as TEMP, FileName, CONVERT(UTStart,char) AS Time " \
-          "     from {table} join FileData using (FileData_Id) " \
-          "         where UTStart > '{start_date}' and UTStart <'{end_date}' {logic}"
-    sql1 = sql.format(column=column, start_date=start_date, end_date=end_date, table=table, logic=logic)
-    sql2 = sql.format(column=column, start_date=start_date, end_date=end_date, table=table, logic=logic2)
-
-    df = pd.read_sql(sql1, db.engine)
-    df2 = pd.read_sql(sql2, db.engine)
-    source = ColumnDataSource(df)
-    source2 = ColumnDataSource(df2)
-
-    tool_list = "pan,reset,save,wheel_zoom, box_zoom"
-    _hover = HoverTool(
-        tooltips="""
-                    <div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Date: </span>
-                            <span style="font-size: 15px;"> @Time</span>
-                        </div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Temperature: </span>
-                            <span style="font-size: 15px;"> @TEMP</span>
-                        </div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Filename: </span>
-                            <span style="font-size: 15px;"> @FileName</span>
-                        </div>
-                    </div>
-                    """
-    )
-
-    p = figure(title=title,
-               x_axis_label='Date', y_axis_label=y_axis_label,
-               x_axis_type='datetime', tools=[tool_list, _hover])
-    p.scatter(source=source, x='UTStart', y='TEMP', color='blue', fill_alpha=0.2, size=12, legend='Blue Arm')
-    p.scatter(source=source2, x='UTStart', y='TEMP', color='red', fill_alpha=0.2, size=10, legend='Red Arm')
-
-    p.xaxis[0].formatter = date_formatter
-
-    p.legend.location = "top_right"
-    p.legend.click_policy = "hide"
-    p.legend.background_fill_alpha = 0.3
-    p.legend.inactive_fill_alpha = 0.8
-
-    return p
-
-
-@data_quality(name='temp_ech', caption='')
-def temp_air_plot(start_date, end_date):
-    """Return a <div> element with a HRS temperature plot.
-
-    The plot shows the HRS temperature for the period between start_date (inclusive) and end_date (exclusive).
+
+    return temperature_data(start_date, end_date, ['TEM_COLL'])
+
+
+@data_quality(name='temp_ech', caption='', spec=temperature_spec('HRS Echelle Mount Temperature'),
+              inputs=[dataset_input('hrs_temperatures', columns=['TEM_ECH'])])
+def temp_ech_data(start_date, end_date):
+    """Return the data for a HRS echelle mount temperature plot.
+
+    The data covers the period between start_date (inclusive) and end_date (exclusive).
 
     Params:
     -------
@@ -403,70 +223,19 @@ def temp_air_plot(start_date, end_date):
 
     Return:
     -------
-    str:
-        A <div> element with the temperature plot.
+    DataFrame:
+        The temperature data.
     """
-    title = "HRS Echelle Mount Temperature"
-    y_axis_label = 'Temperature (K)'
-
-    # creates your query
-    table = 'FitsHeaderHrs'
-    column = 'TEM_ECH'
-    logic = " and FileName like 'H%%'"
-    logic2 = " and FileName like 'R%%'"
-    sql = "select UTStart, {column} as TEMP, FileName, CONVERT(UTStart,char) AS Time " \
-          "     from {table} join FileData using (FileData_Id) " \
-          "         where UTStart > '{start_date}' and UTStart <'{end_date}' {logic}"
-
-    sql1 = sql.format(column=column, start_date=start_date, end_date=end_date, table=table, logic=logic)
-    sql2 = sql.format(column=column, start_date=start_date, end_date=end_date, table=table, logic=logic2)
-
-    df = pd.read_sql(sql1, db.engine)
-    df2 = pd.read_sql(sql2, db.engine)
-    source = ColumnDataSource(df)
-    source2 = ColumnDataSource(df2)
-
-    tool_list = "pan,reset,save,wheel_zoom, box_zoom"
-    _hover = HoverTool(
-        tooltips="""
-                    <div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Date: </span>
-                            <span style="font-size: 15px;"> @Time</span>
-                        </div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Temperature: </span>
-                            <span style="font-size: 15px;"> @TEMP</span>
-                        </div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Filename: </span>
-                            <span style="font-size: 15px;"> @FileName</span>
-                        </div>
-                    </div>
-                    """
-    )
-
-    p = figure(title=title,
-               x_axis_label='Date', y_axis_label=y_axis_label,
-               x_axis_type='datetime', tools=[tool_list, _hover])
-    p.scatter(source=source, x='UTStart', y='TEMP', color='blue', fill_alpha=0.2, size=12, legend='Blue Arm')
-    p.scatter(source=source2, x='UTStart', y='TEMP', color='red', fill_alpha=0.2, size=10, legend='Red Arm')
-
-    p.xaxis[0].formatter = date_formatter
-
-    p.legend.location = "top_right"
-    p.legend.click_policy = "hide"
-    p.legend.background_fill_alpha = 0.3
-    p.legend.inactive_fill_alpha = 0.8
-
-    return p
-
-
-@data_quality(name='temp_ob', caption='')
-def temp_air_plot(start_date, end_date):
-    """Return a <div> element with a HRS temperature plot.
-
-    The plot shows the HRS temperature for the period between start_date (inclusive) and end_date (exclusive).
+
+    return temperature_data(start_date, end_date, ['TEM_ECH'])
+
+
+@data_quality(name='temp_ob', caption='', spec=temperature_spec('HRS Optical Bench Temperature'),
+              inputs=[dataset_input('hrs_temperatures', columns=['TEM_OB'])])
+def temp_ob_data(start_date, end_date):
+    """Return the data for a HRS optical bench temperature plot.
+
+    The data covers the period between start_date (inclusive) and end_date (exclusive).
 
     Params:
     -------
@@ -477,65 +246,21 @@ def temp_air_plot(start_date, end_date):
 
     Return:
     -------
-    str:
-        A <div> element with the temperature plot.
+    DataFrame:
+        The temperature data.
     """
-    title = "HRS Optical Bench Temperature"
-    y_axis_label = 'Temperature (K)'
-
-    # creates your query
-    table = 'FitsHeaderHrs'
-    column = 'TEM_OB'
-    logic = " and FileName like 'H%%'"
-    logic2 = " and FileName like 'R%%'"
-    sql = "select UTStart, {column} as TEMP, FileName, CONVERT(UTStart,char) AS Time " \
-          "     from {table} join FileData using (FileData_Id) " \
-          "         where UTStart > '{start_date}' and UTStart <'{end_date}' {logic}"
-
-    sql1 = sql.format(column=column, start_date=start_date, end_date=end_date, table=table, logic=logic)
-    sql2 = sql.format(column=column, start_date=start_date, end_date=end_date, table=table, logic=logic2)
-
-    df = pd.read_sql(sql1, db.engine)
-    df2 = pd.read_sql(sql2, db.engine)
-    source = ColumnDataSource(df)
-    source2 = ColumnDataSource(df2)
-
-    tool_list = "pan,reset,save,wheel_zoom, box_zoom"
-    _hover = HoverTool(
-        tooltips="""
-                    <div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Date: </span>
-                            <span style="font-size: 15px;"> @Time</span>
-                        </div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Temperature: </span>
-                            <span style="font-size: 15px;"> @TEMP</span>
-                        </div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Filename: </span>
-                            <span style="font-size: 15px;"> @FileName</span>
-                        </div>
-                    </div>
-                    """
-    )
-
-    p = figure(title=title,
-               x_axis_label='Date', y_axis_label=y_axis_label,
-               x_axis_type='datetime', tools=[tool_list, _hover])
-    p.scatter(source=source, x='UTStart', y='TEMP', color='blue', fill_alpha=0.2, size=12, legend='Blue Arm')
-    p.scatter(source=source2, x='UTStart', y='TEMP', color='red', fill_alpha=0.2, size=10, legend='Red Arm')
-
-    p.xaxis[0].formatter = date_formatter
-
-    return p
-
-
-@data_quality(name='temp_iod', caption='')
-def temp_iod_plot(start_date, end_date):
-    """Return a <div> element with a HRS temperature plot.
-
-    The plot shows the HRS temperature for the period between start_date (inclusive) and end_date (exclusive).
+
+    return temperature_data(start_date, end_date, ['TEM_OB'])
+
+
+@data_quality(name='temp_iod', caption='',
+              spec=temperature_spec('HRS Iodine Cell Heater Temperature',
+                                    [series('Iodine Cell', 'purple', size=12, Arm='H')]),
+              inputs=[dataset_input('hrs_temperatures', columns=['TEM_IOD'])])
+def temp_iod_data(start_date, end_date):
+    """Return the data for a HRS iodine cell heater temperature plot.
+
+    The data covers the period between start_date (inclusive) and end_date (exclusive).
 
     Params:
     -------
@@ -546,50 +271,8 @@ def temp_iod_plot(start_date, end_date):
 
     Return:
     -------
-    str:
-        A <div> element with the temperature plot.
+    DataFrame:
+        The temperature data.
     """
-    title = "HRS Iodine Cell Heater Temperature"
-    y_axis_label = 'Temperature (K)'
-
-    # creates your query
-    table = 'FitsHeaderHrs'
-    column = 'TEM_IOD'
-    logic = " and FileName like 'H%%'"
-    sql = "select UTStart, {column} as TEMP, FileName, CONVERT(UTStart,char) AS Time " \
-          "     from {table} join FileData using (FileData_Id) " \
-          "         where UTStart > '{start_date}' and UTStart <'{end_date}' {logic}"
-
-    sql1 = sql.format(column=column, start_date=start_date, end_date=end_date, table=table, logic=logic)
-
-    df = pd.read_sql(sql1, db.engine)
-    source = ColumnDataSource(df)
-
-    tool_list = "pan,reset,save,wheel_zoom, box_zoom"
-    _hover = HoverTool(
-        tooltips="""
-                    <div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Date: </span>
-                            <span style="font-size: 15px;"> @Time</span>
-                        </div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Temperature: </span>
-                            <span style="font-size: 15px;"> @TEMP</span>
-                        </div>
-                        <div>
-                            <span style="font-size: 15px; font-weight: bold;">Filename: </span>
-                            <span style="font-size: 15px;"> @FileName</span>
-                        </div>
-                    </div>
-                    """
-    )
-
-    p = figure(title=title,
-               x_axis_label='Date', y_axis_label=y_axis_label,
-               x_axis_type='datetime', tools=[tool_list, _hover])
-    p.scatter(source=source, x='UTStart', y='TEMP', color='purple', fill_alpha=0.2, size=12, legend='Iodine Cell')
-
-    p.xaxis[0].formatter = date_formatter
-
-    return p
+
+    return temperature_data(start_date, end_date, ['TEM_IOD'])
@@ -1,40 +1,74 @@
-import pandas as pd
+import datetime
+from functools import partial
 
-from bokeh.models import HoverTool
-from bokeh.models.formatters import DatetimeTickFormatter
 from bokeh.palettes import Plasma256
-from bokeh.plotting import figure, ColumnDataSource
 
-from app import db
 from app.decorators import data_quality
+from app.main.data_fetching import read_sql_for_date_range
+from app.main.data_quality_plots import heatmap
+from app.main.figure_templates import template_figure
+from app.main.plot_specs import PlotSpec, series
 
-# creates your plot
-date_formatter = DatetimeTickFormatter(microseconds=['%f'],
-                                       milliseconds=['%S.%2Ns'],
-                                       seconds=[':%Ss'],
-                                       minsec=[':%Mm:%Ss'],
-                                       minutes=['%H:%M:%S'],
-                                       hourmin=['%H:%M:'],
-                                       hours=["%H:%M"],
-                                       days=["%d %b"],
-                                       months=["%d %b %Y"],
-                                       years=["%b %Y"])
-
-
-def get_source(start_date, end_date, obsmode):
-    filename = 'R%%'
+# number of seconds after expiry for which cached nightly heatmaps may be served while they are recreated
+NIGHTLY_MAX_STALENESS = 6 * 3600
+
+
+def arc_spec(title):
+    """Return the plot spec of an AVG(DeltaX) plot.
+
+    Params:
+    -------
+    title: str
+        Plot title.
+
+    Return:
+    -------
+    PlotSpec:
+        The plot spec.
+    """
+
+    return PlotSpec(title=title,
+                    x='UTStart',
+                    y='avg',
+                    x_label='Date',
+                    y_label='AVG(DeltaX)',
+                    series=[series(color='colors', size=10, alpha=0.2)],
+                    hover=[('Date', 'UTStart'), ('AVERAGE', 'avg'), ('HrsOrder', 'HrsOrder')],
+                    frame_details=True,
+                    dense=True)
+
+
+def arc_data(start_date, end_date, obsmode):
+    """Return the AVG(DeltaX) per arc frame and order.
+
+    The points are coloured by order.
+
+    Params:
+    -------
+    start_date: date
+        Earliest date to include in the plot.
+    end_date: date
+        Earliest date not to include in the plot.
+    obsmode: str
+        Observation mode.
+
+    Return:
+    -------
+    DataFrame:
+        The UTStart, HrsOrder, AVG(DeltaX) (as avg), FileData_Id and colour (as colors) of the points.
+    """
+
+    arm = 'R'
     logic = " and OBSMODE='{obsmode}'  " \
             "   and DeltaX > -99 " \
-            "   and FileName like '{filename}' " \
+            "   and Arm = '{arm}' " \
             "   and Object = 1  group by UTStart, HrsOrder" \
-        .format(filename=filename, obsmode=obsmode)
-
-    sql = "Select UTStart, HrsOrder, AVG(DeltaX) as avg, CONVERT(UTStart,char) AS Time " \
-          "     from DQ_HrsArc join FileData using (FileData_Id) " \
-          "     where UTStart > '{start_date}' and UTStart <'{end_date}' {logic}" \
-        .format(start_date=start_date, end_date=end_date, logic=logic)
+        .format(arm=arm, obsmode=obsmode)
+    sql = "Select UTStart, HrsOrder, AVG(DeltaX) as avg, MIN(FileData_Id) AS FileData_Id " \
+          "     from DQ_HrsArc join DQ_HrsFrame using (FileData_Id) " \
+          "     where UTStart >= '{start_date}' and UTStart < '{end_date}' {logic}"
 
-    df = pd.read_sql(sql, db.engine)
+    df = read_sql_for_date_range(sql, start_date, end_date, logic=logic, schema=dict(avg='float32'), streamed=True)
 
     colors = []
     if len(df) > 0:
@@ -44,15 +78,32 @@ def get_source(start_date, end_date, obsmode):
                   df["HrsOrder"]]
     df['colors'] = colors
 
-    source = ColumnDataSource(df)
-    return source
+    return df
 
 
-@data_quality(name='high_resolution', caption='')
-def hrs_high_resolution_plot(start_date, end_date):
-    """Return a <div> element with the High resolution AVG(DeltaX) vs time.
+@data_quality(name='high_resolution', caption='', spec=arc_spec('High Resolution'))
+def hrs_high_resolution_data(start_date, end_date):
+    """Return the data for a plot of the High resolution AVG(DeltaX) vs time.
 
-    The plot shows the AVG(DeltaX) for a set of time
+    Params:
+    -------
+    start_date: date
+        Earliest date to include in the plot.
+    end_date: date
+        Earliest date not to include in the plot.
+
+    Return:
+    -------
+    DataFrame:
+        The data for the plot.
+    """
+
+    return arc_data(start_date, end_date, 'HIGH RESOLUTION')
+
+
+@data_quality(name='medium_resolution', caption='', spec=arc_spec('Medium Resolution'))
+def hrs_medium_resolution_data(start_date, end_date):
+    """Return the data for a plot of the Medium resolution AVG(DeltaX) vs time.
 
     Params:
     -------
@@ -63,150 +114,156 @@ def hrs_high_resolution_plot(start_date, end_date):
 
     Return:
     -------
-    str:
-        A <div> element with the High resolution AVG(DeltaX) vs time.
+    DataFrame:
+        The data for the plot.
     """
 
-    obsmode = 'HIGH RESOLUTION'
-    source = get_source(start_date, end_date, obsmode)
-
-    tool_list = "pan,reset,save,wheel_zoom, box_zoom"
-    _hover = HoverTool(
-        tooltips="""
-                <div>
-                    <div>
-                        <span style="font-size: 15px; font-weight: bold;">Date: </span>
-                        <span style="font-size: 15px;"> @Time</span>
-                    </div>
-                    <div>
-                        <span style="font-size: 15px; font-weight: bold;">AVERAGE: </span>
-                        <span style="font-size: 15px;"> @avg</span>
-                    </div>
-                    <div>
-                        <span style="font-size: 15px; font-weight: bold;">HrsOrder: </span>
-                        <span style="font-size: 15px;"> @HrsOrder</span>
-                    </div>
-                </div>
-                """
-    )
-
-    p = figure(title="High Resolution",
-               x_axis_label='Date',
-               y_axis_label='AVG(DeltaX)',
-               x_axis_type='datetime',
-               tools=[tool_list, _hover])
-    p.scatter(source=source, x='UTStart', y='avg', color='colors', fill_alpha=0.2, size=10)
-
-    p.xaxis[0].formatter = date_formatter
+    return arc_data(start_date, end_date, 'MEDIUM RESOLUTION')
 
-    return p
+
+@data_quality(name='low_resolution', caption='', spec=arc_spec('Low Resolution'))
+def hrs_low_resolution_data(start_date, end_date):
+    """Return the data for a plot of the Low resolution AVG(DeltaX) vs time.
+
+    Params:
+    -------
+    start_date: date
+        Earliest date to include in the plot.
+    end_date: date
+        Earliest date not to include in the plot.
+
+    Return:
+    -------
+    DataFrame:
+        The data for the plot.
+    """
+
+    return arc_data(start_date, end_date, 'LOW RESOLUTION')
 
 
-@data_quality(name='medium_resolution', caption='')
-def hrs_medium_resolution_plot(start_date, end_date):
+def arc_heatmap_data(start_date, end_date, obsmode):
+    """Return the data for a heatmap of the nightly AVG(DeltaX) per order.
+
+    The average is taken over all arc frames of a night, where a night runs from noon to noon (UT) and is labelled by
+    the date on which it starts. The data frame contains the sum and count per night and order rather than the
+    average, so that data frames for consecutive date ranges can be concatenated; the average is computed by
+    render_arc_heatmap.
+
+    Params:
+    -------
+    start_date: date
+        Earliest date to include in the plot.
+    end_date: date
+        Earliest date not to include in the plot.
+    obsmode: str
+        Observation mode.
+
+    Return:
+    -------
+    DataFrame:
+        The sum of the DeltaX values and the number of arcs per night and order.
     """
-        Return a <div> element with the Medium resolution AVG(DeltaX) vs time.
 
-        The plot shows the AVG(DeltaX) for a set of time
+    arm = 'R'
+    sql = "select DATE(UTStart - INTERVAL 12 HOUR) as Night, HrsOrder, SUM(DeltaX) as TotalDeltaX, COUNT(*) as Arcs " \
+          "     from DQ_HrsArc join DQ_HrsFrame using (FileData_Id) " \
+          "     where UTStart >= '{start_date}' and UTStart < '{end_date}' " \
+          "           and OBSMODE='{obsmode}' and DeltaX > -99 and Arm = '{arm}' and Object = 1 " \
+          "     group by Night, HrsOrder"
+    df = read_sql_for_date_range(sql, start_date, end_date, obsmode=obsmode, arm=arm,
+                                 schema=dict(Night='datetime64[ns]', TotalDeltaX='float64'))
+    return df[['Night', 'HrsOrder', 'TotalDeltaX', 'Arcs']]
 
-        Params:
-        -------
-        start_date: date
-            Earliest date to include in the plot.
-        end_date: date
-            Earliest date not to include in the plot.
 
-        Return:
-        -------
-        str:
-            A <div> element with the Medium resolution AVG(DeltaX) vs time.
+def render_arc_heatmap(title, df):
+    """Return a heatmap of the nightly AVG(DeltaX) per order.
+
+    This function may be called in a worker process (see the render argument of the data_quality decorator).
+
+    Params:
+    -------
+    title: str
+        Plot title.
+    df: DataFrame
+        The sums and counts per night and order, as returned by arc_heatmap_data. Nights may occur more than once.
+
+    Return:
+    -------
+    Figure:
+        The heatmap.
     """
 
-    obsmode = 'MEDIUM RESOLUTION'
-    source = get_source(start_date, end_date, obsmode)
-
-    tool_list = "pan,reset,save,wheel_zoom, box_zoom"
-    _hover = HoverTool(
-        tooltips="""
-                <div>
-                    <div>
-                        <span style="font-size: 15px; font-weight: bold;">Date: </span>
-                        <span style="font-size: 15px;"> @Time</span>
-                    </div>
-                    <div>
-                        <span style="font-size: 15px; font-weight: bold;">AVERAGE: </span>
-                        <span style="font-size: 15px;"> @avg</span>
-                    </div>
-                    <div>
-                        <span style="font-size: 15px; font-weight: bold;">HrsOrder: </span>
-                        <span style="font-size: 15px;"> @HrsOrder</span>
-                    </div>
-                </div>
-                """
-    )
-
-    p = figure(title="Medium Resolution",
-               x_axis_label='Date',
-               y_axis_label='AVG(DeltaX)',
-               x_axis_type='datetime',
-               tools=[tool_list, _hover])
-    p.scatter(source=source, x='UTStart', y='avg', color='colors', fill_alpha=0.2, size=10)
-
-    p.xaxis[0].formatter = date_formatter
+    df = df.groupby(['Night', 'HrsOrder'], as_index=False).sum()
+    df['avg'] = df['TotalDeltaX'] / df['Arcs']
+
+    p = template_figure(title=title, x_axis_label='Night', y_axis_label='HrsOrder')
+    heatmap(p, df, x='Night', y='HrsOrder', value='avg', dx=datetime.timedelta(days=1), dy=1,
+            color_bar_title='AVG(DeltaX)')
 
     return p
 
 
-@data_quality(name='low_resolution', caption='')
-def hrs_low_resolution_plot(start_date, end_date):
+@data_quality(name='high_resolution_heatmap', caption='Nightly AVG(DeltaX) per order',
+              render=partial(render_arc_heatmap, 'High Resolution (Nightly Average)'), split_range=True,
+              max_staleness=NIGHTLY_MAX_STALENESS)
+def hrs_high_resolution_heatmap(start_date, end_date):
+    """Return the data for a heatmap of the High resolution AVG(DeltaX) per night and order.
+
+    Params:
+    -------
+    start_date: date
+        Earliest date to include in the plot.
+    end_date: date
+        Earliest date not to include in the plot.
+
+    Return:
+    -------
+    DataFrame:
+        The data for the heatmap.
     """
-        Return a <div> element with the Low resolution AVG(DeltaX) vs time.
 
-        The plot shows the AVG(DeltaX) for a set of time
+    return arc_heatmap_data(start_date, end_date, 'HIGH RESOLUTION')
 
-        Params:
-        -------
-        start_date: date
-            Earliest date to include in the plot.
-        end_date: date
-            Earliest date not to include in the plot.
 
-        Return:
-        -------
-        str:
-            A <div> element with the Low resolution AVG(DeltaX) vs time.
+@data_quality(name='medium_resolution_heatmap', caption='Nightly AVG(DeltaX) per order',
+              render=partial(render_arc_heatmap, 'Medium Resolution (Nightly Average)'), split_range=True,
+              max_staleness=NIGHTLY_MAX_STALENESS)
+def hrs_medium_resolution_heatmap(start_date, end_date):
+    """Return the data for a heatmap of the Medium resolution AVG(DeltaX) per night and order.
+
+    Params:
+    -------
+    start_date: date
+        Earliest date to include in the plot.
+    end_date: date
+        Earliest date not to include in the plot.
+
+    Return:
+    -------
+    DataFrame:
+        The data for the heatmap.
     """
 
-    obsmode = 'LOW RESOLUTION'
-    source = get_source(start_date, end_date, obsmode)
-
-    tool_list = "pan,reset,save,wheel_zoom, box_zoom"
-    _hover = HoverTool(
-        tooltips="""
-                <div>
-                    <div>
-                        <span style="font-size: 15px; font-weight: bold;">Date: </span>
-                        <span style="font-size: 15px;"> @Time</span>
-                    </div>
-                    <div>
-                        <span style="font-size: 15px; font-weight: bold;">AVERAGE: </span>
-                        <span style="font-size: 15px;"> @avg</span>
-                    </div>
-                    <div>
-                        <span style="font-size: 15px; font-weight: bold;">HrsOrder: </span>
-                        <span style="font-size: 15px;"> @HrsOrder</span>
-                    </div>
-                </div>
-                """
-    )
-
-    p = figure(title="Low Resolution",
-               x_axis_label='Date',
-               y_axis_label='AVG(DeltaX)',
-               x_axis_type='datetime',
-               tools=[tool_list, _hover])
-    p.scatter(source=source, x='UTStart', y='avg', color='colors', fill_alpha=0.2, size=10)
-
-    p.xaxis[0].formatter = date_formatter
+    return arc_heatmap_data(start_date, end_date, 'MEDIUM RESOLUTION')
 
-    return p
+
+@data_quality(name='low_resolution_heatmap', caption='Nightly AVG(DeltaX) per order',
+              render=partial(render_arc_heatmap, 'Low Resolution (Nightly Average)'), split_range=True,
+              max_staleness=NIGHTLY_MAX_STALENESS)
+def hrs_low_resolution_heatmap(start_date, end_date):
+    """Return the data for a heatmap of the Low resolution AVG(DeltaX) per night and order.
+
+    Params:
+    -------
+    start_date: date
+        Earliest date to include in the plot.
+    end_date: date
+        Earliest date not to include in the plot.
+
+    Return:
+    -------
+    DataFrame:
+        The data for the heatmap.
+    """
+
+    return arc_heatmap_data(start_date, end_date, 'LOW RESOLUTION')
@@ -1,77 +1,77 @@
-import pandas as pd
+from functools import partial
 
-from bokeh.models.formatters import DatetimeTickFormatter
-from bokeh.plotting import figure, ColumnDataSource
-
-from app import db
 from app.decorators import data_quality
+from app.main.data_fetching import read_sql_for_date_range
+from app.main.data_quality_plots import column_data_source
+from app.main.figure_templates import template_figure
 
-# creates your plot
-date_formatter = DatetimeTickFormatter(microseconds=['%f'],
-                                       milliseconds=['%S.%2Ns'],
-                                       seconds=[':%Ss'],
-                                       minsec=[':%Mm:%Ss'],
-                                       minutes=['%H:%M:%S'],
-                                       hourmin=['%H:%M:'],
-                                       hours=["%H:%M"],
-                                       days=["%d %b"],
-                                       months=["%d %b %Y"],
-                                       years=["%b %Y"])
 colors = ['red', 'magenta', 'blue', 'orange', 'green', 'purple']
 legends_name = ['z1', 'z2', 'z3', 'z4', 'z5', 'z6']
 y_name = ['mean_z1', 'mean_z2', 'mean_z3', 'mean_z4', 'mean_z5', 'mean_z6']
 
 
-# One plot for Ne at 41.5 articulation setting closed dome test
-@data_quality(name='rss_arcintensity_neon', caption='')
-def rss_arcintensity_neon_plot(start_date, end_date):
-    return _rss_arc_intensity(41.50, 'Ne', start_date, end_date)
+def render_arc_intensity(articulation, lamp, df):
+    """Return a RSS arc intensity plot.
 
+    The plots show the average counts in six detector regions of RSS taken with standard arc calibration data.
+    Purpose: to monitor changes in arc line intensities over time.
 
-# One plot for Ar at 26.5 articulation setting closed dome test
-@data_quality(name='rss_arcintensity_argon', caption='')
-def rss_arcintensity_argon_plot(start_date, end_date):
-    return _rss_arc_intensity(26.50, 'Ar', start_date, end_date)
+    To measure arc intensities on RSS, we split up the product RSS frame into 6 regions:
+       _________________________
+      |   |   ||   |   ||   |   |
+      | 1 | 2 || 3 | 4 || 5 | 6 |
+      |___|___||___|___||___|___|
 
+     Here the || represent chip gaps.
 
-# One plot for Xe at 31.0 articulation setting closed dome test
-@data_quality(name='rss_arcintensity_xenon', caption='')
-def rss_arcintensity_xenon_plot(start_date, end_date):
-    return _rss_arc_intensity(31.0, 'Xe', start_date, end_date)
+    This function may be called in a worker process (see the render argument of the data_quality decorator).
 
+    Params:
+    -------
+    articulation: degrees (float - %.2f)
+        RSS camera articulation angle.
+    lamp: str
+        Arc lamp.
+    df: DataFrame
+        The average counts per second per frame, as returned by arc_intensity_data.
 
-# One plot for Cu Ar at 25.0 articulation setting closed dome test
-@data_quality(name='rss_arcintensity_copperargon', caption='')
-def rss_arcintensity_copperargon_plot(start_date, end_date):
-    return _rss_arc_intensity(25.0, 'Cu Ar', start_date, end_date)
+    Return:
+    -------
+    Figure:
+        The plot.
+    """
 
+    # title with articulation angle to 2 decimal points
+    title = 'RSS  Intensity {arc_type} Camang: {cam_ang} deg ' .format(arc_type=lamp, cam_ang=articulation)
+    y_axis_label = 'Average Counts'
 
-# One plot for Th Ar at 35.5 articulation setting closed dome test
-@data_quality(name='rss_arcintensity_thoriumargon', caption='')
-def rss_arcintensity_thoriumargon_plot(start_date, end_date):
-    return _rss_arc_intensity(35.5, 'Th Ar', start_date, end_date)
+    source = column_data_source(df)
 
+    p = template_figure(title=title, x_axis_label='UTStart', y_axis_label=y_axis_label)
+    # creating line and circle sepearately; fill_alpha gives a bit of transparency to the circles
+    # legends are easily added with legend=...
+    for x in range(6):
+        p.line(x='UTStart', y=y_name[x], color=colors[x], source=source, legend=legends_name[x])
+        p.circle(x='UTStart', y=y_name[x], color=colors[x], fill_alpha=0.2, size=10, source=source,
+                 legend=legends_name[x])
 
-def _rss_arc_intensity(articulation, lamp, start_date, end_date):
-    """Return a <div> element with a RSS arc intensity plot.
+    p.legend.location = "top_right"
+    p.legend.click_policy = "hide"
 
-    The plots show the average counts in six detector regions of RSS taken with standard arc calibration data.
-    Purpose: to monitor changes in arc line intensities over time.
+    return p
 
-    To measure arc intensities on RSS, we split up the product RSS frame into 6 regions:
-       _________________________
-      |   |   ||   |   ||   |   |
-      | 1 | 2 || 3 | 4 || 5 | 6 |
-      |___|___||___|___||___|___|
 
-     Here the || represent chip gaps.
+def arc_intensity_data(articulation, lamp, start_date, end_date):
+    """Return the average counts per second in the six detector regions of the RSS arc calibrations.
 
-    The plot is made for the period between start_date (inclusive) and end_date (exclusive).
+    The data is returned for the period between start_date (inclusive) and end_date (exclusive).
 
     Params:
     -------
     articulation: degrees (float - %.2f)
-        RSS camera articulation angle; either 0 or 90.25
+        RSS camera articulation angle.
+    lamp: str
+        Arc lamp.
     start_date: date
         Earliest date to include in the plot.
     end_date: date
@@ -79,18 +79,10 @@ def _rss_arc_intensity(articulation, lamp, start_date, end_date):
 
     Return:
     -------
-    str:
-        A <div> element with the plot.
+    DataFrame:
+        The UTStart and the average counts per second (mean_z1 to mean_z6) of the frames.
     """
-    "normalize"
-
-    # title with articulation angle to 2 decimal points
-    title = 'RSS  Intensity {arc_type} Camang: {cam_ang} deg ' .format(arc_type=lamp, cam_ang=articulation)
-    #  title="Fun"
-    y_axis_label = 'Average Counts'
 
-    # creates your query
-    table = 'DQ_RssArcIntensity'
     # query only selects rows with camang that are specified by articulation
     sql = "select UTStart, mean_z1/ExpTime AS mean_z1, mean_z2/ExpTime AS mean_z2, " \
           "     mean_z3/ExpTime AS mean_z3, mean_z4/ExpTime AS mean_z4," \
@@ -98,25 +90,43 @@ def _rss_arc_intensity(articulation, lamp, start_date, end_date):
           "       join FileData using (FileData_Id)" \
           "       join FitsHeaderRss using (FileData_Id)" \
           "       join FitsHeaderImage using (FileData_Id)" \
-          "       where UTStart > '{start_date}' and UTStart <'{end_date}' " \
+          "       where UTStart >= '{start_date}' and UTStart < '{end_date}' " \
           "       and CAMANG='{camang}' and LAMPID='{lampid}' " \
-          "       and mean_z1 > 0 and mean_z2 > 0 and mean_z3 > 0 and mean_z4 > 0 and mean_z5 > 0 and mean_z6 > 0"\
-        .format(start_date=start_date, end_date=end_date, camang=articulation, lampid=lamp)
-    df = pd.read_sql(sql, db.engine)
-    source = ColumnDataSource(df)
-
-    p = figure(title=title,
-               x_axis_label='UTStart',
-               y_axis_label=y_axis_label,
-               x_axis_type='datetime')
-    # creating line and circle sepearately; fill_alpha gives a bit of transparency to the circles
-    # legends are easily added with legend=...
-    for x in range(6):
-        p.line(x='UTStart', y=y_name[x], color=colors[x], source=source, legend=legends_name[x])
-        p.circle(x='UTStart', y=y_name[x], color=colors[x], fill_alpha=0.2, size=10, source=source, legend=legends_name[x])
+          "       and mean_z1 > 0 and mean_z2 > 0 and mean_z3 > 0 and mean_z4 > 0 and mean_z5 > 0 and mean_z6 > 0"
+    return read_sql_for_date_range(sql, start_date, end_date, camang=articulation, lampid=lamp,
+                                   schema={'mean_z{}'.format(i): 'float32' for i in range(1, 7)})
 
-    p.xaxis[0].formatter = date_formatter
-    p.legend.location = "top_right"
-    p.legend.click_policy = "hide"
 
-    return p
+# One plot for Ne at 41.5 articulation setting closed dome test
+@data_quality(name='rss_arcintensity_neon', caption='', render=partial(render_arc_intensity, 41.50, 'Ne'),
+              split_range=True)
+def rss_arcintensity_neon_data(start_date, end_date):
+    return arc_intensity_data(41.50, 'Ne', start_date, end_date)
+
+
+# One plot for Ar at 26.5 articulation setting closed dome test
+@data_quality(name='rss_arcintensity_argon', caption='', render=partial(render_arc_intensity, 26.50, 'Ar'),
+              split_range=True)
+def rss_arcintensity_argon_data(start_date, end_date):
+    return arc_intensity_data(26.50, 'Ar', start_date, end_date)
+
+
+# One plot for Xe at 31.0 articulation setting closed dome test
+@data_quality(name='rss_arcintensity_xenon', caption='', render=partial(render_arc_intensity, 31.0, 'Xe'),
+              split_range=True)
+def rss_arcintensity_xenon_data(start_date, end_date):
+    return arc_intensity_data(31.0, 'Xe', start_date, end_date)
+
+
+# One plot for Cu Ar at 25.0 articulation setting closed dome test
+@data_quality(name='rss_arcintensity_copperargon', caption='', render=partial(render_arc_intensity, 25.0, 'Cu Ar'),
+              split_range=True)
+def rss_arcintensity_copperargon_data(start_date, end_date):
+    return arc_intensity_data(25.0, 'Cu Ar', start_date, end_date)
+
+
+# One plot for Th Ar at 35.5 articulation setting closed dome test
+@data_quality(name='rss_arcintensity_thoriumargon', caption='', render=partial(render_arc_intensity, 35.5, 'Th Ar'),
+              split_range=True)
+def rss_arcintensity_thoriumargon_data(start_date, end_date):
+    return arc_intensity_data(35.5, 'Th Ar', start_date, end_date)
@@ -1,19 +1,19 @@
-import pandas as pd
-
-from bokeh.embed import components
-from bokeh.models.formatters import DatetimeTickFormatter
-from bokeh.plotting import figure, ColumnDataSource
-
-from app import db
 from app.decorators import data_quality
-from app.main.data_quality_plots import data_quality_date_plot
+from app.main.data_fetching import read_sql_for_date_range
+from app.main.plot_specs import PlotSpec, series
 
 
-@data_quality(name='scam_bias', caption='Mean SCAM Bias Background levels')
-def scam_bias_plot(start_date, end_date):
-    """Return a <div> element with a weather downtime plot.
+@data_quality(name='scam_bias', caption='Mean SCAM Bias Background levels',
+              spec=PlotSpec(title='SCAM Bias Levels',
+                            x='UTStart',
+                            y='BkgdMean',
+                            x_label='Date',
+                            y_label='Bias Background Mean (e)',
+                            series=[series(color='blue')]))
+def scam_bias_data(start_date, end_date):
+    """Return the data for a SCAM bias level plot.
 
-    The plot shows the downtime for the period between start_date (inclusive) and end_date (exclusive).
+    The data covers the bias frames for the period between start_date (inclusive) and end_date (exclusive).
 
     Params:
     -------
@@ -24,12 +24,12 @@ def scam_bias_plot(start_date, end_date):
 
     Return:
     -------
-    str:
-        A <div> element with the weather downtime plot.
+    DataFrame:
+        The UTStart and background mean of the bias frames.
     """
-    title = "SCAM Bias Levels"
-    column = 'BkgdMean'
-    table = 'PipelineDataQuality_CCD'
-    logic = " and FileName like 'S%%' and Target_Name='BIAS'"
-    y_axis_label = 'Bias Background Mean (e)'
-    return data_quality_date_plot(start_date, end_date, title, column, table, logic=logic, y_axis_label=y_axis_label)
+
+    sql = "select UTStart, BkgdMean from PipelineDataQuality_CCD join FileData using (FileData_Id) " \
+          "       where UTStart >= '{start_date}' and UTStart < '{end_date}' " \
+          "             and FileName like 'S%%' and Target_Name='BIAS'"
+    return read_sql_for_date_range(sql, start_date, end_date, schema=dict(BkgdMean='float64'),
+                                   night_column='UTStart')
@@ -1,76 +1,28 @@
 import pandas as pd
-
-from bokeh.embed import components
 from bokeh.models import HoverTool
-from bokeh.models.formatters import DatetimeTickFormatter
 from bokeh.palettes import Plasma256
 from bokeh.plotting import figure, ColumnDataSource
 
-from app import db
 from app.decorators import data_quality
-from app.main.data_quality_plots import data_quality_date_plot
+from app.main.data_fetching import read_sql_for_date_range
 
 
-@data_quality(name='wavelength', caption=' ')
-def hbdet_bias_plot(start_date, end_date):
-    """Return a <div> element with a weather downtime plot.
+def render_filter_throughput(df):
+    """Return a plot of the throughput of the filters as a function of their central wavelength.
 
-    The plot shows the downtime for the period between start_date (inclusive) and end_date (exclusive).
+    There is a series (with markers and a line) per night. This function may be called in a worker process (see the
+    render argument of the data_quality decorator).
 
     Params:
     -------
-    start_date: date
-        Earliest date to include in the plot.
-    end_date: date
-        Earliest date not to include in the plot.
+    df: DataFrame
+        The filter throughputs, as returned by scam_filter_throughput_data.
 
     Return:
     -------
-    str:
-        A <div> element with the weather downtime plot.
+    Figure:
+        The plot.
     """
-    data_list = []
-    date_list = []
-
-    def brake_by_date(data):
-        _date = data["Date"].strftime('%Y-%m-%d')
-        if _date not in data_list:
-            date_dict = {'Name': [], 'Throughput': [], 'Center': [], 'Wavelength': [], "HMFW": []}
-            data_list.append(_date)
-            date_list.append(date_dict)
-        ind = data_list.index(_date)
-        date_list[ind]['Name'].append(data['Name'])
-        date_list[ind]['Throughput'].append(data['Throughput'])
-        date_list[ind]['Center'].append(data['Center'])
-        date_list[ind]['Wavelength'].append(str('%.1f' % data['Center']))
-        date_list[ind]['HMFW'].append(str('%.1f' %data['HMFW']))
-
-    column = 'SalticamThroughputMeasurement'
-
-    sql = 'select Date, SalticamFilter_Name as Name, DescriptiveName as Barcode, ' \
-          ' SalticamThroughputMeasurement as Throughput' \
-          '     from SalticamThroughputMeasurement ' \
-          '         join Throughput using (Throughput_Id) ' \
-          '         join NightInfo using (NightInfo_Id) ' \
-          '         join SalticamFilter using(SalticamFilter_Id) ' \
-        .format(start_date=start_date, end_date=end_date, column=column)
-
-    df = pd.read_sql(sql, db.engine)
-    file_df = pd.read_csv('scam_data.txt', delimiter="\t")
-
-    file_df.columns = ['Barcode', 'Center', 'HMFW']
-
-    df['Barcode_lower'] = df['Barcode'].str.lower()
-    df['Barcode_lower'] = df['Barcode_lower'].str.replace(' ', '')
-
-    file_df['Barcode_low'] = file_df['Barcode'].str.lower()
-    file_df['Barcode_low'] = file_df['Barcode_low'].str.replace(' ', '')
-    file_df['Barcode_low'] = file_df['Barcode_low'].str.replace('_', '')
-    file_df['Center'] = file_df['Center']/10000
-
-    results = pd.merge(df, file_df, left_on='Barcode_lower', right_on="Barcode_low", how='left')
-    for index, row in results.iterrows():
-        brake_by_date(row)
 
     tool_list = "pan,reset,save,wheel_zoom, box_zoom"
     _hover = HoverTool(
@@ -105,24 +57,69 @@ def hbdet_bias_plot(start_date, end_date):
                tools=[tool_list, _hover],
                x_range=(0.3, 1.1))
 
-    sot = sorted(range(len(data_list)), key=lambda k: data_list[k])
-
-    for indx in (reversed(sot)):
+    nights = sorted(df['Date'].dt.strftime('%Y-%m-%d').unique()) if len(df) else []
+    for index, night in reversed(list(enumerate(nights))):
+        rows = df[df['Date'].dt.strftime('%Y-%m-%d') == night]
         d = pd.DataFrame()
-        d['name'] = date_list[indx]['Name']
-        d['centers'] = date_list[indx]['Center']
-        d['throughput'] = date_list[indx]['Throughput']
-        d['wavelength'] = date_list[indx]['Wavelength']
-        d['hmfw'] = date_list[indx]['HMFW']
-
-        d['colors'] = [Plasma256[int(sot.index(indx) * (len(Plasma256) - 1) / float(len(sot)))]
-                      for x in range(len(d['centers']))]
+        d['name'] = rows['Name'].astype(str).values
+        d['centers'] = rows['Center'].values
+        d['throughput'] = rows['Throughput'].values
+        d['wavelength'] = ['%.1f' % center for center in rows['Center']]
+        d['hmfw'] = ['%.1f' % hmfw for hmfw in rows['HMFW']]
+
+        color = Plasma256[int(index * (len(Plasma256) - 1) / float(len(nights)))]
         source = ColumnDataSource(d)
-        p.scatter(source=source, y='throughput', x='centers', color=d['colors'][0], fill_alpha=0.2, size=10, legend=data_list[indx])
-        p.line(source=source, y='throughput', x='centers', color=d['colors'][0], line_width=1, legend=data_list[indx])
+        p.scatter(source=source, y='throughput', x='centers', color=color, fill_alpha=0.2, size=10, legend=night)
+        p.line(source=source, y='throughput', x='centers', color=color, line_width=1, legend=night)
 
     p.legend.location = "top_right"
     p.legend.click_policy = "hide"
     p.legend.background_fill_alpha = 0.3
     p.legend.inactive_fill_alpha = 0.8
-    return p  # data_quality_date_plot(start_date, end_date, title, column, table,
+    return p
+
+
+@data_quality(name='wavelength', caption=' ', render=render_filter_throughput, split_range=True)
+def scam_filter_throughput_data(start_date, end_date):
+    """Return the throughput of the SALTICAM filters with their central wavelength and HMFW.
+
+    The central wavelength and HMFW of the filters are read from the file scam_data.txt. The data covers the period
+    between start_date (inclusive) and end_date (exclusive).
+
+    Params:
+    -------
+    start_date: date
+        Earliest date to include in the plot.
+    end_date: date
+        Earliest date not to include in the plot.
+
+    Return:
+    -------
+    DataFrame:
+        The Date, Name, Barcode, Throughput, Center (in microns) and HMFW of the measurements.
+    """
+
+    sql = 'select Date, SalticamFilter_Name as Name, DescriptiveName as Barcode, ' \
+          ' SalticamThroughputMeasurement as Throughput' \
+          '     from SalticamThroughputMeasurement ' \
+          '         join Throughput using (Throughput_Id) ' \
+          '         join NightInfo using (NightInfo_Id) ' \
+          '         join SalticamFilter using(SalticamFilter_Id) ' \
+          '     where Date >= \'{start_date}\' and Date < \'{end_date}\''
+    df = read_sql_for_date_range(sql, start_date, end_date,
+                                 schema=dict(Date='datetime64[ns]', Barcode='category', Name='category'))
+    file_df = pd.read_csv('scam_data.txt', delimiter="\t")
+
+    file_df.columns = ['Barcode', 'Center', 'HMFW']
+
+    df['Barcode_lower'] = df['Barcode'].astype(str).str.lower()
+    df['Barcode_lower'] = df['Barcode_lower'].str.replace(' ', '')
+
+    file_df['Barcode_low'] = file_df['Barcode'].str.lower()
+    file_df['Barcode_low'] = file_df['Barcode_low'].str.replace(' ', '')
+    file_df['Barcode_low'] = file_df['Barcode_low'].str.replace('_', '')
+    file_df['Center'] = file_df['Center'] / 10000
+
+    results = pd.merge(df, file_df[['Barcode_low', 'Center', 'HMFW']], left_on='Barcode_lower',
+                       right_on='Barcode_low', how='left')
+    return results[['Date', 'Name', 'Barcode', 'Throughput', 'Center', 'HMFW']]
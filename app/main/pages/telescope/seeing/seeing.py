@@ -3,35 +3,19 @@ import pandas as pd
 import datetime
 from bokeh.embed import components
 from bokeh.models import ColumnDataSource
-from bokeh.models.formatters import DatetimeTickFormatter
 from bokeh.plotting import figure
 from flask import current_app
-from app import db
+from app.main import seeing_mirror
+from app.main.data_fetching import stream_sql
+from app.main.data_reduction import TimeBinReducer
+from app.main.figure_templates import datetime_formatter
 
-# setting date format to be used on the x axis of the plot
-date_formatter = DatetimeTickFormatter(days=['%e %b %Y'], months=['%e %b %Y'], years=['%e %b %Y'])
+# date format to be used on the x axis of the plot
+DATE_FORMATS = dict(days=['%e %b %Y'], months=['%e %b %Y'], years=['%e %b %Y'])
 
 # offset value to be added in timestamp in oder to get the exact uct for the database query
 time_offset = 2082844800
 
-#source for seeing
-mean_source1 = ColumnDataSource()
-median_source1=ColumnDataSource()
-
-#source for ee50
-mean_source = ColumnDataSource()
-median_source=ColumnDataSource()
-
-#source for fwhm
-mean_source2=ColumnDataSource()
-median_source2=ColumnDataSource()
-
-difference_source=ColumnDataSource()
-difference_source1=ColumnDataSource()
-
-difference_source2=ColumnDataSource()
-difference_source3=ColumnDataSource()
-
 TOOLS = "pan,wheel_zoom,box_zoom,reset,save"
 
 
@@ -61,7 +45,6 @@ def update(start_date, end_date, binning):
               Default end date for the query.
           optinal_binning: binning
           """
-    global mean_source1,mean_source,median_source1,median_source, difference_source1,difference_source, difference_source2 , difference_source3, mean_source2, median_source2
 
     # if type of start/end date is date, turn it into a datetime,
     # set time of start/end date time to 12:00
@@ -84,6 +67,7 @@ def update(start_date, end_date, binning):
     sql1 = 'SELECT  str_to_date(datetime,"%%Y-%%m-%%d %%H:%%i:%%s") AS datetime, seeing  from seeing ' \
            '    where datetime >= str_to_date("{start_date_}","%%Y-%%m-%%d  %%H:%%i:%%s")' \
            '    and datetime <= str_to_date("{end_date_}","%%Y-%%m-%%d %%H:%%i:%%s") ' \
+           '    order by datetime' \
         .format(start_date_=str(start_date), end_date_=str(end_date))
 
     sql2 = 'select _timestamp_,ee50,fwhm,timestamp from tpc_guidance_status__timestamp where timestamp >= {start_date_}' \
@@ -91,61 +75,44 @@ def update(start_date, end_date, binning):
            ' order by _timestamp_' \
         .format(start_date_=str(first_timestamp), end_date_=str(second_timestamp))
 
-    df2 = pd.read_sql(sql2, db.get_engine(app=current_app, bind='els'))
-    df1 = pd.read_sql(sql1, db.get_engine(app=current_app, bind='suthweather'))
-
-    # setting index time for calculating mean and average
-    df2.index = df2["_timestamp_"]
-    df1.index = df1['datetime']
-
-    # It seems that Pandas doesn't change the index type if the data frame is empty, which means that resampling
-    # would fail for an empty data frame. As there will be no row for median or mean , it is safe to just use the
-    # original data frame to avoid this problem.
+    # the data is aggregated into bins while it is fetched, so that the raw rows don't have to be kept in memory; the
+    # bins start at the start of the queried range
+    freq = str(binning) + 'T'
+    seeing_bins = TimeBinReducer('datetime', freq, ('mean', 'median'), origin=start_date)
+    guidance_bins = TimeBinReducer('_timestamp_', freq, ('mean', 'median'), origin=start_date)
+    if current_app.config['SEEING_MIRROR_ENABLED']:
+        # read the data from the local mirror rather than from the remote databases
+        df2 = seeing_mirror.read('tpc_guidance_status__timestamp', start_date, end_date)
+        df2 = df2[df2['guidance_available'] == 'T'][['_timestamp_', 'ee50', 'fwhm', 'timestamp']]\
+            .sort_values('_timestamp_')
+        guidance_bins.add(df2)
+        seeing_bins.add(seeing_mirror.read('seeing', start_date, end_date))
+    else:
+        stream_sql(sql2, guidance_bins, bind='els')
+        stream_sql(sql1, seeing_bins, bind='suthweather')
+    seeing_aggregates = seeing_bins.result()
+    guidance_aggregates = guidance_bins.result()
 
     # for external seeing calculating median and mean
-    if not df1.empty:
-        mean1_all = df1.resample(str(binning) + 'T').mean()
-    else:
-        mean1_all = df1.copy(deep=True)
+    mean1_all = seeing_aggregates['mean']
     source1 = ColumnDataSource(mean1_all)
-    mean_source1.data = source1.data
+    mean_source1 = source1
 
-    if not df1.empty:
-        median1_all = df1.resample(str(binning) + 'T').median()
-    else:
-        median1_all = df1.copy(deep=True)
+    median1_all = seeing_aggregates['median']
     source = ColumnDataSource(median1_all)
-    median_source1.data = source.data
+    median_source1 = source
 
     # calculate mean and median for ee50
-    if not df2.empty:
-        mean_all = df2.resample(str(binning) + 'T').mean()
-    else:
-        mean_all = df2.copy(deep=True)
+    mean_all = guidance_aggregates['mean']
     source3 = ColumnDataSource(mean_all)
-    mean_source.data = source3.data
+    mean_source = source3
 
-    if not df2.empty:
-        median_all = df2.resample(str(binning) + 'T').median()
-    else:
-        median_all = df2.copy(deep=True)
+    median_all = guidance_aggregates['median']
     source4 = ColumnDataSource(median_all)
-    median_source.data = source4.data
+    median_source = source4
 
     #calculate mean and median for fwhm
-    if not df2.empty:
-        mean_all1 = df2.resample(str(binning) + 'T').mean()
-    else:
-        mean_all1 = df2.copy(deep=True)
-    source4 = ColumnDataSource(mean_all)
-    mean_source2.data = source4.data
-
-    if not df2.empty:
-        median_all = df2.resample(str(binning) + 'T').median()
-    else:
-        median_all = df2.copy(deep=True)
-    source5 = ColumnDataSource(median_all)
-    median_source2.data = source5.data
+    mean_all1 = guidance_aggregates['mean']
 
     # calculate difference for external seeing against fwhm and ee50
     dataframes = [mean1_all, mean_all]
@@ -153,14 +120,14 @@ def update(start_date, end_date, binning):
     add_dataframes.index.name = '_timestamp_'
     add_dataframes['difference'] = add_dataframes['seeing'] - add_dataframes['ee50']
     datasource2 = ColumnDataSource(add_dataframes)
-    difference_source.data = datasource2.data
+    difference_source = datasource2
 
     dataframes = [mean1_all, mean_all1]
     add_dataframes = pd.concat(dataframes, axis=1)
     add_dataframes.index.name = '_timestamp_'
     add_dataframes['difference1'] = add_dataframes['seeing'] - add_dataframes['fwhm']
     datasource1 = ColumnDataSource(add_dataframes)
-    difference_source1.data = datasource1.data
+    difference_source1 = datasource1
 
     # #difference using the median
     # dataframes2 = [median_all, median1_all]
@@ -203,11 +170,11 @@ def update(start_date, end_date, binning):
     # dif.circle(source=difference_source2, x='_timestamp_', y='difference2', legend='ee50_median difference', fill_color='blue')
     # dif.circle(source=difference_source3, x='_timestamp_', y='difference3', legend='fwhm_median difference', color='orange')
 
-    p.xaxis.formatter = date_formatter
+    p.xaxis.formatter = datetime_formatter(DATE_FORMATS)
     p.legend.location = "top_left"
     p.legend.click_policy="hide"
 
-    dif.xaxis.formatter = date_formatter
+    dif.xaxis.formatter = datetime_formatter(DATE_FORMATS)
     dif.legend.click_policy="hide"
 
     script, div = components(p)
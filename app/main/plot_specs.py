@@ -0,0 +1,480 @@
+import json
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from app.main.data_quality_plots import column_data_source
+from app.main.figure_templates import template_figure
+from app.main.frame_details import frame_details_plot
+from app.main.png_images import encode_png, line_pixels, stamp_discs, value_extent
+from app.main.rasterisation import color_rgb, dense_scatter, numeric_values, raster_data
+
+# route for getting a plot in another format; the page path, item name and format are appended
+PLOT_ROUTE = '/plot/'
+
+# HTML for a field of the hover tooltips
+TOOLTIP_FIELD = """
+    <div>
+        <span style="font-size: 15px; font-weight: bold;">{label}: </span>
+        <span style="font-size: 15px;"> @{column}{format}</span>
+    </div>"""
+
+# glyph types supported by plot specs
+GLYPHS = ('scatter', 'line')
+
+# width and height (in pixels) of PNG images
+PNG_WIDTH = 600
+PNG_HEIGHT = 400
+
+# width (in pixels) of the margin around the plot area of PNG images
+PNG_MARGIN = 20
+
+# a series of a plot, with the column values selecting its rows
+Series = namedtuple('Series', ['label', 'color', 'size', 'alpha', 'where'])
+
+
+def series(label=None, color='blue', size=10, alpha=0.2, **where):
+    """Declare a series of a plot spec.
+
+    The series consists of the rows of the plot data whose columns have the values given as keyword arguments, such as
+
+    series('Blue Arm', 'blue', size=12, Arm='H')
+
+    If no keyword arguments are given, the series consists of all rows.
+
+    Params:
+    -------
+    label: str
+        Legend label. No legend item is created if the label is None.
+    color: str
+        Colour, as a hex string (such as '#ff8000') or CSS colour name, or (for scatter plots) the name of a column of
+        the plot data with a colour per row.
+    size: float
+        Marker size, or line width for line plots.
+    alpha: float
+        Fill opacity of the markers, or opacity of the line for line plots.
+    **where: keyword arguments
+        Column values selecting the rows of the series.
+
+    Return:
+    -------
+    Series:
+        The series declaration.
+    """
+
+    return Series(label, color, size, alpha, where)
+
+
+class PlotSpec:
+    """Declarative description of a plot.
+
+    A spec describes how to plot the data frame returned by a data quality item function: which columns to use for the
+    x and y axis, how to split the rows into series, which glyph to use and which fields to show in the hover
+    tooltips. Pass it as the spec argument of the data_quality decorator. The item function then only queries the
+    data, and the plot is created by a renderer (see render_plot), so that the same item can be rendered as a Bokeh
+    model, as JSON data, as CSV or as a PNG image.
+
+    If frame_details is truthy, the data must have a FileData_Id column, and hovering over or tapping a point shows
+    the details of its frame (see app.main.frame_details.frame_details_plot). If dense is truthy, series with many
+    points are rasterised on the server (see app.main.rasterisation.dense_scatter); this requires scatter glyphs.
+
+    Specs are pickled when items are rendered in worker processes, so they should only contain plain values.
+
+    Params:
+    -------
+    title: str
+        Plot title.
+    x: str
+        Column with the x values.
+    y: str
+        Column with the y values.
+    x_label: str
+        Label of the x axis.
+    y_label: str
+        Label of the y axis.
+    x_type: str
+        Type of the x axis, 'datetime' or 'linear'.
+    glyph: str
+        Glyph type, 'scatter' or 'line'.
+    series: list of Series
+        Series of the plot, as returned by the series function. The default is a single series with all rows.
+    hover: list of tuple
+        Label and column of the fields shown in the hover tooltips. The default is to show the x and y value, labelled
+        with the axis labels.
+    frame_details: bool
+        Whether to show frame details for the points.
+    dense: bool
+        Whether to rasterise series with many points.
+    """
+
+    def __init__(self, title, x, y, x_label='', y_label='', x_type='datetime', glyph='scatter', series=None,
+                 hover=None, frame_details=False, dense=False):
+        if glyph not in GLYPHS:
+            raise ValueError('Unsupported glyph type: {glyph}'.format(glyph=glyph))
+        if dense and glyph != 'scatter':
+            raise ValueError('Only scatter plots can be rasterised.')
+        self.title = title
+        self.x = x
+        self.y = y
+        self.x_label = x_label
+        self.y_label = y_label
+        self.x_type = x_type
+        self.glyph = glyph
+        self.series = list(series) if series else [Series(None, 'blue', 10, 0.2, {})]
+        self.hover = list(hover) if hover else [(x_label or x, x), (y_label or y, y)]
+        self.frame_details = frame_details
+        self.dense = dense
+
+    def columns(self, df):
+        """Return the columns of a data frame which are used by this spec.
+
+        Params:
+        -------
+        df: DataFrame
+            Plot data.
+
+        Return:
+        -------
+        list of str:
+            The x and y column, the hover columns, the FileData_Id column (if frame details are shown) and the colour
+            columns, without duplicates and without columns missing in the data frame.
+        """
+
+        columns = [self.x, self.y] + [column for _, column in self.hover]
+        if self.frame_details:
+            columns.append('FileData_Id')
+        columns.extend(s.color for s in self.series)
+        return [column for i, column in enumerate(columns) if column in df.columns and column not in columns[:i]]
+
+    def series_frame(self, df, index):
+        """Return the rows of a data frame which belong to a series of this spec.
+
+        Params:
+        -------
+        df: DataFrame
+            Plot data.
+        index: int
+            Index of the series in the list of series.
+
+        Return:
+        -------
+        DataFrame:
+            The rows of the series.
+        """
+
+        where = self.series[index].where
+        if not where:
+            return df
+        selected = np.ones(len(df), dtype=bool)
+        for column, value in where.items():
+            selected &= (df[column] == value).values
+        return df[selected].reset_index(drop=True)
+
+
+def render_plot(spec, df, output_format):
+    """Render the data of a plot in an output format.
+
+    The supported formats are the keys of the plot_renderers dictionary, namely 'bokeh' (which returns a Bokeh model),
+    'json' (which returns the title, axis labels and the plotted columns per series as a JSON string), 'csv' (which
+    returns the plotted columns with a series column as a string) and 'png' (which returns the bytes of a PNG image).
+
+    Params:
+    -------
+    spec: PlotSpec
+        Plot spec.
+    df: DataFrame
+        Plot data.
+    output_format: str
+        Output format.
+
+    Return:
+    -------
+    object:
+        The rendered plot.
+    """
+
+    if output_format not in plot_renderers:
+        raise ValueError('Unsupported output format: {format}'.format(format=output_format))
+    return plot_renderers[output_format](spec, df)
+
+
+def render_bokeh(spec, df, raster=None, frame_details=True):
+    """Create a Bokeh plot from a plot spec and its data.
+
+    If the spec is dense and a raster argument is given, series with more points than the RASTER_POINT_THRESHOLD
+    setting are rasterised, and they are rasterised again with the data from the item function when the user zooms (see
+    app.main.rasterisation.dense_scatter). In this case the function must be called within a Flask app context.
+
+    Frame details are only shown if both the spec and the frame_details argument ask for them. The frame_details
+    argument may be the URL of the frame details route (see app.main.frame_details.frame_details_url), which should be
+    passed if the function is called outside an app context, for example in a render worker process. Pass False for
+    plots which aren't served by the app, such as those of a static snapshot, as the details are requested from the
+    server. The plot then has plain hover tooltips.
+
+    Params:
+    -------
+    spec: PlotSpec
+        Plot spec.
+    df: DataFrame
+        Plot data.
+    raster: dict
+        Package, name, start date and end date of the data quality item, for fetching its data again.
+    frame_details: bool or str
+        Whether frame details may be shown, or the URL of the frame details route.
+
+    Return:
+    -------
+    LayoutDOM:
+        The plot.
+    """
+
+    show_frame_details = spec.frame_details and frame_details
+    tooltips, formatters = _tooltips(spec, df)
+    p = template_figure(title=spec.title,
+                        x_axis_label=spec.x_label,
+                        y_axis_label=spec.y_label,
+                        x_axis_type=spec.x_type,
+                        tooltips=tooltips if not show_frame_details else None,
+                        formatters=formatters)
+
+    renderers = []
+    for index, s in enumerate(spec.series):
+        frame = spec.series_frame(df, index)
+        kwargs = dict(legend=s.label) if s.label is not None else {}
+        if spec.glyph == 'line':
+            renderer = p.line(source=column_data_source(frame), x=spec.x, y=spec.y, color=s.color, line_width=s.size,
+                              line_alpha=s.alpha, **kwargs)
+        elif spec.dense and raster is not None:
+            renderer = dense_scatter(p, plot_spec_series, raster['start_date'], raster['end_date'], x=spec.x,
+                                     y=spec.y, color=s.color, frame=frame,
+                                     params=dict(package=raster['package'], name=raster['name'], series=index),
+                                     fill_alpha=s.alpha, size=s.size, **kwargs)
+        else:
+            renderer = p.scatter(source=column_data_source(frame), x=spec.x, y=spec.y, color=s.color,
+                                 fill_alpha=s.alpha, size=s.size, **kwargs)
+        renderers.append(renderer)
+
+    if any(s.label is not None for s in spec.series):
+        p.legend.location = 'top_right'
+        p.legend.click_policy = 'hide'
+        p.legend.background_fill_alpha = 0.3
+        p.legend.inactive_fill_alpha = 0.8
+
+    if show_frame_details:
+        url = frame_details if isinstance(frame_details, str) else None
+        return frame_details_plot(p, renderers, tooltips, formatters=formatters, url=url)
+    return p
+
+
+def render_json(spec, df):
+    """Render the data of a plot as JSON.
+
+    The JSON object has the title, the x and y column (as x and y properties) and the axis labels (as x_label and
+    y_label properties) of the spec, as well as a list of the series. Each series has a label, colour and the values of
+    the plotted columns (as a columns property mapping column names to lists of values). Datetimes are given as ISO
+    strings, and missing values as null.
+
+    Params:
+    -------
+    spec: PlotSpec
+        Plot spec.
+    df: DataFrame
+        Plot data.
+
+    Return:
+    -------
+    str:
+        The JSON string.
+    """
+
+    columns = spec.columns(df)
+    series_list = []
+    for index, s in enumerate(spec.series):
+        frame = spec.series_frame(df, index)
+        series_list.append(dict(label=s.label,
+                                color=s.color,
+                                columns={column: json_values(frame[column]) for column in columns}))
+    return json.dumps(dict(title=spec.title,
+                           x=spec.x,
+                           y=spec.y,
+                           x_label=spec.x_label,
+                           y_label=spec.y_label,
+                           series=series_list))
+
+
+def render_csv(spec, df):
+    """Render the data of a plot as CSV.
+
+    The CSV has a header row, a series column with the series labels and the plotted columns. Rows which belong to
+    several series are included once per series.
+
+    Params:
+    -------
+    spec: PlotSpec
+        Plot spec.
+    df: DataFrame
+        Plot data.
+
+    Return:
+    -------
+    str:
+        The CSV.
+    """
+
+    columns = spec.columns(df)
+    frames = []
+    for index, s in enumerate(spec.series):
+        frame = spec.series_frame(df, index)[columns].copy()
+        frame.insert(0, 'series', s.label if s.label is not None else '')
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True).to_csv(index=False, date_format='%Y-%m-%d %H:%M:%S')
+
+
+def render_png(spec, df, width=PNG_WIDTH, height=PNG_HEIGHT):
+    """Render a plot as a PNG image.
+
+    The image is drawn with NumPy and shows the points (or lines) of the series in their colours within a frame. It
+    has no title, tick labels, axis labels or legend; the plot title is only included as a text chunk of the PNG. Use
+    app.main.figure_export.figure_image with the Bokeh plot (see render_bokeh) for an image with these.
+
+    Params:
+    -------
+    spec: PlotSpec
+        Plot spec.
+    df: DataFrame
+        Plot data.
+    width: int
+        Image width, in pixels.
+    height: int
+        Image height, in pixels.
+
+    Return:
+    -------
+    bytes:
+        The PNG image.
+    """
+
+    xs = numeric_values(df[spec.x])
+    ys = numeric_values(df[spec.y])
+    x_min, x_max = value_extent(xs)
+    y_min, y_max = value_extent(ys)
+
+    image = np.full((height, width, 3), 255, dtype=np.float64)
+    plot_width = width - 2 * PNG_MARGIN
+    plot_height = height - 2 * PNG_MARGIN
+    for index, s in enumerate(spec.series):
+        frame = spec.series_frame(df, index)
+        xs = numeric_values(frame[spec.x])
+        ys = numeric_values(frame[spec.y])
+        valid = np.isfinite(xs) & np.isfinite(ys)
+        columns = PNG_MARGIN + np.round((xs[valid] - x_min) / (x_max - x_min) * (plot_width - 1)).astype(np.int64)
+        rows = height - 1 - PNG_MARGIN - np.round((ys[valid] - y_min) / (y_max - y_min) * (plot_height - 1))\
+            .astype(np.int64)
+        if s.color in frame.columns:
+            colors = frame[s.color].astype(str).values[valid]
+        else:
+            colors = np.array([s.color] * len(rows))
+        if spec.glyph == 'line':
+            # a line has a single colour, so that that of its first point is used
+            rows, columns = line_pixels(rows, columns)
+            if len(colors):
+                stamp_discs(image, rows, columns, np.array(color_rgb(colors[0]), dtype=np.float64),
+                            max(int(s.size) // 2, 0), s.alpha, outline=False)
+            continue
+        for color in np.unique(colors):
+            selected = colors == color
+            stamp_discs(image, rows[selected], columns[selected], np.array(color_rgb(color), dtype=np.float64),
+                        max(int(s.size) // 2, 1), s.alpha, outline=True)
+
+    top, bottom = PNG_MARGIN - 1, height - PNG_MARGIN
+    left, right = PNG_MARGIN - 1, width - PNG_MARGIN
+    image[[top, bottom], left:right + 1] = 0
+    image[top:bottom + 1, [left, right]] = 0
+
+    return encode_png(np.round(image).astype(np.uint8), spec.title)
+
+
+def _tooltips(spec, df):
+    """Return the hover tooltips and formatters for a plot spec.
+
+    Params:
+    -------
+    spec: PlotSpec
+        Plot spec.
+    df: DataFrame
+        Plot data.
+
+    Return:
+    -------
+    tuple:
+        The tooltips (as an HTML string) and the tooltip formatters.
+    """
+
+    fields = []
+    formatters = {}
+    for label, column in spec.hover:
+        is_datetime = column in df.columns and pd.api.types.is_datetime64_any_dtype(df[column])
+        if is_datetime:
+            formatters[column] = 'datetime'
+        fields.append(TOOLTIP_FIELD.format(label=label, column=column, format='{%F %T}' if is_datetime else ''))
+    return '<div>{fields}\n</div>'.format(fields=''.join(fields)), formatters
+
+
+def json_values(column):
+    """Return the values of a data frame column as a list which can be serialised as JSON.
+
+    Params:
+    -------
+    column: Series
+        Column values.
+
+    Return:
+    -------
+    list:
+        The values, with datetimes as ISO strings and missing values as None.
+    """
+
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return [value.isoformat() if not pd.isnull(value) else None for value in column]
+    if str(column.dtype) == 'category':
+        column = column.astype(column.cat.categories.dtype)
+    return [value.item() if isinstance(value, np.generic) else value
+            for value in column.astype(object).where(pd.notnull(column), None)]
+
+
+@raster_data(name='plot_spec_series')
+def plot_spec_series(start_date, end_date, package, name, series):
+    """Return the data of a series of a data quality item with a plot spec.
+
+    This function is used for re-rasterising dense plots (see render_bokeh).
+
+    Params:
+    -------
+    start_date: date
+        Earliest date to include.
+    end_date: date
+        Earliest date not to include.
+    package: str
+        Package containing the item.
+    name: str
+        Name of the item.
+    series: int
+        Index of the series in the spec's list of series.
+
+    Return:
+    -------
+    DataFrame:
+        The rows of the series.
+    """
+
+    # importing at the top would be circular, as data quality items are rendered with this module
+    from app.main.data_quality import data_quality_item, data_quality_item_names
+
+    data_quality_item_names(package)
+    func, details = data_quality_item(package, name)
+    return details['spec'].series_frame(func(start_date=start_date, end_date=end_date), series)
+
+
+# functions for rendering plot specs, keyed by output format
+plot_renderers = dict(bokeh=render_bokeh, json=render_json, csv=render_csv, png=render_png)
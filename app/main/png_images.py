@@ -0,0 +1,211 @@
+import struct
+import zlib
+
+import numpy as np
+
+# 5x8 bitmap font for the printable ASCII characters, starting with the space; every character is given by five
+# columns of two hex digits, whose bits 0 (top) to 7 (bottom) are the pixels of the column, with the baseline below
+# bit 6
+FONT = (
+    '0000000000 00005f0000 0007000700 147f147f14 242a7f2a12 2313086462 3649562050 0008070300 001c224100 0041221c00 '
+    '2a1c7f1c2a 08083e0808 0080703000 0808080808 0000606000 2010080402 3e5149453e 00427f4000 7249494946 2141494d33 '
+    '1814127f10 2745454539 3c4a494931 4121110907 3649494936 464949291e 0000140000 0040340000 0008142241 1414141414 '
+    '0041221408 0201590906 3e415d594e 7c1211127c 7f49494936 3e41414122 7f4141413e 7f49494941 7f09090901 3e41415173 '
+    '7f0808087f 00417f4100 2040413f01 7f08142241 7f40404040 7f021c027f 7f0408107f 3e4141413e 7f09090906 3e4151215e '
+    '7f09192946 2649494932 03017f0103 3f4040403f 1f2040201f 3f4038403f 6314081463 0304780403 6159494d43 007f414141 '
+    '0204081020 004141417f 0402010204 4040404040 0003070800 2054547840 7f28444438 3844444428 384444287f 3854545418 '
+    '00087e0902 18a4a49c78 7f08040478 00447d4000 2040403d00 7f10284400 00417f4000 7c04780478 7c08040478 3844444438 '
+    'fc18242418 18242418fc 7c08040408 4854545424 04043f4424 3c4040207c 1c2040201c 3c4030403c 4428102844 4c9090907c '
+    '4464544c44 0008364100 0000770000 0041360800 0201020402'
+).split()
+
+# width and height (in pixels) of a character of the bitmap font, including the space to the next character
+FONT_WIDTH = 6
+FONT_HEIGHT = 8
+
+
+def value_extent(values):
+    """Return the range of values shown along an axis of a PNG image.
+
+    Params:
+    -------
+    values: ndarray
+        Values, which may include NaNs.
+
+    Return:
+    -------
+    tuple:
+        The minimum and maximum, which differ by at least 1.
+    """
+
+    finite = values[np.isfinite(values)]
+    if len(finite) == 0:
+        return 0.0, 1.0
+    low, high = float(finite.min()), float(finite.max())
+    if high - low < 1e-12 * max(abs(low), 1):
+        return low - 0.5, high + 0.5
+    return low, high
+
+
+def line_pixels(rows, columns):
+    """Return the pixels of the line connecting consecutive points.
+
+    Params:
+    -------
+    rows: ndarray
+        Pixel rows of the points.
+    columns: ndarray
+        Pixel columns of the points.
+
+    Return:
+    -------
+    tuple:
+        The rows and columns of the line pixels.
+    """
+
+    if len(rows) < 2:
+        return rows, columns
+    steps = np.maximum(np.abs(np.diff(rows)), np.abs(np.diff(columns))) + 1
+    segments = np.repeat(np.arange(len(steps)), steps)
+    fractions = (np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)) / np.repeat(steps, steps)
+    line_rows = rows[segments] + fractions * (rows[segments + 1] - rows[segments])
+    line_columns = columns[segments] + fractions * (columns[segments + 1] - columns[segments])
+    return np.round(line_rows).astype(np.int64), np.round(line_columns).astype(np.int64)
+
+
+def stamp_discs(image, rows, columns, color, radius, alpha, outline):
+    """Draw discs centred on pixels into an RGB image.
+
+    The discs are blended into the image with the given opacity. If outline is True, the pixels on the edge of the
+    discs are drawn opaque, as Bokeh draws marker outlines.
+
+    Params:
+    -------
+    image: ndarray
+        RGB image, as an array of floats with shape (height, width, 3). It is changed in place.
+    rows: ndarray
+        Rows of the disc centres.
+    columns: ndarray
+        Columns of the disc centres.
+    color: ndarray
+        Red, green and blue component of the colour.
+    radius: int
+        Disc radius, in pixels.
+    alpha: float
+        Opacity of the discs.
+    outline: bool
+        Whether to draw the edge of the discs opaque.
+    """
+
+    height, width = image.shape[:2]
+    for dy in range(-radius, radius + 1):
+        for dx in range(-radius, radius + 1):
+            distance = dy * dy + dx * dx
+            if distance > radius * radius:
+                continue
+            r = rows + dy
+            c = columns + dx
+            inside = (r >= 0) & (r < height) & (c >= 0) & (c < width)
+            r, c = r[inside], c[inside]
+            opacity = 1 if outline and distance > (radius - 1) * (radius - 1) else alpha
+            image[r, c] = image[r, c] * (1 - opacity) + color * opacity
+
+
+def text_width(text):
+    """Return the width of a text drawn with draw_text.
+
+    Params:
+    -------
+    text: str
+        Text.
+
+    Return:
+    -------
+    int:
+        The width, in pixels.
+    """
+
+    return max(FONT_WIDTH * len(text) - 1, 0)
+
+
+def draw_text(image, text, x, y, color, anchor='start', vertical=False, bold=False):
+    """Draw a text with the bitmap font into an RGB image.
+
+    The position is interpreted as for an SVG text element: y is the baseline and x is the start, middle or end of
+    the text, depending on the anchor. Vertical text reads from bottom to top, as SVG text rotated by -90 degrees
+    around its position. Characters which aren't printable ASCII characters are drawn as question marks. Pixels
+    outside the image are clipped.
+
+    Params:
+    -------
+    image: ndarray
+        RGB image, as an array of floats with shape (height, width, 3). It is changed in place.
+    text: str
+        Text.
+    x: float
+        Column of the text position.
+    y: float
+        Row of the text position.
+    color: ndarray
+        Red, green and blue component of the colour.
+    anchor: str
+        Alignment of the text relative to its position ('start', 'middle' or 'end').
+    vertical: bool
+        Whether to draw the text from bottom to top.
+    bold: bool
+        Whether to draw the text in bold.
+    """
+
+    if not text:
+        return
+    columns = []
+    for character in text:
+        code = ord(character) - 32
+        glyph = FONT[code] if 0 <= code < len(FONT) else FONT[ord('?') - 32]
+        columns.extend(int(glyph[i:i + 2], 16) for i in range(0, 10, 2))
+        columns.append(0)
+    bits = np.array(columns[:-1], dtype=np.uint8)
+    mask = (bits[np.newaxis, :] >> np.arange(FONT_HEIGHT, dtype=np.uint8)[:, np.newaxis]) & 1 == 1
+    if bold:
+        mask[:, 1:] |= mask[:, :-1].copy()
+    offset = dict(start=0, middle=mask.shape[1] // 2, end=mask.shape[1])[anchor]
+    if vertical:
+        mask = np.rot90(mask)
+        top, left = int(round(y)) - mask.shape[0] + offset, int(round(x)) - FONT_HEIGHT + 1
+    else:
+        top, left = int(round(y)) - FONT_HEIGHT + 1, int(round(x)) - offset
+    rows, cols = np.nonzero(mask)
+    rows, cols = rows + top, cols + left
+    height, width = image.shape[:2]
+    inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+    image[rows[inside], cols[inside]] = color
+
+
+def encode_png(rgb, title):
+    """Encode an RGB image as PNG.
+
+    Params:
+    -------
+    rgb: ndarray
+        Image, as an array of unsigned bytes with shape (height, width, 3).
+    title: str
+        Title, which is included as a text chunk.
+
+    Return:
+    -------
+    bytes:
+        The PNG image.
+    """
+
+    def chunk(chunk_type, data):
+        return struct.pack('>I', len(data)) + chunk_type + data + \
+               struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff)
+
+    height, width = rgb.shape[:2]
+    # every row starts with the filter type, which is 0 (no filter)
+    rows = np.hstack([np.zeros((height, 1), dtype=np.uint8), rgb.reshape((height, width * 3))])
+    return b'\x89PNG\r\n\x1a\n' + \
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) + \
+        chunk(b'tEXt', b'Title\x00' + (title or '').encode('latin-1', errors='replace')) + \
+        chunk(b'IDAT', zlib.compress(rows.tobytes())) + \
+        chunk(b'IEND', b'')
@@ -0,0 +1,206 @@
+import fcntl
+import importlib
+import json
+import os
+import threading
+import time
+
+from flask import current_app, g
+
+from app.main import main
+from app.main.data_quality import data_quality_page_packages
+from app.main.render_cache import current_generation, prune
+from app.main.views import DATA_QUALITY_ROUTE
+
+# name of the file in the render cache directory which records the generation for which the caches were pre-warmed
+PREWARM_STATE_FILE = 'prewarmed.json'
+
+# name of the lock file in the render cache directory which ensures that only one pre-warming runs at a time
+PREWARM_LOCK_FILE = 'prewarm.lock'
+
+# increment of the niceness of the prewarm_cache command of manage.py, so that it yields the CPU to the server
+PREWARM_NICENESS = 10
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def prewarm(force=False, log=None):
+    """Render the default content of all data quality pages into the caches.
+
+    The content() function of every default data quality page (see data_quality_page_packages) is called in a request
+    context for the page, with g.prewarming set to True, so that all items are created for the page's default date
+    range, irrespective of whether there is cached content for them (see _default_data_quality_content in
+    app.main.data_quality). As the items are written to the render cache on disk, they are available to all server
+    processes.
+
+    Pre-warming is skipped if the caches have been pre-warmed for the current data generation (i.e. the current maximum
+    FileData_Id) already, unless force is True. It is skipped as well if another pre-warming is running, in this or
+    another process. Pages are pre-warmed one at a time, and at most PREWARM_MAX_PARALLELISM items of a page are
+    created in parallel, so that pre-warming doesn't starve interactive requests.
+
+    Render cache entries which haven't been written for a week are removed afterwards.
+
+    This function must be called within a Flask app context, and the ITEM_CACHE_TTL and RENDER_CACHE_DIR settings must
+    be a positive number and a non-empty string, respectively.
+
+    Params:
+    -------
+    force: bool
+        Whether to pre-warm the caches even if they have been pre-warmed for the current data generation already.
+    log: function
+        Function to call with a message for every pre-warmed page.
+
+    Return:
+    -------
+    list of str:
+        The packages of the pre-warmed pages, or None if pre-warming was skipped.
+    """
+
+    directory = current_app.config['RENDER_CACHE_DIR']
+    if not directory or current_app.config['ITEM_CACHE_TTL'] <= 0:
+        raise ValueError('The ITEM_CACHE_TTL and RENDER_CACHE_DIR settings must be set for pre-warming the caches.')
+    os.makedirs(directory, exist_ok=True)
+
+    lock_fd = os.open(os.path.join(directory, PREWARM_LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+
+        generation = current_generation(refresh=True)
+        if not force and _prewarmed_generation(directory) == generation:
+            return None
+
+        packages = []
+        for package in data_quality_page_packages():
+            start = time.perf_counter()
+            try:
+                _prewarm_page(package)
+            except Exception as e:
+                current_app.logger.error('The page {package} could not be pre-warmed: {error}'
+                                         .format(package=package, error=e), exc_info=1)
+                continue
+            packages.append(package)
+            if log:
+                log('{package}: {seconds:.1f} s'.format(package=package, seconds=time.perf_counter() - start))
+
+        _write_prewarmed_generation(directory, generation)
+        prune(directory)
+        return packages
+    finally:
+        os.close(lock_fd)
+
+
+def start_scheduler(app):
+    """Start a background thread which pre-warms the caches whenever the data generation changes.
+
+    The thread checks every PREWARM_INTERVAL seconds whether the caches have been pre-warmed for the current data
+    generation and pre-warms them if not (see prewarm). It is only started if the PREWARM_INTERVAL setting is positive,
+    and only once per process.
+
+    Params:
+    -------
+    app: Flask
+        Flask app.
+    """
+
+    global _scheduler
+
+    interval = app.config['PREWARM_INTERVAL']
+    if interval <= 0:
+        return
+    with _scheduler_lock:
+        if _scheduler is not None and _scheduler[1] == os.getpid():
+            return
+        thread = threading.Thread(target=_run_scheduler, args=(app, interval), daemon=True)
+        _scheduler = (thread, os.getpid())
+        thread.start()
+
+
+@main.before_app_first_request
+def _start_scheduler_for_first_request():
+    """Start the pre-warming scheduler in the server process handling the request.
+
+    The scheduler isn't started when the app is created, as the server may fork its worker processes afterwards.
+    """
+
+    start_scheduler(current_app._get_current_object())
+
+
+def _run_scheduler(app, interval):
+    """Pre-warm the caches periodically.
+
+    Params:
+    -------
+    app: Flask
+        Flask app.
+    interval: float
+        Number of seconds between checks for a new data generation.
+    """
+
+    while True:
+        time.sleep(interval)
+        with app.app_context():
+            try:
+                prewarm()
+            except Exception as e:
+                app.logger.error('The caches could not be pre-warmed: {error}'.format(error=e), exc_info=1)
+
+
+def _prewarm_page(package):
+    """Create the default content of a data quality page, ignoring cached content.
+
+    Params:
+    -------
+    package: str
+        Fully qualified name of the page package.
+    """
+
+    page = package[len('app.main.pages.'):].replace('.', '/')
+    with current_app.test_request_context(DATA_QUALITY_ROUTE + page):
+        g.prewarming = True
+        try:
+            importlib.import_module(package).content()
+        finally:
+            g.prewarming = False
+
+
+def _prewarmed_generation(directory):
+    """Return the data generation for which the caches have been pre-warmed.
+
+    Params:
+    -------
+    directory: str
+        Directory of the render cache.
+
+    Return:
+    -------
+    int or None:
+        The data generation, or None if the caches haven't been pre-warmed yet.
+    """
+
+    try:
+        with open(os.path.join(directory, PREWARM_STATE_FILE)) as f:
+            return json.load(f)['generation']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_prewarmed_generation(directory, generation):
+    """Record the data generation for which the caches have been pre-warmed.
+
+    Params:
+    -------
+    directory: str
+        Directory of the render cache.
+    generation: int
+        Data generation.
+    """
+
+    path = os.path.join(directory, PREWARM_STATE_FILE)
+    tmp_path = '{path}.{pid}.tmp'.format(path=path, pid=os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(dict(generation=generation), f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,219 @@
+import datetime
+import re
+import threading
+import time
+
+import numpy as np
+
+from app import db
+from app.main.data_cache import cache_frame, cached_frame, normalise_sql
+from app.main.single_flight import flight_key
+
+# number of seconds for which the latest night with data is remembered before the database is queried again
+LATEST_NIGHT_CHECK_INTERVAL = 60
+
+# regular expression for the source tables (i.e. the FROM clause) of an SQL query
+SOURCE_TABLES_REGEX = re.compile(r'\bfrom\s+(.+?)(?:\s+(?:where|group\s+by|having|order\s+by|limit)\b|$)',
+                                 re.IGNORECASE | re.DOTALL)
+
+# the latest night with data and the time when it was queried, keyed by source tables and night column
+_latest_nights = {}
+_latest_nights_lock = threading.Lock()
+
+
+def latest_night(source_tables, night_column, refresh=False):
+    """Return the latest night for which there is data in the given source tables.
+
+    A night is a UT date, as for nightly_frames, so that the latest night is the date of the maximum value of the night
+    column in the source tables. The database is queried at most once every LATEST_NIGHT_CHECK_INTERVAL seconds for
+    the same source tables and night column, unless refresh is True.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    source_tables: str
+        Source tables, as in the FROM clause of an SQL query, such as 'DQ_HrsFrame' or
+        'PipelineDataQuality_CCD join FileData using (FileData_Id)'.
+    night_column: str
+        Name of the column containing the datetime or date of a row.
+    refresh: bool
+        Whether to query the database irrespective of when it was queried last.
+
+    Return:
+    -------
+    date or None:
+        The latest night, or None if there are no rows.
+    """
+
+    key = (source_tables, night_column)
+    with _latest_nights_lock:
+        now = time.time()
+        checked = _latest_nights.get(key, {}).get('checked')
+        if refresh or checked is None or now - checked > LATEST_NIGHT_CHECK_INTERVAL:
+            latest = db.engine.execute('SELECT MAX({night_column}) FROM {source_tables}'
+                                       .format(night_column=night_column, source_tables=source_tables)).scalar()
+            if isinstance(latest, datetime.datetime):
+                latest = latest.date()
+            _latest_nights[key] = dict(value=latest, checked=now)
+        return _latest_nights[key]['value']
+
+
+def source_tables(sql):
+    """Return the source tables of an SQL query.
+
+    The source tables are the content of the query's first FROM clause, up to the WHERE, GROUP BY, HAVING, ORDER BY or
+    LIMIT clause. Queries with a subquery in their FROM clause are not supported.
+
+    Params:
+    -------
+    sql: str
+        SQL query.
+
+    Return:
+    -------
+    str or None:
+        The source tables, or None if the query has no FROM clause.
+    """
+
+    match = SOURCE_TABLES_REGEX.search(sql)
+    return ' '.join(match.group(1).split()) if match else None
+
+
+def nightly_frames(sql, start_date, end_date, night_column, fetch, bind=None, schema=None, **kwargs):
+    """Return the result of an SQL query for a date range, using cached results for the nights queried before.
+
+    The date range is segmented into nights, where the night of a date d covers the rows for which the query's date
+    condition holds for the range from d (inclusive) to d + 1 day (exclusive). The result for every night is cached
+    separately (see app.main.data_cache), so that a request for a date range which overlaps with date ranges
+    requested before only needs to query the nights not covered yet. Consecutive uncovered nights are queried
+    together, with the fetch function, and the result is split into nights according to the UT date of night_column.
+
+    The results for a night are treated as final and cached once the query's source tables (see source_tables) contain
+    data for a later night (see latest_night). Results for more recent nights, which may still change, are never
+    cached, but always queried. Cached results don't depend on the data generation, as data for past nights doesn't
+    change.
+
+    This function must be called within a Flask app context, and caching of query results must be enabled.
+
+    Params:
+    -------
+    sql: str
+        SQL query, as for app.main.data_fetching.read_sql_for_date_range.
+    start_date: date
+        Start of the date range (inclusive).
+    end_date: date
+        End of the date range (exclusive).
+    night_column: str
+        Name of the result column containing the datetime or date used in the query's date condition.
+    fetch: function
+        Function returning the uncached query result for a date range, given its start (inclusive) and end
+        (exclusive).
+    bind: str
+        Bind name of the database to query.
+    schema: dict
+        Column types, keyed by column name.
+    kwargs: dict
+        Additional format arguments for the query.
+
+    Return:
+    -------
+    list of DataFrame:
+        The results for the nights of the date range, in chronological order.
+    """
+
+    tables = source_tables(sql.format(start_date=start_date, end_date=end_date, **kwargs))
+    latest = latest_night(tables, night_column) if tables is not None else None
+    nights = [start_date + datetime.timedelta(days=i) for i in range((end_date - start_date).days)]
+    frames = {}
+    for night in nights:
+        if _is_final(night, latest):
+            df = cached_frame(_night_key(sql, night, night_column, bind, schema, kwargs))
+            if df is not None:
+                frames[night] = df
+
+    for gap_start, gap_end in _gaps(nights, frames):
+        df = fetch(gap_start, gap_end)
+        days = df[night_column].values.astype('datetime64[ns]').astype('datetime64[D]')
+        night = gap_start
+        while night < gap_end:
+            frames[night] = df[days == np.datetime64(night, 'D')].reset_index(drop=True)
+            if _is_final(night, latest):
+                cache_frame(_night_key(sql, night, night_column, bind, schema, kwargs), frames[night])
+            night += datetime.timedelta(days=1)
+
+    return [frames[night] for night in nights]
+
+
+def _is_final(night, latest):
+    """Check whether the query results for a night are final.
+
+    Params:
+    -------
+    night: date
+        Night.
+    latest: date or None
+        Latest night with data in the query's source tables, as returned by latest_night.
+
+    Return:
+    -------
+    bool:
+        Whether there is data for a later night.
+    """
+
+    return latest is not None and night < latest
+
+
+def _gaps(nights, frames):
+    """Return the date ranges of consecutive nights without a result.
+
+    Params:
+    -------
+    nights: list of date
+        Consecutive nights.
+    frames: dict
+        Results, keyed by night.
+
+    Return:
+    -------
+    list of tuple:
+        The start (inclusive) and end (exclusive) of the date ranges, in chronological order.
+    """
+
+    gaps = []
+    for night in nights:
+        if night in frames:
+            continue
+        if gaps and gaps[-1][1] == night:
+            gaps[-1] = (gaps[-1][0], night + datetime.timedelta(days=1))
+        else:
+            gaps.append((night, night + datetime.timedelta(days=1)))
+    return gaps
+
+
+def _night_key(sql, night, night_column, bind, schema, kwargs):
+    """Return the cache key for the result of an SQL query for a night.
+
+    Params:
+    -------
+    sql: str
+        SQL query, with the placeholders for the date range.
+    night: date
+        Night.
+    night_column: str
+        Name of the column used for splitting results into nights.
+    bind: str
+        Bind name of the database to query.
+    schema: dict
+        Column types, keyed by column name.
+    kwargs: dict
+        Additional format arguments for the query.
+
+    Return:
+    -------
+    str:
+        The key.
+    """
+
+    return flight_key('night', normalise_sql(sql), kwargs, night_column, bind, sorted((schema or {}).items()),
+                      night.isoformat())
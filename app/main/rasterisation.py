@@ -0,0 +1,381 @@
+import datetime
+import importlib
+import json
+import math
+
+import numpy as np
+import pandas as pd
+from bokeh.colors import named
+from bokeh.models import ColumnDataSource, CustomJS
+from bokeh.util.serialization import transform_column_source_data
+from dateutil import parser
+from flask import current_app
+from itsdangerous import URLSafeSerializer
+
+from app.main.data_quality_plots import column_data_source
+
+# route for re-rasterising a zoomed plot; a token describing the plotted data is appended
+RASTER_ROUTE = '/raster/'
+
+# size (in screen pixels) of a grid cell of a rasterised plot
+RASTER_CELL_SIZE = 3
+
+# opacity of a grid cell containing a single point; cells with more points are more opaque
+RASTER_MIN_ALPHA = 0.3
+
+# number of milliseconds in a day
+MILLISECONDS_PER_DAY = 24 * 3600 * 1000
+
+# salt for signing the tokens describing the plotted data
+RASTER_TOKEN_SALT = 'raster-data'
+
+# JavaScript for re-rasterising a plot when its ranges change
+RANGE_CODE = """
+rasterisation.update(image_source, scatter_source, x_range, y_range, {url});
+"""
+
+raster_data_functions = dict()
+
+
+def raster_data(name):
+    """Decorator for functions returning the data for a dense scatter plot.
+
+    The decorated function must accept a start date (inclusive) and an end date (exclusive) as its first two arguments,
+    and it must return a data frame with the data for this date range. It may accept additional keyword arguments,
+    whose values must be serialisable as JSON.
+
+    The function is registered under the given name, so that the raster route can fetch the data again when a user
+    zooms into a plot created with dense_scatter. The name must be unique within the function's module.
+
+    Params:
+    -------
+    name: str
+        Name for identifying the decorated function.
+    """
+
+    def decorate(func):
+        module_name = func.__module__
+        if module_name not in raster_data_functions:
+            raster_data_functions[module_name] = {}
+        d = raster_data_functions[module_name]
+        if name in d:
+            raise Exception('The module {module} contains multiple functions with a raster_data decorator that '
+                            'has the value "{name}" as its name argument.'.format(module=module_name, name=name))
+        d[name] = func
+        func.raster_data_name = name
+
+        return func
+    return decorate
+
+
+def dense_scatter(p, data, start_date, end_date, x, y, color, params=None, threshold=None, frame=None, **kwargs):
+    """Add a scatter plot to a figure, rasterising it on the server if it has too many points.
+
+    The data for the date range is obtained from the function passed as data argument, which must have a raster_data
+    decorator. If it has at most threshold rows, a scatter renderer is added as usual. Otherwise the points are binned
+    into a grid with cells of RASTER_CELL_SIZE screen pixels, and the grid is added as an RGBA image. The colour of a
+    cell is the mean colour of its points, and its opacity increases with the number of points.
+
+    In the latter case the image is replaced whenever the user zooms or pans. The browser requests the data for the
+    visible region from the raster route, which rasterises it again or, if the region contains at most threshold points,
+    returns the points, which are then shown by the (initially empty) scatter renderer.
+
+    Params:
+    -------
+    p: Figure
+        Plot.
+    data: function
+        Function with a raster_data decorator returning the data for a date range.
+    start_date: date
+        Earliest date to include in the plot.
+    end_date: date
+        Earliest date not to include in the plot.
+    x: str
+        Column with the x values. If it is a datetime column, the data for a zoomed region is only fetched for the
+        visible dates.
+    y: str
+        Column with the y values.
+    color: str
+        Column with the point colours, or a colour for all points.
+    params: dict
+        Additional keyword arguments for the data function.
+    threshold: int
+        Maximum number of points which are not rasterised. The default is given by the RASTER_POINT_THRESHOLD setting.
+    frame: DataFrame
+        Data for the date range, if it has been obtained already. The default is to call the data function.
+    **kwargs: keyword arguments
+        Additional keyword arguments for the scatter renderer, such as size or legend.
+
+    Return:
+    -------
+    GlyphRenderer:
+        The scatter renderer. Its data source is empty if the data is rasterised.
+    """
+
+    params = params or {}
+    if threshold is None:
+        threshold = current_app.config['RASTER_POINT_THRESHOLD']
+    df = frame if frame is not None else data(start_date, end_date, **params)
+    rasterised = len(df) > threshold
+    x_is_datetime = np.issubdtype(df[x].dtype, np.datetime64)
+
+    if rasterised:
+        width = (p.plot_width or 600) // RASTER_CELL_SIZE
+        height = (p.plot_height or 600) // RASTER_CELL_SIZE
+        image_source = ColumnDataSource(data=rasterise(df, x, y, color, width, height))
+        image_renderer = p.image_rgba(source=image_source, image='image', x='x', y='y', dw='dw', dh='dh')
+        df = df.iloc[:0]
+
+    scatter_renderer = p.scatter(source=column_data_source(df), x=x, y=y, color=color, **kwargs)
+
+    if rasterised:
+        # the image should be hidden along with the scatter points when the legend item is clicked
+        for legend in p.legend:
+            for item in legend.items:
+                if scatter_renderer in item.renderers:
+                    item.renderers.append(image_renderer)
+
+        token = URLSafeSerializer(current_app.secret_key, salt=RASTER_TOKEN_SALT).dumps(
+            dict(module=data.__module__,
+                 name=data.raster_data_name,
+                 params=params,
+                 start_date=start_date.isoformat(),
+                 end_date=end_date.isoformat(),
+                 x=x,
+                 x_is_datetime=bool(x_is_datetime),
+                 y=y,
+                 color=color,
+                 width=width,
+                 height=height,
+                 threshold=threshold))
+        callback = CustomJS(args=dict(image_source=image_source,
+                                      scatter_source=scatter_renderer.data_source,
+                                      x_range=p.x_range,
+                                      y_range=p.y_range),
+                            code=RANGE_CODE.format(url=json.dumps(RASTER_ROUTE + token)))
+        for attribute in ('start', 'end'):
+            p.x_range.js_on_change(attribute, callback)
+            p.y_range.js_on_change(attribute, callback)
+
+    return scatter_renderer
+
+
+def rasterise(df, x, y, color, width, height, x_range=None, y_range=None):
+    """Bin the points of a scatter plot into an RGBA image.
+
+    The points are binned into a grid of width x height cells covering the given ranges, which default to the range of
+    the data. The colour of a cell is the mean colour of its points, weighted by the number of points per colour, and
+    its opacity increases logarithmically from RASTER_MIN_ALPHA (for a single point) to 1 (for the most populated
+    cell). Empty cells are transparent.
+
+    Datetime values are converted to milliseconds since the epoch, as used by Bokeh.
+
+    Params:
+    -------
+    df: DataFrame
+        Data frame with the points.
+    x: str
+        Column with the x values.
+    y: str
+        Column with the y values.
+    color: str
+        Column with the point colours, or a colour for all points. Colours must be hex strings (such as '#ff8000') or
+        CSS colour names.
+    width: int
+        Number of cells along the x axis.
+    height: int
+        Number of cells along the y axis.
+    x_range: tuple
+        Minimum and maximum x value covered by the image.
+    y_range: tuple
+        Minimum and maximum y value covered by the image.
+
+    Return:
+    -------
+    dict:
+        The data for an image_rgba glyph, i.e. lists with the image, its lower left corner (x and y) and its size (dw
+        and dh).
+    """
+
+    xs = numeric_values(df[x])
+    ys = numeric_values(df[y])
+    if color in df.columns:
+        categories = df[color].astype('category')
+        palette = np.array([color_rgb(c) for c in categories.cat.categories], dtype=np.float64).reshape((-1, 3))
+        rgb = palette[categories.cat.codes.values]
+    else:
+        rgb = np.tile(np.array(color_rgb(color), dtype=np.float64), (len(df), 1))
+
+    valid = np.isfinite(xs) & np.isfinite(ys)
+    xs, ys, rgb = xs[valid], ys[valid], rgb[valid]
+    x_min, x_max = x_range if x_range else _extent(xs)
+    y_min, y_max = y_range if y_range else _extent(ys)
+    if x_max <= x_min:
+        x_max = x_min + 1
+    if y_max <= y_min:
+        y_max = y_min + 1
+
+    inside = (xs >= x_min) & (xs <= x_max) & (ys >= y_min) & (ys <= y_max)
+    xs, ys, rgb = xs[inside], ys[inside], rgb[inside]
+    columns = np.minimum(((xs - x_min) / (x_max - x_min) * width).astype(np.int64), width - 1)
+    rows = np.minimum(((ys - y_min) / (y_max - y_min) * height).astype(np.int64), height - 1)
+    cells = rows * width + columns
+
+    counts = np.bincount(cells, minlength=width * height)
+    image = np.zeros((height, width), dtype=np.uint32)
+    rgba = image.view(dtype=np.uint8).reshape((height, width, 4))
+    filled = counts > 0
+    for channel in range(3):
+        sums = np.bincount(cells, weights=rgb[:, channel], minlength=width * height)
+        means = np.zeros(width * height)
+        means[filled] = sums[filled] / counts[filled]
+        rgba[:, :, channel] = np.round(means).reshape((height, width))
+    if filled.any():
+        alpha = np.zeros(width * height)
+        max_log_count = max(np.log(counts.max()), 1)
+        alpha[filled] = RASTER_MIN_ALPHA + (1 - RASTER_MIN_ALPHA) * np.log(counts[filled]) / max_log_count
+        rgba[:, :, 3] = np.round(255 * alpha).reshape((height, width))
+
+    return dict(image=[image], x=[x_min], y=[y_min], dw=[x_max - x_min], dh=[y_max - y_min])
+
+
+def raster_region(token, x_start, x_end, y_start, y_end):
+    """Return the data for a region of a rasterised plot.
+
+    The token describes the plotted data and must have been created by dense_scatter. The data is fetched again with
+    the registered data function, restricted to the visible dates if the x values are datetimes. If the region contains
+    more points than the threshold used by dense_scatter, the points are rasterised. Otherwise the points themselves are
+    returned.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    token: str
+        Signed token created by dense_scatter.
+    x_start: float
+        Minimum visible x value. Datetimes are given as milliseconds since the epoch.
+    x_end: float
+        Maximum visible x value.
+    y_start: float
+        Minimum visible y value.
+    y_end: float
+        Maximum visible y value.
+
+    Return:
+    -------
+    dict:
+        The mode ('image' or 'points') and the column data for the image or scatter renderer, serialised as for Bokeh
+        documents.
+    """
+
+    settings = URLSafeSerializer(current_app.secret_key, salt=RASTER_TOKEN_SALT).loads(token)
+
+    # import the module so that its data functions are registered
+    importlib.import_module(settings['module'])
+    data = raster_data_functions[settings['module']][settings['name']]
+
+    start_date = parser.parse(settings['start_date'])
+    end_date = parser.parse(settings['end_date'])
+    if settings['x_is_datetime']:
+        start_date, end_date = _visible_dates(start_date, end_date, x_start, x_end)
+    df = data(start_date, end_date, **settings['params'])
+
+    x, y = settings['x'], settings['y']
+    xs = numeric_values(df[x])
+    ys = numeric_values(df[y])
+    df = df[(xs >= x_start) & (xs <= x_end) & (ys >= y_start) & (ys <= y_end)]
+
+    if len(df) > settings['threshold']:
+        image_data = rasterise(df, x, y, settings['color'], settings['width'], settings['height'],
+                               x_range=(x_start, x_end), y_range=(y_start, y_end))
+        return dict(mode='image', data=transform_column_source_data(image_data))
+    return dict(mode='points', data=transform_column_source_data(column_data_source(df).data))
+
+
+def numeric_values(series):
+    """Return the values of a column as floats, with datetimes as milliseconds since the epoch.
+
+    Params:
+    -------
+    series: Series
+        Column values.
+
+    Return:
+    -------
+    ndarray:
+        The values.
+    """
+
+    if np.issubdtype(series.dtype, np.datetime64):
+        ms = series.values.astype('datetime64[ms]').astype(np.int64).astype(np.float64)
+        ms[pd.isnull(series.values)] = np.nan
+        return ms
+    return series.values.astype(np.float64)
+
+
+def _extent(values):
+    """Return the minimum and maximum of an array, or (0, 1) if the array is empty.
+
+    Params:
+    -------
+    values: ndarray
+        Values without NaNs.
+
+    Return:
+    -------
+    tuple:
+        The minimum and maximum.
+    """
+
+    if len(values) == 0:
+        return 0.0, 1.0
+    return float(values.min()), float(values.max())
+
+
+def color_rgb(color):
+    """Return the red, green and blue component of a colour.
+
+    Params:
+    -------
+    color: str
+        Hex string (such as '#ff8000') or CSS colour name.
+
+    Return:
+    -------
+    tuple:
+        The components, as integers between 0 and 255.
+    """
+
+    if not color.startswith('#'):
+        color = getattr(named, color.lower()).to_hex()
+    return int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16)
+
+
+def _visible_dates(start_date, end_date, x_start, x_end):
+    """Restrict a date range to the dates visible in a zoomed plot.
+
+    Params:
+    -------
+    start_date: datetime
+        Start of the date range (inclusive).
+    end_date: datetime
+        End of the date range (exclusive).
+    x_start: float
+        Minimum visible x value, in milliseconds since the epoch.
+    x_end: float
+        Maximum visible x value, in milliseconds since the epoch.
+
+    Return:
+    -------
+    tuple:
+        The start (inclusive) and end (exclusive) of the visible part of the date range.
+    """
+
+    epoch = datetime.datetime(1970, 1, 1)
+    try:
+        visible_start = epoch + datetime.timedelta(days=math.floor(x_start / MILLISECONDS_PER_DAY))
+        visible_end = epoch + datetime.timedelta(days=math.floor(x_end / MILLISECONDS_PER_DAY) + 1)
+    except OverflowError:
+        return start_date, end_date
+    return max(start_date, visible_start), min(end_date, visible_end)
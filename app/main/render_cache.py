@@ -0,0 +1,111 @@
+import threading
+import time
+
+from flask import current_app
+
+from app import db
+from app.main.cache_backends import cache_backend
+
+# number of seconds for which the maximum FileData_Id is remembered before the database is queried again
+GENERATION_CHECK_INTERVAL = 60
+
+# number of seconds after which render cache entries are removed when the cache is pruned
+RENDER_CACHE_RETENTION = 7 * 24 * 3600
+
+# the latest known maximum FileData_Id and the time when it was queried
+_generation = dict(value=None, checked=None)
+_generation_lock = threading.Lock()
+
+
+def current_generation(refresh=False):
+    """Return the current data generation, which is the maximum FileData_Id in the database.
+
+    The nightly pipeline adds new FileData entries, so that a new generation indicates that cached content may be
+    outdated. The database is queried at most once every GENERATION_CHECK_INTERVAL seconds, unless refresh is True.
+
+    If the RENDER_CACHE_DIR setting is empty and the DATA_CACHE_SIZE setting isn't positive (so that neither the render
+    cache nor the cache for query results is used), None is returned without querying the database.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    refresh: bool
+        Whether to query the database irrespective of when it was queried last.
+
+    Return:
+    -------
+    int or None:
+        The maximum FileData_Id.
+    """
+
+    if not current_app.config['RENDER_CACHE_DIR'] and current_app.config['DATA_CACHE_SIZE'] <= 0:
+        return None
+    with _generation_lock:
+        now = time.time()
+        if refresh or _generation['checked'] is None or now - _generation['checked'] > GENERATION_CHECK_INTERVAL:
+            _generation['value'] = db.engine.execute('SELECT IFNULL(MAX(FileData_Id), 0) FROM FileData').scalar()
+            _generation['checked'] = now
+        return _generation['value']
+
+
+def read_rendered(directory, key):
+    """Read the HTML content of a data quality item from the render cache.
+
+    Params:
+    -------
+    directory: str
+        Directory of the render cache.
+    key: str
+        Key identifying the item and its arguments, as returned by app.main.data_quality.item_key.
+
+    Return:
+    -------
+    tuple or None:
+        The HTML content, the (UTC) datetime when its creation was started and the data generation at that time, or
+        None if the item isn't in the cache.
+    """
+
+    return cache_backend('render_cache', 'filesystem', directory).get(key)
+
+
+def write_rendered(directory, key, content, as_of, generation):
+    """Write the HTML content of a data quality item to the render cache.
+
+    The entry is written to a temporary file first and then moved into place, so that no server process ever reads a
+    partially written entry (see app.main.cache_backends.FilesystemCache).
+
+    Params:
+    -------
+    directory: str
+        Directory of the render cache.
+    key: str
+        Key identifying the item and its arguments, as returned by app.main.data_quality.item_key.
+    content: str
+        HTML content.
+    as_of: datetime
+        (UTC) datetime when the creation of the content was started.
+    generation: int
+        Data generation when the creation of the content was started, as returned by current_generation.
+    """
+
+    cache_backend('render_cache', 'filesystem', directory).set(key, (content, as_of, generation))
+
+
+def prune(directory, retention=RENDER_CACHE_RETENTION):
+    """Remove the render cache entries which have not been written for some time.
+
+    Params:
+    -------
+    directory: str
+        Directory of the render cache.
+    retention: float
+        Number of seconds after which an entry is removed.
+
+    Return:
+    -------
+    int:
+        The number of removed entries.
+    """
+
+    return cache_backend('render_cache', 'filesystem', directory).prune(retention)
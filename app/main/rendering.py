@@ -0,0 +1,74 @@
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from flask import current_app
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def submit_render(func, *args):
+    """Call a rendering function, in a worker process if possible.
+
+    If the RENDER_PROCESSES setting is positive, the function is called in a persistent pool of worker processes, so
+    that several data quality items can be rendered on multiple cores while the current thread continues, for example
+    with querying the data for the next item. Otherwise the function is called in the current thread.
+
+    In the former case the function and its arguments are pickled. So the function must be defined at the top level of
+    a module, and the arguments should be plain values, NumPy arrays or data frames rather than Bokeh models. The
+    return value is pickled as well.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    func: function
+        Function to call.
+    *args: positional arguments
+        Arguments for the function.
+
+    Return:
+    -------
+    Future:
+        Future for the return value of the function.
+    """
+
+    pool = render_pool()
+    if pool is not None:
+        return pool.submit(func, *args)
+
+    future = Future()
+    try:
+        future.set_result(func(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def render_pool():
+    """Return the process pool for rendering data quality items.
+
+    The pool is created on first use, with the number of worker processes given by the RENDER_PROCESSES setting. A new
+    pool is created if the current process is not the one which created the pool, as happens if a server forks its
+    worker processes after the pool has been created.
+
+    This function must be called within a Flask app context.
+
+    Return:
+    -------
+    ProcessPoolExecutor:
+        The pool, or None if the RENDER_PROCESSES setting is 0.
+    """
+
+    global _pool, _pool_pid
+
+    processes = current_app.config['RENDER_PROCESSES']
+    if processes <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=processes)
+            _pool_pid = os.getpid()
+        return _pool
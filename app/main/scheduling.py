@@ -0,0 +1,156 @@
+import datetime
+import math
+import threading
+
+# weight of the latest render time in the moving average of an item's render times
+COST_HISTORY_WEIGHT = 0.3
+
+# expected render time (in seconds) of an item without any history
+DEFAULT_ITEM_COST = 1.0
+
+# moving averages of the render times, keyed by package, item name and range length bucket
+_costs = dict()
+_costs_lock = threading.Lock()
+
+
+def range_length_bucket(start_date, end_date):
+    """Return the bucket for the length of a date range.
+
+    The bucket is the number of days in the range, rounded up to the next power of two, so that ranges of similar
+    length share their render time history.
+
+    Params:
+    -------
+    start_date: date
+        Start of the date range (inclusive).
+    end_date: date
+        End of the date range (exclusive).
+
+    Return:
+    -------
+    int:
+        The bucket.
+    """
+
+    days = max((end_date - start_date) // datetime.timedelta(days=1), 1)
+    return 2 ** int(math.ceil(math.log(days, 2) - 1e-9))
+
+
+def record_item_cost(package, name, bucket, seconds):
+    """Record the render time of a data quality item.
+
+    The render time is added to an exponentially weighted moving average of the render times for the item and range
+    length bucket.
+
+    Params:
+    -------
+    package: str
+        Package containing the item.
+    name: str
+        Name of the item.
+    bucket: int
+        Range length bucket, as returned by range_length_bucket, or 0 if the item has no date range.
+    seconds: float
+        Render time, in seconds.
+    """
+
+    key = (package, name, bucket)
+    with _costs_lock:
+        if key in _costs:
+            mean, count = _costs[key]
+            _costs[key] = ((1 - COST_HISTORY_WEIGHT) * mean + COST_HISTORY_WEIGHT * seconds, count + 1)
+        else:
+            _costs[key] = (seconds, 1)
+
+
+def expected_item_cost(package, name, bucket):
+    """Return the expected render time of a data quality item.
+
+    If there is a history for the item and range length bucket, its moving average is returned. Otherwise the average
+    for the nearest bucket with a history is scaled in proportion to the range length. DEFAULT_ITEM_COST is returned
+    for items without any history.
+
+    Params:
+    -------
+    package: str
+        Package containing the item.
+    name: str
+        Name of the item.
+    bucket: int
+        Range length bucket, as returned by range_length_bucket, or 0 if the item has no date range.
+
+    Return:
+    -------
+    float:
+        The expected render time, in seconds.
+    """
+
+    with _costs_lock:
+        if (package, name, bucket) in _costs:
+            return _costs[(package, name, bucket)][0]
+        buckets = [key[2] for key in _costs if key[:2] == (package, name)]
+        if not buckets:
+            return DEFAULT_ITEM_COST
+        nearest = min(buckets, key=lambda b: abs(math.log(max(b, 1), 2) - math.log(max(bucket, 1), 2)))
+        return _costs[(package, name, nearest)][0] * max(bucket, 1) / max(nearest, 1)
+
+
+def longest_first(package, names, bucket):
+    """Order data quality items by decreasing expected render time.
+
+    Items with the same expected render time keep their order.
+
+    Params:
+    -------
+    package: str
+        Package containing the items.
+    names: list of str
+        Names of the items.
+    bucket: int
+        Range length bucket, as returned by range_length_bucket, or 0 if the items have no date range.
+
+    Return:
+    -------
+    list of str:
+        The names, in the order in which the items should be started.
+    """
+
+    return sorted(names, key=lambda name: -expected_item_cost(package, name, bucket))
+
+
+def item_cost_table():
+    """Return the moving averages of the render times of all data quality items.
+
+    Return:
+    -------
+    list of dict:
+        The package, item name, range length bucket (in days), mean render time (in seconds) and number of recorded
+        render times, ordered by package, name and bucket.
+    """
+
+    with _costs_lock:
+        return [dict(package=key[0], name=key[1], range_days=key[2], mean_seconds=value[0], renders=value[1])
+                for key, value in sorted(_costs.items())]
+
+
+def split_date_range(start_date, end_date, parts):
+    """Split a date range into consecutive ranges of (almost) equal length.
+
+    Params:
+    -------
+    start_date: date
+        Start of the date range (inclusive).
+    end_date: date
+        End of the date range (exclusive).
+    parts: int
+        Number of ranges.
+
+    Return:
+    -------
+    list of tuple:
+        The start (inclusive) and end (exclusive) of the ranges, in chronological order.
+    """
+
+    days = (end_date - start_date) // datetime.timedelta(days=1)
+    boundaries = [start_date + datetime.timedelta(days=days * i // parts) for i in range(parts)] + [end_date]
+    return [(boundaries[i], boundaries[i + 1]) for i in range(parts) if boundaries[i] < boundaries[i + 1]]
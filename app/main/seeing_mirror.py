@@ -0,0 +1,456 @@
+import datetime
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from flask import current_app
+
+from app import db
+
+# offset (in seconds) to add to a Unix timestamp in order to get the timestamp used by the ELS database
+LABVIEW_TIME_OFFSET = 2082844800
+
+# number of rows fetched from the database at a time when syncing the mirror
+SYNC_CHUNK_SIZE = 100000
+
+# earliest time considered when the mirror is synced for the first time and no start time is given
+EARLIEST_SYNC_TIME = datetime.datetime(2000, 1, 1)
+
+# the mirrored tables
+# The key column is used for the high-water mark, for ordering and for finding the rows to replace when data is
+# fetched again. It is either a datetime column ('datetime' key type) or a LabVIEW timestamp column ('labview' key
+# type).
+MIRRORED_TABLES = {
+    'seeing': dict(
+        bind='suthweather',
+        key='datetime',
+        key_type='datetime',
+        columns=['datetime', 'seeing'],
+        sql='SELECT str_to_date(datetime,"%%Y-%%m-%%d %%H:%%i:%%s") AS datetime, seeing FROM seeing '
+            '    WHERE datetime >= str_to_date("{since}","%%Y-%%m-%%d %%H:%%i:%%s") '
+            '    ORDER BY datetime'
+    ),
+    'tpc_guidance_status__timestamp': dict(
+        bind='els',
+        key='timestamp',
+        key_type='labview',
+        columns=['_timestamp_', 'ee50', 'fwhm', 'timestamp', 'guidance_available'],
+        sql='SELECT _timestamp_, ee50, fwhm, timestamp, guidance_available FROM tpc_guidance_status__timestamp '
+            '    WHERE timestamp >= {since} '
+            '    ORDER BY timestamp'
+    )
+}
+
+
+def sync(since=None, full=False):
+    """Update the local mirror of the seeing and ELS guidance data.
+
+    For every table in MIRRORED_TABLES all rows which are newer than the table's high-water mark are fetched from the
+    database and merged into day-partitioned Arrow files in the directory given by the SEEING_MIRROR_DIR setting. The
+    high-water mark is updated after every fetched chunk of rows, so that an interrupted sync resumes where it stopped.
+
+    Rows may arrive late in the remote databases. Hence the period given by the SEEING_MIRROR_LATE_ARRIVAL_WINDOW
+    setting (in seconds) before the high-water mark is fetched again, and the rows already existing in the mirror for
+    this period are replaced with the fetched rows.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    since: datetime
+        Time from which to mirror the data if a table has no high-water mark yet or if a full sync is requested. The
+        default is to use EARLIEST_SYNC_TIME.
+    full: bool
+        Whether to ignore the high-water marks and fetch all rows since the given time.
+
+    Return:
+    -------
+    dict:
+        The number of fetched rows for each mirrored table.
+    """
+
+    return {name: _sync_table(name, since=since, full=full) for name in sorted(MIRRORED_TABLES.keys())}
+
+
+def read(name, start, end):
+    """Read mirrored data for a time range.
+
+    Only the day partitions overlapping the time range are opened, and they are memory-mapped rather than read into
+    memory. Each partition is sliced to the time range before it is converted to a data frame. The start and end time
+    are both inclusive.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    name: str
+        Name of the mirrored table, as used in MIRRORED_TABLES.
+    start: datetime
+        Earliest time to include.
+    end: datetime
+        Latest time to include.
+
+    Return:
+    -------
+    DataFrame:
+        The mirrored rows for the time range, ordered by the table's key column.
+    """
+
+    spec = MIRRORED_TABLES[name]
+    table_dir = _table_dir(name)
+    start_key = _key(spec, start)
+    end_key = _key(spec, end)
+    first_day, last_day = _day_labels(spec, pd.Series([start_key, end_key]))
+
+    frames = []
+    if os.path.isdir(table_dir):
+        for day in sorted(_partition_days(table_dir)):
+            if day < first_day or day > last_day:
+                continue
+            table = _read_partition(_partition_path(table_dir, day))
+            # only the key column is converted before slicing, so that the other columns are converted for the time
+            # range only
+            keys = table.column(spec['key']).to_pandas().values
+            lower = np.searchsorted(keys, _searchable(spec, start_key), side='left')
+            upper = np.searchsorted(keys, _searchable(spec, end_key), side='right')
+            frames.append(table.slice(lower, upper - lower).to_pandas())
+
+    if not frames:
+        return pd.DataFrame(columns=spec['columns'])
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
+
+
+def _sync_table(name, since, full):
+    """Update the local mirror of a table.
+
+    See the sync function for details.
+
+    Params:
+    -------
+    name: str
+        Name of the mirrored table, as used in MIRRORED_TABLES.
+    since: datetime
+        Time from which to mirror if there is no high-water mark or if a full sync is requested.
+    full: bool
+        Whether to ignore the high-water mark.
+
+    Return:
+    -------
+    int:
+        The number of fetched rows.
+    """
+
+    spec = MIRRORED_TABLES[name]
+    table_dir = _table_dir(name)
+    os.makedirs(table_dir, exist_ok=True)
+
+    high_water_mark = None if full else _read_high_water_mark(spec, table_dir)
+    if high_water_mark is None:
+        fetch_from = _key(spec, since if since else EARLIEST_SYNC_TIME)
+    else:
+        fetch_from = _shift_key(spec, high_water_mark, -current_app.config['SEEING_MIRROR_LATE_ARRIVAL_WINDOW'])
+
+    sql = spec['sql'].format(since=_sql_value(spec, fetch_from))
+    engine = db.get_engine(app=current_app, bind=spec['bind'])
+    fetched_rows = 0
+    # partitions whose rows from fetch_from onwards have been replaced already
+    replaced_days = set()
+    for chunk in pd.read_sql(sql, engine, chunksize=SYNC_CHUNK_SIZE):
+        if chunk.empty:
+            continue
+        if spec['key_type'] == 'datetime':
+            chunk[spec['key']] = pd.to_datetime(chunk[spec['key']])
+        fetched_rows += len(chunk)
+        for day, rows in chunk.groupby(_day_labels(spec, chunk[spec['key']]).values):
+            # the fetched rows are ordered by the key column, so that the rows of a partition from fetch_from onwards
+            # are replaced when the partition is merged for the first time, and later rows are just added
+            replace_from = fetch_from if day not in replaced_days else None
+            _merge_partition(_partition_path(table_dir, day), rows, spec['key'], replace_from)
+            replaced_days.add(day)
+
+        # the rows are ordered by the key column, so this chunk is safely on disk up to its maximum key
+        chunk_max = chunk[spec['key']].max()
+        if high_water_mark is None or chunk_max > high_water_mark:
+            high_water_mark = chunk_max
+            _write_high_water_mark(spec, table_dir, high_water_mark)
+
+    return fetched_rows
+
+
+def _merge_partition(path, rows, key, replace_from=None):
+    """Merge rows into a partition file.
+
+    If replace_from is given, the rows of the partition with a key value of at least replace_from are replaced with
+    the given rows; otherwise the given rows are added to the partition. Rows with the same key value are all kept,
+    as several rows may legitimately have the same key value. The merged partition is ordered by the key column (with
+    the order of rows with the same key value preserved) and written atomically, so that concurrent readers always see
+    a complete file.
+
+    Params:
+    -------
+    path: str
+        Path of the partition file. The file need not exist.
+    rows: DataFrame
+        Rows to merge.
+    key: str
+        Name of the key column.
+    replace_from: Timestamp or float
+        Key value from which the existing rows are replaced, or None if no rows are replaced.
+    """
+
+    if os.path.exists(path):
+        existing = _read_partition(path).to_pandas()
+        if replace_from is not None:
+            existing = existing[existing[key] < replace_from]
+        rows = pd.concat([existing, rows], ignore_index=True)
+    rows = rows.sort_values(key, kind='mergesort')
+
+    table = pa.Table.from_pandas(rows, preserve_index=False)
+    tmp_path = '{path}.{pid}.tmp'.format(path=path, pid=os.getpid())
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        writer = pa.RecordBatchFileWriter(sink, table.schema)
+        writer.write_table(table)
+        writer.close()
+    os.replace(tmp_path, path)
+
+
+def _read_partition(path):
+    """Read a partition file.
+
+    The file is memory-mapped rather than read into memory, and its content is returned as an Arrow table, so that it
+    can be sliced before it is converted to a data frame.
+
+    Params:
+    -------
+    path: str
+        Path of the partition file.
+
+    Return:
+    -------
+    Table:
+        The partition content.
+    """
+
+    source = pa.memory_map(path, 'r')
+    return pa.RecordBatchFileReader(source).read_all()
+
+
+def _table_dir(name):
+    """Return the directory containing the partition files for a mirrored table.
+
+    Params:
+    -------
+    name: str
+        Name of the mirrored table.
+
+    Return:
+    -------
+    str:
+        The directory path.
+    """
+
+    return os.path.join(os.path.abspath(current_app.config['SEEING_MIRROR_DIR']), name)
+
+
+def _partition_path(table_dir, day):
+    """Return the path of the partition file for a day.
+
+    Params:
+    -------
+    table_dir: str
+        Directory containing the partition files.
+    day: str
+        Day, in the format YYYY-MM-DD.
+
+    Return:
+    -------
+    str:
+        The file path.
+    """
+
+    return os.path.join(table_dir, '{day}.arrow'.format(day=day))
+
+
+def _partition_days(table_dir):
+    """Return the days for which a partition file exists.
+
+    Params:
+    -------
+    table_dir: str
+        Directory containing the partition files.
+
+    Return:
+    -------
+    list of str:
+        The days, in the format YYYY-MM-DD.
+    """
+
+    return [f[:-len('.arrow')] for f in os.listdir(table_dir) if f.endswith('.arrow')]
+
+
+def _read_high_water_mark(spec, table_dir):
+    """Read the high-water mark of a mirrored table.
+
+    Params:
+    -------
+    spec: dict
+        Description of the mirrored table, as given in MIRRORED_TABLES.
+    table_dir: str
+        Directory containing the partition files.
+
+    Return:
+    -------
+    Timestamp or float:
+        The high-water mark, or None if there is none.
+    """
+
+    path = os.path.join(table_dir, 'high_water_mark.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        value = json.load(f)['high_water_mark']
+    if spec['key_type'] == 'datetime':
+        return pd.Timestamp(value)
+    return float(value)
+
+
+def _write_high_water_mark(spec, table_dir, high_water_mark):
+    """Write the high-water mark of a mirrored table.
+
+    Params:
+    -------
+    spec: dict
+        Description of the mirrored table, as given in MIRRORED_TABLES.
+    table_dir: str
+        Directory containing the partition files.
+    high_water_mark: Timestamp or float
+        The high-water mark.
+    """
+
+    if spec['key_type'] == 'datetime':
+        value = pd.Timestamp(high_water_mark).isoformat()
+    else:
+        value = float(high_water_mark)
+    path = os.path.join(table_dir, 'high_water_mark.json')
+    tmp_path = '{path}.{pid}.tmp'.format(path=path, pid=os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(dict(high_water_mark=value), f)
+    os.replace(tmp_path, path)
+
+
+def _key(spec, t):
+    """Convert a date or datetime into a key value.
+
+    LabVIEW timestamps are calculated in the same way as for the seeing page, i.e. naive datetimes are taken to be in
+    the server's timezone.
+
+    Params:
+    -------
+    spec: dict
+        Description of the mirrored table, as given in MIRRORED_TABLES.
+    t: date or datetime
+        The date or datetime.
+
+    Return:
+    -------
+    Timestamp or float:
+        The key value.
+    """
+
+    if type(t) is datetime.date:
+        t = datetime.datetime(t.year, t.month, t.day)
+    if spec['key_type'] == 'datetime':
+        return pd.Timestamp(t)
+    return t.timestamp() + LABVIEW_TIME_OFFSET
+
+
+def _shift_key(spec, key, seconds):
+    """Shift a key value by a number of seconds.
+
+    Params:
+    -------
+    spec: dict
+        Description of the mirrored table, as given in MIRRORED_TABLES.
+    key: Timestamp or float
+        The key value.
+    seconds: int
+        Number of seconds to shift by. This may be negative.
+
+    Return:
+    -------
+    Timestamp or float:
+        The shifted key value.
+    """
+
+    if spec['key_type'] == 'datetime':
+        return key + pd.Timedelta(seconds=seconds)
+    return key + seconds
+
+
+def _sql_value(spec, key):
+    """Format a key value for use in an SQL query.
+
+    Params:
+    -------
+    spec: dict
+        Description of the mirrored table, as given in MIRRORED_TABLES.
+    key: Timestamp or float
+        The key value.
+
+    Return:
+    -------
+    str:
+        The formatted key value.
+    """
+
+    if spec['key_type'] == 'datetime':
+        return key.strftime('%Y-%m-%d %H:%M:%S')
+    return str(key)
+
+
+def _searchable(spec, key):
+    """Convert a key value so that it can be used for searching a NumPy array of key values.
+
+    Params:
+    -------
+    spec: dict
+        Description of the mirrored table, as given in MIRRORED_TABLES.
+    key: Timestamp or float
+        The key value.
+
+    Return:
+    -------
+    datetime64 or float:
+        The converted key value.
+    """
+
+    if spec['key_type'] == 'datetime':
+        return key.to_datetime64()
+    return key
+
+
+def _day_labels(spec, keys):
+    """Return the day partition labels for key values.
+
+    Params:
+    -------
+    spec: dict
+        Description of the mirrored table, as given in MIRRORED_TABLES.
+    keys: Series
+        The key values.
+
+    Return:
+    -------
+    Series:
+        The labels, in the format YYYY-MM-DD.
+    """
+
+    if spec['key_type'] == 'datetime':
+        times = pd.to_datetime(keys)
+    else:
+        times = pd.to_datetime(keys - LABVIEW_TIME_OFFSET, unit='s')
+    return times.dt.strftime('%Y-%m-%d')
@@ -0,0 +1,291 @@
+import fcntl
+import glob
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import Future
+
+from flask import current_app
+
+# number of seconds between attempts to acquire a file lock held by another process
+LOCK_POLL_SECONDS = 0.05
+
+# futures for the computations in progress in this process, keyed by the normalised key
+_flights = dict()
+_flights_lock = threading.Lock()
+
+
+def flight_key(*parts):
+    """Return a normalised key for a computation.
+
+    The parts are serialised as JSON with sorted dictionary keys, and values which can't be serialised (such as dates)
+    are replaced by their string representation. So equal parameters give the same key, irrespective of the order of
+    keyword arguments.
+
+    Params:
+    -------
+    *parts: positional arguments
+        Values identifying the computation, such as a package, an item name and the item function's arguments.
+
+    Return:
+    -------
+    str:
+        The key.
+    """
+
+    return json.dumps(parts, sort_keys=True, default=str)
+
+
+def single_flight(key, compute):
+    """Compute a value, sharing the computation with concurrent calls for the same key.
+
+    If a computation for the key is in progress in the current process, its future is returned and compute isn't
+    called. Otherwise, if the SINGLE_FLIGHT_DIR setting is non-empty, an exclusive file lock for the key is acquired in
+    that directory, so that concurrent computations in other server processes are waited for. If such a computation has
+    finished while waiting for the lock, its pickled result is used. Otherwise compute is called. The lock is waited for
+    at most SINGLE_FLIGHT_TIMEOUT seconds; after that compute is called without the lock, so that a stuck or very slow
+    computation in another process doesn't block the request.
+
+    A result is only written to a file if another process is waiting for the lock, and the lock and result files are
+    deleted once no process is waiting anymore, so that the directory doesn't grow.
+
+    compute may return a future (for example one returned by app.main.rendering.submit_render). In this case the lock
+    is kept until the future is done. The result must be picklable if the file lock is used.
+
+    The result is not cached; a call after the computation has finished starts a new computation.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    key: str
+        Key identifying the computation, as returned by flight_key.
+    compute: function
+        Function without arguments which returns the value or a future for it.
+
+    Return:
+    -------
+    Future:
+        Future for the value.
+    """
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        if flight is not None:
+            return flight
+        flight = _flights[key] = Future()
+
+    app = current_app._get_current_object()
+    lock = None
+
+    def finish(result=None, exception=None, shared=False):
+        if lock is not None:
+            try:
+                if not _has_waiters(lock):
+                    _remove_files(lock)
+                elif exception is None and not shared:
+                    _write_result(lock, result)
+            except Exception as e:
+                # other processes just compute the value themselves
+                app.logger.warning('The result for {key} could not be shared: {error}'.format(key=key, error=e))
+            finally:
+                _release(lock)
+        with _flights_lock:
+            del _flights[key]
+        if exception is None:
+            flight.set_result(result)
+        else:
+            flight.set_exception(exception)
+
+    def finish_with_future(future):
+        if future.exception() is None:
+            finish(result=future.result())
+        else:
+            finish(exception=future.exception())
+
+    try:
+        directory = app.config['SINGLE_FLIGHT_DIR']
+        if directory:
+            requested = time.time()
+            lock = _acquire(directory, key, app.config['SINGLE_FLIGHT_TIMEOUT'])
+            if lock is None:
+                app.logger.warning('The lock for {key} could not be acquired in time, so that the value is computed '
+                                   'without it.'.format(key=key))
+            else:
+                shared = _read_result(lock, requested)
+                if shared is not None:
+                    finish(result=shared[0], shared=True)
+                    return flight
+        result = compute()
+    except Exception as e:
+        finish(exception=e)
+        return flight
+
+    if isinstance(result, Future):
+        result.add_done_callback(finish_with_future)
+    else:
+        finish(result=result)
+    return flight
+
+
+def _acquire(directory, key, timeout):
+    """Acquire the exclusive file lock for a key.
+
+    This function blocks until the lock is available or the timeout has passed, trying to get the lock every
+    LOCK_POLL_SECONDS seconds. While waiting, a marker file named after the lock file, the process id and the thread id
+    tells the process holding the lock that its result is needed.
+
+    As the lock file is deleted by the last process holding the lock, a lock acquired on a deleted file is dropped and
+    acquired again.
+
+    Params:
+    -------
+    directory: str
+        Directory for the lock and result files.
+    key: str
+        Key identifying the computation.
+    timeout: float
+        Maximum number of seconds to wait for the lock.
+
+    Return:
+    -------
+    tuple or None:
+        The file descriptor of the locked file, the path of the result file and the path of the lock file, or None if
+        the lock couldn't be acquired within the timeout.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+    lock_path = base + '.lock'
+    marker = '{base}.{pid}-{thread}.wait'.format(base=base, pid=os.getpid(), thread=threading.get_ident())
+    open(marker, 'w').close()
+    deadline = time.time() + timeout
+    try:
+        while True:
+            fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                if os.path.exists(lock_path) and os.path.samestat(os.fstat(fd), os.stat(lock_path)):
+                    return fd, base + '.pickle', lock_path
+            except (FileNotFoundError, BlockingIOError):
+                pass
+            except Exception:
+                os.close(fd)
+                raise
+            os.close(fd)
+            if time.time() >= deadline:
+                return None
+            time.sleep(LOCK_POLL_SECONDS)
+    finally:
+        os.remove(marker)
+
+
+def _release(lock):
+    """Release a file lock.
+
+    Params:
+    -------
+    lock: tuple
+        Lock, as returned by _acquire.
+    """
+
+    fcntl.flock(lock[0], fcntl.LOCK_UN)
+    os.close(lock[0])
+
+
+def _has_waiters(lock):
+    """Check whether a process (other than the current thread) is waiting for a file lock.
+
+    Marker files of processes which don't exist anymore are removed.
+
+    Params:
+    -------
+    lock: tuple
+        Lock, as returned by _acquire.
+
+    Return:
+    -------
+    bool:
+        Whether there is a waiting process.
+    """
+
+    waiting = False
+    for marker in glob.glob(lock[2][:-len('.lock')] + '.*.wait'):
+        pid = int(os.path.basename(marker).split('.')[1].split('-')[0])
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            try:
+                os.remove(marker)
+            except FileNotFoundError:
+                pass
+            continue
+        except PermissionError:
+            pass
+        waiting = True
+    return waiting
+
+
+def _remove_files(lock):
+    """Remove the lock and result files of a file lock held by the current thread.
+
+    Params:
+    -------
+    lock: tuple
+        Lock, as returned by _acquire.
+    """
+
+    for path in (lock[1], lock[2]):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _read_result(lock, requested):
+    """Read the result of a computation in another process which finished while waiting for the lock.
+
+    Params:
+    -------
+    lock: tuple
+        Lock, as returned by _acquire.
+    requested: float
+        Time (as returned by time.time) when the lock was requested.
+
+    Return:
+    -------
+    tuple or None:
+        A tuple with the result as its only element, or None if no computation finished after the lock was requested.
+    """
+
+    path = lock[1]
+    try:
+        if os.path.getmtime(path) < requested:
+            return None
+        with open(path, 'rb') as f:
+            return pickle.load(f),
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def _write_result(lock, result):
+    """Write the result of a computation for other processes waiting for the lock.
+
+    The file is replaced atomically.
+
+    Params:
+    -------
+    lock: tuple
+        Lock, as returned by _acquire.
+    result: object
+        Result of the computation.
+    """
+
+    path = lock[1]
+    temporary_path = '{path}.{pid}.tmp'.format(path=path, pid=os.getpid())
+    with open(temporary_path, 'wb') as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, path)
@@ -0,0 +1,376 @@
+import filecmp
+import json
+import os
+import shutil
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from bokeh.embed import autoload_static
+from bokeh.model import Model
+from bokeh.resources import Resources
+from flask import current_app, render_template
+
+from app.main.data_quality import data_quality_item_render, data_quality_item, data_quality_item_content, \
+    data_quality_item_names, data_quality_page_packages, figure_html, item_fingerprint, PAGES_PACKAGE
+from app.main.datasets import DatasetPlan
+from app.main.render_cache import current_generation
+
+# directory of a snapshot containing the shared BokehJS files
+SNAPSHOT_STATIC_DIR = 'static'
+
+# name of the file in a page directory of a snapshot which records for what the page was rendered
+SNAPSHOT_STATE_FILE = 'snapshot.json'
+
+# maximum number of cached query results in the data cache directory of the worker processes
+SNAPSHOT_DATA_CACHE_SIZE = 100000
+
+# apps of the worker processes, keyed by config name
+_worker_apps = {}
+
+
+def snapshot(output_dir, start_date, end_date, config_name, processes=0, packages=None, force=False, log=None):
+    """Render data quality pages for a date range into a static HTML tree.
+
+    Every page is rendered into the file <page path>/index.html of the output directory, and the Bokeh figures of its
+    items into a JavaScript file <export name>.js each, which is loaded by a script tag in the HTML (see Bokeh's
+    autoload_static function). The BokehJS files are copied into the directory static once, and all pages use them. A
+    file index.html in the output directory links to all pages. So the tree can be opened with a browser from the
+    file system or served by any web server.
+
+    The items of a page are created with a dataset plan (see app.main.datasets.DatasetPlan), so that datasets shared
+    by several items are queried once. Dense plots are never rasterised and hover tooltips don't show frame details,
+    as there is no server to ask for them.
+
+    If processes is positive, the pages are rendered in a pool of that many worker processes, each with its own app
+    for the given config. Unless a cache for query results shared by processes is configured (i.e. the DATA_CACHE_SIZE
+    setting is positive and the DATA_CACHE_BACKEND setting isn't 'memory'), the worker processes cache query results
+    in the directory given by the SNAPSHOT_DATA_CACHE_DIR setting, which should be outside the output directory. As
+    query results are cached per night (see app.main.range_cache), a snapshot for a date range overlapping with that of
+    a previous snapshot only queries the nights not covered yet. Otherwise the pages are rendered in the current
+    process, with its app and settings.
+
+    A page is not rendered again if it has been rendered for the same date range, data generation (see
+    app.main.render_cache.current_generation) and item code already, unless force is True. Pages which can't be
+    rendered are logged and skipped.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    output_dir: str
+        Directory for the HTML tree. It is created if it doesn't exist.
+    start_date: date
+        Start of the date range (inclusive).
+    end_date: date
+        End of the date range (exclusive).
+    config_name: str
+        Name of the config for the apps of worker processes.
+    processes: int
+        Number of worker processes, or 0 for rendering the pages in the current process.
+    packages: list of str
+        Packages of the pages to render. By default all default data quality pages are rendered (see
+        app.main.data_quality.data_quality_page_packages).
+    force: bool
+        Whether to render pages even if they have been rendered for the same date range, generation and code already.
+    log: function
+        Function to call with a message for every page.
+
+    Return:
+    -------
+    OrderedDict:
+        The status of the pages ('rendered', 'unchanged' or 'failed'), keyed by package.
+    """
+
+    if packages is None:
+        packages = data_quality_page_packages()
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    assets = _copy_bokeh_files(output_dir)
+
+    statuses = OrderedDict()
+    if processes > 0:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = [(package, executor.submit(_snapshot_page_in_worker, config_name, output_dir, package,
+                                                 start_date, end_date, assets, force))
+                       for package in packages]
+            for package, result in results:
+                statuses[package] = _page_status(package, result.result, log)
+    else:
+        for package in packages:
+            statuses[package] = _page_status(package, lambda: _snapshot_page(output_dir, package, start_date,
+                                                                             end_date, assets, force), log)
+
+    pages = [dict(title=_page_path(package), href=_page_path(package) + '/index.html', status=status)
+             for package, status in statuses.items()]
+    with current_app.test_request_context():
+        html = render_template('snapshot/index.html', pages=pages, start_date=start_date, end_date=end_date)
+    _write_file(os.path.join(output_dir, 'index.html'), html)
+
+    return statuses
+
+
+def _page_status(package, render, log):
+    """Render a page of a snapshot and return its status.
+
+    Params:
+    -------
+    package: str
+        Package of the page.
+    render: function
+        Function rendering the page and returning its status.
+    log: function
+        Function to call with a message for the page.
+
+    Return:
+    -------
+    str:
+        The status ('rendered', 'unchanged' or 'failed').
+    """
+
+    try:
+        status = render()
+    except Exception as e:
+        current_app.logger.error('The page {package} could not be rendered: {error}'.format(package=package, error=e),
+                                 exc_info=1)
+        status = 'failed'
+    if log:
+        log('{package}: {status}'.format(package=package, status=status))
+    return status
+
+
+def _snapshot_page_in_worker(config_name, output_dir, package, start_date, end_date, assets, force):
+    """Render a page of a snapshot in a worker process.
+
+    The app for the config is created on first use in the process. See snapshot for the data cache of the app.
+
+    Params:
+    -------
+    config_name: str
+        Name of the app config.
+    output_dir: str
+        Output directory of the snapshot.
+    package: str
+        Package of the page.
+    start_date: date
+        Start of the date range (inclusive).
+    end_date: date
+        End of the date range (exclusive).
+    assets: dict
+        Names of the BokehJS files in the static directory, as returned by _copy_bokeh_files.
+    force: bool
+        Whether to render the page even if it is unchanged.
+
+    Return:
+    -------
+    str:
+        The status of the page ('rendered' or 'unchanged').
+    """
+
+    # importing at the top would be circular, as the app imports this module's blueprint
+    from app import create_app
+
+    if config_name not in _worker_apps:
+        app = create_app(config_name)
+        if app.config['SNAPSHOT_DATA_CACHE_DIR'] and \
+                (app.config['DATA_CACHE_SIZE'] <= 0 or app.config['DATA_CACHE_BACKEND'] == 'memory'):
+            app.config['DATA_CACHE_BACKEND'] = 'filesystem'
+            app.config['DATA_CACHE_LOCATION'] = os.path.abspath(app.config['SNAPSHOT_DATA_CACHE_DIR'])
+            app.config['DATA_CACHE_SIZE'] = SNAPSHOT_DATA_CACHE_SIZE
+        _worker_apps[config_name] = app
+    with _worker_apps[config_name].app_context():
+        return _snapshot_page(output_dir, package, start_date, end_date, assets, force)
+
+
+def _snapshot_page(output_dir, package, start_date, end_date, assets, force):
+    """Render a page of a snapshot.
+
+    This function must be called within a Flask app context.
+
+    Params:
+    -------
+    output_dir: str
+        Output directory of the snapshot.
+    package: str
+        Package of the page.
+    start_date: date
+        Start of the date range (inclusive).
+    end_date: date
+        End of the date range (exclusive).
+    assets: dict
+        Names of the BokehJS files in the static directory, as returned by _copy_bokeh_files.
+    force: bool
+        Whether to render the page even if it is unchanged.
+
+    Return:
+    -------
+    str:
+        The status of the page ('rendered' or 'unchanged').
+    """
+
+    page_dir = os.path.join(output_dir, *_page_path(package).split('/'))
+    names = data_quality_item_names(package)
+    generation = current_generation(refresh=True)
+    state = dict(start_date=str(start_date),
+                 end_date=str(end_date),
+                 generation=generation,
+                 fingerprints={name: item_fingerprint(package, name) for name in names})
+    if not force and generation is not None and _read_state(page_dir) == state:
+        return 'unchanged'
+
+    plan = DatasetPlan(package)
+    for name in names:
+        plan.add_item(name, data_quality_item(package, name)[1].get('inputs', ()), start_date, end_date)
+    app = current_app._get_current_object()
+    with ThreadPoolExecutor(max_workers=max(current_app.config['ITEM_MAX_PARALLELISM'], 1)) as executor:
+        items = list(executor.map(lambda name: plan.run(name, _snapshot_item, app, package, name, start_date,
+                                                        end_date),
+                                  names))
+
+    os.makedirs(page_dir, exist_ok=True)
+    # autoload scripts mustn't load BokehJS, as the page includes it already
+    no_resources = Resources(mode='cdn', components=[])
+    figures = []
+    for name, item in zip(names, items):
+        details = data_quality_item(package, name)[1]
+        export_name = details.get('export_name') or name
+        if isinstance(item, Model):
+            filename = '{export_name}.js'.format(export_name=export_name)
+            js, content = autoload_static(item, no_resources, filename)
+            _write_file(os.path.join(page_dir, filename), js)
+        else:
+            content = data_quality_item_content(item)
+        figures.append(figure_html(content, caption=details.get('caption'), export_name=export_name))
+
+    static_dir = os.path.relpath(os.path.join(output_dir, SNAPSHOT_STATIC_DIR), page_dir)
+    with current_app.test_request_context():
+        html = render_template('snapshot/page.html',
+                               title=_page_path(package),
+                               figures=figures,
+                               start_date=start_date,
+                               end_date=end_date,
+                               js_files=[static_dir + '/' + f for f in assets['js']],
+                               css_files=[static_dir + '/' + f for f in assets['css']],
+                               index=os.path.relpath(os.path.join(output_dir, 'index.html'), page_dir))
+    _write_file(os.path.join(page_dir, 'index.html'), html)
+    _write_file(os.path.join(page_dir, SNAPSHOT_STATE_FILE), json.dumps(state, indent=2, sort_keys=True))
+    plan.record()
+
+    return 'rendered'
+
+
+def _snapshot_item(app, package, name, start_date, end_date):
+    """Create a data quality item for a snapshot.
+
+    Items with a plot spec are created without rasterisation and without frame details, as there is no server to
+    rasterise or to look up frame details.
+
+    This function may be called in a thread other than the one which created the snapshot.
+
+    Params:
+    -------
+    app: Flask
+        Flask app.
+    package: str
+        Package containing the item.
+    name: str
+        Name of the item.
+    start_date: date
+        Start of the date range (inclusive).
+    end_date: date
+        End of the date range (exclusive).
+
+    Return:
+    -------
+    object:
+        The data quality item, usually a Bokeh model.
+    """
+
+    with app.app_context():
+        func = data_quality_item(package, name)[0]
+        render = data_quality_item_render(package, name, frame_details=False)
+        result = func(start_date=start_date, end_date=end_date)
+        return render(result) if render is not None else result
+
+
+def _copy_bokeh_files(output_dir):
+    """Copy the BokehJS JavaScript and CSS files into the static directory of a snapshot.
+
+    Files which exist with the same content already are left unchanged.
+
+    Params:
+    -------
+    output_dir: str
+        Output directory of the snapshot.
+
+    Return:
+    -------
+    dict:
+        The names of the JavaScript files (as js) and CSS files (as css) in the static directory.
+    """
+
+    static_dir = os.path.join(output_dir, SNAPSHOT_STATIC_DIR)
+    os.makedirs(static_dir, exist_ok=True)
+    resources = Resources(mode='absolute')
+    assets = dict(js=[], css=[])
+    for kind, paths in (('js', resources.js_files), ('css', resources.css_files)):
+        for path in paths:
+            target = os.path.join(static_dir, os.path.basename(path))
+            if not os.path.exists(target) or not filecmp.cmp(path, target, shallow=False):
+                shutil.copyfile(path, target)
+            assets[kind].append(os.path.basename(path))
+    return assets
+
+
+def _page_path(package):
+    """Return the path of a page, relative to the pages package.
+
+    Params:
+    -------
+    package: str
+        Package of the page.
+
+    Return:
+    -------
+    str:
+        The path, such as 'instrument/hrs/red/bias'.
+    """
+
+    return package[len(PAGES_PACKAGE) + 1:].replace('.', '/')
+
+
+def _read_state(page_dir):
+    """Return the recorded date range, generation and item fingerprints of a rendered page.
+
+    Params:
+    -------
+    page_dir: str
+        Directory of the page.
+
+    Return:
+    -------
+    dict or None:
+        The state, or None if the page hasn't been rendered.
+    """
+
+    try:
+        with open(os.path.join(page_dir, SNAPSHOT_STATE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_file(path, content):
+    """Write a file atomically.
+
+    Params:
+    -------
+    path: str
+        File path.
+    content: str
+        File content.
+    """
+
+    tmp_path = '{path}.{pid}.tmp'.format(path=path, pid=os.getpid())
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
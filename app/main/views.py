@@ -1,13 +1,29 @@
 import importlib
 
-from flask import render_template
-from werkzeug.exceptions import NotFound
+from dateutil import parser
+from flask import current_app, jsonify, render_template, request, Response, stream_with_context
+from itsdangerous import BadSignature
+from werkzeug.exceptions import BadRequest, NotAcceptable, NotFound
 
+from app.decorators import admin_required
 from . import main
+from .cache_backends import backend_stats
+from .data_api import data_format, DATA_API_ROUTE, DATA_EXPORT_ROUTE, DATA_FORMATS, encode_frames, export_items, \
+    has_item_data, item_frames
+from .data_quality import data_quality_item, data_quality_item_names, PAGES_PACKAGE
+from .datasets import recent_plans
+from .figure_export import export_figures, FIGURE_EXPORT_ROUTE, FIGURE_FORMATS
+from .frame_details import frame_details, FRAME_DETAILS_ROUTE
+from .plot_specs import render_plot, PLOT_ROUTE
+from .rasterisation import raster_region, RASTER_ROUTE
+from .scheduling import item_cost_table
 
 
 DATA_QUALITY_ROUTE = '/data-quality/'
 
+# MIME types of the formats in which plots with a plot spec can be served
+PLOT_MIME_TYPES = dict(csv='text/csv', json='application/json', png='image/png')
+
 
 @main.route('/')
 def index():
@@ -36,3 +52,325 @@ def data_quality_page(page):
         traceback.print_exc()
         raise NotFound
     return render_template('data_quality/data_quality_page.html', title=dq.title(), content=dq.content())
+
+
+@main.route(FRAME_DETAILS_ROUTE + '<int:file_data_id>')
+def frame_details_lookup(file_data_id):
+    """Serve the details of a frame as JSON.
+
+    The JSON object has the FileData_Id as its FileData_Id property and a list of [name, value] pairs as its values
+    property. See the function app.main.frame_details.frame_details for the included details.
+
+    Params:
+    -------
+    file_data_id: int
+        FileData_Id of the frame.
+
+    """
+
+    details = frame_details(file_data_id)
+    if details is None:
+        raise NotFound
+    return jsonify(FileData_Id=file_data_id, values=[list(name_value) for name_value in details])
+
+
+@main.route(RASTER_ROUTE + '<token>')
+def raster_lookup(token):
+    """Serve the data for the visible region of a rasterised plot as JSON.
+
+    The visible region must be given by the query parameters x_start, x_end, y_start and y_end. See the function
+    app.main.rasterisation.raster_region for the returned JSON object.
+
+    Params:
+    -------
+    token: str
+        Token describing the plotted data, as created by app.main.rasterisation.dense_scatter.
+
+    """
+
+    try:
+        region = [float(request.args[name]) for name in ('x_start', 'x_end', 'y_start', 'y_end')]
+    except (KeyError, ValueError):
+        raise BadRequest('The query parameters x_start, x_end, y_start and y_end must be numbers.')
+    try:
+        return jsonify(raster_region(token, *region))
+    except BadSignature:
+        raise NotFound
+
+
+@main.route(PLOT_ROUTE + '<path:page>/<name>.<any(csv, json, png):output_format>')
+def plot_output(page, name, output_format):
+    """Serve a data quality item with a plot spec as CSV, JSON or PNG.
+
+    The date range must be given by the query parameters start_date (inclusive) and end_date (exclusive). See the
+    module app.main.plot_specs for the content of the formats.
+
+    Params:
+    -------
+    page: str
+        Path of the directory containing the page content, as for data quality pages.
+    name: str
+        Name of the item, as used in its data_quality decorator.
+    output_format: str
+        Output format ('csv', 'json' or 'png').
+
+    """
+
+    package, func, details = _page_item(page, name)
+    if details.get('spec') is None:
+        raise NotFound
+    start_date, end_date = _date_range_arguments()
+
+    df = func(start_date=start_date, end_date=end_date)
+    return Response(render_plot(details['spec'], df, output_format), mimetype=PLOT_MIME_TYPES[output_format])
+
+
+@main.route(DATA_API_ROUTE + '<path:page>/<name>')
+def item_data(page, name):
+    """Serve the data of a data quality item as JSON, CSV, Apache Arrow IPC stream or NumPy .npz archive.
+
+    The date range must be given by the query parameters start_date (inclusive) and end_date (exclusive). The format is
+    chosen with the format query parameter ('json', 'csv', 'arrow' or 'npz') or, if this is missing, the Accept
+    header. The data is streamed without creating the item's content, so that only items with a render function or
+    plot spec are available. See the module app.main.data_api for the content of the formats.
+
+    Params:
+    -------
+    page: str
+        Path of the directory containing the page content, as for data quality pages.
+    name: str
+        Name of the item, as used in its data_quality decorator.
+
+    """
+
+    package, func, details = _page_item(page, name)
+    if not has_item_data(details):
+        raise NotFound('The data quality item {name} has no data separate from its plot.'.format(name=name))
+    start_date, end_date = _date_range_arguments()
+    output_format = data_format(request.args.get('format'), request.accept_mimetypes)
+    if output_format is None:
+        raise NotAcceptable('The supported formats are {formats}.'.format(formats=', '.join(DATA_FORMATS)))
+
+    frames = item_frames(package, name, start_date, end_date)
+    response = Response(stream_with_context(encode_frames(frames, output_format)),
+                        mimetype=DATA_FORMATS[output_format])
+    response.headers['Content-Disposition'] = 'attachment; filename={filename}.{extension}'\
+        .format(filename=details['export_name'], extension=output_format)
+    response.headers['Vary'] = 'Accept'
+    return response
+
+
+@main.route(DATA_EXPORT_ROUTE + '<path:page>')
+def export_data(page):
+    """Serve the data of several data quality items of a page as a zip archive.
+
+    The date range must be given by the query parameters start_date (inclusive) and end_date (exclusive). The items
+    may be chosen with the items query parameter, a comma-separated list of item names; by default all the items of
+    the page with data separate from their plot are included. The format of the files in the archive is chosen with
+    the format query parameter ('json', 'csv', 'arrow' or 'npz'), and it defaults to 'csv'. Datasets shared by the
+    items are queried once only. See the function app.main.data_api.export_items for the content of the archive.
+
+    Params:
+    -------
+    page: str
+        Path of the directory containing the page content, as for data quality pages.
+
+    """
+
+    package, names = _page_package(page)
+    if request.args.get('items'):
+        names = _item_names_argument(page)
+        for name in names:
+            _, _, details = _page_item(page, name)
+            if not has_item_data(details):
+                raise NotFound('The data quality item {name} has no data separate from its plot.'.format(name=name))
+    else:
+        names = [name for name in names if has_item_data(data_quality_item(package, name)[1])]
+    if not names:
+        raise NotFound('The page has no data quality items with data separate from their plot.')
+    start_date, end_date = _date_range_arguments()
+    output_format = request.args.get('format', 'csv')
+    if output_format not in DATA_FORMATS:
+        raise NotAcceptable('The supported formats are {formats}.'.format(formats=', '.join(DATA_FORMATS)))
+
+    response = Response(stream_with_context(export_items(package, names, start_date, end_date, output_format)),
+                        mimetype='application/zip')
+    response.headers['Content-Disposition'] = 'attachment; filename={page}_{start}_{end}.zip'\
+        .format(page=package.rsplit('.', 1)[-1], start=start_date, end=end_date)
+    return response
+
+
+@main.route(FIGURE_EXPORT_ROUTE + '<path:page>')
+def export_figure_images(page):
+    """Serve images of the figures of a page as a zip archive.
+
+    The date range must be given by the query parameters start_date (inclusive) and end_date (exclusive). The items
+    may be chosen with the items query parameter, a comma-separated list of item names; by default all the items of
+    the page are included. The image format is chosen with the format query parameter ('png' or 'svg'), and it
+    defaults to 'png'. The images are rendered on the server, without a browser. See the function
+    app.main.figure_export.export_figures for the content of the archive.
+
+    Params:
+    -------
+    page: str
+        Path of the directory containing the page content, as for data quality pages.
+
+    """
+
+    package, names = _page_package(page)
+    if request.args.get('items'):
+        names = _item_names_argument(page)
+    start_date, end_date = _date_range_arguments()
+    output_format = request.args.get('format', 'png')
+    if output_format not in FIGURE_FORMATS:
+        raise NotAcceptable('The supported formats are {formats}.'.format(formats=', '.join(FIGURE_FORMATS)))
+
+    response = Response(stream_with_context(export_figures(package, names, start_date, end_date, output_format)),
+                        mimetype='application/zip')
+    response.headers['Content-Disposition'] = 'attachment; filename={page}_figures_{start}_{end}.zip'\
+        .format(page=package.rsplit('.', 1)[-1], start=start_date, end=end_date)
+    return response
+
+
+@main.route('/admin/item-costs')
+@admin_required
+def item_costs():
+    """Serve the recorded render times of the data quality items as JSON.
+
+    The JSON object has a list of the moving averages of the render times as its costs property. See the function
+    app.main.scheduling.item_cost_table for the properties of the list items. The render times are recorded per server
+    process, so that different requests may get different results. Only administrators (see the ADMIN_USERS setting)
+    may access this route.
+
+    """
+
+    return jsonify(costs=item_cost_table())
+
+
+@main.route('/admin/cache-stats')
+@admin_required
+def cache_stats():
+    """Serve the hit and miss counts of the cache backends as JSON.
+
+    The JSON object has a list of the counts as its backends property. See the function
+    app.main.cache_backends.backend_stats for the properties of the list items. The counts are recorded per server
+    process, so that different requests may get different results. Only administrators (see the ADMIN_USERS setting)
+    may access this route.
+
+    """
+
+    return jsonify(backends=backend_stats())
+
+
+@main.route('/admin/datasets')
+@admin_required
+def dataset_plans():
+    """Serve the dataset plans of the most recently created pages as JSON.
+
+    The JSON object has a list of the plan summaries as its plans property, most recent first. See the method
+    app.main.datasets.DatasetPlan.summary for the properties of the list items, which include the graph of datasets and
+    items in the DOT language and show which queries were shared by several items. The plans are recorded per server
+    process, so that different requests may get different results. Only administrators (see the ADMIN_USERS setting)
+    may access this route.
+
+    """
+
+    return jsonify(plans=recent_plans())
+
+
+def _page_item(page, name):
+    """Return the package, function and details of a data quality item of a page.
+
+    A NotFound exception is raised if there is no such page or item.
+
+    Params:
+    -------
+    page: str
+        Path of the directory containing the page content, as for data quality pages.
+    name: str
+        Name of the item, as used in its data_quality decorator.
+
+    Return:
+    -------
+    tuple:
+        The package, the item function and the item details.
+    """
+
+    package, _ = _page_package(page)
+    try:
+        func, details = data_quality_item(package, name)
+    except KeyError:
+        raise NotFound
+    return package, func, details
+
+
+def _page_package(page):
+    """Return the package and the names of the data quality items of a page.
+
+    A NotFound exception is raised if there is no such page.
+
+    Params:
+    -------
+    page: str
+        Path of the directory containing the page content, as for data quality pages.
+
+    Return:
+    -------
+    tuple:
+        The package and the list of item names, in the order of the page's content.txt file.
+    """
+
+    package = PAGES_PACKAGE + '.' + page.strip('/').replace('/', '.')
+    try:
+        importlib.import_module(package)
+        return package, data_quality_item_names(package)
+    except (ImportError, IOError, ValueError):
+        raise NotFound
+
+
+def _item_names_argument(page):
+    """Return the item names given by the items query parameter.
+
+    A NotFound exception is raised if the page has no item with one of the names.
+
+    Params:
+    -------
+    page: str
+        Path of the directory containing the page content, as for data quality pages.
+
+    Return:
+    -------
+    list of str:
+        The names, in the order of the query parameter.
+    """
+
+    names = [name.strip() for name in request.args['items'].split(',') if name.strip()]
+    for name in names:
+        _page_item(page, name)
+    return names
+
+
+def _date_range_arguments():
+    """Return the date range given by the start_date and end_date query parameters.
+
+    A BadRequest exception is raised if the query parameters are missing or aren't dates, if the start date isn't
+    earlier than the end date or if the date range is longer than the number of days given by the
+    MAX_DATE_RANGE_DAYS setting.
+
+    Return:
+    -------
+    tuple:
+        The start date (inclusive) and end date (exclusive).
+    """
+
+    try:
+        start_date = parser.parse(request.args['start_date']).date()
+        end_date = parser.parse(request.args['end_date']).date()
+    except (KeyError, ValueError, OverflowError):
+        raise BadRequest('The query parameters start_date and end_date must be dates.')
+    if start_date >= end_date:
+        raise BadRequest('The start date must be earlier than the end date.')
+    max_days = current_app.config['MAX_DATE_RANGE_DAYS']
+    if (end_date - start_date).days > max_days:
+        raise BadRequest('The date range must not be longer than {days} days.'.format(days=max_days))
+    return start_date, end_date
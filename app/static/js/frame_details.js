@@ -0,0 +1,110 @@
+/**
+ * On-demand frame details for Bokeh plots.
+ *
+ * The plots only include the FileData_Id of each frame. The details of a frame are requested from the frame details
+ * route when its point is hovered over or tapped, and are cached in the browser.
+ */
+var frameDetails = (function($) {
+    var cache = {};
+    var lastHovered = {};
+
+    /**
+     * Return a promise for the details of a frame.
+     */
+    function fetch(url, fileDataId) {
+        if (!cache[fileDataId]) {
+            cache[fileDataId] = $.getJSON(url + fileDataId).fail(function() {
+                delete cache[fileDataId];
+            });
+        }
+        return cache[fileDataId];
+    }
+
+    /**
+     * Return the indices of the points in a hit test result or selection.
+     */
+    function indices(result) {
+        if (!result) {
+            return [];
+        }
+        return result.indices || (result['1d'] && result['1d'].indices) || [];
+    }
+
+    /**
+     * Return the value of a frame detail.
+     */
+    function value(details, name) {
+        for (var i = 0; i < details.values.length; i++) {
+            if (details.values[i][0] === name) {
+                return details.values[i][1];
+            }
+        }
+        return null;
+    }
+
+    function escape(text) {
+        return $('<div>').text(text === null ? '' : String(text)).html();
+    }
+
+    /**
+     * Show the file name and UTStart of a hovered frame in the panel.
+     */
+    function hover(source, cbData, panel, url) {
+        var hovered = indices(cbData.index);
+        if (hovered.length === 0) {
+            return;
+        }
+        var fileDataId = source.data['FileData_Id'][hovered[0]];
+        if (lastHovered[panel.id] === fileDataId || panel.tappedId) {
+            return;
+        }
+        lastHovered[panel.id] = fileDataId;
+        fetch(url, fileDataId).done(function(details) {
+            if (lastHovered[panel.id] !== fileDataId || panel.tappedId) {
+                return;
+            }
+            panel.text = '<p><strong>' + escape(value(details, 'FileName')) + '</strong> ' +
+                escape(value(details, 'UTStart')) + ' <em>(tap the point for all details)</em></p>';
+        });
+    }
+
+    /**
+     * List all details of a tapped frame in the panel.
+     */
+    function tap(sources, panel, url) {
+        for (var i = 0; i < sources.length; i++) {
+            var selected = indices(sources[i].selected);
+            if (selected.length > 0) {
+                showDetails(panel, url, sources[i].data['FileData_Id'][selected[0]]);
+                return;
+            }
+        }
+        panel.tappedId = null;
+    }
+
+    /**
+     * Fetch the details of a frame and list them in the panel.
+     */
+    function showDetails(panel, url, fileDataId) {
+        panel.tappedId = fileDataId;
+        panel.text = '<p>Loading details for frame ' + escape(fileDataId) + '...</p>';
+        fetch(url, fileDataId).done(function(details) {
+            if (panel.tappedId !== fileDataId) {
+                return;
+            }
+            var rows = details.values.map(function(nameValue) {
+                return '<tr><th>' + escape(nameValue[0]) + '</th><td>' + escape(nameValue[1]) + '</td></tr>';
+            });
+            panel.text = '<table class="table table-condensed frame-details-table">' + rows.join('') + '</table>';
+        }).fail(function() {
+            if (panel.tappedId === fileDataId) {
+                panel.text = '<p>The details for frame ' + escape(fileDataId) + ' could not be loaded.</p>';
+            }
+        });
+    }
+
+    return {
+        hover: hover,
+        tap: tap
+    };
+})(jQuery);
@@ -0,0 +1,99 @@
+/**
+ * Re-rasterisation of dense scatter plots.
+ *
+ * Dense scatter plots are rendered as an image on the server. When the user zooms or pans, the data for the visible
+ * region is requested from the raster route. The response contains either a new image or, if the region contains few
+ * enough points, the points themselves, which are shown by the plot's scatter renderer.
+ */
+var rasterisation = (function($) {
+    // milliseconds to wait for further range changes before requesting data
+    var DELAY = 300;
+
+    var states = {};
+
+    /**
+     * Replace the data of a column data source with data serialised by Bokeh.
+     */
+    function setData(source, data) {
+        var decoded = Bokeh.require('core/util/serialization').decode_column_data(data);
+        source.setv({_shapes: decoded[1], data: decoded[0]});
+    }
+
+    /**
+     * Remove all rows from a column data source.
+     */
+    function clear(source) {
+        var data = {};
+        for (var column in source.data) {
+            if (source.data.hasOwnProperty(column)) {
+                data[column] = [];
+            }
+        }
+        source.setv({_shapes: {}, data: data});
+    }
+
+    /**
+     * Schedule an update of a plot after a range change.
+     */
+    function update(imageSource, scatterSource, xRange, yRange, url) {
+        var state = states[imageSource.id];
+        if (!state) {
+            // remember the initial image, which shows all the data
+            state = states[imageSource.id] = {
+                data: imageSource.data,
+                shapes: imageSource._shapes,
+                x0: imageSource.data.x[0],
+                x1: imageSource.data.x[0] + imageSource.data.dw[0],
+                y0: imageSource.data.y[0],
+                y1: imageSource.data.y[0] + imageSource.data.dh[0],
+                showsAll: true,
+                timeout: null,
+                request: 0
+            };
+        }
+        clearTimeout(state.timeout);
+        state.timeout = setTimeout(function() {
+            refresh(state, imageSource, scatterSource, xRange, yRange, url);
+        }, DELAY);
+    }
+
+    /**
+     * Show the data for the visible region of a plot.
+     */
+    function refresh(state, imageSource, scatterSource, xRange, yRange, url) {
+        var xStart = Math.min(xRange.start, xRange.end);
+        var xEnd = Math.max(xRange.start, xRange.end);
+        var yStart = Math.min(yRange.start, yRange.end);
+        var yEnd = Math.max(yRange.start, yRange.end);
+        var request = ++state.request;
+
+        // the initial image can be used if all the data is visible
+        if (xStart <= state.x0 && xEnd >= state.x1 && yStart <= state.y0 && yEnd >= state.y1) {
+            if (!state.showsAll) {
+                imageSource.setv({_shapes: state.shapes, data: state.data});
+                clear(scatterSource);
+                state.showsAll = true;
+            }
+            return;
+        }
+
+        var params = {x_start: xStart, x_end: xEnd, y_start: yStart, y_end: yEnd};
+        $.getJSON(url, params).done(function(response) {
+            if (request !== state.request) {
+                return;
+            }
+            if (response.mode === 'image') {
+                setData(imageSource, response.data);
+                clear(scatterSource);
+            } else {
+                setData(scatterSource, response.data);
+                clear(imageSource);
+            }
+            state.showsAll = false;
+        });
+    }
+
+    return {
+        update: update
+    };
+})(jQuery);
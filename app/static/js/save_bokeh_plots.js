@@ -1,22 +1,28 @@
 (function($) {
     $(document).ready(function() {
         $('button.save-plots').click(function() {
+            // let the server render all figures if it can, so that the browser needn't have rendered them
+            var exportUrl = $(this).attr('data-export-url');
+            if (exportUrl) {
+                window.location.href = exportUrl;
+                return;
+            }
+
             var zip = new JSZip();
 
             $('figure.data-quality-item').each(function(index, element) {
                 var exportName = $(element).attr('data-export-name');
 
-                $('canvas.bk-canvas').each(function(index, element) {
-                    var url = this.toDataURL("application/pdf");
+                // only the canvas of this figure belongs to its image
+                var canvas = $(element).find('canvas.bk-canvas').get(0);
+                if (canvas) {
+                    var url = canvas.toDataURL('image/png');
                     zip.file(exportName + '.png', url.substr(url.indexOf(',') + 1), {base64: true});
-                });
+                }
             });
 
             var content = zip.generate({type: 'blob'});
-            console.log(zip);
             saveAs(content, 'plots.zip');
         });
     });
 })(jQuery);
-
-
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+"""Benchmark for building Bokeh figures from templates.
+
+The figures of the HRS temperature plots and of the HRS arc plots (AVG(DeltaX) scatter plots and nightly heatmaps) are
+built without any data, once with Bokeh's figure function and a new tick formatter (as the plots did before figure
+templates were introduced) and once with app.main.figure_templates.template_figure, which builds the figure with
+Bokeh's public API from keyword arguments prepared once per process. The mean build time per figure is reported for
+both variants.
+
+The templates are built before the timed runs, as they persist for the lifetime of the server process.
+
+Example:
+
+    python benchmarks/figure_templates.py --figures 500
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from bokeh.models.formatters import DatetimeTickFormatter
+from bokeh.plotting import figure
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main.figure_templates import DATE_FORMATS, PLOT_TOOLS, template_figure
+
+
+def fresh_temperature_figure():
+    """Build the figure of an HRS temperature plot with Bokeh's figure function.
+
+    Return:
+    -------
+    Figure:
+        The figure.
+    """
+
+    p = figure(title='HRS Temperature', x_axis_label='Date', y_axis_label='Temperature (K)',
+               x_axis_type='datetime', tools=PLOT_TOOLS)
+    p.xaxis[0].formatter = DatetimeTickFormatter(**DATE_FORMATS)
+    return p
+
+
+def template_temperature_figure():
+    """Build the figure of an HRS temperature plot from a template.
+
+    Return:
+    -------
+    Figure:
+        The figure.
+    """
+
+    return template_figure(title='HRS Temperature', x_axis_label='Date', y_axis_label='Temperature (K)')
+
+
+def fresh_arc_figure():
+    """Build the figure of an HRS arc plot with Bokeh's figure function.
+
+    Return:
+    -------
+    Figure:
+        The figure.
+    """
+
+    p = figure(title='High Resolution', x_axis_label='Date', y_axis_label='AVG(DeltaX)', x_axis_type='datetime',
+               tools=PLOT_TOOLS)
+    p.xaxis[0].formatter = DatetimeTickFormatter(**DATE_FORMATS)
+    return p
+
+
+def template_arc_figure():
+    """Build the figure of an HRS arc plot from a template.
+
+    Return:
+    -------
+    Figure:
+        The figure.
+    """
+
+    return template_figure(title='High Resolution', x_axis_label='Date', y_axis_label='AVG(DeltaX)')
+
+
+def fresh_heatmap_figure():
+    """Build the figure of an HRS arc heatmap with Bokeh's figure function.
+
+    Return:
+    -------
+    Figure:
+        The figure.
+    """
+
+    p = figure(title='High Resolution (Nightly Average)', x_axis_label='Night', y_axis_label='HrsOrder',
+               x_axis_type='datetime', tools=PLOT_TOOLS)
+    p.xaxis[0].formatter = DatetimeTickFormatter(**DATE_FORMATS)
+    return p
+
+
+def template_heatmap_figure():
+    """Build the figure of an HRS arc heatmap from a template.
+
+    Return:
+    -------
+    Figure:
+        The figure.
+    """
+
+    return template_figure(title='High Resolution (Nightly Average)', x_axis_label='Night', y_axis_label='HrsOrder')
+
+
+def time_builds(build, figures, repeats):
+    """Build a number of figures and return the fastest mean build time.
+
+    Params:
+    -------
+    build: function
+        Function building a figure.
+    figures: int
+        Number of figures per timed run.
+    repeats: int
+        Number of timed runs.
+
+    Return:
+    -------
+    float:
+        The fastest mean time per figure (in seconds).
+    """
+
+    build()
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(figures):
+            build()
+        duration = (time.perf_counter() - start) / figures
+        best = duration if best is None else min(best, duration)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark building Bokeh figures from templates.')
+    parser.add_argument('--figures', type=int, default=200, help='number of figures per timed run')
+    parser.add_argument('--repeats', type=int, default=3, help='number of timed runs per variant')
+    args = parser.parse_args()
+
+    plots = [('HRS temperature', fresh_temperature_figure, template_temperature_figure),
+             ('HRS arc', fresh_arc_figure, template_arc_figure),
+             ('HRS arc heatmap', fresh_heatmap_figure, template_heatmap_figure)]
+    for name, fresh, templated in plots:
+        fresh_time = time_builds(fresh, args.figures, args.repeats)
+        template_time = time_builds(templated, args.figures, args.repeats)
+        print('{name}: figure function {fresh:.2f} ms, template {template:.2f} ms ({speedup:.1f}x)'
+              .format(name=name, fresh=1000 * fresh_time, template=1000 * template_time,
+                      speedup=fresh_time / template_time))
+
+
+if __name__ == '__main__':
+    main()
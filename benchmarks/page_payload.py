@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+"""Benchmark for the size and parse time of the plot data embedded in a page.
+
+A data frame resembling the data of a large HRS temperature page (UTStart, a temperature and a file name per frame)
+is generated, and a scatter plot like those on the HRS temperature page is created for it, once with the columns
+passed to Bokeh as Python lists (so that they are serialised as JSON lists) and once with column_data_source (so that
+numeric and datetime columns are serialised as base64 encoded binary buffers) and once rasterised on the server (so
+that only an image of constant size is embedded).
+
+For both variants the size of the serialised Bokeh document (which is what is embedded in the page) and the time
+needed for serialising it are reported. If Node.js is available, the time for parsing the document JSON and decoding
+the binary buffers in JavaScript, as done by BokehJS in the browser, is reported as well.
+
+Example:
+
+    python benchmarks/page_payload.py --rows 200000
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from bokeh.document import Document
+from bokeh.plotting import figure, ColumnDataSource
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main.data_quality_plots import column_data_source
+from app.main.rasterisation import rasterise, RASTER_CELL_SIZE
+
+# JavaScript for parsing a document and decoding its binary buffers, as BokehJS does
+PARSE_SCRIPT = """
+var fs = require('fs');
+var text = fs.readFileSync(process.argv[2], 'utf8');
+var best = null;
+for (var i = 0; i < %(repeats)d; i++) {
+    var start = process.hrtime();
+    var doc = JSON.parse(text);
+    doc.roots.references.forEach(function (reference) {
+        var data = reference.attributes.data;
+        if (!data) {
+            return;
+        }
+        Object.keys(data).forEach(function (column) {
+            var array = data[column];
+            if (array && array.__ndarray__) {
+                var buffer = Buffer.from(array.__ndarray__, 'base64');
+                var bytes = buffer.buffer.slice(buffer.byteOffset, buffer.byteOffset + buffer.length);
+                var types = {float32: Float32Array, float64: Float64Array, int32: Int32Array};
+                data[column] = new (types[array.dtype] || Uint8Array)(bytes);
+            }
+        });
+    });
+    var duration = process.hrtime(start);
+    var seconds = duration[0] + duration[1] / 1e9;
+    best = best === null ? seconds : Math.min(best, seconds);
+}
+console.log(best);
+"""
+
+
+def generate_data(rows):
+    """Generate HRS temperature data.
+
+    Params:
+    -------
+    rows: int
+        Number of rows to generate.
+
+    Return:
+    -------
+    DataFrame:
+        The generated data.
+    """
+
+    seconds = np.sort(np.random.randint(0, 365 * 24 * 3600, size=rows))
+    ut_start = pd.Timestamp('2017-01-01') + pd.to_timedelta(seconds, unit='s')
+    file_names = ['R{date}{number:04d}.fits'.format(date=t.strftime('%Y%m%d'), number=i % 1000)
+                  for i, t in enumerate(ut_start)]
+    df = pd.DataFrame(dict(UTStart=ut_start,
+                           TEMP=(np.random.normal(loc=290, scale=0.5, size=rows)).astype(np.float32),
+                           FileName=pd.Categorical(file_names)))
+    return df
+
+
+def list_data_source(df):
+    """Create a column data source with all columns as Python lists.
+
+    Params:
+    -------
+    df: DataFrame
+        Data frame.
+
+    Return:
+    -------
+    ColumnDataSource:
+        The column data source.
+    """
+
+    data = {column: df[column].astype(object if column == 'FileName' else df[column].dtype).tolist()
+            for column in df.columns}
+    data['index'] = df.index.tolist()
+    return ColumnDataSource(data=data)
+
+
+def document_json(source):
+    """Create a temperature plot for a column data source and return the serialised document.
+
+    Params:
+    -------
+    source: ColumnDataSource
+        Column data source.
+
+    Return:
+    -------
+    str:
+        The serialised document.
+    """
+
+    p = figure(title='HRS Temperature', x_axis_label='Date', y_axis_label='Temperature (K)', x_axis_type='datetime')
+    p.scatter(source=source, x='UTStart', y='TEMP', color='blue', fill_alpha=0.2, size=12)
+    doc = Document()
+    doc.add_root(p)
+    return doc.to_json_string()
+
+
+def raster_document_json(df):
+    """Create a rasterised temperature plot for a data frame and return the serialised document.
+
+    Params:
+    -------
+    df: DataFrame
+        Data frame.
+
+    Return:
+    -------
+    str:
+        The serialised document.
+    """
+
+    p = figure(title='HRS Temperature', x_axis_label='Date', y_axis_label='Temperature (K)', x_axis_type='datetime')
+    image_data = rasterise(df, 'UTStart', 'TEMP', 'blue', p.plot_width // RASTER_CELL_SIZE,
+                           p.plot_height // RASTER_CELL_SIZE)
+    p.image_rgba(source=ColumnDataSource(data=image_data), image='image', x='x', y='y', dw='dw', dh='dh')
+    doc = Document()
+    doc.add_root(p)
+    return doc.to_json_string()
+
+
+def time_serialisation(df, create_document, repeats):
+    """Serialise a plot for a data frame and return the fastest time and the serialised document.
+
+    Params:
+    -------
+    df: DataFrame
+        Data frame.
+    create_document: function
+        Function creating the serialised document for a data frame.
+    repeats: int
+        Number of timed runs.
+
+    Return:
+    -------
+    tuple:
+        The fastest time (in seconds) and the serialised document.
+    """
+
+    best = None
+    text = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        text = create_document(df)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best, text
+
+
+def time_parsing(text, node, repeats, tmp_dir):
+    """Parse a serialised document with Node.js and return the fastest time.
+
+    Params:
+    -------
+    text: str
+        Serialised document.
+    node: str
+        Path of the Node.js executable.
+    repeats: int
+        Number of timed runs.
+    tmp_dir: str
+        Directory for temporary files.
+
+    Return:
+    -------
+    float:
+        The fastest time (in seconds).
+    """
+
+    doc_file = os.path.join(tmp_dir, 'document.json')
+    script_file = os.path.join(tmp_dir, 'parse.js')
+    with open(doc_file, 'w') as f:
+        f.write(text)
+    with open(script_file, 'w') as f:
+        f.write(PARSE_SCRIPT % dict(repeats=repeats))
+    output = subprocess.check_output([node, script_file, doc_file])
+    return float(output.decode('utf-8').strip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the size and parse time of embedded plot data.')
+    parser.add_argument('--rows', type=int, default=200000, help='number of generated rows')
+    parser.add_argument('--repeats', type=int, default=3, help='number of timed runs per variant')
+    parser.add_argument('--node', default=shutil.which('node'), help='path of the Node.js executable')
+    args = parser.parse_args()
+
+    df = generate_data(args.rows)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        print('Rows: {rows}'.format(rows=args.rows))
+        variants = (('JSON lists', lambda d: document_json(list_data_source(d))),
+                    ('Binary arrays', lambda d: document_json(column_data_source(d))),
+                    ('Rasterised', raster_document_json))
+        for label, create_document in variants:
+            duration, text = time_serialisation(df, create_document, args.repeats)
+            print('{label}: {size:.1f} MB, serialised in {time:.3f} s'
+                  .format(label=label, size=len(text) / 1e6, time=duration))
+            if args.node:
+                parse_time = time_parsing(text, args.node, args.repeats, tmp_dir)
+                print('{label}: parsed in {time:.3f} s'.format(label=label, time=parse_time))
+        if not args.node:
+            print('Node.js is not available, so the parse time is not measured.')
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
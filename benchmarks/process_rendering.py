@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""Benchmark for rendering data quality items in worker processes.
+
+Data frames resembling the data of HRS temperature plots are generated, and for each of them a scatter plot is
+created and converted into HTML with Bokeh's components function, as done for the items of a data quality page. This
+is done once in the current thread and once in a pool of worker processes (see app.main.rendering.submit_render), and
+the total time for all items is reported for both variants.
+
+The worker pool is created and warmed up before the timed runs, as it persists between requests on the server.
+
+Example:
+
+    python benchmarks/process_rendering.py --items 12 --rows 50000 --processes 4
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from bokeh.plotting import figure
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main.data_quality import _render_content
+from app.main.data_quality_plots import column_data_source
+from app.main.rendering import submit_render
+
+
+def generate_data(items, rows):
+    """Generate HRS temperature data for a number of items.
+
+    Params:
+    -------
+    items: int
+        Number of items.
+    rows: int
+        Number of rows per item.
+
+    Return:
+    -------
+    list of DataFrame:
+        The generated data.
+    """
+
+    data = []
+    for _ in range(items):
+        seconds = np.sort(np.random.randint(0, 365 * 24 * 3600, size=rows))
+        data.append(pd.DataFrame(dict(UTStart=pd.Timestamp('2017-01-01') + pd.to_timedelta(seconds, unit='s'),
+                                      TEMP=np.random.normal(loc=290, scale=0.5, size=rows).astype(np.float32))))
+    return data
+
+
+def render_temperature_plot(df):
+    """Create a temperature plot for a data frame.
+
+    Params:
+    -------
+    df: DataFrame
+        Data frame.
+
+    Return:
+    -------
+    Figure:
+        The plot.
+    """
+
+    p = figure(title='HRS Temperature', x_axis_label='Date', y_axis_label='Temperature (K)', x_axis_type='datetime')
+    p.scatter(source=column_data_source(df), x='UTStart', y='TEMP', color='blue', fill_alpha=0.2, size=12)
+    return p
+
+
+def time_rendering(data, repeats):
+    """Render all items and return the fastest time.
+
+    Params:
+    -------
+    data: list of DataFrame
+        Data for the items.
+    repeats: int
+        Number of timed runs.
+
+    Return:
+    -------
+    float:
+        The fastest time (in seconds).
+    """
+
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        futures = [submit_render(_render_content, render_temperature_plot, df) for df in data]
+        for future in futures:
+            future.result()
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark rendering data quality items in worker processes.')
+    parser.add_argument('--items', type=int, default=12, help='number of items per page')
+    parser.add_argument('--rows', type=int, default=50000, help='number of rows per item')
+    parser.add_argument('--processes', type=int, default=4, help='number of worker processes')
+    parser.add_argument('--repeats', type=int, default=3, help='number of timed runs per variant')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    data = generate_data(args.items, args.rows)
+    with app.app_context():
+        app.config['RENDER_PROCESSES'] = 0
+        thread_time = time_rendering(data, args.repeats)
+
+        app.config['RENDER_PROCESSES'] = args.processes
+        time_rendering(data[:args.processes], 1)
+        process_time = time_rendering(data, args.repeats)
+
+    print('Items: {items}, rows per item: {rows}'.format(items=args.items, rows=args.rows))
+    print('Request thread: {time:.3f} s'.format(time=thread_time))
+    print('{processes} worker processes: {time:.3f} s'.format(processes=args.processes, time=process_time))
+
+
+if __name__ == '__main__':
+    main()
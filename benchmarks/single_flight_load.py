@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+"""Load test for sharing the computation of data quality items between concurrent requests.
+
+A table with randomly generated frames is created in the database given by the --database-uri option, and a data
+quality item querying this table is requested by an increasing number of concurrent requests, which are spread over
+several processes with several threads each (like the uWSGI server processes). This is done once with every request
+computing the item itself and once with the computations shared (see app.main.single_flight.single_flight), and the
+number of database queries and the total time are reported for both variants. The table is dropped again at the end.
+
+Example:
+
+    python benchmarks/single_flight_load.py --rows 500000 --processes 4 --max-requests 32
+"""
+
+import argparse
+import datetime
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from flask import Flask
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import db
+from app.decorators import data_quality
+from app.main.data_fetching import read_sql_for_date_range
+from app.main.data_quality import _compute_item_content, _item_content
+
+TABLE = 'BenchmarkFrame'
+
+SQL = "SELECT DATE(UTStart) AS Night, AVG(Value) AS Value, COUNT(*) AS Frames FROM " + TABLE + " " \
+      "    WHERE UTStart >= '{start_date}' AND UTStart < '{end_date}' GROUP BY Night"
+
+START_DATE = datetime.date(2016, 1, 1)
+
+
+@data_quality(name='nightly_values', caption='')
+def nightly_values(start_date, end_date):
+    df = read_sql_for_date_range(SQL, start_date, end_date)
+    return df.to_html()
+
+
+def create_app(database_uri, single_flight_dir):
+    """Create a Flask app with the settings used by the data quality items.
+
+    Params:
+    -------
+    database_uri: str
+        URI of the database.
+    single_flight_dir: str
+        Directory for the lock files.
+
+    Return:
+    -------
+    Flask:
+        The app.
+    """
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['ITEM_MAX_PARALLELISM'] = 1
+    app.config['ITEM_SPLIT_SECONDS'] = 0
+    app.config['QUERY_MAX_PARALLELISM'] = 1
+    app.config['QUERY_PARTITION_DAYS'] = 100000
+    app.config['RENDER_PROCESSES'] = 0
+    app.config['SINGLE_FLIGHT_DIR'] = single_flight_dir
+    db.init_app(app)
+    return app
+
+
+def generate_data(rows, days):
+    """Create the benchmark table and fill it with random frames.
+
+    Params:
+    -------
+    rows: int
+        Number of rows to generate.
+    days: int
+        Number of days covered by the generated frames.
+    """
+
+    seconds = np.sort(np.random.randint(0, days * 24 * 3600, size=rows))
+    df = pd.DataFrame(dict(UTStart=pd.Timestamp(START_DATE) + pd.to_timedelta(seconds, unit='s'),
+                           Value=np.random.normal(size=rows)))
+    df.to_sql(TABLE, db.engine, index=False, chunksize=10000, if_exists='replace')
+
+
+def serve_requests(database_uri, single_flight_dir, days, requests, shared, barrier, queries):
+    """Serve concurrent requests for the benchmark item in a server process.
+
+    Params:
+    -------
+    database_uri: str
+        URI of the database.
+    single_flight_dir: str
+        Directory for the lock files.
+    days: int
+        Number of days in the requested date range.
+    requests: int
+        Number of concurrent requests served by this process.
+    shared: bool
+        Whether the computation of the item is shared between requests.
+    barrier: Barrier
+        Barrier for starting the requests of all processes at the same time.
+    queries: Value
+        Counter for the database queries.
+    """
+
+    app = create_app(database_uri, single_flight_dir)
+    package = nightly_values.__module__.rsplit('.', 1)[0]
+    kwargs = dict(start_date=START_DATE, end_date=START_DATE + datetime.timedelta(days=days))
+    with app.app_context():
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_query(*args):
+            with queries.get_lock():
+                queries.value += 1
+
+        def request():
+            with app.app_context():
+                content = _item_content if shared else _compute_item_content
+                result = content(app, package, 'nightly_values', 0, (), kwargs)
+                if not isinstance(result, str):
+                    result.result()
+
+        threads = [threading.Thread(target=request) for _ in range(requests)]
+        barrier.wait()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+def run_load(database_uri, single_flight_dir, days, processes, requests, shared):
+    """Serve concurrent requests for the benchmark item in several server processes.
+
+    Params:
+    -------
+    database_uri: str
+        URI of the database.
+    single_flight_dir: str
+        Directory for the lock files.
+    days: int
+        Number of days in the requested date range.
+    processes: int
+        Number of server processes.
+    requests: int
+        Total number of concurrent requests.
+    shared: bool
+        Whether the computation of the item is shared between requests.
+
+    Return:
+    -------
+    tuple:
+        The number of database queries and the time (in seconds) until all requests were served.
+    """
+
+    context = multiprocessing.get_context('fork')
+    queries = context.Value('i', 0)
+    processes = min(processes, requests)
+    barrier = context.Barrier(processes + 1)
+    workers = [context.Process(target=serve_requests,
+                               args=(database_uri, single_flight_dir, days,
+                                     requests // processes + (1 if i < requests % processes else 0),
+                                     shared, barrier, queries))
+               for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    return queries.value, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test for sharing item computations between requests.')
+    parser.add_argument('--database-uri', help='URI of a scratch database (default: temporary SQLite file)')
+    parser.add_argument('--rows', type=int, default=500000, help='number of generated rows')
+    parser.add_argument('--days', type=int, default=732, help='number of days covered by the data')
+    parser.add_argument('--processes', type=int, default=4, help='number of server processes')
+    parser.add_argument('--max-requests', type=int, default=32, help='maximum number of concurrent requests')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    database_uri = args.database_uri or 'sqlite:///' + os.path.join(tmp_dir, 'benchmark.sqlite')
+    single_flight_dir = os.path.join(tmp_dir, 'single_flight')
+
+    app = create_app(database_uri, single_flight_dir)
+    with app.app_context():
+        generate_data(args.rows, args.days)
+        db.engine.dispose()
+
+    try:
+        print('Requests | Queries (separate) | Time (separate) | Queries (shared) | Time (shared)')
+        requests = 1
+        while requests <= args.max_requests:
+            separate_queries, separate_time = run_load(database_uri, single_flight_dir, args.days, args.processes,
+                                                       requests, shared=False)
+            shared_queries, shared_time = run_load(database_uri, single_flight_dir, args.days, args.processes,
+                                                   requests, shared=True)
+            print('{requests:8d} | {separate_queries:18d} | {separate_time:13.2f} s | {shared_queries:16d} | '
+                  '{shared_time:11.2f} s'.format(requests=requests,
+                                                 separate_queries=separate_queries,
+                                                 separate_time=separate_time,
+                                                 shared_queries=shared_queries,
+                                                 shared_time=shared_time))
+            requests *= 2
+    finally:
+        with app.app_context():
+            db.engine.execute('DROP TABLE {table}'.format(table=TABLE))
+
+
+if __name__ == '__main__':
+    main()
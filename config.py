@@ -1,6 +1,7 @@
 import enum
 import logging
 import os
+import re
 
 from logging.handlers import RotatingFileHandler
 from logging.handlers import SMTPHandler
@@ -38,6 +39,14 @@ class Config:
         # secret key
         secret_key = Config._environment_variable('SECRET_KEY', prefix=prefix, config_name=config_name)
 
+        # usernames of the users who may access the admin pages
+        admin_users_value = Config._environment_variable('ADMIN_USERS',
+                                                         prefix=prefix,
+                                                         config_name=config_name,
+                                                         required=False,
+                                                         default='')
+        admin_users = [username for username in re.split(r'\s*,\s*', admin_users_value.strip()) if username]
+
         # database
         database_uris = {
             'sdb': Config._environment_variable('SDB_DATABASE_URI', prefix=prefix, config_name=config_name),
@@ -121,8 +130,188 @@ class Config:
         # enable logging?
         with_logging = int(os.environ.get(prefix + 'WITH_LOGGING', True)) != 0
 
+        # directory for the local columnar mirror of the seeing and ELS guidance data
+        seeing_mirror_dir = Config._environment_variable('SEEING_MIRROR_DIR',
+                                                         prefix=prefix,
+                                                         config_name=config_name,
+                                                         required=False,
+                                                         default='seeing_mirror')
+
+        # directory for the query results cached by the worker processes creating a snapshot ('' for no such cache)
+        snapshot_data_cache_dir = Config._environment_variable('SNAPSHOT_DATA_CACHE_DIR',
+                                                               prefix=prefix,
+                                                               config_name=config_name,
+                                                               required=False,
+                                                               default='snapshot_data_cache')
+
+        # read the seeing data from the local mirror rather than from the remote databases?
+        seeing_mirror_enabled = int(Config._environment_variable('SEEING_MIRROR_ENABLED',
+                                                                 prefix=prefix,
+                                                                 config_name=config_name,
+                                                                 required=False,
+                                                                 default=0)) != 0
+
+        # period (in seconds) before the high-water mark which is fetched again when syncing the mirror
+        seeing_mirror_late_arrival_window = int(Config._environment_variable('SEEING_MIRROR_LATE_ARRIVAL_WINDOW',
+                                                                             prefix=prefix,
+                                                                             config_name=config_name,
+                                                                             required=False,
+                                                                             default=24 * 3600))
+
+        # absolute path of the directory for the lock files which let server processes share the computation of a data
+        # quality item ('' for sharing within a process only)
+        single_flight_dir = Config._environment_variable('SINGLE_FLIGHT_DIR',
+                                                         prefix=prefix,
+                                                         config_name=config_name,
+                                                         required=False,
+                                                         default='')
+
+        # maximum number of seconds to wait for another server process computing the same data quality item
+        single_flight_timeout = int(Config._environment_variable('SINGLE_FLIGHT_TIMEOUT',
+                                                                 prefix=prefix,
+                                                                 config_name=config_name,
+                                                                 required=False,
+                                                                 default=60))
+
+        # number of seconds between checks whether the caches need to be pre-warmed (0 for no checks)
+        prewarm_interval = int(Config._environment_variable('PREWARM_INTERVAL',
+                                                            prefix=prefix,
+                                                            config_name=config_name,
+                                                            required=False,
+                                                            default=0))
+
+        # maximum number of data quality items of a page which are created in parallel when pre-warming the caches
+        prewarm_max_parallelism = int(Config._environment_variable('PREWARM_MAX_PARALLELISM',
+                                                                   prefix=prefix,
+                                                                   config_name=config_name,
+                                                                   required=False,
+                                                                   default=1))
+
+        # directory for the render cache shared by all server processes ('' for no render cache)
+        render_cache_dir = Config._environment_variable('RENDER_CACHE_DIR',
+                                                        prefix=prefix,
+                                                        config_name=config_name,
+                                                        required=False,
+                                                        default='')
+
+        # number of days covered by a single query when data for a long date range is fetched in parallel
+        query_partition_days = int(Config._environment_variable('QUERY_PARTITION_DAYS',
+                                                                prefix=prefix,
+                                                                config_name=config_name,
+                                                                required=False,
+                                                                default=31))
+
+        # maximum number of queries run in parallel when data for a long date range is fetched
+        query_max_parallelism = int(Config._environment_variable('QUERY_MAX_PARALLELISM',
+                                                                 prefix=prefix,
+                                                                 config_name=config_name,
+                                                                 required=False,
+                                                                 default=4))
+
+        # maximum number of points in a dense scatter plot which are not rasterised
+        raster_point_threshold = int(Config._environment_variable('RASTER_POINT_THRESHOLD',
+                                                                  prefix=prefix,
+                                                                  config_name=config_name,
+                                                                  required=False,
+                                                                  default=50000))
+
+        # number of days of data queried at a time when the data of a data quality item is exported
+        data_api_chunk_days = int(Config._environment_variable('DATA_API_CHUNK_DAYS',
+                                                               prefix=prefix,
+                                                               config_name=config_name,
+                                                               required=False,
+                                                               default=30))
+
+        # maximum number of days in the date range of a request for plots, data or figures
+        max_date_range_days = int(Config._environment_variable('MAX_DATE_RANGE_DAYS',
+                                                               prefix=prefix,
+                                                               config_name=config_name,
+                                                               required=False,
+                                                               default=3660))
+
+        # kind of cache for query results ('memory', 'shared_memory', 'filesystem' or 'redis')
+        data_cache_backend = Config._environment_variable('DATA_CACHE_BACKEND',
+                                                          prefix=prefix,
+                                                          config_name=config_name,
+                                                          required=False,
+                                                          default='memory')
+
+        # location of the cache for query results ('' for the default location of its kind)
+        data_cache_location = Config._environment_variable('DATA_CACHE_LOCATION',
+                                                           prefix=prefix,
+                                                           config_name=config_name,
+                                                           required=False,
+                                                           default='')
+
+        # maximum number of cached query results (0 for no caching)
+        data_cache_size = int(Config._environment_variable('DATA_CACHE_SIZE',
+                                                           prefix=prefix,
+                                                           config_name=config_name,
+                                                           required=False,
+                                                           default=0))
+
+        # kind of cache for the content of data quality items ('memory', 'shared_memory', 'filesystem' or 'redis')
+        item_cache_backend = Config._environment_variable('ITEM_CACHE_BACKEND',
+                                                          prefix=prefix,
+                                                          config_name=config_name,
+                                                          required=False,
+                                                          default='memory')
+
+        # location of the cache for the content of data quality items ('' for the default location of its kind)
+        item_cache_location = Config._environment_variable('ITEM_CACHE_LOCATION',
+                                                           prefix=prefix,
+                                                           config_name=config_name,
+                                                           required=False,
+                                                           default='')
+
+        # number of seconds for which the content of a data quality item is cached (0 for no caching)
+        item_cache_ttl = int(Config._environment_variable('ITEM_CACHE_TTL',
+                                                          prefix=prefix,
+                                                          config_name=config_name,
+                                                          required=False,
+                                                          default=0))
+
+        # maximum number of data quality items whose content is cached
+        item_cache_size = int(Config._environment_variable('ITEM_CACHE_SIZE',
+                                                           prefix=prefix,
+                                                           config_name=config_name,
+                                                           required=False,
+                                                           default=500))
+
+        # maximum number of data quality items of a page which are created in parallel
+        item_max_parallelism = int(Config._environment_variable('ITEM_MAX_PARALLELISM',
+                                                                prefix=prefix,
+                                                                config_name=config_name,
+                                                                required=False,
+                                                                default=1))
+
+        # expected render time (in seconds) above which the date range of a splittable item is split (0 for never)
+        item_split_seconds = float(Config._environment_variable('ITEM_SPLIT_SECONDS',
+                                                                prefix=prefix,
+                                                                config_name=config_name,
+                                                                required=False,
+                                                                default=0))
+
+        # number of worker processes for rendering data quality items (0 to render in the request thread)
+        render_processes = int(Config._environment_variable('RENDER_PROCESSES',
+                                                            prefix=prefix,
+                                                            config_name=config_name,
+                                                            required=False,
+                                                            default=0))
+
         return dict(
+            admin_users=admin_users,
+            data_api_chunk_days=data_api_chunk_days,
+            data_cache_backend=data_cache_backend,
+            data_cache_location=data_cache_location,
+            data_cache_size=data_cache_size,
             database_uris=database_uris,
+            item_cache_backend=item_cache_backend,
+            item_cache_location=item_cache_location,
+            item_cache_size=item_cache_size,
+            item_cache_ttl=item_cache_ttl,
+            item_max_parallelism=item_max_parallelism,
+            item_split_seconds=item_split_seconds,
             flyway_command=flyway_command,
             logging_file_base_path=logging_file_base_path,
             logging_file_logging_level=logging_file_logging_level,
@@ -135,9 +324,23 @@ class Config:
             logging_mail_logging_level_name=logging_mail_logging_level_name,
             logging_mail_subject=logging_mail_subject,
             logging_mail_to_addresses=to_addresses,
+            max_date_range_days=max_date_range_days,
             migration_sql_dir=migration_sql_dir,
             migration_tool=migration_tool,
+            prewarm_interval=prewarm_interval,
+            prewarm_max_parallelism=prewarm_max_parallelism,
+            query_max_parallelism=query_max_parallelism,
+            query_partition_days=query_partition_days,
+            raster_point_threshold=raster_point_threshold,
+            render_cache_dir=render_cache_dir,
+            render_processes=render_processes,
             secret_key=secret_key,
+            seeing_mirror_dir=seeing_mirror_dir,
+            seeing_mirror_enabled=seeing_mirror_enabled,
+            seeing_mirror_late_arrival_window=seeing_mirror_late_arrival_window,
+            single_flight_dir=single_flight_dir,
+            single_flight_timeout=single_flight_timeout,
+            snapshot_data_cache_dir=snapshot_data_cache_dir,
             ssl_status=ssl_status,
             with_logging=with_logging
         )
@@ -273,6 +476,9 @@ class Config:
         # secret key
         app.config['SECRET_KEY'] = settings['secret_key']
 
+        # users who may access the admin pages
+        app.config['ADMIN_USERS'] = settings['admin_users']
+
         if settings['with_logging']:
             # logging to file
             file_handler = RotatingFileHandler(filename=settings['logging_file_base_path'],
@@ -297,6 +503,47 @@ class Config:
             'suthweather': settings['database_uris']['suthweather']
         }
 
+        # parallel fetching of long date ranges
+        app.config['QUERY_PARTITION_DAYS'] = settings['query_partition_days']
+        app.config['QUERY_MAX_PARALLELISM'] = settings['query_max_parallelism']
+
+        # rasterisation of dense scatter plots
+        app.config['RASTER_POINT_THRESHOLD'] = settings['raster_point_threshold']
+
+        # scheduling and rendering of data quality items
+        app.config['ITEM_MAX_PARALLELISM'] = settings['item_max_parallelism']
+        app.config['ITEM_SPLIT_SECONDS'] = settings['item_split_seconds']
+        app.config['RENDER_PROCESSES'] = settings['render_processes']
+
+        # database migration
+        app.config['DB_MIGRATION_SQL_DIR'] = settings['migration_sql_dir']
+
+        # local mirror of the seeing data
+        app.config['SEEING_MIRROR_DIR'] = settings['seeing_mirror_dir']
+        app.config['SEEING_MIRROR_ENABLED'] = settings['seeing_mirror_enabled']
+        app.config['SEEING_MIRROR_LATE_ARRIVAL_WINDOW'] = settings['seeing_mirror_late_arrival_window']
+
+        # static snapshots
+        app.config['SNAPSHOT_DATA_CACHE_DIR'] = settings['snapshot_data_cache_dir']
+
+        # sharing and caching of data quality item computations between requests
+        app.config['DATA_CACHE_BACKEND'] = settings['data_cache_backend']
+        app.config['DATA_CACHE_LOCATION'] = settings['data_cache_location']
+        app.config['DATA_CACHE_SIZE'] = settings['data_cache_size']
+        app.config['ITEM_CACHE_BACKEND'] = settings['item_cache_backend']
+        app.config['ITEM_CACHE_LOCATION'] = settings['item_cache_location']
+        app.config['ITEM_CACHE_SIZE'] = settings['item_cache_size']
+        app.config['ITEM_CACHE_TTL'] = settings['item_cache_ttl']
+        app.config['SINGLE_FLIGHT_DIR'] = settings['single_flight_dir']
+        app.config['SINGLE_FLIGHT_TIMEOUT'] = settings['single_flight_timeout']
+        app.config['RENDER_CACHE_DIR'] = settings['render_cache_dir']
+        app.config['PREWARM_INTERVAL'] = settings['prewarm_interval']
+        app.config['PREWARM_MAX_PARALLELISM'] = settings['prewarm_max_parallelism']
+
+        # data API
+        app.config['DATA_API_CHUNK_DAYS'] = settings['data_api_chunk_days']
+        app.config['MAX_DATE_RANGE_DAYS'] = settings['max_date_range_days']
+
         # use SSL?
         app.config['SSL_STATUS'] = False  # settings['ssl_status']
 
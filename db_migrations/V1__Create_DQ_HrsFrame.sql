@@ -0,0 +1,30 @@
+-- Denormalised table with one row per HRS frame, combining FileData, FitsHeaderHrs, PipelineDataQuality_CCD and
+-- ProposalCode. The table is filled and kept up to date by the refresh_hrs_frames command of the manage.py script.
+
+CREATE TABLE DQ_HrsFrame (
+    FileData_Id INT NOT NULL,
+    Arm CHAR(1) NOT NULL COMMENT 'H for the blue arm, R for the red arm',
+    FileName VARCHAR(32) NOT NULL,
+    UTStart DATETIME NOT NULL,
+    OBSMODE VARCHAR(32) DEFAULT NULL,
+    Target_Name VARCHAR(100) DEFAULT NULL,
+    Proposal_Code VARCHAR(100) DEFAULT NULL,
+    BkgdMean DOUBLE DEFAULT NULL,
+    TEM_AIR DOUBLE DEFAULT NULL,
+    TEM_BCAM DOUBLE DEFAULT NULL,
+    TEM_COLL DOUBLE DEFAULT NULL,
+    TEM_ECH DOUBLE DEFAULT NULL,
+    TEM_IOD DOUBLE DEFAULT NULL,
+    TEM_OB DOUBLE DEFAULT NULL,
+    TEM_RCAM DOUBLE DEFAULT NULL,
+    TEM_RMIR DOUBLE DEFAULT NULL,
+    TEM_VAC DOUBLE DEFAULT NULL,
+    PRE_DEW DOUBLE DEFAULT NULL,
+    PRE_VAC DOUBLE DEFAULT NULL,
+    FOC_BMIR DOUBLE DEFAULT NULL,
+    FOC_RMIR DOUBLE DEFAULT NULL,
+    PRIMARY KEY (FileData_Id),
+    KEY DQ_HrsFrame_Arm_UTStart (Arm, UTStart),
+    KEY DQ_HrsFrame_Target_Arm_UTStart (Target_Name, Arm, UTStart),
+    KEY DQ_HrsFrame_Proposal_Mode_Arm_UTStart (Proposal_Code, OBSMODE, Arm, UTStart)
+) ENGINE=InnoDB;
@@ -0,0 +1,11 @@
+-- DQ_HrsFrame gets a row for every HRS frame, including frames without a FitsHeaderHrs entry, and it no longer stores
+-- the BkgdMean value, as there may be several PipelineDataQuality_CCD rows per frame. Join PipelineDataQuality_CCD
+-- instead. The table is emptied, so that the next run of the refresh_hrs_frames command of the manage.py script fills
+-- it again from scratch.
+
+DELETE FROM DQ_HrsFrame;
+
+ALTER TABLE DQ_HrsFrame
+    DROP COLUMN BkgdMean,
+    ADD COLUMN HasHeader TINYINT(1) NOT NULL COMMENT '1 if the frame has a FitsHeaderHrs entry, 0 otherwise'
+        AFTER Proposal_Code;
@@ -38,10 +38,10 @@ def migrate_database():
         return
     elif migration_tool == 'Flyway':
         root_dir = os.path.abspath(os.path.join(__file__, os.pardir))
-        local('export FLASK_APP=site_app.py; FLASK_CONFIG=production; {root_dir}/venv/bin/flask flyway'\
+        local('export FLASK_APP=site_app.py; export FLASK_CONFIG=production; {root_dir}/venv/bin/flask flyway'\
             .format(root_dir=root_dir))
     elif migration_tool == 'Flask-Migrate':
-        local('export FLASK_APP=site_app.py; FLASK_CONFIG=production; venv/bin/flask db upgrade -d {sql_dir}'
+        local('export FLASK_APP=site_app.py; export FLASK_CONFIG=production; venv/bin/flask db upgrade -d {sql_dir}'
               .format(sql_dir=migration_sql_dir))
     else:
         print('Unknown database migration tool: {tool}'.format(tool=migration_tool))
@@ -93,9 +93,21 @@ def update_environment_variables_file():
     """
     settings = Config.settings('production')
     environment_variables = dict(
+        ADMIN_USERS=','.join(settings['admin_users']),
         ELS_DATABASE_URI=settings['database_uris']['els'],
         SDB_DATABASE_URI=settings['database_uris']['sdb'],
         SUTHWEATHER_DATABASE_URI=settings['database_uris']['suthweather'],
+        DATA_API_CHUNK_DAYS=settings['data_api_chunk_days'],
+        MAX_DATE_RANGE_DAYS=settings['max_date_range_days'],
+        DATA_CACHE_BACKEND=settings['data_cache_backend'],
+        DATA_CACHE_LOCATION=settings['data_cache_location'],
+        DATA_CACHE_SIZE=settings['data_cache_size'],
+        ITEM_CACHE_BACKEND=settings['item_cache_backend'],
+        ITEM_CACHE_LOCATION=settings['item_cache_location'],
+        ITEM_CACHE_SIZE=settings['item_cache_size'],
+        ITEM_CACHE_TTL=settings['item_cache_ttl'],
+        ITEM_MAX_PARALLELISM=settings['item_max_parallelism'],
+        ITEM_SPLIT_SECONDS=settings['item_split_seconds'],
         LOGGING_FILE_BASE_PATH=settings['logging_file_base_path'],
         LOGGING_FILE_LOGGING_LEVEL=settings['logging_file_logging_level_name'],
         LOGGING_FILE_MAX_BYTES=settings['logging_file_max_bytes'],
@@ -104,7 +116,20 @@ def update_environment_variables_file():
         LOGGING_MAIL_LOGGING_LEVEL=settings['logging_mail_logging_level_name'],
         LOGGING_MAIL_SUBJECT=settings['logging_mail_subject'],
         LOGGING_MAIL_TO_ADDRESSES=settings['logging_mail_to_addresses'],
+        PREWARM_INTERVAL=settings['prewarm_interval'],
+        PREWARM_MAX_PARALLELISM=settings['prewarm_max_parallelism'],
+        QUERY_MAX_PARALLELISM=settings['query_max_parallelism'],
+        QUERY_PARTITION_DAYS=settings['query_partition_days'],
+        RASTER_POINT_THRESHOLD=settings['raster_point_threshold'],
+        RENDER_CACHE_DIR=settings['render_cache_dir'],
+        RENDER_PROCESSES=settings['render_processes'],
         SECRET_KEY=settings['secret_key'],
+        SEEING_MIRROR_DIR=settings['seeing_mirror_dir'],
+        SEEING_MIRROR_ENABLED=int(settings['seeing_mirror_enabled']),
+        SEEING_MIRROR_LATE_ARRIVAL_WINDOW=settings['seeing_mirror_late_arrival_window'],
+        SINGLE_FLIGHT_DIR=settings['single_flight_dir'],
+        SINGLE_FLIGHT_TIMEOUT=settings['single_flight_timeout'],
+        SNAPSHOT_DATA_CACHE_DIR=settings['snapshot_data_cache_dir'],
         SSL_STATUS=settings['ssl_status']
     )
     file_content = ''
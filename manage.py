@@ -22,6 +22,75 @@ def profile(length=25, profile_dir=None):
     app.run()
 
 
+@manager.command
+def sync_seeing_mirror(since=None, full=False):
+    """Update the local mirror of the seeing and ELS guidance data."""
+    from dateutil import parser
+    from app.main.seeing_mirror import sync
+    fetched_rows = sync(since=parser.parse(since) if since else None, full=full)
+    for table in sorted(fetched_rows.keys()):
+        print('{table}: {rows} rows fetched'.format(table=table, rows=fetched_rows[table]))
+
+
+@manager.command
+def refresh_hrs_frames():
+    """Bring the denormalised HRS frame table up to date."""
+    from app.main.hrs_frames import refresh
+    inserted_rows, updated_rows = refresh()
+    print('{inserted} frames added, {updated} frames updated'.format(inserted=inserted_rows, updated=updated_rows))
+
+
+@manager.command
+def prewarm_cache(force=False):
+    """Render the default content of all data quality pages into the render cache."""
+    import os
+    from app.main.prewarming import prewarm, PREWARM_NICENESS
+    os.nice(PREWARM_NICENESS)
+    packages = prewarm(force=force, log=print)
+    if packages is None:
+        print('The caches are up to date or being pre-warmed already.')
+    else:
+        print('{count} pages pre-warmed'.format(count=len(packages)))
+
+
+@manager.command
+def advise_indexes(start_date=None, end_date=None, write_migration=False):
+    """Suggest database indexes for the queries issued by the data quality items."""
+    import datetime
+    from dateutil import parser
+    from flask import current_app
+    from app.main import index_advisor
+    end_date = parser.parse(end_date).date() if end_date else datetime.date.today()
+    start_date = parser.parse(start_date).date() if start_date else end_date - datetime.timedelta(days=31)
+    queries, failures = index_advisor.capture_queries(start_date, end_date)
+    results = index_advisor.analyse_queries(queries)
+    candidates = index_advisor.candidate_indexes(results)
+    print(index_advisor.report(results, candidates, failures))
+    if write_migration and any(candidate['bind'] is None for candidate in candidates):
+        path = index_advisor.write_migration(candidates, current_app.config['DB_MIGRATION_SQL_DIR'])
+        print('Migration written to {path}'.format(path=path))
+
+
+@manager.command
+def snapshot(start_date=None, end_date=None, output_dir='snapshot', processes=None, force=False):
+    """Render all data quality pages for a date range (by default the previous month) into static HTML files."""
+    import datetime
+    from dateutil import parser
+    from app.main.snapshots import snapshot as create_snapshot
+    today = datetime.date.today()
+    end_date = parser.parse(end_date).date() if end_date else today.replace(day=1)
+    if start_date:
+        start_date = parser.parse(start_date).date()
+    else:
+        start_date = (end_date - datetime.timedelta(days=1)).replace(day=1)
+    processes = int(processes) if processes is not None else os.cpu_count()
+    statuses = create_snapshot(output_dir, start_date, end_date, os.getenv('FLASK_CONFIG') or 'development',
+                               processes=processes, force=force, log=print)
+    failed = [package for package, status in statuses.items() if status == 'failed']
+    print('{count} pages written to {output_dir}, {failed} failed'.format(count=len(statuses) - len(failed),
+                                                                          output_dir=output_dir, failed=len(failed)))
+
+
 @manager.command
 def test():
     raise NotImplementedError('Please use the command "./run_tests.sh" for running the tests.')
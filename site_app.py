@@ -1,5 +1,32 @@
 import os
+import subprocess
+
+from sqlalchemy.engine.url import make_url
 
 from app import create_app
+from config import Config
 
 app = create_app(os.environ['FLASK_CONFIG'])
+
+
+@app.cli.command()
+def flyway():
+    """Migrate the SDB database with Flyway, using the SQL scripts in the migration SQL directory.
+
+    The password is passed to Flyway in the FLYWAY_PASSWORD environment variable rather than as a command line
+    argument, so that it isn't visible in the process list.
+    """
+
+    settings = Config.settings(os.environ['FLASK_CONFIG'])
+    url = make_url(settings['database_uris']['sdb'])
+    jdbc_url = 'jdbc:mysql://{host}:{port}/{database}'.format(host=url.host,
+                                                              port=url.port or 3306,
+                                                              database=url.database)
+    sql_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), settings['migration_sql_dir']))
+    env = dict(os.environ, FLYWAY_PASSWORD=url.password or '')
+    subprocess.check_call([settings['flyway_command'],
+                           '-url=' + jdbc_url,
+                           '-user=' + url.username,
+                           '-locations=filesystem:' + sql_dir,
+                           'migrate'],
+                          env=env)
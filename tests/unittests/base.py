@@ -1,8 +1,51 @@
+import re
 import unittest
+from unittest import mock
+
+import pandas as pd
 
 from app import create_app
 
 
+class FakeReadSql:
+    """Stand-in for pandas.read_sql, which records the queries and returns data frames created by a function.
+
+    The function is called with the query and the number of queries recorded so far (including the query itself).
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.queries = []
+
+    def __call__(self, sql, engine, params=None):
+        self.queries.append(sql)
+        return self.frame(sql, len(self.queries))
+
+
+def query_dates(sql):
+    """Return the dates (in the form yyyy-mm-dd) in an SQL query as timestamps."""
+
+    return [pd.Timestamp(d) for d in re.findall(r'\d{4}-\d{2}-\d{2}', sql)]
+
+
+def frame_rows(sql, **columns):
+    """Return two HRS frames taken on the night of the first date in an SQL query.
+
+    The frames have a UTStart column, the given columns (in alphabetical order), a FileData_Id and an Arm column, and
+    all the TEM_ columns mentioned in the query, with the value 280.
+    """
+
+    start = query_dates(sql)[0]
+    df = pd.DataFrame(dict(UTStart=[start + pd.Timedelta(hours=20), start + pd.Timedelta(hours=21)]))
+    for column in sorted(columns):
+        df[column] = columns[column]
+    df['FileData_Id'] = [7, 8]
+    df['Arm'] = ['H', 'R']
+    for column in re.findall(r'TEM_\w+', sql):
+        df[column] = 280.0
+    return df
+
+
 class BaseTestCase(unittest.TestCase):
     """Base class for Flask unit tests.
 
@@ -21,6 +64,26 @@ class BaseTestCase(unittest.TestCase):
     def tearDown(self):
         self.app_context.pop()
 
+    def patch_read_sql(self, frame):
+        """Replace pandas.read_sql for the data fetching functions until the end of the test.
+
+        Params:
+        -------
+        frame: function
+            Function returning the data frame for a query, as described for FakeReadSql.
+
+        Return:
+        -------
+        FakeReadSql:
+            The stand-in, whose queries attribute lists the queries of the current test.
+        """
+
+        read_sql = FakeReadSql(frame)
+        patch = mock.patch('app.main.data_fetching.pd.read_sql', side_effect=read_sql)
+        patch.start()
+        self.addCleanup(patch.stop)
+        return read_sql
+
 
 class NoAuthBaseTestCase(BaseTestCase):
     """Base class for Flask unit tests without authentication.
@@ -0,0 +1,35 @@
+from tests.unittests.base import BaseTestCase
+
+ADMIN_ROUTES = ['/admin/item-costs', '/admin/cache-stats', '/admin/datasets']
+
+
+class AdminTestCase(BaseTestCase):
+    def setUp(self):
+        BaseTestCase.setUp(self)
+        self.app.config['WTF_CSRF_ENABLED'] = False
+
+    def login(self):
+        response = self.client.post('/login', data=dict(username='test', password='test'))
+        self.assertEqual(302, response.status_code)
+
+    def test_admin_routes_require_administrator(self):
+        """
+        When I request an admin route without being logged in, as a logged-in user or as an administrator
+        Then I am redirected to the login page, am forbidden access or get the route's JSON, respectively
+        """
+
+        for route in ADMIN_ROUTES:
+            response = self.client.get(route)
+            self.assertEqual(302, response.status_code)
+            self.assertIn('/login', response.headers['Location'])
+
+        self.app.config['ADMIN_USERS'] = ['admin']
+        self.login()
+        for route in ADMIN_ROUTES:
+            self.assertEqual(403, self.client.get(route).status_code)
+
+        self.app.config['ADMIN_USERS'] = ['admin', 'test']
+        for route in ADMIN_ROUTES:
+            response = self.client.get(route)
+            self.assertEqual(200, response.status_code)
+            self.assertEqual('application/json', response.mimetype)
@@ -0,0 +1,196 @@
+import json
+import multiprocessing
+import os
+import shutil
+import socketserver
+import tempfile
+import threading
+from unittest import mock
+
+from app.main import cache_backends
+from app.main.cache_backends import cache_backend, FilesystemCache, MemoryCache, RedisCache, SharedMemoryCache
+from tests.unittests.base import NoAuthBaseTestCase
+
+
+class RedisStandIn(socketserver.ThreadingTCPServer):
+    """Minimal server for the GET and SET commands of the Redis protocol, storing values in a dictionary."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        socketserver.ThreadingTCPServer.__init__(self, ('127.0.0.1', 0), RedisStandInHandler)
+        self.values = {}
+
+
+class RedisStandInHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:-2])):
+                length = int(self.rfile.readline()[1:-2])
+                args.append(self.rfile.read(length + 2)[:-2])
+            command = args[0].upper()
+            if command == b'GET':
+                value = self.server.values.get(args[1])
+                reply = b'$-1\r\n' if value is None else b'$' + str(len(value)).encode() + b'\r\n' + value + b'\r\n'
+            elif command == b'SET':
+                self.server.values[args[1]] = args[2]
+                reply = b'+OK\r\n'
+            else:
+                reply = b'-ERR unknown command\r\n'
+            self.wfile.write(reply)
+
+
+def write_in_child_process(path, slots):
+    SharedMemoryCache(path, slots).set('key', {'written by': 'child'})
+
+
+class CacheBackendsTestCase(NoAuthBaseTestCase):
+    def setUp(self):
+        NoAuthBaseTestCase.setUp(self)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        NoAuthBaseTestCase.tearDown(self)
+
+    def assert_get_and_set(self, backend):
+        self.assertIsNone(backend.get('key'))
+        backend.set('key', ('<p></p>', 42))
+        self.assertEqual(('<p></p>', 42), backend.get('key'))
+        backend.set('key', ('<p>new</p>', 43))
+        self.assertEqual(('<p>new</p>', 43), backend.get('key'))
+        self.assertIsNone(backend.get('other key'))
+        stats = backend.stats()
+        self.assertEqual(backend.kind, stats['kind'])
+        self.assertEqual(2, stats['hits'])
+        self.assertEqual(2, stats['misses'])
+
+    def test_memory_cache(self):
+        """
+        When I use the memory cache
+        Then values can be stored and retrieved, and hits and misses are counted
+        """
+
+        self.assert_get_and_set(MemoryCache(max_entries=10))
+
+    def test_memory_cache_removes_least_recently_used_entries(self):
+        """
+        When I put more entries into the memory cache than allowed
+        Then the least recently used entries are removed
+        """
+
+        cache = MemoryCache(max_entries=2)
+        cache.set('a', 'A')
+        cache.set('b', 'B')
+        cache.get('a')
+        cache.set('c', 'C')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual('A', cache.get('a'))
+
+    def test_shared_memory_cache(self):
+        """
+        When I use the shared memory cache
+        Then values can be stored and retrieved, and hits and misses are counted
+        """
+
+        self.assert_get_and_set(SharedMemoryCache(os.path.join(self.tmp_dir, 'shm'), slots=4))
+
+    def test_shared_memory_cache_is_shared_between_processes(self):
+        """
+        When a process writes to the shared memory cache
+        Then another process can read the value, unless the value is too large for a slot
+        """
+
+        path = os.path.join(self.tmp_dir, 'shm')
+        cache = SharedMemoryCache(path, slots=4)
+        process = multiprocessing.Process(target=write_in_child_process, args=(path, 4))
+        process.start()
+        process.join()
+        self.assertEqual({'written by': 'child'}, cache.get('key'))
+
+        cache.set('large', b'x' * cache_backends.SHARED_MEMORY_SLOT_BYTES)
+        self.assertIsNone(cache.get('large'))
+
+    def test_filesystem_cache(self):
+        """
+        When I use the filesystem cache
+        Then values can be stored and retrieved, and hits and misses are counted
+        """
+
+        self.assert_get_and_set(FilesystemCache(self.tmp_dir))
+
+    def test_filesystem_cache_removes_oldest_entries(self):
+        """
+        When I put more entries into the filesystem cache than allowed
+        Then the oldest entries are removed, and entries can be pruned by age
+        """
+
+        cache = FilesystemCache(self.tmp_dir, max_entries=2)
+        with mock.patch('app.main.cache_backends.FILESYSTEM_PRUNE_INTERVAL', 1):
+            for modified, key in enumerate(('a', 'b', 'c')):
+                cache.set(key, key.upper())
+                os.utime(cache._path(key), (modified, modified))
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual('C', cache.get('c'))
+        self.assertEqual(2, cache.prune(retention=-1))
+        self.assertIsNone(cache.get('c'))
+
+    def test_redis_cache(self):
+        """
+        When I use the Redis cache with a server understanding the Redis protocol
+        Then values can be stored and retrieved, and hits and misses are counted
+        """
+
+        server = RedisStandIn()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            host, port = server.server_address
+            self.assert_get_and_set(RedisCache('redis://{host}:{port}'.format(host=host, port=port)))
+            self.assertEqual(1, len(server.values))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_unreachable_redis_server_causes_misses(self):
+        """
+        When the Redis server can't be reached
+        Then values aren't stored, and lookups are counted as misses
+        """
+
+        server = RedisStandIn()
+        port = server.server_address[1]
+        server.server_close()
+        cache = RedisCache('redis://127.0.0.1:{port}'.format(port=port))
+        cache.set('key', 'value')
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(1, cache.stats()['misses'])
+
+    def test_backends_are_chosen_by_kind(self):
+        """
+        When I ask for a cache backend
+        Then a backend of the requested kind is returned, and the same backend is returned for the same arguments
+        """
+
+        self.assertIsInstance(cache_backend('test', 'memory', None, 10), MemoryCache)
+        self.assertIs(cache_backend('test', 'memory', None, 10), cache_backend('test', 'memory', None, 10))
+        self.assertIsNot(cache_backend('test', 'memory', None, 10), cache_backend('other', 'memory', None, 10))
+        self.assertIsInstance(cache_backend('test', 'filesystem', self.tmp_dir, 10), FilesystemCache)
+        with self.assertRaises(ValueError):
+            cache_backend('test', 'floppy disk')
+
+    def test_cache_stats_are_served(self):
+        """
+        When I request the cache statistics
+        Then the hit and miss counts of the backends used are returned
+        """
+
+        cache_backend('test', 'filesystem', self.tmp_dir, 10).get('key')
+        response = self.client.get('/admin/cache-stats')
+        self.assertEqual(200, response.status_code)
+        self.assertIn(dict(name='test', kind='filesystem', location=self.tmp_dir, hits=0, misses=1),
+                      json.loads(response.get_data(as_text=True))['backends'])
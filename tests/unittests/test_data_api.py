@@ -0,0 +1,136 @@
+import datetime
+import io
+import json
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from app.main.data_api import encode_frames, export_items
+from app.main.data_quality import data_quality_item_names
+from tests.unittests.base import frame_rows, NoAuthBaseTestCase
+
+URL = '/api/data/instrument/hrs/red/bias/hrdet_bias?start_date=2017-01-01&end_date=2017-01-04'
+
+EXPORT_URL = '/api/export/instrument/hrs/environment/temperature?start_date=2017-01-01&end_date=2017-01-03'
+
+
+def bias_frames(sql, count):
+    return frame_rows(sql, BkgdMean=[1.5, np.nan])
+
+
+class DataApiTestCase(NoAuthBaseTestCase):
+    def setUp(self):
+        NoAuthBaseTestCase.setUp(self)
+        self.app.config['DATA_API_CHUNK_DAYS'] = 1
+        self.read_sql = self.patch_read_sql(bias_frames)
+
+    def test_data_is_queried_in_chunks(self):
+        """
+        When I request the data of an item with a plot spec for a date range longer than DATA_API_CHUNK_DAYS
+        Then the date range is queried in chunks, and the JSON contains the rows of all chunks
+        """
+
+        response = self.client.get(URL)
+        self.assertEqual('application/json', response.mimetype)
+        data = json.loads(response.get_data(as_text=True))
+        self.assertEqual(3, len(self.read_sql.queries))
+        self.assertEqual(['UTStart', 'BkgdMean', 'FileData_Id', 'Arm'], data['columns'])
+        self.assertEqual(6, len(data['rows']))
+        self.assertEqual(['2017-01-01T20:00:00', 1.5, 7, 'H'], data['rows'][0])
+        self.assertEqual(None, data['rows'][1][1])
+
+    def test_format_is_negotiated(self):
+        """
+        When I request the data of an item with an Accept header or a format parameter
+        Then I get the requested format, or an error if the format is not supported
+        """
+
+        response = self.client.get(URL, headers={'Accept': 'text/html, text/csv;q=0.9'})
+        self.assertEqual('text/csv', response.mimetype)
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual(['UTStart,BkgdMean,FileData_Id,Arm', '2017-01-01 20:00:00,1.5,7,H'], lines[:2])
+        self.assertEqual(7, len(lines))
+
+        response = self.client.get(URL + '&format=npz', headers={'Accept': 'text/csv'})
+        self.assertEqual('application/x-npz', response.mimetype)
+        arrays = np.load(io.BytesIO(response.get_data()))
+        self.assertEqual([7, 8] * 3, list(arrays['FileData_Id']))
+        self.assertEqual(np.dtype('datetime64[ns]'), arrays['UTStart'].dtype)
+
+        response = self.client.get(URL, headers={'Accept': 'image/png'})
+        self.assertEqual(406, response.status_code)
+
+        response = self.client.get('/api/data/examples/example2/weather_downtime'
+                                   '?start_date=2017-01-01&end_date=2017-01-04')
+        self.assertEqual(404, response.status_code)
+
+    def test_date_range_is_validated(self):
+        """
+        When I request the data of an item for a reversed, empty or too long date range
+        Then the request fails without querying the database
+        """
+
+        rss_url = '/api/data/instrument/rss/bias/rss_bias?start_date={start}&end_date={end}'
+        self.assertEqual(200, self.client.get(rss_url.format(start='2017-01-01', end='2017-01-03')).status_code)
+        del self.read_sql.queries[:]
+
+        self.app.config['MAX_DATE_RANGE_DAYS'] = 30
+        self.assertEqual(400, self.client.get(rss_url.format(start='2017-01-03', end='2017-01-01')).status_code)
+        self.assertEqual(400, self.client.get(rss_url.format(start='2017-01-01', end='2017-01-01')).status_code)
+        self.assertEqual(400, self.client.get(rss_url.format(start='2017-01-01', end='2017-03-01')).status_code)
+        self.assertEqual([], self.read_sql.queries)
+
+    def test_npz_combines_chunks(self):
+        """
+        When I encode data frames whose string columns have different lengths as a NumPy archive
+        Then each column is a single array wide enough for all strings
+        """
+
+        frames = [pd.DataFrame(dict(Name=['a', 'bb'], Value=[1, 2])), pd.DataFrame(dict(Name=['cccc'], Value=[3.5]))]
+        arrays = np.load(io.BytesIO(b''.join(encode_frames(frames, 'npz'))))
+        self.assertEqual(['a', 'bb', 'cccc'], list(arrays['Name']))
+        self.assertEqual([1.0, 2.0, 3.5], list(arrays['Value']))
+
+    def test_export_shares_datasets(self):
+        """
+        When I export several items of a page which declare the same dataset as input
+        Then I get a zip archive with a file per item and a manifest, and the dataset is queried once per date range
+        """
+
+        response = self.client.get(EXPORT_URL + '&items=temp_air,temp_vac&format=json')
+        self.assertEqual('application/zip', response.mimetype)
+        self.assertIn('temperature_2017-01-01_2017-01-03.zip', response.headers['Content-Disposition'])
+        archive = zipfile.ZipFile(io.BytesIO(response.get_data()))
+        self.assertEqual(['temp_air.json', 'temp_vac.json', 'manifest.json'], archive.namelist())
+        self.assertEqual(2, len(self.read_sql.queries))
+        data = json.loads(archive.read('temp_vac.json').decode('utf-8'))
+        self.assertEqual(['UTStart', 'TEMP', 'FileData_Id', 'Arm'], data['columns'])
+        self.assertEqual(4, len(data['rows']))
+        manifest = json.loads(archive.read('manifest.json').decode('utf-8'))
+        self.assertEqual(['temp_air', 'temp_vac'], [f['item'] for f in manifest['files']])
+
+        response = self.client.get(EXPORT_URL)
+        names = zipfile.ZipFile(io.BytesIO(response.get_data())).namelist()
+        self.assertEqual(9, len(names))
+        self.assertIn('temp_iod.csv', names)
+
+        response = self.client.get(EXPORT_URL + '&items=temp_air,unknown')
+        self.assertEqual(404, response.status_code)
+
+    def test_export_is_generated_on_the_fly(self):
+        """
+        When I export several items of a page
+        Then the file of an item is generated as soon as the item is finished, before the next item is added
+        """
+
+        package = 'app.main.pages.instrument.hrs.environment.temperature'
+        data_quality_item_names(package)
+        chunks = export_items(package, ['temp_air', 'temp_vac'], datetime.date(2017, 1, 1), datetime.date(2017, 1, 3),
+                              'csv')
+        first = next(chunks)
+        self.assertTrue(first.startswith(b'PK'))
+        self.assertIn(b'temp_air.csv', first)
+        self.assertNotIn(b'temp_vac.csv', first)
+        archive = zipfile.ZipFile(io.BytesIO(first + b''.join(chunks)))
+        self.assertEqual(['temp_air.csv', 'temp_vac.csv', 'manifest.json'], archive.namelist())
@@ -0,0 +1,89 @@
+import datetime
+import time
+
+import pandas as pd
+
+from app.main import render_cache
+from app.main.data_cache import data_cache, normalise_sql
+from app.main.data_fetching import read_sql, read_sql_for_date_range
+from tests.unittests.base import NoAuthBaseTestCase
+
+
+def throughput(sql, count):
+    return pd.DataFrame(dict(Date=[datetime.date(2017, 1, 1)], Barcode=['A'], Value=[count]))
+
+
+class DataCacheTestCase(NoAuthBaseTestCase):
+    def setUp(self):
+        NoAuthBaseTestCase.setUp(self)
+        self.app.config['DATA_CACHE_SIZE'] = 100
+        self.app.config['QUERY_PARTITION_DAYS'] = 7
+        self.app.config['QUERY_MAX_PARALLELISM'] = 2
+        self.set_generation(1)
+        data_cache().clear()
+        self.read_sql = self.patch_read_sql(throughput)
+
+    def tearDown(self):
+        render_cache._generation.update(value=None, checked=None)
+        NoAuthBaseTestCase.tearDown(self)
+
+    def set_generation(self, generation):
+        render_cache._generation.update(value=generation, checked=time.time())
+
+    def test_whitespace_is_normalised(self):
+        """
+        When I normalise an SQL query
+        Then runs of whitespace are replaced with a single space, except in quoted literals
+        """
+
+        self.assertEqual("SELECT * FROM FileData WHERE FileName='a  b' AND `x  y`=1",
+                         normalise_sql("  SELECT *\n    FROM FileData\n    WHERE FileName='a  b'\tAND `x  y`=1;\n"))
+
+    def test_query_results_are_shared(self):
+        """
+        When I read the same query twice with different whitespace
+        Then the database is queried once, and the returned data frames are independent copies with the schema applied
+        """
+
+        first = read_sql('SELECT * FROM Throughput', schema=dict(Barcode='category'))
+        first['Value'] = 42
+        second = read_sql('SELECT *\n    FROM Throughput ', schema=dict(Barcode='category'))
+        self.assertEqual(1, len(self.read_sql.queries))
+        self.assertEqual([1], list(second['Value']))
+        self.assertEqual('category', str(second['Barcode'].dtype))
+
+        read_sql('SELECT * FROM Throughput')
+        self.assertEqual(2, len(self.read_sql.queries))
+
+    def test_new_data_generation_invalidates_results(self):
+        """
+        When I read a query again after the data generation has changed
+        Then the database is queried again
+        """
+
+        read_sql('SELECT * FROM Throughput')
+        self.set_generation(2)
+        self.assertEqual([2], list(read_sql('SELECT * FROM Throughput')['Value']))
+
+    def test_partitions_are_cached(self):
+        """
+        When I read a query for a date range overlapping a date range read before
+        Then only the partitions not read before are queried
+        """
+
+        sql = "SELECT * FROM Throughput WHERE Date >= '{start_date}' AND Date < '{end_date}'"
+        read_sql_for_date_range(sql, datetime.date(2017, 1, 1), datetime.date(2017, 1, 15))
+        self.assertEqual(2, len(self.read_sql.queries))
+        read_sql_for_date_range(sql, datetime.date(2017, 1, 1), datetime.date(2017, 1, 22))
+        self.assertEqual(3, len(self.read_sql.queries))
+
+    def test_results_are_not_cached_if_disabled(self):
+        """
+        When I read the same query twice with a DATA_CACHE_SIZE setting of 0
+        Then the database is queried twice
+        """
+
+        self.app.config['DATA_CACHE_SIZE'] = 0
+        read_sql('SELECT * FROM Throughput')
+        read_sql('SELECT * FROM Throughput')
+        self.assertEqual(2, len(self.read_sql.queries))
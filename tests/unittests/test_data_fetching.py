@@ -0,0 +1,77 @@
+import datetime
+import unittest
+from unittest import mock
+
+from app import db
+from app.main.data_fetching import date_range_partitions, read_sql_for_date_range
+from tests.unittests.base import NoAuthBaseTestCase
+
+
+class DateRangePartitionsTestCase(unittest.TestCase):
+    def test_short_range_is_not_split(self):
+        """
+        When I split a date range which isn't longer than the partition size
+        Then I get the whole range as a single partition
+        """
+
+        start = datetime.date(2017, 1, 1)
+        end = datetime.date(2017, 2, 1)
+        self.assertEqual([(start, end)], date_range_partitions(start, end, 31, 4))
+
+    def test_range_is_not_split_without_parallelism(self):
+        """
+        When I split a long date range with a maximum parallelism of 1
+        Then I get the whole range as a single partition
+        """
+
+        start = datetime.date(2016, 1, 1)
+        end = datetime.date(2018, 1, 1)
+        self.assertEqual([(start, end)], date_range_partitions(start, end, 31, 1))
+
+    def test_long_range_is_split_into_contiguous_partitions(self):
+        """
+        When I split a long date range
+        Then I get contiguous partitions of the partition size in chronological order, with a shorter last partition
+        """
+
+        start = datetime.date(2017, 1, 1)
+        end = datetime.date(2017, 3, 15)
+        partitions = date_range_partitions(start, end, 31, 4)
+        self.assertEqual([(datetime.date(2017, 1, 1), datetime.date(2017, 2, 1)),
+                          (datetime.date(2017, 2, 1), datetime.date(2017, 3, 4)),
+                          (datetime.date(2017, 3, 4), datetime.date(2017, 3, 15))], partitions)
+
+
+class StreamedReadTestCase(NoAuthBaseTestCase):
+    def setUp(self):
+        NoAuthBaseTestCase.setUp(self)
+        self.app.config['DATA_CACHE_SIZE'] = 0
+        with db.engine.begin() as connection:
+            connection.execute('CREATE TABLE StreamedArc (UTStart TEXT, DeltaX REAL)')
+            connection.execute('INSERT INTO StreamedArc VALUES ("2017-01-01 20:00:00", 1.5), '
+                               '("2017-01-01 21:00:00", 2.5), ("2017-01-02 20:00:00", 3.5)')
+
+    def tearDown(self):
+        with db.engine.begin() as connection:
+            connection.execute('DROP TABLE StreamedArc')
+        NoAuthBaseTestCase.tearDown(self)
+
+    def test_streamed_result_equals_read_result(self):
+        """
+        When I read a query result in chunks
+        Then I get the same data frame, with the same column types, as when reading it at once
+        """
+
+        sql = 'SELECT UTStart, DeltaX FROM StreamedArc WHERE UTStart >= "{start_date}" AND UTStart < "{end_date}"'
+        schema = dict(UTStart='datetime64[ns]', DeltaX='float32')
+        with mock.patch('app.main.data_fetching.STREAM_CHUNK_SIZE', 2):
+            streamed = read_sql_for_date_range(sql, datetime.date(2017, 1, 1), datetime.date(2017, 1, 3),
+                                               schema=schema, streamed=True)
+        read = read_sql_for_date_range(sql, datetime.date(2017, 1, 1), datetime.date(2017, 1, 3), schema=schema)
+        self.assertEqual(3, len(streamed))
+        self.assertTrue(streamed.equals(read))
+
+        empty = read_sql_for_date_range(sql, datetime.date(2016, 1, 1), datetime.date(2016, 1, 3), schema=schema,
+                                        streamed=True)
+        self.assertEqual(['UTStart', 'DeltaX'], list(empty.columns))
+        self.assertEqual(0, len(empty))
@@ -0,0 +1,74 @@
+import datetime
+import decimal
+import unittest
+
+import numpy as np
+import pandas as pd
+from bokeh.models import ColorBar
+from bokeh.plotting import figure
+
+from app.main.data_quality_plots import column_data_source, heatmap
+
+
+class ColumnDataSourceTestCase(unittest.TestCase):
+    def test_numeric_and_datetime_columns_are_contiguous_arrays(self):
+        """
+        When I create a column data source for a data frame with numeric and datetime columns
+        Then all its columns are contiguous NumPy arrays, and 64 bit integers are converted to 32 bit integers
+        """
+
+        df = pd.DataFrame(dict(UTStart=pd.date_range('2017-01-01', periods=10, freq='H'),
+                               TEMP=np.arange(10, dtype=np.float32),
+                               Count=np.arange(10, dtype=np.int64)))
+        source = column_data_source(df.iloc[::2])
+        for column in ('UTStart', 'TEMP', 'Count'):
+            self.assertIsInstance(source.data[column], np.ndarray)
+            self.assertTrue(source.data[column].flags['C_CONTIGUOUS'])
+        self.assertEqual(np.float32, source.data['TEMP'].dtype)
+        self.assertEqual(np.int32, source.data['Count'].dtype)
+        self.assertEqual([0, 2, 4, 6, 8], list(source.data['Count']))
+
+    def test_categorical_columns_are_converted(self):
+        """
+        When I create a column data source for a data frame with a categorical column
+        Then the column contains the original strings
+        """
+
+        df = pd.DataFrame(dict(FileName=pd.Categorical(['R201701010001.fits', 'R201701010002.fits',
+                                                        'R201701010001.fits'])))
+        source = column_data_source(df)
+        self.assertEqual(['R201701010001.fits', 'R201701010002.fits', 'R201701010001.fits'],
+                         list(source.data['FileName']))
+
+    def test_object_numeric_columns_are_rejected(self):
+        """
+        When I create a column data source for a data frame with numbers stored as objects
+        Then I get a ValueError
+        """
+
+        df = pd.DataFrame(dict(BkgdMean=[decimal.Decimal('1.5'), decimal.Decimal('2.5')]))
+        with self.assertRaises(ValueError):
+            column_data_source(df)
+
+
+class HeatmapTestCase(unittest.TestCase):
+    def test_heatmap_is_a_dense_grid(self):
+        """
+        When I add a heatmap for nightly values of two orders, with a night missing
+        Then the plot has a single image with a cell per night and order, missing cells are NaN, and a colour bar
+        """
+
+        df = pd.DataFrame(dict(Night=pd.to_datetime(['2017-01-01', '2017-01-01', '2017-01-03']),
+                               HrsOrder=[60, 61, 61],
+                               avg=[0.5, 1.5, 2.5]))
+        p = figure(x_axis_type='datetime')
+        renderer = heatmap(p, df, x='Night', y='HrsOrder', value='avg', dx=datetime.timedelta(days=1), dy=1)
+        grid = renderer.data_source.data['image'][0]
+        self.assertEqual((2, 3), grid.shape)
+        self.assertEqual([0.5, 1.5, 2.5], [grid[0, 0], grid[1, 0], grid[1, 2]])
+        self.assertTrue(np.isnan(grid[0, 1]))
+        day = 24 * 3600 * 1000
+        self.assertEqual(pd.Timestamp('2017-01-01').value / 1e6 - day / 2, renderer.glyph.x)
+        self.assertEqual(3 * day, renderer.glyph.dw)
+        self.assertEqual(59.5, renderer.glyph.y)
+        self.assertEqual(1, len([r for r in p.right if isinstance(r, ColorBar)]))
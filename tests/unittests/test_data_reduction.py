@@ -0,0 +1,69 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from app.main.data_reduction import TimeBinReducer
+
+
+def _chunks(df, size):
+    return [df.iloc[i:i + size] for i in range(0, len(df), size)]
+
+
+class DataReductionTestCase(unittest.TestCase):
+    def setUp(self):
+        times = pd.Timestamp('2017-01-01') + pd.to_timedelta(np.sort(np.random.randint(0, 86400, 5000)), unit='s')
+        self.df = pd.DataFrame(dict(UTStart=times,
+                                    Value=np.random.normal(size=5000),
+                                    Key=np.random.randint(0, 5, size=5000)))
+
+    def test_time_bins_equal_resampling(self):
+        """
+        When I stream rows in chunks into a time bin reducer
+        Then I get the same means and medians as when resampling all rows
+        """
+
+        reducer = TimeBinReducer('UTStart', '10T', ('mean', 'median'))
+        for chunk in _chunks(self.df[['UTStart', 'Value']], 333):
+            reducer.add(chunk)
+        result = reducer.result()
+
+        resampled = self.df[['UTStart', 'Value']].set_index('UTStart').resample('10T')
+        self.assertTrue(np.allclose(resampled.mean()['Value'].values, result['mean']['Value'].values, equal_nan=True))
+        self.assertTrue(np.allclose(resampled.median()['Value'].values, result['median']['Value'].values,
+                                    equal_nan=True))
+
+    def test_time_bins_require_ordered_rows(self):
+        """
+        When I stream rows into a time bin reducer which are not ordered by time
+        Then I get an error
+        """
+
+        reducer = TimeBinReducer('UTStart', '10T')
+        chunks = _chunks(self.df, 1000)
+        reducer.add(chunks[1])
+        with self.assertRaises(ValueError):
+            reducer.add(chunks[0])
+
+    def test_time_bins_start_at_origin(self):
+        """
+        When I stream rows into a time bin reducer with a bin width which doesn't divide a day evenly
+        Then the bins start at the start of the day of the first row, or at the given origin
+        """
+
+        df = self.df[['UTStart', 'Value']]
+        df = df[df['UTStart'] >= pd.Timestamp('2017-01-01 12:00')]
+
+        reducer = TimeBinReducer('UTStart', '7T')
+        for chunk in _chunks(df, 333):
+            reducer.add(chunk)
+        result = reducer.result()['mean']
+        self.assertEqual(0, (result.index[0] - pd.Timestamp('2017-01-01')) / pd.Timedelta(minutes=7) % 1)
+        resampled = df.set_index('UTStart').resample('7T').mean()
+        self.assertEqual(list(resampled.index), list(result.index))
+
+        origin = pd.Timestamp('2017-01-01 11:58')
+        reducer = TimeBinReducer('UTStart', '7T', origin=origin)
+        reducer.add(df)
+        result = reducer.result()['mean']
+        self.assertEqual(0, (result.index[0] - origin) / pd.Timedelta(minutes=7) % 1)
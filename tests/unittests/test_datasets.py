@@ -0,0 +1,78 @@
+import datetime
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from app.main.datasets import DatasetPlan, dataset, dataset_frame, dataset_input
+from tests.unittests.base import NoAuthBaseTestCase
+
+fetches = []
+
+
+@dataset(name='test_temperatures')
+def temperatures(start_date, end_date, columns, arm='red'):
+    fetches.append(sorted(columns))
+    time.sleep(0.2)
+    return pd.DataFrame({column: [1.0, 2.0] for column in ['UTStart'] + list(columns)})
+
+
+START_DATE = datetime.date(2017, 1, 1)
+
+END_DATE = datetime.date(2017, 1, 8)
+
+
+class DatasetsTestCase(NoAuthBaseTestCase):
+    def setUp(self):
+        NoAuthBaseTestCase.setUp(self)
+        del fetches[:]
+        self.plan = DatasetPlan('test_page')
+        self.plan.add_item('air', [dataset_input('test_temperatures', columns=['TEM_AIR'])], START_DATE, END_DATE)
+        self.plan.add_item('vac', [dataset_input('test_temperatures', columns=['TEM_VAC'])], START_DATE, END_DATE)
+        self.plan.add_item('blue', [dataset_input('test_temperatures', columns=['TEM_AIR'], arm='blue')], START_DATE,
+                           END_DATE)
+
+    def frame(self, item, column):
+        return self.plan.run(item, dataset_frame, 'test_temperatures', START_DATE, END_DATE, columns=[column])
+
+    def test_shared_dataset_is_fetched_once(self):
+        """
+        When two items declaring the same dataset as input ask for it in parallel
+        Then the dataset is fetched once with the union of their columns, and each item gets its own columns only
+        """
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            air = executor.submit(self.frame, 'air', 'TEM_AIR')
+            vac = executor.submit(self.frame, 'vac', 'TEM_VAC')
+        self.assertEqual([['TEM_AIR', 'TEM_VAC']], fetches)
+        self.assertEqual(['UTStart', 'TEM_AIR'], list(air.result().columns))
+        self.assertEqual(['UTStart', 'TEM_VAC'], list(vac.result().columns))
+
+    def test_undeclared_dataset_is_fetched_directly(self):
+        """
+        When I ask for a dataset outside a plan, or with columns not declared as input
+        Then the dataset is fetched with the requested columns only
+        """
+
+        dataset_frame('test_temperatures', START_DATE, END_DATE, columns=['TEM_AIR'])
+        self.frame('air', 'TEM_COLL')
+        self.assertEqual([['TEM_AIR'], ['TEM_COLL']], fetches)
+
+    def test_plan_summary(self):
+        """
+        When I request the dataset plans after a page has been created
+        Then the plan lists every distinct dataset with its items and whether it was shared
+        """
+
+        self.frame('air', 'TEM_AIR')
+        self.frame('vac', 'TEM_VAC')
+        self.plan.record()
+
+        response = self.client.get('/admin/datasets')
+        plan = json.loads(response.get_data(as_text=True))['plans'][0]
+        self.assertEqual('test_page', plan['page'])
+        red, blue = plan['datasets']
+        self.assertEqual((['air', 'vac'], 1, True), (red['served'], red['fetches'], red['shared']))
+        self.assertEqual((['blue'], [], 0, False), (blue['items'], blue['served'], blue['fetches'], blue['shared']))
+        self.assertIn('dataset1 -> "blue" [style=dashed];', plan['dot'])
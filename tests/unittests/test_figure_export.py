@@ -0,0 +1,94 @@
+import io
+import json
+import struct
+import zipfile
+import zlib
+from xml.etree import ElementTree
+
+import numpy as np
+from bokeh.plotting import figure
+
+from app.main.figure_export import figure_image
+from tests.unittests.base import frame_rows, NoAuthBaseTestCase
+
+URL = '/api/figures/instrument/hrs/environment/temperature?start_date=2017-01-01&end_date=2017-01-03'
+
+SVG = '{http://www.w3.org/2000/svg}'
+
+
+def temperature_frames(sql, count):
+    return frame_rows(sql)
+
+
+def png_pixels(png):
+    """Decode an unfiltered RGB PNG image, as created by app.main.png_images.encode_png."""
+
+    width, height = struct.unpack('>II', png[16:24])
+    idat = png.index(b'IDAT')
+    length = struct.unpack('>I', png[idat - 4:idat])[0]
+    rows = np.frombuffer(zlib.decompress(png[idat + 4:idat + 4 + length]), dtype=np.uint8)
+    return rows.reshape((height, width * 3 + 1))[:, 1:].reshape((height, width, 3))
+
+
+class FigureExportTestCase(NoAuthBaseTestCase):
+    def setUp(self):
+        NoAuthBaseTestCase.setUp(self)
+        self.read_sql = self.patch_read_sql(temperature_frames)
+
+    def test_figure_is_rendered_without_browser(self):
+        """
+        When I render a Bokeh figure with markers, a line and an unsupported glyph as PNG and SVG
+        Then both show the markers, line, title, axis labels, tick labels and legend, and name the unsupported glyph
+        """
+
+        p = figure(title='Points & Line', x_axis_label='x', y_axis_label='y')
+        p.scatter(x=[0, 10], y=[0, 10], color='red', fill_alpha=1, size=10, legend='points')
+        p.line(x=[0, 10], y=[10, 0], color='blue')
+        p.quad(left=[1], right=[2], bottom=[1], top=[2])
+
+        pixels = png_pixels(figure_image(p, 'png', width=200, height=100))
+        self.assertEqual((100, 200, 3), pixels.shape)
+        self.assertEqual([255, 0, 0], list(pixels[100 - 1 - 20, 20]))
+        self.assertEqual([255, 255, 255], list(pixels[50, 60]))
+        # title
+        self.assertTrue((pixels[:19, :100] == 0).all(axis=2).any())
+        # tick labels and x axis label
+        self.assertTrue((pixels[81:, :] < 255).any(axis=2).sum() > 50)
+        # y axis label
+        self.assertTrue((pixels[:, :10] == 0).all(axis=2).any())
+        # legend marker
+        self.assertTrue((pixels[20:50, 150:] == [255, 0, 0]).all(axis=2).any())
+
+        root = ElementTree.fromstring(figure_image(p, 'svg', width=200, height=100))
+        texts = [e.text for e in root.iter(SVG + 'text')]
+        self.assertIn('Points & Line', texts)
+        self.assertIn('points', texts)
+        self.assertIn('x', texts)
+        self.assertIn('y', texts)
+        self.assertIn('Not drawn: Quad', texts)
+        self.assertEqual(3, len(list(root.iter(SVG + 'circle'))))
+        self.assertEqual(1, len(list(root.iter(SVG + 'polyline'))))
+
+    def test_page_figures_are_exported(self):
+        """
+        When I export the figures of a page
+        Then I get a zip archive with an image per item named by its export name, and datasets are queried once
+        """
+
+        response = self.client.get(URL + '&format=svg&items=temp_air,temp_vac')
+        self.assertEqual('application/zip', response.mimetype)
+        archive = zipfile.ZipFile(io.BytesIO(response.get_data()))
+        self.assertEqual(['temp_air.svg', 'temp_vac.svg', 'manifest.json'], archive.namelist())
+        self.assertEqual(1, len(self.read_sql.queries))
+        root = ElementTree.fromstring(archive.read('temp_air.svg'))
+        self.assertIn('HRS Environment Air Temperature', [e.text for e in root.iter(SVG + 'text')])
+        manifest = json.loads(archive.read('manifest.json').decode('utf-8'))
+        self.assertEqual([], manifest['skipped'])
+
+        response = self.client.get(URL)
+        names = zipfile.ZipFile(io.BytesIO(response.get_data())).namelist()
+        self.assertEqual(9, len(names))
+        self.assertIn('temp_iod.png', names)
+
+        self.assertEqual(406, self.client.get(URL + '&format=pdf').status_code)
+        self.assertEqual(404, self.client.get(URL + '&items=unknown').status_code)
@@ -0,0 +1,58 @@
+from bokeh.model import Model
+from bokeh.plotting import figure
+
+from app.main.figure_templates import PLOT_TOOLS, datetime_formatter, template_figure
+from tests.unittests.base import NoAuthBaseTestCase
+
+
+def canonical(value, seen):
+    """Return a representation of a property value which does not depend on model ids."""
+
+    if isinstance(value, Model):
+        if id(value) in seen:
+            return 'ref', seen[id(value)]
+        seen[id(value)] = len(seen)
+        properties = value.properties_with_values(include_defaults=True)
+        return type(value).__name__, tuple((k, canonical(v, seen)) for k, v in sorted(properties.items()))
+    if isinstance(value, dict):
+        return tuple((k, canonical(v, seen)) for k, v in sorted(value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(canonical(v, seen) for v in value)
+    return value
+
+
+def fresh_figure():
+    p = figure(title='Temperature', x_axis_label='Date', y_axis_label='TEMP', x_axis_type='datetime',
+               tools=PLOT_TOOLS)
+    p.xaxis[0].formatter = datetime_formatter()
+    return p
+
+
+def model_ids(p):
+    return set(m._id for m in p.references())
+
+
+class FigureTemplatesTestCase(NoAuthBaseTestCase):
+    def test_template_figure_equals_fresh_figure(self):
+        """
+        When I create a figure from a template
+        Then it has the same models and property values as a figure created with Bokeh's figure function
+        """
+
+        self.assertEqual(canonical(fresh_figure(), {}),
+                         canonical(template_figure('Temperature', x_axis_label='Date', y_axis_label='TEMP'), {}))
+
+    def test_template_figures_share_no_models(self):
+        """
+        When I create two figures from the same template and change one of them
+        Then the figures have no models in common, and the other figure is unchanged
+        """
+
+        p = template_figure('Temperature', x_axis_label='Date', y_axis_label='TEMP')
+        q = template_figure('Temperature', x_axis_label='Date', y_axis_label='TEMP')
+        self.assertEqual(set(), model_ids(p) & model_ids(q))
+
+        p.circle([1, 2], [3, 4], legend='Points')
+        p.xaxis[0].formatter.days = ['%d']
+        p.toolbar.tools.pop()
+        self.assertEqual(canonical(fresh_figure(), {}), canonical(q, {}))
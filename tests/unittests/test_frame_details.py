@@ -0,0 +1,120 @@
+import datetime
+import decimal
+import json
+from unittest import mock
+
+from bokeh.models import HoverTool, TapTool
+from bokeh.plotting import figure, ColumnDataSource
+
+from app import db
+from app.main.frame_details import _frame_details, _json_value, frame_details, frame_details_plot, FRAME_DETAILS_ROUTE
+from app.main.hrs_frames import HEADER_COLUMNS
+from tests.unittests.base import NoAuthBaseTestCase
+
+
+class FrameDetailsTestCase(NoAuthBaseTestCase):
+    def setUp(self):
+        NoAuthBaseTestCase.setUp(self)
+        _frame_details.cache_clear()
+
+    def tearDown(self):
+        _frame_details.cache_clear()
+        NoAuthBaseTestCase.tearDown(self)
+
+    def test_frame_details_are_served_as_json(self):
+        """
+        When I request the details of an existing frame
+        Then I get its details as a list of name-value pairs, in the order of the database columns
+        """
+
+        details = (('FileData_Id', 42), ('FileName', 'R201701010042.fits'), ('UTStart', '2017-01-01T20:15:00'))
+        with mock.patch('app.main.views.frame_details', return_value=details):
+            response = self.client.get(FRAME_DETAILS_ROUTE + '42')
+        self.assertEqual(200, response.status_code)
+        data = json.loads(response.get_data(as_text=True))
+        self.assertEqual(42, data['FileData_Id'])
+        self.assertEqual([['FileData_Id', 42], ['FileName', 'R201701010042.fits'], ['UTStart', '2017-01-01T20:15:00']],
+                         data['values'])
+
+    def test_missing_frame_is_not_found(self):
+        """
+        When I request the details of a frame which doesn't exist
+        Then I get a 404 error
+        """
+
+        with mock.patch('app.main.views.frame_details', return_value=None):
+            response = self.client.get(FRAME_DETAILS_ROUTE + '42')
+        self.assertEqual(404, response.status_code)
+
+    def test_database_values_are_converted_for_json(self):
+        """
+        When I convert database values for JSON
+        Then dates and datetimes become ISO strings and decimals become floats
+        """
+
+        self.assertEqual('2017-01-01', _json_value(datetime.date(2017, 1, 1)))
+        self.assertEqual('2017-01-01T20:15:00', _json_value(datetime.datetime(2017, 1, 1, 20, 15)))
+        self.assertEqual(1.5, _json_value(decimal.Decimal('1.5')))
+        self.assertEqual('RSS', _json_value(b'RSS'))
+        self.assertIsNone(_json_value(None))
+
+    def test_frame_details_plot_has_hover_and_tap_tools(self):
+        """
+        When I add frame details to a plot with two renderers
+        Then the plot has a hover tool for each renderer and a tap tool for both
+        """
+
+        p = figure(tools='pan')
+        renderers = [p.scatter(source=ColumnDataSource(dict(UTStart=[], TEMP=[], FileData_Id=[])),
+                               x='UTStart',
+                               y='TEMP')
+                     for _ in range(2)]
+        frame_details_plot(p, renderers, '@TEMP')
+        hover_tools = [tool for tool in p.tools if isinstance(tool, HoverTool)]
+        tap_tools = [tool for tool in p.tools if isinstance(tool, TapTool)]
+        self.assertEqual([[renderer] for renderer in renderers], [tool.renderers for tool in hover_tools])
+        self.assertEqual(1, len(tap_tools))
+        self.assertEqual(renderers, tap_tools[0].renderers)
+
+    def test_frame_details_have_explicit_columns_and_misses_are_not_cached(self):
+        """
+        When I look up a frame before and after it is added to the database
+        Then it is found once it has been added, and only the frame details columns are included
+        """
+
+        header_columns = ''.join(', {column} DOUBLE'.format(column=column) for column in HEADER_COLUMNS)
+        for sql in ['CREATE TABLE ProposalCode (ProposalCode_Id INT, Proposal_Code VARCHAR(100))',
+                    'CREATE TABLE FileData (FileData_Id INT, FileName VARCHAR(32), UTStart DATETIME, '
+                    '                       OBSMODE VARCHAR(32), Target_Name VARCHAR(100), ProposalCode_Id INT, '
+                    '                       Internal_Note VARCHAR(100))',
+                    'CREATE TABLE FitsHeaderHrs (FileData_Id INT{columns})'.format(columns=header_columns)]:
+            db.engine.execute(sql)
+        try:
+            self.assertIsNone(frame_details(42))
+            db.engine.execute("INSERT INTO ProposalCode VALUES (1, 'CAL_FLAT')")
+            db.engine.execute("INSERT INTO FileData VALUES (42, 'R201701010042', '2017-01-01 20:15:00', "
+                              "                             'LOW RESOLUTION', 'FLAT', 1, 'secret')")
+            db.engine.execute('INSERT INTO FitsHeaderHrs (FileData_Id, TEM_AIR) VALUES (42, 281.5)')
+            details = dict(frame_details(42))
+            self.assertEqual('R201701010042', details['FileName'])
+            self.assertEqual('CAL_FLAT', details['Proposal_Code'])
+            self.assertEqual(281.5, details['TEM_AIR'])
+            self.assertNotIn('Internal_Note', details)
+        finally:
+            for table in ('FitsHeaderHrs', 'FileData', 'ProposalCode'):
+                db.engine.execute('DROP TABLE {table}'.format(table=table))
+
+    def test_frame_details_url_includes_mount_path(self):
+        """
+        When I add frame details to a plot while the app is mounted under a path
+        Then the callbacks request the details from the frame details route under that path
+        """
+
+        p = figure(tools='pan')
+        renderer = p.scatter(source=ColumnDataSource(dict(UTStart=[], TEMP=[], FileData_Id=[])), x='UTStart', y='TEMP')
+        with self.app.test_request_context('/', base_url='http://localhost/dq'):
+            frame_details_plot(p, [renderer], '@TEMP')
+        codes = [tool.callback.code for tool in p.tools if isinstance(tool, (HoverTool, TapTool))]
+        self.assertEqual(2, len(codes))
+        for code in codes:
+            self.assertIn('"/dq/frame-details/"', code)
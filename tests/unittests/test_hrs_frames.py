@@ -0,0 +1,115 @@
+import datetime
+
+import pandas as pd
+
+from app import db
+from app.main.data_quality import data_quality_item, data_quality_item_names
+from app.main.hrs_frames import HEADER_COLUMNS, refresh
+from tests.unittests.base import NoAuthBaseTestCase
+
+PAGES = 'app.main.pages.instrument.hrs.'
+
+START_DATE = datetime.date(2017, 1, 1)
+
+END_DATE = datetime.date(2017, 1, 3)
+
+# FileData_Id, file name, target, proposal code, obsmode, number of PipelineDataQuality_CCD rows, FitsHeaderHrs entry?
+FRAMES = [(1, 'R201701010001', 'BIAS', None, None, 2, True),
+          (2, 'R201701010002', 'BIAS', None, None, 1, False),
+          (3, 'H201701010003', 'BIAS', None, None, 1, True),
+          (4, 'R201701010004', 'FLAT', 'CAL_FLAT', 'LOW RESOLUTION', 2, True),
+          (5, 'H201701010005', 'STAR', 'SCI', 'HIGH RESOLUTION', 0, True),
+          (6, 'P201701010006', 'BIAS', None, None, 1, False)]
+
+# baseline queries joining the source tables, as used by the plots before the HRS frame table existed
+BASELINE_BIAS_SQL = "select UTStart, BkgdMean from PipelineDataQuality_CCD join FileData using (FileData_Id) " \
+                    "       where UTStart > '2017-01-01' and UTStart < '2017-01-03' " \
+                    "             and FileName like 'R%%' and Target_Name='BIAS'"
+BASELINE_FLATS_SQL = "select UTStart, BkgdMean from PipelineDataQuality_CCD " \
+                     "       join FileData using (FileData_Id) join ProposalCode using (ProposalCode_Id) " \
+                     "       where UTStart > '2017-01-01' and UTStart < '2017-01-03' " \
+                     "             and Proposal_Code = 'CAL_FLAT' and FileName like 'R%%'"
+BASELINE_TEMPERATURE_SQL = "select UTStart, TEM_AIR from FitsHeaderHrs join FileData using (FileData_Id) " \
+                           "       where UTStart > '2017-01-01' and UTStart < '2017-01-03' " \
+                           "             and (FileName like 'H%%' or FileName like 'R%%')"
+
+
+class HrsFramesTestCase(NoAuthBaseTestCase):
+    def setUp(self):
+        NoAuthBaseTestCase.setUp(self)
+        header_columns = ''.join(', {column} DOUBLE'.format(column=column) for column in HEADER_COLUMNS)
+        for sql in ['CREATE TABLE ProposalCode (ProposalCode_Id INT, Proposal_Code VARCHAR(100))',
+                    'CREATE TABLE FileData (FileData_Id INT, FileName VARCHAR(32), UTStart DATETIME, '
+                    '                       OBSMODE VARCHAR(32), Target_Name VARCHAR(100), ProposalCode_Id INT)',
+                    'CREATE TABLE FitsHeaderHrs (FileData_Id INT{columns})'.format(columns=header_columns),
+                    'CREATE TABLE PipelineDataQuality_CCD (PipelineDataQuality_CCD_Id INT, FileData_Id INT, '
+                    '                                      BkgdMean DOUBLE)',
+                    'CREATE TABLE DQ_HrsFrame (FileData_Id INT PRIMARY KEY, Arm CHAR(1), FileName VARCHAR(32), '
+                    '                          UTStart DATETIME, OBSMODE VARCHAR(32), Target_Name VARCHAR(100), '
+                    '                          Proposal_Code VARCHAR(100), HasHeader TINYINT{header_columns})'
+                    .format(header_columns=header_columns)]:
+            db.engine.execute(sql)
+        db.engine.execute("INSERT INTO ProposalCode VALUES (1, 'CAL_FLAT'), (2, 'SCI')")
+        ccd_row_id = 0
+        for file_data_id, filename, target, proposal_code, obsmode, ccd_rows, has_header in FRAMES:
+            proposal_code_id = dict(CAL_FLAT=1, SCI=2).get(proposal_code)
+            db.engine.execute('INSERT INTO FileData VALUES (?, ?, ?, ?, ?, ?)',
+                              (file_data_id, filename, '2017-01-01 2{i}:00:00'.format(i=file_data_id), obsmode,
+                               target, proposal_code_id))
+            for _ in range(ccd_rows):
+                ccd_row_id += 1
+                db.engine.execute('INSERT INTO PipelineDataQuality_CCD VALUES (?, ?, ?)',
+                                  (ccd_row_id, file_data_id, 1000.0 + ccd_row_id))
+            if has_header:
+                self.add_header(file_data_id)
+
+    def tearDown(self):
+        for table in ('DQ_HrsFrame', 'PipelineDataQuality_CCD', 'FitsHeaderHrs', 'FileData', 'ProposalCode'):
+            db.engine.execute('DROP TABLE {table}'.format(table=table))
+        NoAuthBaseTestCase.tearDown(self)
+
+    def add_header(self, file_data_id):
+        db.engine.execute('INSERT INTO FitsHeaderHrs (FileData_Id, TEM_AIR) VALUES (?, ?)',
+                          (file_data_id, 280.0 + file_data_id))
+
+    def item_data(self, page, name):
+        package = PAGES + page
+        data_quality_item_names(package)
+        return data_quality_item(package, name)[0](start_date=START_DATE, end_date=END_DATE)
+
+    def test_plotted_points_match_baseline_queries(self):
+        """
+        When I refresh the HRS frame table and query the bias, flat and temperature plot data
+        Then the plots have as many points as with the baseline queries joining the source tables
+        """
+
+        self.assertEqual((5, 0), refresh())
+
+        baseline = pd.read_sql(BASELINE_BIAS_SQL, db.engine)
+        df = self.item_data('red.bias', 'hrdet_bias')
+        self.assertEqual(3, len(baseline))
+        self.assertEqual(sorted(baseline['BkgdMean']), sorted(df['BkgdMean']))
+
+        baseline = pd.read_sql(BASELINE_FLATS_SQL, db.engine)
+        df = self.item_data('red.flats', 'hrs_flats')
+        self.assertEqual(2, len(baseline))
+        self.assertEqual(sorted(baseline['BkgdMean']), sorted(df['BkgdMean']))
+
+        baseline = pd.read_sql(BASELINE_TEMPERATURE_SQL, db.engine)
+        df = self.item_data('environment.temperature', 'temp_air')
+        self.assertEqual(4, len(baseline))
+        self.assertEqual(sorted(baseline['TEM_AIR']), sorted(df['TEMP']))
+
+    def test_late_headers_are_filled_in(self):
+        """
+        When a FitsHeaderHrs entry is added after its frame has been added to the HRS frame table
+        Then the next refresh fills in the header values
+        """
+
+        refresh()
+        self.add_header(2)
+        self.assertEqual((0, 1), refresh())
+        baseline = pd.read_sql(BASELINE_TEMPERATURE_SQL, db.engine)
+        df = self.item_data('environment.temperature', 'temp_air')
+        self.assertEqual(5, len(baseline))
+        self.assertEqual(sorted(baseline['TEM_AIR']), sorted(df['TEMP']))
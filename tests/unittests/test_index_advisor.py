@@ -0,0 +1,75 @@
+import datetime
+import unittest
+from unittest import mock
+
+from app.main.data_cache import data_cache
+from app.main.index_advisor import capture_queries, index_columns, migration_sql
+from tests.unittests.base import NoAuthBaseTestCase
+
+
+class IndexAdvisorTestCase(unittest.TestCase):
+    def test_equality_columns_precede_range_column(self):
+        """
+        When I request the index columns for a query with equality and range conditions
+        Then the equality columns are followed by the first range column
+        """
+
+        sql = "SELECT UTStart, FileName FROM DQ_HrsFrame " \
+              "    WHERE UTStart > '2017-01-01' AND UTStart < '2017-02-01' AND Target_Name = 'BIAS' AND Arm = 'H'"
+        columns = ['FileData_Id', 'Arm', 'UTStart', 'Target_Name', 'FileName']
+        self.assertEqual(['Arm', 'Target_Name', 'UTStart'], index_columns(sql, 'DQ_HrsFrame', columns))
+
+    def test_leading_wildcard_and_other_tables_are_ignored(self):
+        """
+        When I request the index columns for a query with a leading wildcard and a column of another table
+        Then neither of these is used for the index
+        """
+
+        sql = "SELECT * FROM FileData JOIN FitsHeaderHrs USING (FileData_Id) " \
+              "    WHERE FileName LIKE '%%H%%' AND FitsHeaderHrs.UTStart > '2017-01-01'"
+        columns = ['FileData_Id', 'FileName', 'UTStart']
+        self.assertEqual([], index_columns(sql, 'FileData', columns))
+
+    def test_grouping_columns_are_used_without_range_condition(self):
+        """
+        When I request the index columns for a query without range conditions
+        Then the GROUP BY and ORDER BY columns are appended to the equality columns
+        """
+
+        sql = "SELECT HrsOrder, AVG(DeltaX) FROM DQ_HrsArc WHERE Object = 1 GROUP BY HrsOrder ORDER BY HrsOrder DESC"
+        columns = ['FileData_Id', 'HrsOrder', 'Object', 'DeltaX']
+        self.assertEqual(['Object', 'HrsOrder'], index_columns(sql, 'DQ_HrsArc', columns))
+
+    def test_migration_contains_sdb_indexes_only(self):
+        """
+        When I generate a migration for suggested indexes
+        Then it creates the indexes for the SDB database only
+        """
+
+        candidates = [dict(bind=None, table='DQ_HrsFrame', columns=['Arm', 'UTStart'], statements=['SELECT 1']),
+                      dict(bind='els', table='tpc', columns=['timestamp'], statements=['SELECT 2'])]
+        sql = migration_sql(candidates)
+        self.assertTrue('CREATE INDEX ix_DQ_HrsFrame_Arm_UTStart ON DQ_HrsFrame (Arm, UTStart);' in sql)
+        self.assertFalse('tpc' in sql)
+
+
+class CaptureQueriesTestCase(NoAuthBaseTestCase):
+    def test_query_results_are_not_cached_while_capturing(self):
+        """
+        When I capture the queries of the data quality items while query results are cached
+        Then the items are called without the data cache, and the cache is used again afterwards
+        """
+
+        self.app.config['DATA_CACHE_SIZE'] = 100
+        caches = []
+
+        def item(start_date, end_date):
+            caches.append(data_cache())
+
+        with mock.patch('app.main.index_advisor.data_quality_page_packages', return_value=['pages']), \
+                mock.patch('app.main.index_advisor.data_quality_item_names', return_value=['item']), \
+                mock.patch('app.main.index_advisor.data_quality_item', return_value=(item, {})):
+            queries, failures = capture_queries(datetime.date(2017, 1, 1), datetime.date(2017, 1, 2))
+        self.assertEqual([None], caches)
+        self.assertEqual([], failures)
+        self.assertEqual(100, self.app.config['DATA_CACHE_SIZE'])
@@ -0,0 +1,86 @@
+import datetime
+import time
+
+from app.decorators import data_quality
+from app.main.data_quality import figure_html, _item_content, item_key
+from app.main.item_cache import item_cache
+from tests.unittests.base import NoAuthBaseTestCase
+
+computations = []
+
+
+@data_quality(name='item_cache_item', caption='', max_staleness=60)
+def cached_item(start_date, end_date):
+    computations.append(start_date)
+    time.sleep(0.2)
+    return '<p>computation {count}</p>'.format(count=len(computations))
+
+
+# package under which the test item is registered
+PACKAGE = cached_item.__module__.rsplit('.', 1)[0]
+
+KWARGS = dict(start_date=datetime.date(2017, 1, 1), end_date=datetime.date(2017, 1, 8))
+
+
+class ItemCacheTestCase(NoAuthBaseTestCase):
+    def setUp(self):
+        NoAuthBaseTestCase.setUp(self)
+        self.app.config['ITEM_CACHE_TTL'] = 10
+        self.app.config['SINGLE_FLIGHT_DIR'] = ''
+        item_cache().clear()
+        del computations[:]
+
+    def content(self):
+        return _item_content(self.app, PACKAGE, 'item_cache_item', 8, (), KWARGS).result()
+
+    def age_cache(self, seconds):
+        key = item_key(PACKAGE, 'item_cache_item', (), KWARGS)
+        content, as_of, generation = item_cache().get(key)
+        item_cache().set(key, (content, as_of - datetime.timedelta(seconds=seconds), generation))
+
+    def test_fresh_content_is_served_from_the_cache(self):
+        """
+        When I request an item twice within its time to live
+        Then it is computed once
+        """
+
+        first = self.content()
+        second = self.content()
+        self.assertEqual(1, len(computations))
+        self.assertEqual(first, second)
+
+    def test_stale_content_is_served_while_it_is_refreshed(self):
+        """
+        When I request an item whose content has expired less than max_staleness seconds ago
+        Then the stale content is returned immediately and recreated in the background
+        """
+
+        self.content()
+        self.age_cache(30)
+        start = time.perf_counter()
+        content, as_of = self.content()
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self.assertEqual('<p>computation 1</p>', content)
+
+        time.sleep(0.5)
+        self.assertEqual(2, len(computations))
+        self.assertEqual('<p>computation 2</p>', self.content()[0])
+
+    def test_content_too_stale_is_recreated(self):
+        """
+        When I request an item whose content has expired more than max_staleness seconds ago
+        Then the content is recreated before it is returned
+        """
+
+        self.content()
+        self.age_cache(100)
+        self.assertEqual('<p>computation 2</p>', self.content()[0])
+
+    def test_caption_shows_time_of_data(self):
+        """
+        When I create the HTML for an item with the time of its data
+        Then the caption includes that time
+        """
+
+        html = figure_html('<p></p>', caption='Arcs', export_name='arcs', as_of=datetime.datetime(2017, 3, 4, 5, 6))
+        self.assertIn('Arcs <span class="data-as-of">Data as of 2017-03-04 05:06 UT</span>', html)
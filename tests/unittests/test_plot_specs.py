@@ -0,0 +1,140 @@
+import datetime
+import json
+import struct
+import zlib
+
+import numpy as np
+import pandas as pd
+from bokeh.models import ColumnDataSource
+
+from app.decorators import data_quality
+from app.main.data_quality import _item_content
+from app.main.plot_specs import _tooltips, json_values, PlotSpec, render_bokeh, render_csv, render_json, render_png, \
+    series
+from tests.unittests.base import NoAuthBaseTestCase
+
+SPEC = PlotSpec(title='Test Temperature',
+                x='UTStart',
+                y='TEMP',
+                x_label='Date',
+                y_label='Temperature (K)',
+                series=[series('Blue Arm', 'blue', Arm='H'), series('Red Arm', '#ff0000', Arm='R')])
+
+
+def temperatures():
+    return pd.DataFrame(dict(UTStart=pd.date_range('2017-01-01', periods=4, freq='H'),
+                             TEMP=np.array([280, 281, 282, 283], dtype=np.float32),
+                             Arm=pd.Series(['H', 'R', 'R', 'H']).astype('category'),
+                             FileData_Id=[1, 2, 3, 4]))
+
+
+@data_quality(name='plot_specs_item', caption='', spec=SPEC)
+def plot_specs_item(start_date, end_date):
+    return temperatures()
+
+
+# package under which the test item is registered
+PACKAGE = plot_specs_item.__module__.rsplit('.', 1)[0]
+
+
+def bias_frames(sql, count):
+    return pd.DataFrame(dict(UTStart=pd.date_range('2017-01-01', periods=2, freq='H'),
+                             BkgdMean=[1.5, 2.5],
+                             FileData_Id=[7, 8]))
+
+
+class PlotSpecsTestCase(NoAuthBaseTestCase):
+    def test_series_are_selected_by_column_values(self):
+        """
+        When I render a plot spec with two series as a Bokeh plot
+        Then each series gets the rows with its column values and a legend item
+        """
+
+        p = render_bokeh(SPEC, temperatures())
+        sources = [r.data_source for r in p.renderers if isinstance(getattr(r, 'data_source', None),
+                                                                    ColumnDataSource)]
+        self.assertEqual([[1, 4], [2, 3]], [list(source.data['FileData_Id']) for source in sources])
+        self.assertEqual(['Blue Arm', 'Red Arm'], [item.label['value'] for item in p.legend[0].items])
+
+    def test_json_and_csv_contain_plotted_columns(self):
+        """
+        When I render a plot spec as JSON and CSV
+        Then the plotted columns are included per series, with datetimes as ISO strings
+        """
+
+        data = json.loads(render_json(SPEC, temperatures()))
+        self.assertEqual('Test Temperature', data['title'])
+        self.assertEqual(['Blue Arm', 'Red Arm'], [s['label'] for s in data['series']])
+        self.assertEqual(dict(UTStart=['2017-01-01T00:00:00', '2017-01-01T03:00:00'], TEMP=[280.0, 283.0]),
+                         data['series'][0]['columns'])
+
+        lines = render_csv(SPEC, temperatures()).splitlines()
+        self.assertEqual(['series,UTStart,TEMP', 'Blue Arm,2017-01-01 00:00:00,280.0'], lines[:2])
+        self.assertEqual(5, len(lines))
+
+    def test_categorical_columns_can_be_hovered_and_serialised(self):
+        """
+        When I create hover tooltips for and serialise a categorical column
+        Then it is treated like a column of its categories' type
+        """
+
+        spec = PlotSpec(title='Test Temperature', x='UTStart', y='TEMP', x_label='Date', y_label='Temperature (K)',
+                        series=SPEC.series, hover=[('Date', 'UTStart'), ('Arm', 'Arm')])
+        tooltips, formatters = _tooltips(spec, temperatures())
+        self.assertEqual(dict(UTStart='datetime'), formatters)
+        self.assertIn('@Arm', tooltips)
+        self.assertEqual(['H', 'R', 'R', 'H'], json_values(temperatures()['Arm']))
+
+    def test_png_shows_points(self):
+        """
+        When I render a plot spec as a PNG image
+        Then I get a valid PNG image of the requested size with points in the series colours
+        """
+
+        png = render_png(SPEC, temperatures(), width=100, height=80)
+        self.assertEqual(b'\x89PNG\r\n\x1a\n', png[:8])
+        width, height = struct.unpack('>II', png[16:24])
+        self.assertEqual((100, 80), (width, height))
+
+        idat = png.index(b'IDAT')
+        length = struct.unpack('>I', png[idat - 4:idat])[0]
+        rows = np.frombuffer(zlib.decompress(png[idat + 4:idat + 4 + length]), dtype=np.uint8)
+        pixels = rows.reshape((height, 1 + width * 3))[:, 1:].reshape((height, width, 3))
+        self.assertTrue(((pixels[:, :, 0] == 255) & (pixels[:, :, 1] == 0) & (pixels[:, :, 2] == 0)).any())
+        self.assertTrue(((pixels[:, :, 0] == 0) & (pixels[:, :, 1] == 0) & (pixels[:, :, 2] == 255)).any())
+
+    def test_item_with_spec_is_rendered_as_bokeh_plot(self):
+        """
+        When I create the content of a data quality item with a plot spec
+        Then the content contains a Bokeh plot
+        """
+
+        kwargs = dict(start_date=datetime.date(2017, 1, 1), end_date=datetime.date(2017, 1, 2))
+        content, _ = _item_content(self.app, PACKAGE, 'plot_specs_item', 0, (), kwargs, refresh=True).result()
+        self.assertIn('Test Temperature', content)
+        self.assertIn('<script', content)
+
+    def test_plot_route_serves_other_formats(self):
+        """
+        When I request a data quality item with a plot spec from the plot route
+        Then I get the item in the requested format, or an error for invalid items and dates
+        """
+
+        self.patch_read_sql(bias_frames)
+
+        response = self.client.get('/plot/instrument/hrs/red/bias/hrdet_bias.csv'
+                                   '?start_date=2017-01-01&end_date=2017-01-02')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('text/csv', response.mimetype)
+        self.assertEqual('series,UTStart,BkgdMean,FileData_Id', response.get_data(as_text=True).splitlines()[0])
+
+        response = self.client.get('/plot/instrument/hrs/red/bias/hrdet_bias.png'
+                                   '?start_date=2017-01-01&end_date=2017-01-02')
+        self.assertEqual('image/png', response.mimetype)
+
+        response = self.client.get('/plot/instrument/hrs/red/bias/unknown.json'
+                                   '?start_date=2017-01-01&end_date=2017-01-02')
+        self.assertEqual(404, response.status_code)
+
+        response = self.client.get('/plot/instrument/hrs/red/bias/hrdet_bias.json?start_date=yesterday')
+        self.assertEqual(400, response.status_code)
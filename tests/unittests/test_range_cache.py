@@ -0,0 +1,100 @@
+import datetime
+import time
+from unittest import mock
+
+import pandas as pd
+
+from app.main import range_cache, render_cache
+from app.main.data_cache import data_cache
+from app.main.data_fetching import read_sql_for_date_range
+from tests.unittests.base import NoAuthBaseTestCase, query_dates
+
+SQL = "SELECT UTStart, Value FROM DQ_HrsFrame WHERE UTStart >= '{start_date}' AND UTStart < '{end_date}'"
+
+
+def nightly_values(sql, count):
+    start, end = query_dates(sql)
+    days = pd.date_range(start, end - pd.Timedelta(days=1))
+    return pd.DataFrame(dict(UTStart=days + pd.Timedelta(hours=20), Value=[count] * len(days)))
+
+
+class RangeCacheTestCase(NoAuthBaseTestCase):
+    def setUp(self):
+        NoAuthBaseTestCase.setUp(self)
+        self.app.config['DATA_CACHE_SIZE'] = 100
+        render_cache._generation.update(value=1, checked=time.time())
+        self.set_latest_night(datetime.date(2017, 2, 1))
+        data_cache().clear()
+        self.read_sql = self.patch_read_sql(nightly_values)
+
+    def tearDown(self):
+        render_cache._generation.update(value=None, checked=None)
+        range_cache._latest_nights.clear()
+        NoAuthBaseTestCase.tearDown(self)
+
+    def set_latest_night(self, night):
+        range_cache._latest_nights[('DQ_HrsFrame', 'UTStart')] = dict(value=night, checked=time.time())
+
+    def queried_ranges(self):
+        return [tuple(d.date() for d in query_dates(sql)) for sql in self.read_sql.queries]
+
+    def read(self, start_day, end_day):
+        return read_sql_for_date_range(SQL, datetime.date(2017, 1, start_day), datetime.date(2017, 1, end_day),
+                                       night_column='UTStart')
+
+    def test_only_missing_nights_are_queried(self):
+        """
+        When I extend a date range requested before on both sides
+        Then only the added nights are queried, and the result has all nights in order
+        """
+
+        self.read(5, 10)
+        df = self.read(3, 12)
+        self.assertEqual([(datetime.date(2017, 1, 5), datetime.date(2017, 1, 10)),
+                          (datetime.date(2017, 1, 3), datetime.date(2017, 1, 5)),
+                          (datetime.date(2017, 1, 10), datetime.date(2017, 1, 12))], self.queried_ranges())
+        self.assertEqual([d.day for d in pd.date_range('2017-01-03', '2017-01-11')],
+                         [t.day for t in df['UTStart']])
+        self.assertEqual([2, 2, 1, 1, 1, 1, 1, 3, 3], list(df['Value']))
+
+    def test_recent_nights_are_queried_again(self):
+        """
+        When I request a date range including the latest night with data twice
+        Then the latest night is queried again, whereas earlier nights are taken from the cache
+        """
+
+        self.set_latest_night(datetime.date(2017, 1, 6))
+        self.read(1, 8)
+        df = self.read(1, 8)
+        self.assertEqual((datetime.date(2017, 1, 6), datetime.date(2017, 1, 8)), self.queried_ranges()[-1])
+        self.assertEqual([1, 1, 1, 1, 1, 2, 2], list(df['Value']))
+
+    def test_nights_are_not_cached_without_data_cache(self):
+        """
+        When I request the same date range twice with a DATA_CACHE_SIZE setting of 0
+        Then the whole date range is queried twice
+        """
+
+        self.app.config['DATA_CACHE_SIZE'] = 0
+        self.read(1, 8)
+        self.read(1, 8)
+        self.assertEqual([(datetime.date(2017, 1, 1), datetime.date(2017, 1, 8))] * 2, self.queried_ranges())
+
+    def test_finality_uses_source_tables_of_query(self):
+        """
+        When I request a date range for a query joining tables
+        Then the latest night is looked up as the UT date of the latest row in the joined tables
+        """
+
+        sql = "select UTStart, BkgdMean from PipelineDataQuality_CCD join FileData using (FileData_Id) " \
+              "       where UTStart >= '{start_date}' and UTStart < '{end_date}' and FileName like 'P%%'"
+        self.assertEqual('PipelineDataQuality_CCD join FileData using (FileData_Id)',
+                         range_cache.source_tables(sql.format(start_date='2017-01-01', end_date='2017-01-02')))
+
+        range_cache._latest_nights.clear()
+        with mock.patch('app.main.range_cache.db') as db:
+            db.engine.execute.return_value.scalar.return_value = datetime.datetime(2017, 1, 6, 1, 30)
+            self.read(1, 8)
+            self.read(1, 8)
+        db.engine.execute.assert_called_once_with('SELECT MAX(UTStart) FROM DQ_HrsFrame')
+        self.assertEqual((datetime.date(2017, 1, 6), datetime.date(2017, 1, 8)), self.queried_ranges()[-1])
@@ -0,0 +1,99 @@
+import datetime
+import json
+
+import numpy as np
+import pandas as pd
+from bokeh.models import CustomJS
+from bokeh.models.glyphs import ImageRGBA
+from bokeh.plotting import figure
+
+from app.main.rasterisation import dense_scatter, raster_data, rasterise, RASTER_ROUTE
+from tests.unittests.base import NoAuthBaseTestCase
+
+
+@raster_data(name='test_points')
+def points_data(start_date, end_date, rows):
+    ut_start = pd.Timestamp(start_date) + pd.to_timedelta(np.linspace(0, 24 * 3600, rows, endpoint=False), unit='s')
+    return pd.DataFrame(dict(UTStart=ut_start, TEMP=np.linspace(280, 290, rows, dtype=np.float32)))
+
+
+def raster_urls(p):
+    """Return the raster route URLs used by the range callbacks of a plot."""
+
+    urls = set()
+    for callback in p.x_range.js_property_callbacks['change:start']:
+        if isinstance(callback, CustomJS):
+            urls.add(json.loads(callback.code.split('y_range, ')[1].split(');')[0]))
+    return urls
+
+
+class RasterisationTestCase(NoAuthBaseTestCase):
+    def test_rasterise_bins_points(self):
+        """
+        When I rasterise points of two colours
+        Then the image has the mean colour of the points in each cell and is transparent elsewhere
+        """
+
+        df = pd.DataFrame(dict(x=[0.1, 0.2, 0.15, 3.9], y=[0.1, 0.1, 0.2, 3.9],
+                               color=['#ff0000', '#0000ff', '#0000ff', '#00ff00']))
+        data = rasterise(df, 'x', 'y', 'color', width=4, height=4, x_range=(0, 4), y_range=(0, 4))
+        rgba = data['image'][0].view(dtype=np.uint8).reshape((4, 4, 4))
+        self.assertEqual([85, 0, 170, 255], rgba[0, 0].tolist())
+        self.assertEqual([0, 255, 0], rgba[3, 3, :3].tolist())
+        self.assertLess(rgba[3, 3, 3], 255)
+        self.assertEqual(0, rgba[1, 1, 3])
+        self.assertEqual([[0], [0], [4], [4]], [data['x'], data['y'], data['dw'], data['dh']])
+
+    def test_few_points_are_not_rasterised(self):
+        """
+        When I create a dense scatter plot with fewer points than the threshold
+        Then the points are plotted as a scatter plot
+        """
+
+        p = figure()
+        renderer = dense_scatter(p, points_data, datetime.date(2017, 1, 1), datetime.date(2017, 1, 2), x='UTStart',
+                                 y='TEMP', color='blue', params=dict(rows=10), threshold=10)
+        self.assertEqual(10, len(renderer.data_source.data['TEMP']))
+        self.assertFalse(any(isinstance(r.glyph, ImageRGBA) for r in p.renderers if hasattr(r, 'glyph')))
+
+    def test_many_points_are_rasterised_and_refetched_on_zoom(self):
+        """
+        When I create a dense scatter plot with more points than the threshold and zoom into it
+        Then the plot contains an image, and the raster route returns an image or the points, depending on the number
+        of visible points
+        """
+
+        p = figure(plot_width=300, plot_height=150)
+        renderer = dense_scatter(p, points_data, datetime.date(2017, 1, 1), datetime.date(2017, 1, 2), x='UTStart',
+                                 y='TEMP', color='blue', params=dict(rows=100), threshold=10)
+        self.assertEqual(0, len(renderer.data_source.data['TEMP']))
+        images = [r for r in p.renderers if hasattr(r, 'glyph') and isinstance(r.glyph, ImageRGBA)]
+        self.assertEqual(1, len(images))
+        self.assertEqual((50, 100), images[0].data_source.data['image'][0].shape)
+
+        url, = raster_urls(p)
+        start = pd.Timestamp('2017-01-01').value / 1e6
+        region = dict(x_start=start, x_end=start + 12 * 3600 * 1000, y_start=280, y_end=290)
+        response = self.client.get(url, query_string=region)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('image', json.loads(response.get_data(as_text=True))['mode'])
+
+        region['x_end'] = start + 3600 * 1000
+        response = self.client.get(url, query_string=region)
+        data = json.loads(response.get_data(as_text=True))
+        self.assertEqual('points', data['mode'])
+        self.assertIn('TEMP', data['data'])
+
+    def test_invalid_raster_requests_are_rejected(self):
+        """
+        When I request a raster region with a forged token or without a region
+        Then I get a 404 or 400 error, respectively
+        """
+
+        region = dict(x_start=0, x_end=1, y_start=0, y_end=1)
+        self.assertEqual(404, self.client.get(RASTER_ROUTE + 'forged', query_string=region).status_code)
+        p = figure()
+        dense_scatter(p, points_data, datetime.date(2017, 1, 1), datetime.date(2017, 1, 2), x='UTStart', y='TEMP',
+                      color='blue', params=dict(rows=100), threshold=10)
+        url, = raster_urls(p)
+        self.assertEqual(400, self.client.get(url).status_code)
@@ -0,0 +1,114 @@
+import datetime
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from app.decorators import data_quality
+from app.main import render_cache
+from app.main.data_quality import _item_content
+from app.main.item_cache import item_cache
+from app.main.prewarming import prewarm
+from app.main.render_cache import prune, read_rendered, write_rendered
+from tests.unittests.base import NoAuthBaseTestCase
+
+computations = []
+
+
+@data_quality(name='render_cache_item', caption='')
+def rendered_item(start_date, end_date):
+    computations.append(start_date)
+    return '<p>computation {count}</p>'.format(count=len(computations))
+
+
+# package under which the test item is registered
+PACKAGE = rendered_item.__module__.rsplit('.', 1)[0]
+
+KWARGS = dict(start_date=datetime.date(2017, 1, 1), end_date=datetime.date(2017, 1, 8))
+
+
+class RenderCacheTestCase(NoAuthBaseTestCase):
+    def setUp(self):
+        NoAuthBaseTestCase.setUp(self)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.app.config['ITEM_CACHE_TTL'] = 600
+        self.app.config['RENDER_CACHE_DIR'] = self.tmp_dir
+        self.app.config['SINGLE_FLIGHT_DIR'] = ''
+        self.set_generation(1)
+        item_cache().clear()
+        del computations[:]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        render_cache._generation.update(value=None, checked=None)
+        NoAuthBaseTestCase.tearDown(self)
+
+    def set_generation(self, generation):
+        render_cache._generation.update(value=generation, checked=time.time())
+
+    def content(self, refresh=False):
+        return _item_content(self.app, PACKAGE, 'render_cache_item', 8, (), KWARGS, refresh).result()[0]
+
+    def test_entries_are_written_and_read(self):
+        """
+        When I write content to the render cache and prune it
+        Then I can read the content until it is older than the retention period
+        """
+
+        as_of = datetime.datetime(2017, 1, 1, 12, 0)
+        write_rendered(self.tmp_dir, 'key', '<p></p>', as_of, 7)
+        self.assertEqual(('<p></p>', as_of, 7), read_rendered(self.tmp_dir, 'key'))
+        self.assertIsNone(read_rendered(self.tmp_dir, 'other key'))
+
+        self.assertEqual(0, prune(self.tmp_dir, retention=60))
+        self.assertEqual(1, prune(self.tmp_dir, retention=-1))
+        self.assertIsNone(read_rendered(self.tmp_dir, 'key'))
+
+    def test_content_is_shared_through_the_render_cache(self):
+        """
+        When I request an item which another process has put into the render cache
+        Then the item isn't created again
+        """
+
+        self.assertEqual('<p>computation 1</p>', self.content())
+        item_cache().clear()
+        self.assertEqual('<p>computation 1</p>', self.content())
+        self.assertEqual(1, len(computations))
+
+    def test_content_for_an_old_generation_is_recreated(self):
+        """
+        When I request an item after the data generation has changed
+        Then the item is created again
+        """
+
+        self.content()
+        self.set_generation(2)
+        self.assertEqual('<p>computation 2</p>', self.content())
+
+    def test_refresh_ignores_cached_content(self):
+        """
+        When I request an item with refresh set to True
+        Then the item is created again and cached
+        """
+
+        self.content()
+        self.assertEqual('<p>computation 2</p>', self.content(refresh=True))
+        self.assertEqual('<p>computation 2</p>', self.content())
+
+    def test_prewarming_runs_once_per_generation(self):
+        """
+        When I pre-warm the caches repeatedly
+        Then the pages are only pre-warmed again for a new generation or if pre-warming is forced
+        """
+
+        packages = ['app.main.pages.a', 'app.main.pages.b']
+        with mock.patch('app.main.prewarming.data_quality_page_packages', return_value=packages), \
+                mock.patch('app.main.prewarming._prewarm_page') as prewarm_page, \
+                mock.patch('app.main.prewarming.current_generation', side_effect=[1, 1, 1, 2]):
+            self.assertEqual(packages, prewarm())
+            self.assertIsNone(prewarm())
+            self.assertEqual(packages, prewarm(force=True))
+            self.assertEqual(packages, prewarm())
+            self.assertEqual(6, prewarm_page.call_count)
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp_dir, 'prewarmed.json')))
@@ -0,0 +1,43 @@
+import os
+
+import pandas as pd
+from bokeh.plotting import figure
+
+from app.main.data_quality import _render_content
+from app.main.rendering import render_pool, submit_render
+from tests.unittests.base import NoAuthBaseTestCase
+
+
+def process_id(_):
+    return os.getpid()
+
+
+def render_figure(df):
+    p = figure()
+    p.scatter(x=df['x'].values, y=df['y'].values)
+    return p
+
+
+class RenderingTestCase(NoAuthBaseTestCase):
+    def test_rendering_in_request_thread(self):
+        """
+        When I submit a rendering function and no render processes are configured
+        Then the function is called in the current process
+        """
+
+        self.app.config['RENDER_PROCESSES'] = 0
+        self.assertIsNone(render_pool())
+        self.assertEqual(os.getpid(), submit_render(process_id, None).result())
+
+    def test_rendering_in_worker_process(self):
+        """
+        When I submit a rendering function and render processes are configured
+        Then the function is called in a worker process, and the HTML content of a Bokeh model is returned
+        """
+
+        self.app.config['RENDER_PROCESSES'] = 2
+        self.assertNotEqual(os.getpid(), submit_render(process_id, None).result())
+        df = pd.DataFrame(dict(x=[1.0, 2.0], y=[3.0, 4.0]))
+        content = submit_render(_render_content, render_figure, df).result()
+        self.assertIn('<script', content)
+        self.assertIn('class="bk-root"', content)
@@ -0,0 +1,123 @@
+import datetime
+import json
+import threading
+
+import pandas as pd
+
+from app.decorators import data_quality
+from app.main import scheduling
+from app.main.data_quality import _item_content
+from app.main.scheduling import (expected_item_cost, longest_first, range_length_bucket, record_item_cost,
+                                 split_date_range, DEFAULT_ITEM_COST)
+from tests.unittests.base import NoAuthBaseTestCase
+
+queried_ranges = []
+
+
+def render_range_count(df):
+    return '<p>{rows}</p>'.format(rows=len(df))
+
+
+@data_quality(name='scheduling_split_item', caption='', render=render_range_count, render_in_process=False,
+              split_range=True)
+def split_item(start_date, end_date):
+    queried_ranges.append((start_date, end_date, threading.current_thread().name))
+    return pd.DataFrame(dict(Night=pd.date_range(start_date, periods=(end_date - start_date).days)))
+
+
+# package under which the test item is registered
+PACKAGE = split_item.__module__.rsplit('.', 1)[0]
+
+
+class SchedulingTestCase(NoAuthBaseTestCase):
+    def setUp(self):
+        NoAuthBaseTestCase.setUp(self)
+        scheduling._costs.clear()
+        del queried_ranges[:]
+
+    def test_range_length_buckets(self):
+        """
+        When I ask for the bucket of date ranges
+        Then the number of days is rounded up to a power of two
+        """
+
+        start = datetime.date(2017, 1, 1)
+        self.assertEqual([1, 1, 2, 4, 4, 32], [range_length_bucket(start, start + datetime.timedelta(days=days))
+                                               for days in (0, 1, 2, 3, 4, 31)])
+
+    def test_expected_costs(self):
+        """
+        When I record render times for an item
+        Then their moving average is expected for the same bucket, scaled for other buckets, and the default is
+        expected for other items
+        """
+
+        record_item_cost('pkg', 'item', 4, 2.0)
+        self.assertEqual(2.0, expected_item_cost('pkg', 'item', 4))
+        record_item_cost('pkg', 'item', 4, 4.0)
+        self.assertAlmostEqual(2.6, expected_item_cost('pkg', 'item', 4))
+        self.assertAlmostEqual(5.2, expected_item_cost('pkg', 'item', 8))
+        self.assertEqual(DEFAULT_ITEM_COST, expected_item_cost('pkg', 'other', 4))
+
+    def test_longest_first(self):
+        """
+        When I order items by their expected render time
+        Then the slowest item comes first and items without history keep their order
+        """
+
+        record_item_cost('pkg', 'fast', 1, 0.1)
+        record_item_cost('pkg', 'slow', 1, 5.0)
+        self.assertEqual(['slow', 'a', 'b', 'fast'], longest_first('pkg', ['a', 'fast', 'b', 'slow'], 1))
+
+    def test_split_date_range(self):
+        """
+        When I split a date range
+        Then I get consecutive ranges covering the whole range
+        """
+
+        start, end = datetime.date(2017, 1, 1), datetime.date(2017, 1, 11)
+        ranges = split_date_range(start, end, 3)
+        self.assertEqual(3, len(ranges))
+        self.assertEqual(start, ranges[0][0])
+        self.assertEqual(end, ranges[-1][1])
+        for previous, following in zip(ranges[:-1], ranges[1:]):
+            self.assertEqual(previous[1], following[0])
+        self.assertEqual([(start, start + datetime.timedelta(days=1))],
+                         split_date_range(start, start + datetime.timedelta(days=1), 3))
+
+    def test_slow_splittable_item_is_queried_in_parallel(self):
+        """
+        When I create a splittable item which is expected to be slow
+        Then its date range is queried in parallel partitions, which are concatenated, and its render time is recorded
+        """
+
+        self.app.config['ITEM_MAX_PARALLELISM'] = 4
+        self.app.config['ITEM_SPLIT_SECONDS'] = 1
+        start, end = datetime.date(2017, 1, 1), datetime.date(2017, 1, 21)
+        bucket = range_length_bucket(start, end)
+        record_item_cost(PACKAGE, 'scheduling_split_item', bucket, 10)
+
+        content = _item_content(self.app, PACKAGE, 'scheduling_split_item', bucket, (),
+                                dict(start_date=start, end_date=end)).result()[0]
+        self.assertEqual('<p>20</p>', content)
+        self.assertEqual(4, len(queried_ranges))
+        self.assertNotIn(threading.current_thread().name, [r[2] for r in queried_ranges])
+        self.assertEqual(2, scheduling._costs[(PACKAGE, 'scheduling_split_item', bucket)][1])
+
+        self.app.config['ITEM_SPLIT_SECONDS'] = 0
+        del queried_ranges[:]
+        _item_content(self.app, PACKAGE, 'scheduling_split_item', bucket, (),
+                      dict(start_date=start, end_date=end)).result()
+        self.assertEqual(1, len(queried_ranges))
+
+    def test_item_costs_endpoint(self):
+        """
+        When I request the item costs
+        Then I get the recorded moving averages as JSON
+        """
+
+        record_item_cost('pkg', 'item', 2, 1.5)
+        response = self.client.get('/admin/item-costs')
+        self.assertEqual(200, response.status_code)
+        costs = json.loads(response.get_data(as_text=True))['costs']
+        self.assertEqual([dict(package='pkg', name='item', range_days=2, mean_seconds=1.5, renders=1)], costs)
@@ -0,0 +1,135 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from app.main.single_flight import _acquire, _release, flight_key, single_flight
+from tests.unittests.base import NoAuthBaseTestCase
+
+
+def slow_computation(counter_file, value):
+    with open(counter_file, 'a') as f:
+        f.write('computed\n')
+    time.sleep(0.5)
+    return value
+
+
+def compute_in_server_process(app, counter_file, barrier, results):
+    barrier.wait()
+    with app.app_context():
+        flight = single_flight(flight_key('item', 42), lambda: slow_computation(counter_file, os.getpid()))
+        results.put(flight.result())
+
+
+class SingleFlightTestCase(NoAuthBaseTestCase):
+    def setUp(self):
+        NoAuthBaseTestCase.setUp(self)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.counter_file = os.path.join(self.tmp_dir, 'counter.txt')
+        self.app.config['SINGLE_FLIGHT_DIR'] = os.path.join(self.tmp_dir, 'single_flight')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        NoAuthBaseTestCase.tearDown(self)
+
+    def computations(self):
+        with open(self.counter_file) as f:
+            return len(f.readlines())
+
+    def test_keys_are_normalised(self):
+        """
+        When I create keys for the same parameters in different orders
+        Then the keys are equal
+        """
+
+        self.assertEqual(flight_key('item', dict(a=1, b='x')), flight_key('item', dict(b='x', a=1)))
+        self.assertNotEqual(flight_key('item', dict(a=1)), flight_key('item', dict(a=2)))
+
+    def test_concurrent_computations_in_a_process_are_shared(self):
+        """
+        When several threads request the same computation at the same time
+        Then the computation is done once and all threads get its result
+        """
+
+        results = []
+
+        def request():
+            with self.app.app_context():
+                results.append(single_flight(flight_key('item', 1),
+                                             lambda: slow_computation(self.counter_file, 'content')).result())
+
+        threads = [threading.Thread(target=request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(['content'] * 8, results)
+        self.assertEqual(1, self.computations())
+
+        single_flight(flight_key('item', 1), lambda: slow_computation(self.counter_file, 'content')).result()
+        self.assertEqual(2, self.computations())
+
+    def test_errors_are_shared(self):
+        """
+        When a shared computation fails
+        Then all requests get the error
+        """
+
+        def fail():
+            raise ValueError('No data')
+
+        with self.assertRaises(ValueError):
+            single_flight(flight_key('failing'), fail).result()
+
+    def test_concurrent_computations_in_different_processes_are_shared(self):
+        """
+        When several server processes request the same computation at the same time
+        Then the computation is done once and all processes get its result
+        """
+
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        barrier = context.Barrier(3)
+        processes = [context.Process(target=compute_in_server_process,
+                                     args=(self.app, self.counter_file, barrier, results))
+                     for _ in range(3)]
+        for process in processes:
+            process.start()
+        values = [results.get(timeout=30) for _ in processes]
+        for process in processes:
+            process.join()
+        self.assertEqual(1, self.computations())
+        self.assertEqual(1, len(set(values)))
+        self.assertEqual([], os.listdir(self.app.config['SINGLE_FLIGHT_DIR']))
+
+    def test_results_are_only_written_for_waiting_processes(self):
+        """
+        When a process computes a value while no other process is waiting for it
+        Then no result file is written, and the lock file is deleted
+        """
+
+        with self.app.app_context():
+            self.assertEqual('content', single_flight(flight_key('item', 2),
+                                                      lambda: slow_computation(self.counter_file, 'content')).result())
+        self.assertEqual([], os.listdir(self.app.config['SINGLE_FLIGHT_DIR']))
+
+    def test_lock_is_waited_for_with_timeout(self):
+        """
+        When another process holds the lock for a computation for longer than SINGLE_FLIGHT_TIMEOUT
+        Then the value is computed without the lock once the timeout has passed
+        """
+
+        self.app.config['SINGLE_FLIGHT_TIMEOUT'] = 1
+        key = flight_key('item', 3)
+        lock = _acquire(self.app.config['SINGLE_FLIGHT_DIR'], key, 0)
+        try:
+            start = time.time()
+            with self.app.app_context():
+                flight = single_flight(key, lambda: slow_computation(self.counter_file, 'content'))
+                self.assertEqual('content', flight.result())
+            self.assertTrue(1 <= time.time() - start < 5)
+            self.assertEqual(1, self.computations())
+        finally:
+            _release(lock)
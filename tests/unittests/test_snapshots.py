@@ -0,0 +1,89 @@
+import datetime
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from app.main.snapshots import snapshot
+from tests.unittests.base import frame_rows, NoAuthBaseTestCase
+
+PACKAGES = ['app.main.pages.instrument.hrs.environment.temperature', 'app.main.pages.instrument.hrs.red.bias']
+
+START_DATE = datetime.date(2017, 1, 1)
+
+END_DATE = datetime.date(2017, 1, 3)
+
+
+def hrs_frames(sql, count):
+    return frame_rows(sql, BkgdMean=[1.5, 1.7])
+
+
+class SnapshotsTestCase(NoAuthBaseTestCase):
+    def setUp(self):
+        NoAuthBaseTestCase.setUp(self)
+        self.output_dir = tempfile.mkdtemp()
+        self.read_sql = self.patch_read_sql(hrs_frames)
+        self.patch = mock.patch('app.main.snapshots.current_generation', return_value=42)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        shutil.rmtree(self.output_dir)
+        NoAuthBaseTestCase.tearDown(self)
+
+    def test_snapshot_is_static_html_tree(self):
+        """
+        When I create a snapshot of pages
+        Then there is an HTML file per page with a data file per figure, sharing the BokehJS files and shared datasets
+        """
+
+        statuses = snapshot(self.output_dir, START_DATE, END_DATE, 'testing', packages=PACKAGES)
+        self.assertEqual(['rendered', 'rendered'], list(statuses.values()))
+        self.assertEqual(2, len(self.read_sql.queries))
+
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, 'static', 'bokeh.min.js')))
+        with open(os.path.join(self.output_dir, 'index.html')) as f:
+            self.assertIn('href="instrument/hrs/red/bias/index.html"', f.read())
+        page_dir = os.path.join(self.output_dir, 'instrument', 'hrs', 'environment', 'temperature')
+        with open(os.path.join(page_dir, 'index.html')) as f:
+            html = f.read()
+        self.assertIn('src="../../../../static/bokeh.min.js"', html)
+        self.assertIn('src="temp_air.js"', html)
+        with open(os.path.join(page_dir, 'temp_air.js')) as f:
+            self.assertIn('HRS Environment Air Temperature', f.read())
+
+    def test_snapshot_has_no_frame_details(self):
+        """
+        When I create a snapshot of pages with plots showing frame details on the server
+        Then no figure of the snapshot asks for frame details
+        """
+
+        snapshot(self.output_dir, START_DATE, END_DATE, 'testing', packages=PACKAGES)
+        js_files = [os.path.join(directory, filename)
+                    for directory, _, filenames in os.walk(self.output_dir)
+                    for filename in filenames
+                    if filename.endswith('.js') and os.path.basename(directory) != 'static']
+        self.assertTrue(js_files)
+        for path in js_files:
+            with open(path) as f:
+                self.assertFalse('frameDetails' in f.read(), path)
+
+    def test_unchanged_pages_are_skipped(self):
+        """
+        When I create a snapshot again for the same date range
+        Then the pages are not rendered again, unless I force it or the date range changes
+        """
+
+        snapshot(self.output_dir, START_DATE, END_DATE, 'testing', packages=PACKAGES)
+        del self.read_sql.queries[:]
+
+        statuses = snapshot(self.output_dir, START_DATE, END_DATE, 'testing', packages=PACKAGES)
+        self.assertEqual(['unchanged', 'unchanged'], list(statuses.values()))
+        self.assertEqual([], self.read_sql.queries)
+
+        statuses = snapshot(self.output_dir, START_DATE, END_DATE, 'testing', packages=PACKAGES[:1], force=True)
+        self.assertEqual(['rendered'], list(statuses.values()))
+
+        statuses = snapshot(self.output_dir, START_DATE, END_DATE + datetime.timedelta(days=1), 'testing',
+                            packages=PACKAGES)
+        self.assertEqual(['rendered', 'rendered'], list(statuses.values()))